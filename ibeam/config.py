@@ -19,6 +19,10 @@ class Config():
 
             raise AttributeError(f'{key} is not a valid config key. Existing keys: {list(self._all_variables.keys())}')
 
+    def with_variables(self, **variables) -> 'Config':
+        """Returns a copy of this config with some variables replaced, such as those that differ between the supervised accounts."""
+        return Config({**self._all_variables, **variables})
+
     @property
     def all_variables(self):
         return self._all_variables.copy()
\ No newline at end of file
@@ -1,8 +1,10 @@
 import argparse
+import datetime
 import logging
 import os
 import signal
 import sys
+from functools import partial
 from pathlib import Path
 
 def add_to_path():
@@ -13,15 +15,23 @@ add_to_path()
 
 from ibeam.config import Config
 from ibeam.src.handlers.login_handler import LoginHandler
-from ibeam.src.handlers.process_handler import ProcessHandler
+from ibeam.src.gateway_readiness import GatewayReadiness
+from ibeam.src.handlers.process_handler import ProcessHandler, BlueGreenProcessHandler, GATEWAY_CONF, GATEWAY_ALTERNATE_CONF, GATEWAY_RESTART_BLUE_GREEN, with_port, write_alternate_conf
 from ibeam.src.handlers.secrets_handler import SecretsHandler
 from ibeam.src.handlers.strategy_handler import StrategyHandler
+from ibeam.src.login.browser_budget import BrowserBudget
+from ibeam.src.login.browser_pool import BrowserPool
 from ibeam.src.login.driver import DriverFactory, shut_down_browser
+from ibeam.src.login.resource_blocking import ResourceBlocking, parse_list
+from ibeam.src.login.session_store import SessionStore
 from ibeam.src.login.targets import create_targets
 
 import ibeam
 
 from ibeam.src.gateway_client import GatewayClient
+from ibeam.src.log_archive import LogArchive
+from ibeam.src.session_refresh import RefreshPlanner, TradingCalendar, parse_trading_hours, parse_trading_days, parse_holidays
+from ibeam.src.supervisor import Supervisor, parse_accounts, account_variables, copy_gateway_dir, account_conf, secrets_prefix, port_of
 from ibeam.src.handlers.http_handler import HttpHandler
 from ibeam.src import var, two_fa_selector
 from ibeam.src.handlers.inputs_handler import InputsHandler
@@ -38,29 +48,56 @@ def parse_args():
     parser.add_argument('-u', '--user', action='store_true', help='Get the user.')
     parser.add_argument('-c', '--check', action='store_true', help='Check if session is authenticated.')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output.')
+    parser.add_argument('-l', '--list-logs', action='store_true', help='List the log files kept in the Outputs Directory.')
+    parser.add_argument('--log', metavar='YYYY-MM-DD', help='Print the log of a past day.')
 
     args = parser.parse_args()
     return args
 
 
-if __name__ == '__main__':
-    cnf = Config(var.all_variables)
+def show_logs(cnf: Config, args) -> int:
+    """Lists the log files or prints the log of a day, returning the exit code."""
+    archive = LogArchive(cnf.OUTPUTS_DIR)
+    if args.list_logs:
+        for entry in archive.index():
+            size = f'{entry["bytes"]} bytes' if entry['bytes'] is not None else 'size unknown'
+            lines = f', {entry["lines"]} lines' if entry['lines'] is not None else ''
+            print(f'{entry["day"]}  {entry["file"]}  {size}{lines}, {entry["stored_bytes"]} bytes stored')
+        return 0
 
-    from ibeam.src import logs
-    logs.initialize(
-        log_format=cnf.LOG_FORMAT,
-        log_level=cnf.LOG_LEVEL,
-        log_to_file=cnf.LOG_TO_FILE,
-        outputs_dir=cnf.OUTPUTS_DIR,
-    )
+    try:
+        for line in archive.stream_day(datetime.date.fromisoformat(args.log)):
+            sys.stdout.write(line)
+    except ValueError:
+        print(f'Invalid day: "{args.log}", use YYYY-MM-DD', file=sys.stderr)
+        return 1
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
 
 
-    _LOGGER.info(f'############ Starting IBeam version {ibeam.__version__} ############')
-    args = parse_args()
+def new_driver_factory(cnf: Config, name: str = 'default') -> DriverFactory:
+    return DriverFactory(
+        driver_path=cnf.CHROME_DRIVER_PATH,
+        name=name,
+        ui_scaling=cnf.UI_SCALING,
+        page_load_timeout=cnf.PAGE_LOAD_TIMEOUT,
+        resource_blocking=ResourceBlocking(
+            preset=cnf.BROWSER_RESOURCE_BLOCKING,
+            blocked_urls=parse_list(cnf.BROWSER_BLOCKED_URLS),
+            allowed_hosts=parse_list(cnf.BROWSER_ALLOWED_HOSTS),
+            base_url=cnf.GATEWAY_BASE_URL,
+        ),
+    )
 
-    if args.verbose:
-        logs.set_level_for_all(_LOGGER, logging.DEBUG)
 
+def new_gateway_client(cnf: Config,
+                       name: str = None,
+                       browser_pool: BrowserPool = None,
+                       browser_budget: BrowserBudget = None,
+                       ) -> GatewayClient:
+    """Creates the handlers maintaining one Gateway. If 'name' is set, the Gateway is the one of that account among the accounts run by the Supervisor."""
     inputs_handler = InputsHandler(inputs_dir=cnf.INPUTS_DIR, gateway_dir=cnf.GATEWAY_DIR)
 
     http_handler = HttpHandler(
@@ -72,13 +109,12 @@ if __name__ == '__main__':
         route_reauthenticate=cnf.ROUTE_REAUTHENTICATE,
         route_initialise=cnf.ROUTE_INITIALISE,
         request_timeout=cnf.REQUEST_TIMEOUT,
+        pool_size=cnf.HTTP_POOL_SIZE,
+        pool_idle_timeout=cnf.HTTP_POOL_IDLE_TIMEOUT,
+        pool_max_reconnects=cnf.HTTP_POOL_MAX_RECONNECTS,
     )
 
-    driver_factory = DriverFactory(
-        driver_path=cnf.CHROME_DRIVER_PATH,
-        ui_scaling=cnf.UI_SCALING,
-        page_load_timeout=cnf.PAGE_LOAD_TIMEOUT,
-    )
+    driver_factory = new_driver_factory(cnf, name or 'default')
 
     two_fa_handler = two_fa_selector.select(
         handler_name=cnf.TWO_FA_HANDLER,
@@ -89,10 +125,27 @@ if __name__ == '__main__':
     )
 
     _LOGGER.info(f'Secrets source: {cnf.SECRETS_SOURCE}')
-    secrets_handler = SecretsHandler(secrets_source=cnf.SECRETS_SOURCE, gcp_base_url=cnf.GCP_SECRETS_URL)
+    secrets_handler = SecretsHandler(
+        secrets_source=cnf.SECRETS_SOURCE,
+        gcp_base_url=cnf.GCP_SECRETS_URL,
+        env_prefix='IBEAM_' if name is None else secrets_prefix(name),
+        secrets_cache_ttl=cnf.SECRETS_CACHE_TTL,
+    )
 
     targets = create_targets(cnf)
 
+    session_store = None
+    if cnf.SESSION_STORE:
+        session_store_key = cnf.SESSION_STORE_KEY or secrets_handler.key
+        if session_store_key is None:
+            _LOGGER.error('IBEAM_SESSION_STORE is enabled but no key to encrypt the session with was found. Specify one by setting IBEAM_SESSION_STORE_KEY environment variable. Continuing without storing sessions.')
+        else:
+            session_store = SessionStore(
+                path=os.path.join(cnf.OUTPUTS_DIR, 'session.enc'),
+                key=session_store_key,
+                max_age=cnf.SESSION_STORE_MAX_AGE,
+            )
+
     login_handler = LoginHandler(
         secrets_handler=secrets_handler,
         two_fa_handler=two_fa_handler,
@@ -106,18 +159,55 @@ if __name__ == '__main__':
         oauth_timeout=cnf.OAUTH_TIMEOUT,
         max_presubmit_buffer=cnf.MAX_PRESUBMIT_BUFFER,
         min_presubmit_buffer=cnf.MIN_PRESUBMIT_BUFFER,
+        presubmit_buffer_floor=cnf.PRESUBMIT_BUFFER_FLOOR,
         max_failed_auth=cnf.MAX_FAILED_AUTH,
         outputs_dir=cnf.OUTPUTS_DIR,
         use_paper_account=cnf.USE_PAPER_ACCOUNT,
         count_timeout_as_failed=cnf.COUNT_TIMEOUT_AS_FAILED,
+        browser_pool=browser_pool,
+        login_engine=cnf.LOGIN_ENGINE,
+        dom_wait_engine=cnf.DOM_WAIT_ENGINE,
+        session_store=session_store,
+        browser_budget=browser_budget,
+        http_login_verify=inputs_handler.cacert_pem_path if inputs_handler.valid_certificates else False,
     )
 
-    process_handler = ProcessHandler(
-        gateway_process_match=cnf.GATEWAY_PROCESS_MATCH,
-        gateway_dir=cnf.GATEWAY_DIR,
-        gateway_startup=cnf.GATEWAY_STARTUP,
-        verify_connection=http_handler.base_route,
-    )
+    def new_process_handler(base_url: str, pid_file: str, gateway_conf: str = None) -> ProcessHandler:
+        return ProcessHandler(
+            gateway_process_match=cnf.GATEWAY_PROCESS_MATCH,
+            gateway_dir=cnf.GATEWAY_DIR,
+            gateway_startup=cnf.GATEWAY_STARTUP,
+            verify_connection=partial(http_handler.try_request, base_url),
+            pid_file=os.path.join(cnf.OUTPUTS_DIR, pid_file),
+            readiness=GatewayReadiness(
+                log_dir=os.path.join(cnf.GATEWAY_DIR, 'logs'),
+                base_url=base_url,
+                ready_pattern=cnf.GATEWAY_READY_PATTERN,
+                poll_interval=cnf.GATEWAY_READY_POLL_INTERVAL,
+            ),
+            gateway_conf=gateway_conf,
+        )
+
+    # the Gateways of the accounts are told apart by their conf files
+    conf = GATEWAY_CONF if name is None else account_conf(name)
+    alternate_conf = GATEWAY_ALTERNATE_CONF if name is None else account_conf(name, alternate=True)
+    if name is not None:
+        write_alternate_conf(cnf.GATEWAY_DIR, port_of(cnf.GATEWAY_BASE_URL), target=conf)
+
+    if cnf.GATEWAY_RESTART_MODE == GATEWAY_RESTART_BLUE_GREEN:
+        write_alternate_conf(cnf.GATEWAY_DIR, cnf.GATEWAY_ALTERNATE_PORT, target=alternate_conf)
+        alternate_base_url = with_port(cnf.GATEWAY_BASE_URL, cnf.GATEWAY_ALTERNATE_PORT)
+        process_handler = BlueGreenProcessHandler(
+            process_handlers=[
+                new_process_handler(cnf.GATEWAY_BASE_URL, 'gateway.pid', conf),
+                new_process_handler(alternate_base_url, 'gateway.alternate.pid', alternate_conf),
+            ],
+            base_urls=[cnf.GATEWAY_BASE_URL, alternate_base_url],
+            base_url_holders=[http_handler, login_handler],
+            state_file=os.path.join(cnf.OUTPUTS_DIR, 'gateway_base_url'),
+        )
+    else:
+        process_handler = new_process_handler(cnf.GATEWAY_BASE_URL, 'gateway.pid', None if name is None else conf)
 
     strategy_handler = StrategyHandler(
         http_handler=http_handler,
@@ -129,21 +219,109 @@ if __name__ == '__main__':
         restart_wait=cnf.RESTART_WAIT,
         max_reauthenticate_retries=cnf.MAX_REAUTHENTICATE_RETRIES,
         max_status_check_retries=cnf.MAX_STATUS_CHECK_RETRIES,
+        gateway_restart_mode=cnf.GATEWAY_RESTART_MODE,
     )
 
+    refresh_planner = None
+    if cnf.SESSION_REFRESH:
+        refresh_planner = RefreshPlanner(
+            calendar=TradingCalendar(
+                timezone=cnf.TRADING_TIMEZONE,
+                hours=parse_trading_hours(cnf.TRADING_HOURS),
+                days=parse_trading_days(cnf.TRADING_DAYS),
+                holidays=parse_holidays(cnf.TRADING_HOLIDAYS),
+                quiet_margin=cnf.TRADING_QUIET_MARGIN,
+            ),
+            lead_time=cnf.SESSION_REFRESH_LEAD_TIME,
+            cooldown=cnf.SESSION_REFRESH_COOLDOWN,
+        )
+
     client = GatewayClient(
         http_handler=http_handler,
         strategy_handler=strategy_handler,
         process_handler=process_handler,
-        health_server_port=cnf.HEALTH_SERVER_PORT,
+        health_server_port=cnf.HEALTH_SERVER_PORT if name is None else None,
         spawn_new_processes=cnf.SPAWN_NEW_PROCESSES,
         maintenance_interval=cnf.MAINTENANCE_INTERVAL,
         request_retries=cnf.REQUEST_RETRIES,
         active=cnf.START_ACTIVE,
+        maintenance_schedule=cnf.MAINTENANCE_SCHEDULE,
+        min_maintenance_interval=cnf.MIN_MAINTENANCE_INTERVAL,
+        max_maintenance_interval=cnf.MAX_MAINTENANCE_INTERVAL,
+        status_cache_ttl=cnf.STATUS_CACHE_TTL,
+        name=name,
+        refresh_planner=refresh_planner,
+    )
+    return client
+
+
+if __name__ == '__main__':
+    cnf = Config(var.all_variables)
+
+    args = parse_args()
+    if args.list_logs or args.log:
+        sys.exit(show_logs(cnf, args))
+
+    from ibeam.src import logs
+    logs.initialize(
+        log_format=cnf.LOG_FORMAT,
+        log_level=cnf.LOG_LEVEL,
+        log_to_file=cnf.LOG_TO_FILE,
+        outputs_dir=cnf.OUTPUTS_DIR,
+        log_json=cnf.LOG_JSON,
+        log_compress=cnf.LOG_COMPRESS,
+        log_max_age=cnf.LOG_MAX_AGE,
+        log_max_bytes=cnf.LOG_MAX_BYTES,
     )
 
+
+    _LOGGER.info(f'############ Starting IBeam version {ibeam.__version__} ############')
+
+    if args.verbose:
+        logs.set_level_for_all(_LOGGER, logging.DEBUG)
+
+    accounts = parse_accounts(cnf.ACCOUNTS)
+
+    browser_pool = None
+    if cnf.BROWSER_POOL_SIZE > 0 and cnf.SPAWN_NEW_PROCESSES and not accounts:
+        # each spawned process would launch browsers of its own and exit without quitting them
+        _LOGGER.warning('IBEAM_BROWSER_POOL_SIZE is not supported with IBEAM_SPAWN_NEW_PROCESSES, launching a new browser for every login.')
+    elif cnf.BROWSER_POOL_SIZE > 0:
+        # shared by the accounts, if several are run
+        browser_pool = BrowserPool(
+            driver_factory=new_driver_factory(cnf),
+            size=cnf.BROWSER_POOL_SIZE,
+            max_age=cnf.BROWSER_POOL_MAX_AGE,
+            max_uses=cnf.BROWSER_POOL_MAX_USES,
+        )
+        browser_pool.warm_in_background()
+
+    supervisor = None
+    if accounts:
+        if cnf.SPAWN_NEW_PROCESSES:
+            _LOGGER.warning('IBEAM_SPAWN_NEW_PROCESSES is not supported when running several accounts, maintaining them in this process.')
+
+        browser_budget = BrowserBudget(size=cnf.BROWSER_BUDGET, timeout=cnf.BROWSER_BUDGET_TIMEOUT)
+        clients = {}
+        for index, name in enumerate(accounts):
+            account_cnf = cnf.with_variables(**account_variables(cnf, name, index), SPAWN_NEW_PROCESSES=False)
+            copy_gateway_dir(cnf.GATEWAY_DIR, account_cnf.GATEWAY_DIR)
+            os.makedirs(account_cnf.OUTPUTS_DIR, exist_ok=True)
+            _LOGGER.info(f'Account {name}: Gateway at {account_cnf.GATEWAY_BASE_URL} running from {account_cnf.GATEWAY_DIR}')
+            clients[name] = new_gateway_client(account_cnf, name=name, browser_pool=browser_pool, browser_budget=browser_budget)
+
+        supervisor = Supervisor(clients=clients, health_server_port=cnf.HEALTH_SERVER_PORT, browser_budget=browser_budget)
+        client = None
+    else:
+        client = new_gateway_client(cnf, browser_pool=browser_pool)
+        http_handler = client.http_handler
+        strategy_handler = client.strategy_handler
+        process_handler = client.process_handler
+
     def stop(_, _1):
-        client.shutdown()
+        (supervisor or client).shutdown()
+        if browser_pool is not None:
+            browser_pool.close()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, stop)
@@ -151,7 +329,20 @@ if __name__ == '__main__':
 
     _LOGGER.info(f'Configuration:\n{cnf.all_variables}')
 
-    if args.start:
+    if supervisor is not None:
+        if args.kill:
+            for name, success in supervisor.kill_gateways().items():
+                _LOGGER.info(f'Gateway of account {name} {"" if success else "not "}killed.')
+            supervisor.shutdown()
+        elif args.start or args.authenticate or args.check or args.tickle:
+            _LOGGER.error('Only maintaining and killing the Gateways is supported when running several accounts with IBEAM_ACCOUNTS.')
+            supervisor.shutdown()
+        else:
+            if not args.maintain:
+                # we have to do this here first because APS waits before running it the first time
+                supervisor.start_and_authenticate()
+            supervisor.maintain()
+    elif args.start:
         pids = process_handler.start_gateway()
         if pids is not None:
             _LOGGER.info(f'Gateway running with pids: {pids}')
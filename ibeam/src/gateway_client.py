@@ -2,15 +2,22 @@ import logging
 import sys
 import time
 
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Optional, Tuple
+from apscheduler.events import EVENT_JOB_EXECUTED
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
+from ibeam.src import log_context
 from ibeam.src.health_server import new_health_server
 from ibeam.src.handlers.http_handler import HttpHandler, Status
-from ibeam.src.handlers.process_handler import ProcessHandler
+from ibeam.src.handlers.process_handler import ProcessHandler, BlueGreenProcessHandler
 from ibeam.src.handlers.strategy_handler import StrategyHandler
+from ibeam.src.maintenance_schedule import AdaptiveSchedule, MAINTENANCE_SCHEDULE_ADAPTIVE, MAINTENANCE_SCHEDULE_FIXED
+from ibeam.src.session_refresh import RefreshPlanner
+from ibeam.src.status_snapshot import StatusSnapshot
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -22,12 +29,23 @@ class GatewayClient():
                  http_handler: HttpHandler,
                  strategy_handler: StrategyHandler,
                  process_handler: ProcessHandler,
-                 health_server_port: int,
+                 health_server_port: Optional[int],
                  spawn_new_processes: bool,
                  maintenance_interval: int,
                  request_retries: int,
                  active:bool=True,
+                 maintenance_schedule:str=MAINTENANCE_SCHEDULE_FIXED,
+                 min_maintenance_interval:int=10,
+                 max_maintenance_interval:int=180,
+                 status_cache_ttl:float=0,
+                 name:Optional[str]=None,
+                 refresh_planner:Optional[RefreshPlanner]=None,
                  ):
+        """
+        :param health_server_port: Port of the health server. If None, no health server is started, as when the Supervisor serves the status of all accounts.
+        :param name: Name of the account, set when this client is one of several run by the Supervisor.
+        :param refresh_planner: Plans when to refresh the session ahead of its expiry. If None, the session is only logged into again once it expired.
+        """
 
         self._should_shutdown = False
 
@@ -39,29 +57,60 @@ class GatewayClient():
         self.spawn_new_processes = spawn_new_processes
         self.maintenance_interval = maintenance_interval
         self.request_retries = request_retries
+        self.status_cache_ttl = status_cache_ttl
+        self.name = name
+        self.job_id = 'maintenance' if name is None else f'maintenance-{name}'
+        self.status_snapshot = StatusSnapshot(self.http_handler.get_status, self.status_cache_ttl)
+        self.refresh_planner = refresh_planner
+        self._refresh_at = None
+
+        if maintenance_schedule == MAINTENANCE_SCHEDULE_ADAPTIVE:
+            self.adaptive_schedule = AdaptiveSchedule(
+                base_interval=maintenance_interval,
+                min_interval=min_maintenance_interval,
+                max_interval=max_maintenance_interval,
+            )
+        else:
+            if maintenance_schedule != MAINTENANCE_SCHEDULE_FIXED:
+                _LOGGER.error(f'Unknown maintenance schedule: "{maintenance_schedule}". Defaulting to "{MAINTENANCE_SCHEDULE_FIXED}".')
+            self.adaptive_schedule = None
 
         self._concurrent_maintenance_attempts = 1
-        self._health_server = new_health_server(
-            self.health_server_port,
-            self.http_handler.get_status,
-            self.get_shutdown_status,
-            self.on_activate,
-            self.on_deactivate,
-        )
+        self._owns_scheduler = True
+        self._health_server = None
+        if self.health_server_port is not None:
+            self._health_server = new_health_server(
+                self.health_server_port,
+                self.status_snapshot.get,
+                self.get_shutdown_status,
+                self.on_activate,
+                self.on_deactivate,
+                self.get_base_url,
+            )
 
         self._active = active
 
     def get_shutdown_status(self) -> bool:
         return self._should_shutdown
 
+    def get_base_url(self) -> str:
+        """Base URL of the Gateway in use, which changes when the Gateway is restarted in 'blue_green' mode."""
+        return self.http_handler.base_url
+
     def start_and_authenticate(self, request_retries=1) -> (bool, bool, Status):
         """Starts the gateway and authenticates using the credentials stored."""
 
-        self.process_handler.start_gateway()
+        # within a maintenance, this carries on with its cycle
+        with log_context.cycle(self.name):
+            if not self.process_handler.find_processes():
+                # a Gateway started anew has no session, the stored one can be resumed
+                self.strategy_handler.resume_pending = True
+            self.process_handler.start_gateway()
 
-        success, shutdown, status = self.strategy_handler.try_authenticating(request_retries=request_retries)
-        self._should_shutdown = shutdown
-        return success, shutdown, status
+            success, shutdown, status = self.strategy_handler.try_authenticating(request_retries=request_retries)
+            self._should_shutdown = shutdown
+            self.status_snapshot.update(status)
+            return success, shutdown, status
 
     def on_activate(self) -> bool:
         if self._active:
@@ -77,8 +126,10 @@ class GatewayClient():
 
         _LOGGER.info('Deactivating')
         self._active = False
+        self._follow_gateway()
         self.http_handler.logout()
         self.process_handler.kill_gateway()
+        self.status_snapshot.invalidate()
         return True
 
     def build_scheduler(self):
@@ -87,12 +138,84 @@ class GatewayClient():
         else:
             executors = {'default': ThreadPoolExecutor(self._concurrent_maintenance_attempts)}
         job_defaults = {'coalesce': False, 'max_instances': self._concurrent_maintenance_attempts}
-        self._scheduler = BackgroundScheduler(executors=executors, job_defaults=job_defaults, timezone='UTC')
-        self._scheduler.add_job(self._maintenance, trigger=IntervalTrigger(seconds=self.maintenance_interval))
+        self.schedule(BackgroundScheduler(executors=executors, job_defaults=job_defaults, timezone='UTC'))
+        self._owns_scheduler = True
+
+    def schedule(self, scheduler: BackgroundScheduler):
+        """Adds the maintenance job to the scheduler, which the Supervisor shares between the clients of all accounts."""
+        self._scheduler = scheduler
+        self._owns_scheduler = False
+        self._scheduler.add_job(self._maintenance, trigger=IntervalTrigger(seconds=self.maintenance_interval), id=self.job_id)
+        # maintenance results are handled in this process, as maintenance may be running in a spawned one
+        self._scheduler.add_listener(self._on_maintenance_executed, EVENT_JOB_EXECUTED)
+
+    def _follow_gateway(self):
+        """Follows the Gateway a spawned maintenance process may have replaced in 'blue_green' restart mode, as the switch happened only in that process."""
+        if self.spawn_new_processes and isinstance(self.process_handler, BlueGreenProcessHandler):
+            if self.process_handler.follow_state():
+                self.status_snapshot.invalidate()
+
+    def _on_maintenance_executed(self, event):
+        if event.job_id != self.job_id:
+            return
+
+        self._follow_gateway()
+        if event.retval is None:
+            return
+
+        success, status, latency = event.retval
+        self.status_snapshot.update(status)
+        if status.running:
+            # the maintenance may have run in a spawned process, where the resume was tried on this client's copy
+            self.strategy_handler.resume_pending = False
+        self._plan_refresh(success, status, event.scheduled_run_time)
+
+        if self.adaptive_schedule is None:
+            return
+
+        self.adaptive_schedule.record(success, status, latency)
+        interval = self.adaptive_schedule.next_interval()
+
+        if self._scheduler.get_job(self.job_id) is None:
+            return
+
+        self._scheduler.reschedule_job(self.job_id, trigger=IntervalTrigger(seconds=interval))
+        _LOGGER.info(f'Next maintenance in {round(interval)} seconds ({self.adaptive_schedule})')
+
+    def _plan_refresh(self, success: bool, status: Status, run_time: datetime):
+        """Plans the next session refresh in this process, as maintenance may be running in a spawned one."""
+        if self.refresh_planner is None:
+            return
+
+        if success and self._refresh_at is not None and self._refresh_at <= run_time:
+            # the maintenance that just ran refreshed the session, unless the refresh failed
+            self.refresh_planner.record_refresh(run_time)
+            self._refresh_at = None
+
+        refresh_at = self.refresh_planner.plan(status)
+        if refresh_at is None or self._refresh_at is None or abs(refresh_at - self._refresh_at) >= timedelta(minutes=1):
+            # the expiry reported by the Gateway drifts slightly between maintenances, which isn't worth a new plan
+            self._log_refresh_plan(refresh_at, status)
+            self._refresh_at = refresh_at
+
+    def _log_refresh_plan(self, refresh_at: Optional[datetime], status: Status):
+        if refresh_at is None:
+            if self._refresh_at is not None:
+                _LOGGER.info('Session refresh cancelled, the session expiry is no longer known')
+            return
+
+        calendar = self.refresh_planner.calendar
+        if calendar.is_quiet(refresh_at):
+            _LOGGER.info(f'Session expires in {status.expiration_time()}, refresh planned at {refresh_at.astimezone(calendar.tz)}')
+        else:
+            _LOGGER.warning(f'Session expires in {status.expiration_time()} with no quiet time left before, refresh planned at {refresh_at.astimezone(calendar.tz)} during trading hours')
 
     def maintain(self):
         self.build_scheduler()
-        _LOGGER.info(f'Starting maintenance with interval {self.maintenance_interval} seconds')
+        if self.adaptive_schedule is not None:
+            _LOGGER.info(f'Starting adaptive maintenance with intervals between {self.adaptive_schedule.min_interval} and {self.adaptive_schedule.max_interval} seconds')
+        else:
+            _LOGGER.info(f'Starting maintenance with interval {self.maintenance_interval} seconds')
         self._scheduler.start()
         try:
             while True:
@@ -104,27 +227,51 @@ class GatewayClient():
         self._scheduler.shutdown(wait=False)
         self.shutdown()
 
-    def _maintenance(self):
+    def _maintenance(self) -> Optional[Tuple[bool, Status, Optional[float]]]:
+        """Returns whether the Gateway is authenticated, its status and the latency of the validation request, used by the adaptive schedule."""
+        # the records logged during one maintenance share a cycle ID
+        with log_context.cycle(self.name):
+            return self._maintenance_cycle()
+
+    def _maintenance_cycle(self) -> Optional[Tuple[bool, Status, Optional[float]]]:
         if not self._active:
             _LOGGER.info('Maintenance skipped, GatewayClient is not active.')
-            return
+            return None
 
-        _LOGGER.info('Maintenance')
+        _LOGGER.info('Maintenance' if self.name is None else f'Maintenance of account {self.name}')
 
-        success, shutdown, status = self.start_and_authenticate(request_retries=self.request_retries)
+        if self._refresh_at is not None and datetime.now(timezone.utc) >= self._refresh_at:
+            success, shutdown, status = self.strategy_handler.refresh_session(request_retries=self.request_retries)
+            self._should_shutdown = shutdown
+            self.status_snapshot.update(status)
+        else:
+            success, shutdown, status = self.start_and_authenticate(request_retries=self.request_retries)
+        latency = None
 
         if shutdown:
+            if not self._owns_scheduler:
+                # the other accounts keep being maintained
+                _LOGGER.warning(f'Stopping the maintenance of account {self.name} due to critical error.')
+                self._scheduler.remove_job(self.job_id)
+                return None
+
             _LOGGER.warning('Shutting IBeam down due to critical error.')
             self._scheduler.remove_all_jobs()
             self._scheduler.shutdown(False)
             if self._health_server:
                 self._health_server.shutdown()
+            return None
         elif success:
             _LOGGER.info(f'Gateway running and authenticated, session id: {status.session_id}, server name: {status.server_name}')
-            validate_success = self.http_handler.validate()
+            with log_context.step('validate'):
+                validate_start = time.time()
+                validate_success = self.http_handler.validate()
+                latency = time.time() - validate_start
             if not validate_success:
                 _LOGGER.warning(f'Validation result is False when IBeam attempted to extend the SSO token. This could indicate token authentication issues.')
 
+        return success, status, latency
+
     def shutdown(self):
         if self._health_server:
             self._health_server.shutdown()
@@ -132,13 +279,15 @@ class GatewayClient():
     def __getstate__(self):
         state = self.__dict__.copy()
 
-        # APS schedulers and health_server can't be pickled
+        # APS schedulers, health_server and the snapshot's locks can't be pickled
         del state['_scheduler']
         del state['_health_server']
+        del state['status_snapshot']
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        self.status_snapshot = StatusSnapshot(self.http_handler.get_status, self.status_cache_ttl)
         self.build_scheduler()
 
     @property
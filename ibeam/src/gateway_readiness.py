@@ -0,0 +1,112 @@
+import logging
+import os
+import re
+import socket
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Optional
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+
+class GatewayReadiness():
+    """
+    Detects the moment a starting Gateway can accept requests.
+
+    Two signals are watched: the Gateway's log announcing that it is listening, and the Gateway's listen socket becoming connectable. Both are cheap to check, so they are probed at a short interval, waking the caller as soon as either fires instead of pinging the Gateway once per second.
+
+    Attributes:
+        log_dir (str): Directory the Gateway writes its logs to.
+        base_url (str): Base URL of the Gateway, whose host and port are probed.
+        ready_pattern (str): Regular expression matching the Gateway's log line announcing it is listening.
+        poll_interval (float): Number of seconds between the probes.
+    """
+
+    def __init__(self,
+                 log_dir: str,
+                 base_url: str,
+                 ready_pattern: str,
+                 poll_interval: float = 0.1,
+                 ):
+        self.log_dir = log_dir
+        self.base_url = base_url
+        self.ready_pattern = re.compile(ready_pattern)
+        self.poll_interval = poll_interval
+
+        url = urllib.parse.urlsplit(base_url)
+        self.host = url.hostname or 'localhost'
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+
+        self._offsets = {}
+        self._partial = {}
+
+    def _log_files(self) -> list:
+        try:
+            return [os.path.join(self.log_dir, name) for name in os.listdir(self.log_dir)
+                    if name.startswith('gw.') and name.endswith('.log') and not name.startswith('gw.message.')]
+        except OSError:
+            return []
+
+    def mark(self):
+        """Remembers the current end of the Gateway's logs, so that only lines written from now on are considered. Call before starting the Gateway."""
+        self._offsets = {}
+        self._partial = {}
+        for path in self._log_files():
+            try:
+                self._offsets[path] = os.path.getsize(path)
+            except OSError:
+                continue
+
+    def log_ready(self) -> bool:
+        """Whether the Gateway has logged the ready line since the last mark."""
+        for path in self._log_files():
+            offset = self._offsets.get(path, 0)
+            try:
+                if os.path.getsize(path) <= offset:
+                    continue
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    content = f.read()
+            except OSError:
+                continue
+
+            self._offsets[path] = offset + len(content)
+            lines = (self._partial.get(path, '') + content.decode('utf-8', errors='replace')).split('\n')
+            # the last line may still be being written
+            self._partial[path] = lines.pop()
+
+            for line in lines:
+                if self.ready_pattern.search(line):
+                    _LOGGER.debug(f'Gateway log reports it is ready: {line.strip()}')
+                    return True
+        return False
+
+    def socket_ready(self) -> bool:
+        """Whether the Gateway's listen socket accepts connections."""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=self.poll_interval):
+                return True
+        except OSError:
+            return False
+
+    def wait(self, deadline: float) -> Optional[str]:
+        """
+        Blocks until the Gateway signals it is ready or the deadline passes.
+
+        :param deadline: time.time() at which to stop waiting.
+        :return: The signal that fired, 'log' or 'socket', or None if the deadline passed.
+        """
+        while True:
+            if self.log_ready():
+                return 'log'
+            if self.socket_ready():
+                return 'socket'
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.poll_interval, remaining))
+
+    def __repr__(self):
+        return f'GatewayReadiness(log_dir={self.log_dir}, host={self.host}, port={self.port}, ready_pattern={self.ready_pattern.pattern})'
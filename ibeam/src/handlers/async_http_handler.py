@@ -0,0 +1,93 @@
+import json
+import logging
+import urllib.parse
+from pathlib import Path
+
+from ibeam.src.handlers.http_handler import HttpHandler, Status
+from ibeam.src.http_pool import AsyncConnectionPool
+from ibeam.src.metrics import HTTP_REQUEST_DURATION, STATUS_OUTCOMES
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+
+class AsyncHttpHandler(HttpHandler):
+    """
+    An asyncio-native variant of the HttpHandler.
+
+    It accepts the same parameters and returns the same Status objects as the HttpHandler, but all Gateway I/O is performed on the event loop, allowing a single loop to communicate with many Gateways at once. Every request method is a coroutine.
+    """
+
+    def build_pool(self):
+        """The async pool is always used. Pool size of 0 closes the connection after every request."""
+        self.pool = AsyncConnectionPool(
+            ssl_context=self.ssl_context,
+            timeout=self.request_timeout,
+            pool_size=self.pool_size,
+            idle_timeout=self.pool_idle_timeout,
+            max_reconnects=self.pool_max_reconnects,
+        )
+
+    async def url_request(self, url, method='GET'):
+        _LOGGER.debug(f'{method} {url}{"" if self.inputs_handler.valid_certificates else " (unverified)"}')
+        return await self.pool.request(url, method=method)
+
+    async def try_request(self, url, method='GET', max_attempts=1) -> Status:
+        """Asynchronous counterpart of HttpHandler.try_request."""
+        route = urllib.parse.urlsplit(url).path
+        attempt = 0
+        while True:
+            status = Status()
+            try:
+                # if this doesn't throw an exception, the gateway is running and there is an active session
+                with HTTP_REQUEST_DURATION.time(route=route, method=method):
+                    response = await self.url_request(url, method=method)
+                return self._read_response(status, response)
+            except Exception as e:
+                self._handle_request_exception(status, e)
+
+            if max_attempts <= 1:
+                return status
+
+            if attempt >= max_attempts - 1:
+                _LOGGER.info(
+                    f'Max request retries reached after {max_attempts} attempts. Consider increasing the retries by setting IBEAM_REQUEST_RETRIES environment variable')
+                return status
+
+            _LOGGER.info(f'Attempt number {attempt + 2}')
+            attempt += 1
+
+    async def get_status(self, max_attempts=1) -> Status:
+        """We use tickle instead of iserver/auth/status because it is more versatile."""
+        status = self._parse_status(await self.tickle(max_attempts=max_attempts))
+        STATUS_OUTCOMES.inc(status=status.parsed_status)
+        return status
+
+    async def validate(self) -> bool:
+        """Validate provides information on the current session. Works also after logout."""
+        status = await self.try_request(self.base_url + self.route_validate, 'GET')
+        if status.session:
+            return json.loads(status.response)['RESULT']
+        return False
+
+    async def tickle(self, max_attempts=1) -> Status:
+        return await self.try_request(self.base_url + self.route_tickle, 'POST', max_attempts=max_attempts)
+
+    async def logout(self):
+        """Logout will log the user out, but maintain the session, allowing us to reauthenticate directly."""
+        return await self.url_request(self.base_url + self.route_logout, 'POST')
+
+    async def reauthenticate(self):
+        """Reauthenticate will work only if there is an existing session."""
+        return await self.url_request(self.base_url + self.route_reauthenticate, 'POST')
+
+    async def initialise(self):
+        """Initialise the session."""
+        return await self.url_request(self.base_url + self.route_initialise, 'POST')
+
+    async def base_route(self):
+        """Call base base_url"""
+        return await self.try_request(self.base_url)
+
+    def close(self):
+        """Closes all idle connections to the Gateway."""
+        self.pool.clear()
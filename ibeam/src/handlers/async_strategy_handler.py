@@ -0,0 +1,277 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional
+
+from ibeam.src import log_context
+from ibeam.src.handlers.async_http_handler import AsyncHttpHandler
+from ibeam.src.handlers.http_handler import Status
+from ibeam.src.handlers.strategy_handler import StrategyHandler, condition_authenticated_true, is_authenticated, is_fully_authenticated, \
+    strategy_A_logout_first, strategy_A_outcome, strategy_B_action, AUTHENTICATED, NOT_AUTHENTICATED, COMPETING, LOG_IN, LOGOUT_AND_REAUTHENTICATE
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+
+class AsyncStrategyHandler(StrategyHandler):
+    """
+    A coroutine variant of the StrategyHandler, to be used with the AsyncHttpHandler.
+
+    Follows the same authentication strategies and returns the same results as the StrategyHandler, making its decisions with the same helpers, but waits with asyncio.sleep instead of blocking the thread. The browser login and killing of the Gateway are blocking by nature and are run in the default executor.
+    """
+
+    http_handler: AsyncHttpHandler
+
+    @log_context.async_step('authenticate')
+    async def try_authenticating(self, request_retries=1) -> (bool, bool, Status):
+
+        status = await self.http_handler.get_status(max_attempts=request_retries)
+        if is_authenticated(status):
+            self.resume_pending = False
+            return True, False, status
+
+        _LOGGER.info(str(status))
+
+        if not status.running:  # no gateway running
+            _LOGGER.error('Cannot communicate with the Gateway. Consider increasing IBEAM_GATEWAY_STARTUP')
+            return False, False, status
+
+        outermost = self._start_timing()
+        try:
+            resumed_status = await self._resume_session() if self._take_resume() else None
+            if resumed_status is not None:
+                self._observe_authenticated('resume', outermost)
+                return True, False, resumed_status
+
+            _LOGGER.info(f'Authentication strategy: "{self.authentication_strategy}"')
+
+            if self.authentication_strategy == 'A':
+                result = await self._authentication_strategy_A(status, request_retries)
+            elif self.authentication_strategy == 'B':
+                result = await self._authentication_strategy_B(status, request_retries)
+            else:
+                _LOGGER.error(f'Unknown authentication strategy: "{self.authentication_strategy}". Defaulting to strategy A.')
+                result = await self._authentication_strategy_A(status, request_retries)
+
+            if result[0]:
+                self._observe_authenticated('login', outermost)
+            return result
+        finally:
+            self._stop_timing(outermost)
+
+    @log_context.async_step('refresh_session')
+    async def refresh_session(self, request_retries=1) -> (bool, bool, Status):
+        _LOGGER.info('Refreshing the session ahead of its expiry, logging out and in anew...')
+        await self._logout()
+
+        status = await self.http_handler.get_status(max_attempts=request_retries)
+        if not status.running:
+            _LOGGER.error('Cannot communicate with the Gateway. Consider increasing IBEAM_GATEWAY_STARTUP')
+            return False, False, status
+
+        self._start_timing()
+        try:
+            if self.authentication_strategy == 'B':
+                result = await self._log_in(status)
+            else:
+                result = await self._authentication_strategy_A(status, request_retries)
+
+            if result[0]:
+                self._observe_authenticated('refresh', True)
+            return result
+        finally:
+            self._stop_timing(True)
+
+    async def _resume_session(self) -> Optional[Status]:
+        if getattr(self.login_handler, 'session_store', None) is None:
+            return None
+
+        try:
+            if not await asyncio.to_thread(self.login_handler.resume_session):
+                return None
+
+            _LOGGER.info('Validating and reauthenticating the resumed session...')
+            await self.http_handler.validate()
+            await self.http_handler.reauthenticate()
+        except Exception as e:
+            _LOGGER.exception(f'Error resuming the stored session: {e}')
+            return None
+
+        status = await self._repeatedly_check_status(self.max_status_check_retries, condition_authenticated_true)
+        if is_fully_authenticated(status):
+            _LOGGER.info('Resuming the stored session succeeded, no login needed')
+            try:
+                await self.http_handler.initialise()
+            except Exception as e:
+                _LOGGER.warning(f'Error initialising the resumed session: {e}')
+            return status
+
+        _LOGGER.info(f'Resuming the stored session failed, logging in instead. {status}')
+        self.login_handler.session_store.clear()
+        return None
+
+    async def _authentication_strategy_A(self, status:Status, request_retries=1) -> (bool, bool, Status):
+        if strategy_A_logout_first(status):
+            await self._logout()
+
+        success, shutdown = await asyncio.to_thread(self.login_handler.login)
+        _LOGGER.info(f'Logging in {"succeeded" if success else "failed"}')
+        if shutdown:
+            return False, True, status
+        if not success:
+            return False, False, status
+
+        await asyncio.sleep(3)  # buffer for session to be authenticated
+
+        # double check if authenticated
+        status = await self.http_handler.get_status(max_attempts=max(request_retries, 2))
+        outcome = strategy_A_outcome(status)
+        if outcome == NOT_AUTHENTICATED:
+            await self.http_handler.reauthenticate()
+
+            if self.reauthenticate_wait > 0:
+                _LOGGER.info(f'Waiting {self.reauthenticate_wait} seconds to reauthenticate before restarting.')
+                await asyncio.sleep(self.reauthenticate_wait)
+
+            if self.restart_failed_sessions:
+                _LOGGER.info('Logging out and reattempting full authentication')
+                await self._logout()
+                return await self.try_authenticating(request_retries=request_retries)
+        elif outcome == COMPETING:
+            await self.http_handler.reauthenticate()
+            await asyncio.sleep(self.restart_wait)
+
+        return outcome == AUTHENTICATED, False, status
+
+    async def _authentication_strategy_B(self, status:Status, request_retries=1) -> (bool, bool, Status):
+        action = strategy_B_action(status)
+        if action == LOG_IN:
+            return await self._log_in(status)
+        return await self._reauthenticate(status, first_logout=action == LOGOUT_AND_REAUTHENTICATE)
+
+    async def _log_in(self, status):
+        try:
+            success, shutdown = await asyncio.to_thread(self.login_handler.login)
+            _LOGGER.info(f'Logging in {"succeeded" if success else "failed"}')
+
+            if not success or shutdown:
+                return False, shutdown, status
+        except Exception as e:
+            _LOGGER.exception(f'Error logging in: {e}')
+            return False, False, status
+
+        return await self._post_authentication()
+
+    @log_context.async_step('reauthenticate')
+    async def _reauthenticate(self, status, first_logout=False):
+        try:
+            if first_logout:
+                await self._logout()
+            await self.http_handler.reauthenticate()
+        except Exception as e:
+            _LOGGER.exception(f'Error reauthenticating: {e}')
+            return False, False, status
+
+        return await self._post_authentication()
+
+    @log_context.async_step('logout')
+    async def _logout(self):
+        try:
+            logout_response = await self.http_handler.logout()
+            logout_success = logout_response.read().decode('utf8') == '{"status":true}'
+            _LOGGER.info(f'Gateway logout {"successful" if logout_success else "unsuccessful"}')
+        except Exception as e:
+            _LOGGER.exception(f'Exception logging out: {e}')
+
+    @log_context.async_step('post_authentication')
+    async def _post_authentication(self):
+        """This method double-checks that the authentication was successful, and if not, reauthenticates"""
+
+        # if we only just logged in and succeeded, this will not reauthenticate but only check status
+        status = await self._repeatedly_reauthenticate(self.max_reauthenticate_retries, condition_authenticated_true)
+
+        if not is_fully_authenticated(status):
+            if self._replaces_gateway():
+                _LOGGER.error(f'Repeatedly reauthenticating failed {self.max_reauthenticate_retries} times. Replacing the Gateway and restarting the authentication process.')
+                result = await self._restart_blue_green()
+                if result is not None:
+                    return result
+
+            _LOGGER.error(f'Repeatedly reauthenticating failed {self.max_reauthenticate_retries} times. Killing the Gateway and restarting the authentication process.')
+
+            try:
+                success = await asyncio.to_thread(self.process_handler.kill_gateway)
+            except Exception as e:
+                _LOGGER.exception(f'Error killing the Gateway: {e}')
+                success = False
+
+            if not success:
+                _LOGGER.error(f'Killing the Gateway process failed')
+
+            return False, False, status
+
+        await self.http_handler.initialise()
+
+        return True, False, status
+
+    async def _restart_blue_green(self) -> Optional[tuple]:
+        loop = asyncio.get_running_loop()
+
+        def logout():
+            # the logout coroutine runs on the event loop, while the restart blocks a worker thread
+            asyncio.run_coroutine_threadsafe(self._logout(), loop).result()
+
+        try:
+            replaced = await asyncio.to_thread(self.process_handler.restart_gateway, logout)
+        except Exception as e:
+            _LOGGER.exception(f'Error replacing the Gateway: {e}')
+            replaced = False
+
+        if not replaced:
+            return None
+
+        self._restarting = True
+        try:
+            return await self.try_authenticating(request_retries=2)
+        finally:
+            self._restarting = False
+
+    async def _repeatedly_check_status(self, max_attempts=1, condition:callable=condition_authenticated_true):
+        if not callable(condition):
+            raise ValueError(f'Condition must be a callable, found: "{type(condition)}": {condition}')
+
+        status = None
+
+        for attempt in range(max_attempts):
+            status = await self.http_handler.get_status()
+
+            if condition(status):
+                return status
+
+            if attempt < max_attempts - 1:
+                await asyncio.sleep(1)
+                if attempt == 0:
+                    _LOGGER.info(f'Repeating status check attempts another {max_attempts - attempt - 1} times')
+
+        _LOGGER.info(f'Max status check retries reached after {max_attempts} attempts. Consider increasing the retries by setting IBEAM_MAX_STATUS_CHECK_ATTEMPTS environment variable')
+        return status
+
+    async def _repeatedly_reauthenticate(self, max_attempts=1, condition:callable=condition_authenticated_true):
+        if not callable(condition):
+            raise ValueError(f'Condition must be a callable, found: "{type(condition)}": {condition}')
+
+        status = None
+
+        for attempt in range(max_attempts):
+            log_context.set_attempt(attempt + 1)
+            status = await self._repeatedly_check_status(self.max_status_check_retries, condition)
+            _LOGGER.info(str(status))
+
+            if condition(status):
+                return status
+
+            if attempt < max_attempts - 1:
+                await self.http_handler.reauthenticate()
+                _LOGGER.info(f'Repeated reauthentication attempt number {attempt + 2}')
+
+        _LOGGER.info(f'Max reauthenticate retries reached after {max_attempts} attempts. Consider increasing the retries by setting IBEAM_MAX_REAUTHENTICATE_RETRIES environment variable')
+        return status
@@ -10,6 +10,8 @@ import urllib.request
 import urllib.parse
 
 from ibeam.src.handlers.inputs_handler import InputsHandler
+from ibeam.src.http_pool import ConnectionPool
+from ibeam.src.metrics import HTTP_REQUEST_DURATION, STATUS_OUTCOMES
 from ibeam.src.utils.py_utils import exception_to_string
 
 _LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
@@ -85,6 +87,12 @@ class Status():
 
         return 'NOT AUTHENTICATED'
 
+    def to_dict(self) -> dict:
+        """Returns the parsed fields of the status, without the raw response."""
+        d = {k: v for k, v in self.__dict__.items() if k != 'response'}
+        d['parsed_status'] = self.parsed_status
+        return d
+
     def __repr__(self):
         d = self.__dict__.copy()
         if 'response' in d:
@@ -104,6 +112,9 @@ class HttpHandler():
                  route_reauthenticate: str,
                  route_initialise: str,
                  request_timeout: int,
+                 pool_size: int = 0,
+                 pool_idle_timeout: int = 30,
+                 pool_max_reconnects: int = 1,
                  ):
 
         self.inputs_handler = inputs_handler
@@ -115,7 +126,11 @@ class HttpHandler():
         self.route_reauthenticate = route_reauthenticate
         self.route_initialise = route_initialise
         self.request_timeout = request_timeout
+        self.pool_size = pool_size
+        self.pool_idle_timeout = pool_idle_timeout
+        self.pool_max_reconnects = pool_max_reconnects
         self.build_ssh_context()
+        self.build_pool()
 
     def build_ssh_context(self):
         self.ssl_context = ssl.SSLContext()
@@ -124,111 +139,140 @@ class HttpHandler():
             self.ssl_context.check_hostname = True
             self.ssl_context.load_verify_locations(self.inputs_handler.cacert_pem_path)
 
+    def build_pool(self):
+        """Builds the keep-alive connection pool. Pool size of 0 disables pooling and a new connection is opened for every request."""
+        if self.pool_size <= 0:
+            self.pool = None
+            return
+
+        self.pool = ConnectionPool(
+            ssl_context=self.ssl_context,
+            timeout=self.request_timeout,
+            pool_size=self.pool_size,
+            idle_timeout=self.pool_idle_timeout,
+            max_reconnects=self.pool_max_reconnects,
+        )
+
     def url_request(self, url, method='GET'):
         _LOGGER.debug(f'{method} {url}{"" if self.inputs_handler.valid_certificates else " (unverified)"}')
+        if self.pool is not None:
+            return self.pool.request(url, method=method)
+
         req = request.Request(url, method=method)
         return urllib.request.urlopen(req, context=self.ssl_context, timeout=self.request_timeout)
 
-    def try_request(self, url, method='GET', max_attempts=1) -> Status:
-        """Attempts a HTTP request and returns Status object indicating whether the gateway can be reached, whether there is an active session and whether it is authenticated. Attempts to repeat the request up to max_attempts times.
-
-        status.running -> gateway running
-        status.session -> active session present
-        status.authenticated -> session authenticated (equivalent to 'all good')
-        status.competing -> session competing
-        """
-
-        def _request(attempt=0) -> Status:
-            status = Status()
-            try:
-                # if this doesn't throw an exception, the gateway is running and there is an active session
-                response = self.url_request(url, method=method)
-                status.running = True
-                status.response = response.read().decode('utf8')
+    def _read_response(self, status: Status, response) -> Status:
+        status.running = True
+        status.response = response.read().decode('utf8')
 
-                if status.response == '{"error":"no session"}':
-                    _LOGGER.error(f'Error: "no session" returned.')
-                    status.session = False
-                else:
-                    status.session = True
+        if status.response == '{"error":"no session"}':
+            _LOGGER.error(f'Error: "no session" returned.')
+            status.session = False
+        else:
+            status.session = True
 
-                return status
+        return status
 
-            except HTTPError as e:
+    def _handle_request_exception(self, status: Status, exception: Exception):
+        """Classifies the exception raised by a request and updates the status accordingly."""
+        try:
+            raise exception
+        except HTTPError as e:
+            status.running = True
+
+            if e.code == 401:
+                # the gateway is running but there is no active session
+                pass
+
+            elif e.code == 500 and 'Internal Server Error' in str(e):
+                _LOGGER.error(f'IBKR server error: "{e}". One of reasons for this error is IBKR server restart.')
+                status.session = False  # ensure we reauthenticate
+
+
+            elif e.code == 503 and 'Service Unavailable' in str(e):
+                _LOGGER.error(f'IBKR service unavailable: "{e}". It seems IBKR servers are not ready to handle requests. We may need to wait until the servers are ready.')
+                status.session = False  # ensure we reauthenticate
+
+            else:  # todo: possibly other codes could appear when not authenticated, fix when necessary
+                try:
+                    raise RuntimeError('Unrecognised HTTPError') from e
+                except Exception as ee:
+                    _LOGGER.exception(ee)
+
+        except (URLError, socket.timeout) as e:
+            reason = str(e)
+
+            """
+                No connection... - happens when port isn't open
+                Cannot assign... - happens when calling a port taken by Docker but not served, when called from within the container.
+                Errno 0... - happens when calling a port taken by Docker but not served, when called from the host machine.
+            """
+
+            if 'No connection could be made because the target machine actively refused it' in reason \
+                    or 'Cannot assign requested address' in reason \
+                    or '[Errno 0] Error' in reason:
+                pass  # we expect these errors and don't need to log them
+
+            elif "timed out" in reason \
+                    or "The read operation timed out" in reason:
+                #TODO: this will cause full relogin, we probably only need to repeat the request
+                _LOGGER.error(
+                    f'Connection timeout after {self.request_timeout} seconds. Consider increasing timeout by setting IBEAM_REQUEST_TIMEOUT environment variable. Error: {reason}')
                 status.running = True
 
-                if e.code == 401:
-                    # the gateway is running but there is no active session
-                    pass
-
-                elif e.code == 500 and 'Internal Server Error' in str(e):
-                    _LOGGER.error(f'IBKR server error: "{e}". One of reasons for this error is IBKR server restart.')
-                    status.session = False  # ensure we reauthenticate
-
-
-                elif e.code == 503 and 'Service Unavailable' in str(e):
-                    _LOGGER.error(f'IBKR service unavailable: "{e}". It seems IBKR servers are not ready to handle requests. We may need to wait until the servers are ready.')
-                    status.session = False  # ensure we reauthenticate
-
-                else:  # todo: possibly other codes could appear when not authenticated, fix when necessary
-                    try:
-                        raise RuntimeError('Unrecognised HTTPError') from e
-                    except Exception as ee:
-                        _LOGGER.exception(ee)
+            elif 'Connection refused' in reason:
+                _LOGGER.info(
+                    f'Gateway running but not serving yet. Consider increasing IBEAM_GATEWAY_STARTUP timeout. Error: {reason}')
+                status.running = True
 
-            except (URLError, socket.timeout) as e:
-                reason = str(e)
+            elif 'An existing connection was forcibly closed by the remote host' in reason:
+                _LOGGER.error(
+                    'Connection to Gateway was forcibly closed by the remote host. This means something is closing the Gateway process.')
 
-                """
-                    No connection... - happens when port isn't open
-                    Cannot assign... - happens when calling a port taken by Docker but not served, when called from within the container.
-                    Errno 0... - happens when calling a port taken by Docker but not served, when called from the host machine.
-                """
+            elif 'certificate verify failed: self signed certificate' in reason:
+                _LOGGER.error(
+                    'Failed to verify the self-signed certificate. This could mean your self-generated .jks certificate and password are not correctly provided in Inputs Directory or listed in conf.yaml. Ensure your certificate\'s filename and password are correctly listed in conf.yaml, or see https://github.com/Voyz/ibeam/wiki/TLS-Certificates-and-HTTPS#certificates-in-confyaml for more information.')
 
-                if 'No connection could be made because the target machine actively refused it' in reason \
-                        or 'Cannot assign requested address' in reason \
-                        or '[Errno 0] Error' in reason:
-                    pass  # we expect these errors and don't need to log them
+            else:
+                try:
+                    raise RuntimeError('Unrecognised URLError or socket.timeout') from e
+                except Exception as ee:
+                    _LOGGER.exception(ee)
+                status.running = True
 
-                elif "timed out" in reason \
-                        or "The read operation timed out" in reason:
-                    #TODO: this will cause full relogin, we probably only need to repeat the request
-                    _LOGGER.error(
-                        f'Connection timeout after {self.request_timeout} seconds. Consider increasing timeout by setting IBEAM_REQUEST_TIMEOUT environment variable. Error: {reason}')
-                    status.running = True
+        except ConnectionResetError as e:
+            if 'An existing connection was forcibly closed by the remote host' in str(e):
+                _LOGGER.error(
+                    'Connection to Gateway was forcibly closed by the remote host. This means something is closing the Gateway process.')
+            else:
+                try:
+                    raise RuntimeError('Unrecognised ConnectionResetError') from e
+                except Exception as ee:
+                    _LOGGER.exception(ee)
 
-                elif 'Connection refused' in reason:
-                    _LOGGER.info(
-                        f'Gateway running but not serving yet. Consider increasing IBEAM_GATEWAY_STARTUP timeout. Error: {reason}')
-                    status.running = True
+        except Exception as e:  # all other exceptions
+            _LOGGER.exception(f'Unrecognised Exception:\n{exception_to_string(e)}')
 
-                elif 'An existing connection was forcibly closed by the remote host' in reason:
-                    _LOGGER.error(
-                        'Connection to Gateway was forcibly closed by the remote host. This means something is closing the Gateway process.')
+    def try_request(self, url, method='GET', max_attempts=1) -> Status:
+        """Attempts a HTTP request and returns Status object indicating whether the gateway can be reached, whether there is an active session and whether it is authenticated. Attempts to repeat the request up to max_attempts times.
 
-                elif 'certificate verify failed: self signed certificate' in reason:
-                    _LOGGER.error(
-                        'Failed to verify the self-signed certificate. This could mean your self-generated .jks certificate and password are not correctly provided in Inputs Directory or listed in conf.yaml. Ensure your certificate\'s filename and password are correctly listed in conf.yaml, or see https://github.com/Voyz/ibeam/wiki/TLS-Certificates-and-HTTPS#certificates-in-confyaml for more information.')
+        status.running -> gateway running
+        status.session -> active session present
+        status.authenticated -> session authenticated (equivalent to 'all good')
+        status.competing -> session competing
+        """
 
-                else:
-                    try:
-                        raise RuntimeError('Unrecognised URLError or socket.timeout') from e
-                    except Exception as ee:
-                        _LOGGER.exception(ee)
-                    status.running = True
-
-            except ConnectionResetError as e:
-                if 'An existing connection was forcibly closed by the remote host' in str(e):
-                    _LOGGER.error(
-                        'Connection to Gateway was forcibly closed by the remote host. This means something is closing the Gateway process.')
-                else:
-                    try:
-                        raise RuntimeError('Unrecognised ConnectionResetError') from e
-                    except Exception as ee:
-                        _LOGGER.exception(ee)
+        route = urllib.parse.urlsplit(url).path
 
-            except Exception as e:  # all other exceptions
-                _LOGGER.exception(f'Unrecognised Exception:\n{exception_to_string(e)}')
+        def _request(attempt=0) -> Status:
+            status = Status()
+            try:
+                # if this doesn't throw an exception, the gateway is running and there is an active session
+                with HTTP_REQUEST_DURATION.time(route=route, method=method):
+                    response = self.url_request(url, method=method)
+                return self._read_response(status, response)
+            except Exception as e:
+                self._handle_request_exception(status, e)
 
             if max_attempts <= 1:
                 return status
@@ -245,8 +289,11 @@ class HttpHandler():
 
     def get_status(self, max_attempts=1) -> Status:
         """We use tickle instead of iserver/auth/status because it is more versatile."""
-        status = self.tickle(max_attempts=max_attempts)
+        status = self._parse_status(self.tickle(max_attempts=max_attempts))
+        STATUS_OUTCOMES.inc(status=status.parsed_status)
+        return status
 
+    def _parse_status(self, status: Status) -> Status:
         if status.session:
             json_response = json.loads(status.response)
 
@@ -301,10 +348,12 @@ class HttpHandler():
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        # ssl_context can't be pickled
+        # ssl_context and the pool's connections can't be pickled
         del state['ssl_context']
+        del state['pool']
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
         self.build_ssh_context()
+        self.build_pool()
@@ -1,8 +1,10 @@
 import logging
+import os
 import time
+from contextlib import contextmanager
 from functools import partial
 from pathlib import Path
-from typing import Optional, cast
+from typing import Optional, Union, cast
 
 from cryptography.fernet import Fernet
 from selenium import webdriver
@@ -14,9 +16,17 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support.ui import Select
 
+from ibeam.src import log_context
 from ibeam.src.handlers.secrets_handler import SecretsHandler
+from ibeam.src.login.browser_budget import BrowserBudget
+from ibeam.src.login.browser_pool import BrowserPool
+from ibeam.src.login.pacing import PresubmitBuffer, wait_until_ready, toggle_checkbox, toggle_switched, fields_populated, trigger_cleared
+from ibeam.src.login.http_login import HttpLoginSession, HtmlPage, LoginEngineUnsupported, identify_page, option_value, LOGIN_ENGINE_SELENIUM, LOGIN_ENGINE_HTTP
+from ibeam.src.login.dom_probe import dom_probe, dom_observe, DOM_WAIT_POLL, DOM_WAIT_OBSERVER
+from ibeam.src.login.session_store import SessionStore, cookies_from_driver, cookies_from_session, set_session_cookies
 from ibeam.src.login.driver import DriverFactory, start_up_browser, save_screenshot, shut_down_browser
-from ibeam.src.login.targets import Targets, targets_from_versions, is_present, Target, identify_target, find_element, has_text, is_visible, is_clickable
+from ibeam.src.metrics import LOGIN_DURATION, LOGIN_STEP_DURATION
+from ibeam.src.login.targets import Targets, targets_from_versions, version_fingerprints, versions_in_order, WEBSITE_VERSIONS, TargetCondition, is_present, Target, identify_target, find_element, has_text, is_visible, is_clickable
 from ibeam.src.two_fa_handlers.notification_resend_handler import NotificationResendTwoFaHandler
 from ibeam.src.two_fa_handlers.two_fa_handler import TwoFaHandler
 from ibeam.src.utils.py_utils import exception_to_string
@@ -24,6 +34,7 @@ from ibeam.src.utils.selenium_utils import any_of
 
 _LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
 
+_PAPER_ACCOUNT_ERROR = 'You have selected the Live Account Mode, but the specified user is a Paper Trading user. Please select the correct Login mode.'
 
 
 class AttemptException(Exception):
@@ -31,31 +42,22 @@ class AttemptException(Exception):
         self.cause = cause
         super().__init__(*args, **kwargs)
 
-def check_version(driver) -> int:
-    """ Check for the IBRK website version. Currently, there are various versions shown to users and we want to know which one we are operating on.
+@contextmanager
+def login_step(step: str):
+    """Times the login step in LOGIN_STEP_DURATION and names it in the records logged within it. Can decorate a function too."""
+    with LOGIN_STEP_DURATION.time(step=step), log_context.step(step):
+        yield
 
-    Versions:
 
-    * 1 = available until March 2023
-    * 2 = available from March 2023
-    """
-    try:
-        user_name_present = EC.presence_of_element_located((By.NAME, 'user_name'))
-        WebDriverWait(driver, 5).until(user_name_present)
-        return 1
-    except TimeoutException as e:
-        pass
+def check_version(driver, versions: dict, preferred: Optional[int] = None, timeout: float = 10) -> Optional[int]:
+    """ Check for the IBRK website version. Currently, there are various versions shown to users and we want to know which one we are operating on.
 
+    The fingerprints of all versions are checked in a single wait, starting with the preferred version. Returns None if none is found before the timeout.
+    """
     try:
-        user_name_present = EC.presence_of_element_located((By.NAME, 'username'))
-        WebDriverWait(driver, 5).until(user_name_present)
-        return 2
+        return WebDriverWait(driver, timeout).until(version_fingerprints(versions, preferred))
     except TimeoutException as e:
-        pass
-
-    _LOGGER.warning(f'Cannot determine the version of IBKR website, assuming version 1')
-
-    return 1
+        return None
 
 
 def _wait_and_identify_trigger(targets: Targets,
@@ -63,13 +65,23 @@ def _wait_and_identify_trigger(targets: Targets,
                                timeout: int,
                                *expected_conditions,
                                skip_identify: bool = False,
+                               dom_wait_engine: str = DOM_WAIT_POLL,
                                ) -> (WebElement, Target):
-    trigger = WebDriverWait(driver, timeout).until(any_of(*expected_conditions))
+    if all(isinstance(condition, TargetCondition) for condition in expected_conditions):
+        if dom_wait_engine == DOM_WAIT_OBSERVER:
+            # the page reports back as soon as a condition is met
+            trigger, condition = dom_observe(driver, timeout, *expected_conditions)
+        else:
+            # a single script evaluates all conditions per poll and tells which target fired
+            trigger, condition = WebDriverWait(driver, timeout).until(dom_probe(*expected_conditions))
+        target = condition.target
+    else:
+        trigger = WebDriverWait(driver, timeout).until(any_of(*expected_conditions))
+        target = None if skip_identify else identify_target(trigger, targets)
 
     if skip_identify:
         return trigger, None
 
-    target = identify_target(trigger, targets)
     _LOGGER.debug(f'target: {target}')
 
     return trigger, target
@@ -94,17 +106,28 @@ def handle_two_fa(two_fa_handler:TwoFaHandler, driver:webdriver.Chrome, strict_t
 
     return two_fa_code
 
+def check_credentials(account: Optional[str], password: Optional[str]):
+    if account is None:
+        _LOGGER.error(f'Account cannot be None. Specify by setting IBEAM_ACCOUNT environment variable.')
+        raise AttemptException(cause='shutdown')
+
+    if password is None:
+        _LOGGER.error(f'Password cannot be None. Specify by setting IBEAM_PASSWORD environment variable.')
+        raise AttemptException(cause='shutdown')
+
+def check_two_fa_handler(two_fa_handler: Optional[TwoFaHandler]):
+    if two_fa_handler is None:
+        _LOGGER.critical(
+            f'######## ATTENTION! ######## No 2FA handler found. You may define your own 2FA handler or use built-in handlers. See documentation for more: https://github.com/Voyz/ibeam/wiki/Two-Factor-Authentication')
+        raise AttemptException(cause='shutdown')
+
+def decrypt_password(password: str, key: Optional[str]) -> str:
+    if key is None:
+        return password
+    return Fernet(key).decrypt(password.encode('utf-8')).decode("utf-8")
+
 class LoginHandler():
-    _VERSIONS = {
-        1: {
-            'USER_NAME_EL': 'NAME@@user_name',
-            'ERROR_EL': 'CSS_SELECTOR@@.alert.alert-danger.margin-top-10'
-        },
-        2: {
-            'USER_NAME_EL': 'NAME@@username',
-            'ERROR_EL': 'CSS_SELECTOR@@.xyz-errormessage'
-        }
-    }
+    _VERSIONS = WEBSITE_VERSIONS
 
     def __init__(self,
                  secrets_handler:SecretsHandler,
@@ -123,6 +146,13 @@ class LoginHandler():
                  outputs_dir: str,
                  use_paper_account: bool = False,
                  count_timeout_as_failed: bool = True,
+                 browser_pool: Optional[BrowserPool] = None,
+                 login_engine: str = LOGIN_ENGINE_SELENIUM,
+                 http_login_verify: Union[str, bool] = False,
+                 presubmit_buffer_floor: Optional[int] = None,
+                 dom_wait_engine: str = DOM_WAIT_POLL,
+                 session_store: Optional[SessionStore] = None,
+                 browser_budget: Optional[BrowserBudget] = None,
                  ):
 
         self.secrets_handler = secrets_handler
@@ -142,10 +172,23 @@ class LoginHandler():
         self.outputs_dir = outputs_dir
         self.use_paper_account = use_paper_account
         self.count_timeout_as_failed = count_timeout_as_failed
+        self.browser_pool = browser_pool
+        self.login_engine = login_engine
+        self.http_login_verify = http_login_verify
+        self.dom_wait_engine = dom_wait_engine
+        self.session_store = session_store
+        self.browser_budget = browser_budget
 
         self.failed_attempts = 0
-        self.presubmit_buffer = self.min_presubmit_buffer
+        self.presubmit_buffer = PresubmitBuffer(
+            min_buffer=self.min_presubmit_buffer,
+            max_buffer=self.max_presubmit_buffer,
+            floor=presubmit_buffer_floor,
+            history_path=os.path.join(self.outputs_dir, 'presubmit_buffer.json') if self.outputs_dir else None,
+        )
+        self.website_version = None
 
+    @login_step('step_login')
     def step_login(self,
                    targets: Targets,
                    wait_and_identify_trigger: callable,
@@ -156,13 +199,7 @@ class LoginHandler():
                    presubmit_buffer: int,
                    ):
 
-        if account is None:
-            _LOGGER.error(f'Account cannot be None. Specify by setting IBEAM_ACCOUNT environment variable.')
-            raise AttemptException(cause='shutdown')
-
-        if password is None:
-            _LOGGER.error(f'Password cannot be None. Specify by setting IBEAM_PASSWORD environment variable.')
-            raise AttemptException(cause='shutdown')
+        check_credentials(account, password)
 
         # input credentials
         user_name_el = find_element(targets['USER_NAME'], driver)
@@ -172,24 +209,23 @@ class LoginHandler():
 
         if self.use_paper_account:
             _LOGGER.info('Switching to paper mode')
-            live_paper_toggle_el = find_element(targets['LIVE_PAPER_TOGGLE'], driver)
-            live_paper_toggle_el.click()
-            time.sleep(3)
+            self.click_paper_toggle(driver, targets)
 
         user_name_el.clear()
         password_el.clear()
 
         user_name_el.send_keys(account)
 
-        if key is None:
-            password_el.send_keys(password)
-        else:
-            password_el.send_keys(Fernet(key).decrypt(password.encode('utf-8')).decode("utf-8"))
+        decrypted_password = decrypt_password(password, key)
+        password_el.send_keys(decrypted_password)
 
         password_el.send_keys(Keys.TAB)
 
-        # small buffer to prevent race-condition on client side
-        time.sleep(presubmit_buffer)
+        wait_until_ready(driver, fields_populated({user_name_el: account, password_el: decrypted_password}), 'credentials filled in')
+
+        # small buffer to prevent race-condition on client side, learned from past logins
+        if presubmit_buffer > 0:
+            time.sleep(presubmit_buffer)
 
         _LOGGER.info('Submitting the form')
         submit_form_el = find_element(targets['SUBMIT'], driver)
@@ -198,7 +234,7 @@ class LoginHandler():
         trigger, target = wait_and_identify_trigger(
             has_text(targets['SUCCESS']),
             is_visible(targets['TWO_FA']),
-            is_visible(targets['TWO_FA_SELECT']),
+            is_visible(targets['TWO_FA_SELECT'], tag='select'),
             is_visible(targets['TWO_FA_NOTIFICATION']),
             is_visible(targets['ERROR']),
             is_clickable(targets['IBKEY_PROMO']),
@@ -206,6 +242,7 @@ class LoginHandler():
 
         return trigger, target
 
+    @login_step('step_select_two_fa')
     def step_select_two_fa(self,
                            targets: Targets,
                            wait_and_identify_trigger: callable,
@@ -229,6 +266,7 @@ class LoginHandler():
         return trigger, target
 
 
+    @login_step('step_two_fa_notification')
     def step_two_fa_notification(self,
                                  targets: Targets,
                                  wait_and_identify_trigger: callable,
@@ -252,6 +290,7 @@ class LoginHandler():
         )
         return trigger, target
 
+    @login_step('step_two_fa')
     def step_two_fa(self,
                     targets: Targets,
                     wait_and_identify_trigger: callable,
@@ -260,10 +299,7 @@ class LoginHandler():
                     strict_two_fa_code: bool,
                     ):
         _LOGGER.info(f'Credentials correct, but Gateway requires two-factor authentication.')
-        if two_fa_handler is None:
-            _LOGGER.critical(
-                f'######## ATTENTION! ######## No 2FA handler found. You may define your own 2FA handler or use built-in handlers. See documentation for more: https://github.com/Voyz/ibeam/wiki/Two-Factor-Authentication')
-            raise AttemptException(cause='shutdown')
+        check_two_fa_handler(two_fa_handler)
 
         two_fa_code = handle_two_fa(two_fa_handler, driver, strict_two_fa_code)
 
@@ -287,6 +323,7 @@ class LoginHandler():
 
             return trigger, target
 
+    @login_step('step_handle_ib_key_promo')
     def step_handle_ib_key_promo(self,
                                  driver: webdriver.Chrome,
                                  targets: Targets,
@@ -295,7 +332,7 @@ class LoginHandler():
                                  ):
         _LOGGER.info('Handling IB-Key promo display...')
         # ib_promo_key_trigger.click()
-        time.sleep(3)
+        wait_and_identify_trigger(is_clickable(targets['IBKEY_PROMO']), skip_identify=True)
         driver.execute_script("arguments[0].click();", ib_promo_key_trigger)
 
         trigger, target = wait_and_identify_trigger(
@@ -305,26 +342,34 @@ class LoginHandler():
 
         return trigger, target
 
+    def click_paper_toggle(self, driver: webdriver.Chrome, targets: Targets):
+        live_paper_toggle_el = find_element(targets['LIVE_PAPER_TOGGLE'], driver)
+        checkbox_el = toggle_checkbox(driver, live_paper_toggle_el)
+        initial = checkbox_el.is_selected()
+        live_paper_toggle_el.click()
+        wait_until_ready(driver, toggle_switched(checkbox_el, initial), 'live/paper toggle switched')
+
+    @login_step('step_paper_toggle')
     def step_paper_toggle(self,
                           driver:webdriver.Chrome,
                           targets: Targets,
-                          wait_and_identify_trigger: callable
+                          wait_and_identify_trigger: callable,
+                          error_trigger: Optional[WebElement] = None,
                           ):
         _LOGGER.info('Switching to paper mode and reattempting to submit the form')
-        live_paper_toggle_el = find_element(targets['LIVE_PAPER_TOGGLE'], driver)
-        live_paper_toggle_el.click()
-
-        time.sleep(3)
+        self.click_paper_toggle(driver, targets)
 
         submit_form_el = find_element(targets['SUBMIT'], driver)
         submit_form_el.click()
 
-        time.sleep(3)
+        # the paper account error would otherwise be identified again
+        if error_trigger is not None:
+            wait_until_ready(driver, trigger_cleared(error_trigger), 'paper account error cleared')
 
         trigger, target = wait_and_identify_trigger(
             has_text(targets['SUCCESS']),
             is_visible(targets['TWO_FA']),
-            is_visible(targets['TWO_FA_SELECT']),
+            is_visible(targets['TWO_FA_SELECT'], tag='select'),
             is_visible(targets['TWO_FA_NOTIFICATION']),
             is_visible(targets['ERROR']),
             is_clickable(targets['IBKEY_PROMO']),
@@ -341,27 +386,26 @@ class LoginHandler():
                    ):
         _LOGGER.error(f'Error displayed by the login webpage: {error_trigger.text}')
         save_screenshot(driver, outputs_dir, '__failed_attempt')
-        if error_trigger.text == 'Invalid username password combination' and self.presubmit_buffer < max_presubmit_buffer:
-            # global _PRESUBMIT_BUFFER
-            # _PRESUBMIT_BUFFER += 5
-            self.presubmit_buffer += 5
-            if self.presubmit_buffer >= self.max_presubmit_buffer:
-                self.presubmit_buffer = self.max_presubmit_buffer
-                _LOGGER.warning(f'The presubmit buffer set to maximum: {self.max_presubmit_buffer}')
-            else:
-                _LOGGER.warning(f'Increased presubmit buffer to {self.presubmit_buffer}')
+        if error_trigger.text == 'Invalid username password combination':
+            explored = self.presubmit_buffer.exploring
+            self.presubmit_buffer.record_failure()
+            if explored:
+                _LOGGER.warning(f'Failed attempt not counted, as the presubmit buffer was lowered below IBEAM_MIN_PRESUBMIT_BUFFER={self.min_presubmit_buffer}')
+                raise AttemptException(cause='continue')
+
+        self.count_failed_attempt(error_trigger.text, max_failed_auth)
 
+        raise AttemptException(cause='continue')
+
+    def count_failed_attempt(self, error_text: str, max_failed_auth: int):
         # try to prevent having the account locked-out
-        if error_trigger.text == 'failed' or error_trigger.text == 'Invalid username password combination' and max_failed_auth > 0:
+        if error_text == 'failed' or error_text == 'Invalid username password combination' and max_failed_auth > 0:
             self.failed_attempts += 1
             if self.failed_attempts >= self.max_failed_auth:
                 _LOGGER.critical(
                     f'######## ATTENTION! ######## Maximum number of failed authentication attempts (IBEAM_MAX_FAILED_AUTH={self.max_failed_auth}) reached. IBeam will shut down to prevent an account lock-out. It is recommended you attempt to authenticate manually in order to reset the counter. Read the execution logs and report issues at https://github.com/Voyz/ibeam/issues')
                 raise AttemptException(cause='shutdown')
 
-        time.sleep(1)
-        raise AttemptException(cause='continue')
-
 
     def handle_timeout_exception(self,
                                  e:Exception,
@@ -395,7 +439,6 @@ class LoginHandler():
 
     def step_failed_two_fa(self, driver:webdriver.Chrome):
         # this means no two_fa_code was returned and trigger remained the same - ie. don't authenticate
-        time.sleep(1)
         driver.refresh()
         raise AttemptException(cause='continue')
         # todo: retry authentication or resend code
@@ -403,7 +446,6 @@ class LoginHandler():
     def step_success(self):
         _LOGGER.info('Webpage displayed "Client login succeeds"')
         self.failed_attempts = 0
-        self.presubmit_buffer = self.min_presubmit_buffer
         raise AttemptException(cause='success')
 
 
@@ -413,10 +455,11 @@ class LoginHandler():
             wait_and_identify_trigger: callable,
             driver: webdriver.Chrome
     ):
-        trigger, target = self.step_login(targets, wait_and_identify_trigger, driver, self.secrets_handler.account, self.secrets_handler.password, self.secrets_handler.key, self.presubmit_buffer)
+        account, password, key = self.secrets_handler.credentials()
+        trigger, target = self.step_login(targets, wait_and_identify_trigger, driver, account, password, key, self.presubmit_buffer.value)
 
-        if target == targets['ERROR'] and trigger.text == 'You have selected the Live Account Mode, but the specified user is a Paper Trading user. Please select the correct Login mode.':
-            trigger, target = self.step_paper_toggle(driver, targets, wait_and_identify_trigger)
+        if target == targets['ERROR'] and trigger.text == _PAPER_ACCOUNT_ERROR:
+            trigger, target = self.step_paper_toggle(driver, targets, wait_and_identify_trigger, trigger)
 
         if target == targets['TWO_FA_SELECT']:
             trigger, target = self.step_select_two_fa(targets, wait_and_identify_trigger, driver, self.two_fa_select_target)
@@ -437,17 +480,34 @@ class LoginHandler():
             self.step_failed_two_fa(driver)
 
         elif target == targets['SUCCESS']:
+            self.presubmit_buffer.record_success()
             self.step_success()
 
+    def apply_version(self, targets: Targets, website_version: int) -> Targets:
+        """Sets the targets of the website version, remembering it so that it is looked for first on the next load."""
+        if self.website_version is not None and website_version != self.website_version:
+            _LOGGER.info(f'IBKR website version changed from {self.website_version} to {website_version}')
+            # drop the targets of the previous version, so that they aren't mistaken for forced ones
+            for name, element in [('USER_NAME', 'USER_NAME_EL'), ('ERROR', 'ERROR_EL')]:
+                if name in targets and targets[name].variable == self._VERSIONS[self.website_version][element]:
+                    del targets[name]
+
+        self.website_version = website_version
+        return targets_from_versions(targets, self._VERSIONS[website_version])
+
+    @login_step('load_page')
     def load_page(self, targets:Targets, driver:webdriver.Chrome, base_url: str, route_auth: str):
         driver.get(base_url + route_auth)
 
-        website_version = check_version(driver)
+        website_version = check_version(driver, self._VERSIONS, self.website_version)
+        if website_version is None:
+            website_version = self.website_version or 1
+            _LOGGER.warning(f'Cannot determine the version of IBKR website, assuming version {website_version}')
 
-        targets = targets_from_versions(targets, self._VERSIONS[website_version])
+        targets = self.apply_version(targets, website_version)
         _LOGGER.debug(f'Targets: {targets}')
 
-        wait_and_identify_trigger = partial(_wait_and_identify_trigger, targets, driver, self.oauth_timeout)
+        wait_and_identify_trigger = partial(_wait_and_identify_trigger, targets, driver, self.oauth_timeout, dom_wait_engine=self.dom_wait_engine)
 
         # wait for the page to load
         wait_and_identify_trigger(is_clickable(targets['USER_NAME']), skip_identify=True)
@@ -455,6 +515,229 @@ class LoginHandler():
 
         return wait_and_identify_trigger
 
+    @login_step('load_page_http')
+    def load_page_http(self, targets: Targets, session: HttpLoginSession, base_url: str, route_auth: str) -> (HtmlPage, Targets):
+        page = session.load(base_url + route_auth)
+
+        for website_version in versions_in_order(self._VERSIONS, self.website_version):
+            if page.find(Target(self._VERSIONS[website_version]['USER_NAME_EL']), visible=False) is not None:
+                break
+        else:
+            raise LoginEngineUnsupported(f'Login form not found in the webpage, it is likely rendered with JavaScript')
+
+        targets = self.apply_version(targets, website_version)
+        _LOGGER.debug(f'Targets: {targets}')
+        _LOGGER.info(f'Gateway auth webpage loaded (version {website_version})')
+
+        return page, targets
+
+    def _paper_toggle_values(self, page: HtmlPage, targets: Targets) -> dict:
+        toggle_el = page.find(targets['LIVE_PAPER_TOGGLE'], visible=False)
+        if toggle_el is not None and toggle_el.tag == 'label':
+            toggle_el = page.find_by_id(toggle_el.attrs.get('for'))
+
+        if toggle_el is None or not toggle_el.attrs.get('name'):
+            raise LoginEngineUnsupported(f'Cannot find the field toggled by {targets["LIVE_PAPER_TOGGLE"]}')
+
+        return {toggle_el.attrs['name']: toggle_el.attrs.get('value') or 'on'}
+
+    def _field_name(self, page: HtmlPage, target: Target) -> str:
+        field_el = page.find(target, visible=False)
+        if field_el is None or not field_el.attrs.get('name'):
+            raise LoginEngineUnsupported(f'Cannot find the form field {target} in the webpage')
+        return field_el.attrs['name']
+
+    def attempt_http(self, targets: Targets, session: HttpLoginSession, page: HtmlPage):
+        """Counterpart of the attempt method, replaying the same steps with plain HTTP requests."""
+        account, password, key = self.secrets_handler.credentials()
+        check_credentials(account, password)
+
+        user_name_el = page.find(targets['USER_NAME'], visible=False)
+        values = {
+            self._field_name(page, targets['USER_NAME']): account,
+            self._field_name(page, targets['PASSWORD']): decrypt_password(password, key),
+        }
+
+        if self.use_paper_account:
+            _LOGGER.info('Switching to paper mode')
+            values.update(self._paper_toggle_values(page, targets))
+
+        _LOGGER.info('Submitting the form')
+        with login_step('http_step_login'):
+            page = session.submit(page, user_name_el, values)
+
+        try:
+            self._complete_attempt_http(targets, session, page, user_name_el, values)
+        except LoginEngineUnsupported as e:
+            # the credentials were submitted already, falling back to a browser would submit them once more
+            _LOGGER.error(f'Cannot complete the login without a browser once the credentials were submitted: {e}')
+            self.count_failed_attempt('failed', self.max_failed_auth)
+            raise AttemptException(cause='continue')
+
+    def _complete_attempt_http(self, targets: Targets, session: HttpLoginSession, page: HtmlPage, user_name_el, values: dict):
+        """Follows the pages displayed once the credentials were submitted. Always raises an AttemptException, or LoginEngineUnsupported if a page cannot be handled."""
+        trigger, target = identify_page(page, targets, 'SUCCESS', 'ERROR', 'TWO_FA_SELECT', 'TWO_FA_NOTIFICATION', 'TWO_FA', 'IBKEY_PROMO')
+
+        if target == targets['ERROR'] and trigger.text == _PAPER_ACCOUNT_ERROR:
+            _LOGGER.info('Switching to paper mode and reattempting to submit the form')
+            values.update(self._paper_toggle_values(page, targets))
+            with login_step('http_step_paper_toggle'):
+                page = session.submit(page, page.find(targets['USER_NAME'], visible=False) or user_name_el, values)
+            trigger, target = identify_page(page, targets, 'SUCCESS', 'ERROR', 'TWO_FA_SELECT', 'TWO_FA_NOTIFICATION', 'TWO_FA', 'IBKEY_PROMO')
+
+        if target == targets['TWO_FA_SELECT']:
+            _LOGGER.info(f'Required to select a 2FA method.')
+            option_el = next((option for option in trigger.options if option.text == self.two_fa_select_target), None)
+            if option_el is None:
+                _LOGGER.error(f'2FA method "{self.two_fa_select_target}" not found among: {[option.text for option in trigger.options]}')
+                raise AttemptException(cause='break')
+
+            with login_step('http_step_select_two_fa'):
+                page = session.submit(page, trigger, {trigger.attrs.get('name', ''): option_value(option_el)})
+            trigger, target = identify_page(page, targets, 'SUCCESS', 'ERROR', 'TWO_FA_NOTIFICATION', 'TWO_FA', 'IBKEY_PROMO')
+            _LOGGER.info(f'2FA method "{self.two_fa_select_target}" selected successfully.')
+
+        if target == targets['TWO_FA_NOTIFICATION']:
+            raise LoginEngineUnsupported('Notification two-factor authentication requires a browser')
+
+        if target == targets['TWO_FA']:
+            _LOGGER.info(f'Credentials correct, but Gateway requires two-factor authentication.')
+            check_two_fa_handler(self.two_fa_handler)
+            # resolved before a code is used up
+            two_fa_field = self._field_name(page, targets['TWO_FA_INPUT'])
+
+            # there is no browser to pass, handlers interacting with the page are not supported by this engine
+            two_fa_code = handle_two_fa(self.two_fa_handler, None, self.strict_two_fa_code)
+            if two_fa_code is None:
+                _LOGGER.warning(f'No 2FA code returned. Aborting authentication.')
+                raise AttemptException(cause='break')
+
+            _LOGGER.info('Submitting the 2FA form')
+            two_fa_el = page.find(targets['TWO_FA_INPUT'], visible=False)
+            with login_step('http_step_two_fa'):
+                page = session.submit(page, two_fa_el or trigger, {two_fa_field: two_fa_code})
+            trigger, target = identify_page(page, targets, 'SUCCESS', 'ERROR', 'IBKEY_PROMO', 'TWO_FA')
+
+        if target == targets['IBKEY_PROMO']:
+            _LOGGER.info('Handling IB-Key promo display...')
+            with login_step('http_step_handle_ib_key_promo'):
+                page = session.click(page, trigger)
+            trigger, target = identify_page(page, targets, 'SUCCESS', 'ERROR')
+
+        if target == targets['ERROR']:
+            _LOGGER.error(f'Error displayed by the login webpage: {trigger.text}')
+            self.count_failed_attempt(trigger.text, self.max_failed_auth)
+            raise AttemptException(cause='continue')
+
+        elif target == targets['TWO_FA']:
+            raise AttemptException(cause='continue')
+
+        elif target == targets['SUCCESS']:
+            self.step_success()
+
+        raise LoginEngineUnsupported(f'Response page at {page.url} could not be identified')
+
+    def store_session(self, get_cookies: callable):
+        """Stores the cookies of a successful login, if the session store is enabled. Failing to do so doesn't fail the login."""
+        if self.session_store is None:
+            return
+
+        try:
+            self.session_store.save(get_cookies(), {'website_version': self.website_version, 'base_url': self.base_url})
+        except Exception as e:
+            _LOGGER.warning(f'Cannot store the session: {e}')
+
+    @login_step('resume_session')
+    def resume_session(self) -> bool:
+        """
+        Replays the stored SSO cookies to the Gateway's auth route, so that the Gateway can pick up the IBKR session they belong to without logging in.
+
+        Returns whether the auth webpage confirmed that the cookies were accepted, by displaying the login success message. The session still needs to be validated and reauthenticated afterwards.
+        """
+        if self.session_store is None:
+            return False
+
+        stored = self.session_store.load()
+        if stored is None:
+            return False
+
+        if self.website_version is None:
+            self.website_version = stored['state'].get('website_version')
+
+        session = HttpLoginSession(self.http_login_verify, self.oauth_timeout)
+        try:
+            set_session_cookies(session.session, stored['cookies'])
+            page = session.load(self.base_url + self.route_auth)
+        except Exception as e:
+            _LOGGER.warning(f'Cannot resume the stored session: {e}')
+            return False
+        finally:
+            session.close()
+
+        _, target = identify_page(page, self.targets, 'SUCCESS')
+        if target is not None:
+            _LOGGER.info(f'Resumed the stored session from {int(time.time() - stored["saved_at"])} seconds ago')
+            return True
+
+        for website_version in versions_in_order(self._VERSIONS, self.website_version):
+            if page.find(Target(self._VERSIONS[website_version]['USER_NAME_EL']), visible=False) is not None:
+                _LOGGER.info('Stored session was not accepted, the auth webpage asks to log in')
+                self.session_store.clear()
+                return False
+
+        # the webpage may be rendered with JavaScript, the stored session is kept for when the Gateway starts again
+        _LOGGER.info('Cannot confirm that the stored session was accepted, the auth webpage displays neither the login success message nor the login form')
+        return False
+
+    def _login_http(self) -> (bool, bool):
+        session = HttpLoginSession(self.http_login_verify, self.oauth_timeout)
+        targets = self.targets
+        success = False
+
+        try:
+            _LOGGER.info(f'Loading auth webpage at {self.base_url + self.route_auth} without a browser')
+            page, targets = self.load_page_http(targets, session, self.base_url, self.route_auth)
+
+            immediate_attempts = 0
+
+            while immediate_attempts < max(self.max_immediate_attempts, 1):
+                immediate_attempts += 1
+                log_context.set_attempt(immediate_attempts)
+                _LOGGER.info(f'Login attempt number {immediate_attempts}')
+
+                try:
+                    self.attempt_http(targets, session, page)
+                except AttemptException as e:
+                    if e.cause == 'continue':
+                        try:
+                            page, targets = self.load_page_http(targets, session, self.base_url, self.route_auth)
+                        except LoginEngineUnsupported as unsupported:
+                            # the credentials were already submitted, falling back to the browser would submit them again
+                            _LOGGER.error(f'Cannot reload the auth webpage without a browser, ending the authentication: {unsupported}')
+                            break
+                        continue
+                    elif e.cause == 'success':
+                        success = True
+                        break
+                    elif e.cause == 'shutdown':
+                        return False, True
+                    elif e.cause == 'break':
+                        break
+                    else:
+                        raise RuntimeError(f'Invalid AttemptException: {e}')
+
+            if success:
+                self.store_session(partial(cookies_from_session, session.session))
+        except LoginEngineUnsupported:
+            raise
+        except Exception as e:
+            _LOGGER.error(f'Error encountered during authentication without a browser \nException:\n{exception_to_string(e)}')
+            success = False
+        finally:
+            session.close()
+
+        return success, False
+
     def login(self) -> (bool, bool):
         """
         Logs into the currently running gateway.
@@ -467,15 +750,45 @@ class LoginHandler():
         :return: Whether authentication was successful and whether IBeam should shut down
         :rtype: (bool, bool)
         """
+        start = time.perf_counter()
+        with log_context.step('login'):
+            success, shutdown = self._login()
+        LOGIN_DURATION.observe(time.perf_counter() - start, result='shutdown' if shutdown else 'success' if success else 'failure')
+        return success, shutdown
+
+    def _login(self) -> (bool, bool):
+        if self.login_engine == LOGIN_ENGINE_HTTP:
+            try:
+                return self._login_http()
+            except LoginEngineUnsupported as e:
+                _LOGGER.warning(f'Cannot log in without a browser, falling back to Selenium: {e}')
+
+        if self.browser_budget is None:
+            return self._login_browser()
+
+        with login_step('wait_for_browser'):
+            acquired = self.browser_budget.acquire(self.driver_factory.name)
+        if not acquired:
+            return False, False
+
+        try:
+            return self._login_browser()
+        finally:
+            self.browser_budget.release(self.driver_factory.name)
+
+    def _login_browser(self) -> (bool, bool):
         display = None
         success = False
         driver = None
-        website_version = -1
         targets = self.targets
 
         try:
             _LOGGER.info(f'Loading auth webpage at {self.base_url + self.route_auth}')
-            driver, display = start_up_browser(self.driver_factory)
+            with login_step('start_up_browser'):
+                if self.browser_pool is not None:
+                    driver = self.browser_pool.acquire()
+                else:
+                    driver, display = start_up_browser(self.driver_factory)
 
             wait_and_identify_trigger = self.load_page(targets, driver, self.base_url, self.route_auth)
 
@@ -483,6 +796,7 @@ class LoginHandler():
 
             while immediate_attempts < max(self.max_immediate_attempts, 1):
                 immediate_attempts += 1
+                log_context.set_attempt(immediate_attempts)
                 _LOGGER.info(f'Login attempt number {immediate_attempts}')
 
                 try:
@@ -508,11 +822,12 @@ class LoginHandler():
                     else:
                         raise RuntimeError(f'Invalid AttemptException: {e}')
 
+            if success:
+                self.store_session(partial(cookies_from_driver, driver))
 
-            time.sleep(1)
         except TimeoutException as e:
             try:
-                self.handle_timeout_exception(e, targets, driver, website_version, self.route_auth, self.base_url, self.outputs_dir)
+                self.handle_timeout_exception(e, targets, driver, self.website_version or -1, self.route_auth, self.base_url, self.outputs_dir)
             except AttemptException as e2:
                 if e2.cause == 'shutdown':
                     return False, True
@@ -523,6 +838,9 @@ class LoginHandler():
             save_screenshot(driver, self.outputs_dir, '__generic-exception')
             success = False
         finally:
-            shut_down_browser(driver, display)
+            if self.browser_pool is not None:
+                self.browser_pool.release(driver)
+            else:
+                shut_down_browser(driver, display)
 
         return success, False
\ No newline at end of file
@@ -1,58 +1,90 @@
 import logging
 import os
+import re
 import subprocess
 import sys
 import time
+import urllib.parse
 from pathlib import Path
 from typing import Optional, List
 
 import psutil
 
+from ibeam.src.gateway_readiness import GatewayReadiness
 from ibeam.src.handlers.http_handler import HttpHandler
+from ibeam.src.metrics import GATEWAY_STARTUP_DURATION
 
 _LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
 
+GATEWAY_CONF = 'conf.yaml'
+GATEWAY_ALTERNATE_CONF = 'conf.alternate.yaml'
+
+GATEWAY_RESTART_KILL = 'kill'
+GATEWAY_RESTART_BLUE_GREEN = 'blue_green'
+GATEWAY_RESTART_MODES = [GATEWAY_RESTART_KILL, GATEWAY_RESTART_BLUE_GREEN]
+
+
+def _matches(process: psutil.Process, name: str) -> bool:
+    """Whether the process' command line or executable contains 'name'. Raises psutil.NoSuchProcess if the process is gone."""
+    exe, cmdline = "", []
+    try:
+        cmdline = process.cmdline()
+        exe = process.exe()
+    except (psutil.AccessDenied, psutil.ZombieProcess):
+        pass
+    return name in ' '.join(cmdline) or name in os.path.basename(exe)
+
+
+def _started_with_conf(process: psutil.Process, conf_name: str) -> bool:
+    """Whether the process was given the conf file as an argument, as the Gateway is by its run script. Raises psutil.NoSuchProcess if the process is gone."""
+    try:
+        cmdline = process.cmdline()
+    except (psutil.AccessDenied, psutil.ZombieProcess):
+        return False
+    return any(re.split(r'[\\/]', arg)[-1] == conf_name for arg in cmdline)
+
+
+def _is_alive(process: psutil.Process) -> bool:
+    try:
+        return process.is_running() and process.status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
 
 # from https://stackoverflow.com/questions/550653/cross-platform-way-to-get-pids-by-process-name-in-python/2241047
-def _find_procs_by_name(name):
-    "Return a list of processes matching 'name'."
+def _find_procs_by_name(name, processes=None):
+    "Return a list of processes matching 'name'. All processes on the host are scanned unless 'processes' are provided."
     assert name, name
     ls = []
-    for p in psutil.process_iter():
-        name_, exe, cmdline = "", "", []
+    for p in (processes if processes is not None else psutil.process_iter()):
         try:
-            # name_ = p.name()
-            cmdline = p.cmdline()
-            exe = p.exe()
-        except (psutil.AccessDenied, psutil.ZombieProcess):
-            pass
+            if _matches(p, name):
+                ls.append(p)
         except psutil.NoSuchProcess:
             continue
-        if name in ' '.join(cmdline) or name in os.path.basename(exe):
-            ls.append(p)
     return ls
 
 
-def _start_gateway(gateway_dir):
+def _start_gateway(gateway_dir, conf_name: str = GATEWAY_CONF) -> subprocess.Popen:
     creationflags = 0  # when not on Windows, we send 0 to avoid errors.
 
     if sys.platform == 'win32':
-        args = ["cmd", "/k", r"bin\run.bat", r"root\conf.yaml"]
+        args = ["cmd", "/k", r"bin\run.bat", "root\\" + conf_name]
         _LOGGER.info(f'Starting Gateway as Windows process with params: {args}')
         creationflags = subprocess.CREATE_NEW_CONSOLE
 
     elif sys.platform == 'darwin':
-        args = ["open", "-F", "-a", "Terminal", r"bin/run.sh", r"root/conf.yaml"]
+        args = ["open", "-F", "-a", "Terminal", r"bin/run.sh", "root/" + conf_name]
         _LOGGER.info(f'Starting Gateway as Mac process with params: {args}')
 
     elif sys.platform == 'linux':
-        args = ["bash", r"bin/run.sh", r"root/conf.yaml"]
+        args = ["bash", r"bin/run.sh", "root/" + conf_name]
         _LOGGER.info(f'Starting Gateway as Linux process with params: {args}')
 
     else:
         raise EnvironmentError(f'Unknown platform: {sys.platform}')
 
-    subprocess.Popen(
+    return subprocess.Popen(
         args=args,
         cwd=gateway_dir,
         creationflags=creationflags
@@ -63,8 +95,14 @@ def _try_starting_gateway(
         gateway_dir:os.PathLike,
         gateway_startup:int,
         verify_connection:callable,
+        find_processes:callable = None,
+        start_gateway:callable = None,
+        readiness:Optional[GatewayReadiness] = None,
 )  -> Optional[List[int]]:
-    processes = _find_procs_by_name(gateway_process_match)
+    find_processes = find_processes if find_processes is not None else lambda: _find_procs_by_name(gateway_process_match)
+    start_gateway = start_gateway if start_gateway is not None else _start_gateway
+
+    processes = find_processes()
     if processes:
         server_process_pids = [process.pid for process in processes]
     else:
@@ -72,16 +110,21 @@ def _try_starting_gateway(
         _LOGGER.info(
             'Note that the Gateway log below may display "Open https://localhost:[PORT] to login" - ignore this command.')
 
-        _start_gateway(gateway_dir)
+        if readiness is not None:
+            readiness.mark()
+
+        t_start = time.time()
+        start_gateway(gateway_dir)
 
         server_process_pids = None
 
         # let's try to communicate with the Gateway
-        t_end = time.time() + gateway_startup
+        t_end = t_start + gateway_startup
 
         while time.time() < t_end:
-            processes = _find_procs_by_name(gateway_process_match)
+            processes = find_processes()
             if len(processes) == 0:
+                time.sleep(0.1)
                 continue
 
             server_process_pids = [process.pid for process in processes]
@@ -90,14 +133,24 @@ def _try_starting_gateway(
 
         if server_process_pids is None:
             _LOGGER.error(f'Cannot find gateway process by name: "{gateway_process_match}"')
+            GATEWAY_STARTUP_DURATION.observe(time.time() - t_start, result='not_found')
             return None
 
         ping_success = False
         while time.time() < t_end:
+            if readiness is not None:
+                # sleeps until the Gateway's log or listen socket report it is ready, only then it's worth pinging it
+                signal = readiness.wait(t_end)
+                if signal is None:
+                    break
+                _LOGGER.debug(f'Gateway readiness signalled by its {signal}')
+
             status = verify_connection()
             if not status.running:
                 seconds_remaining = round(t_end - time.time())
-                if seconds_remaining > 0:
+                if readiness is not None:
+                    time.sleep(readiness.poll_interval)
+                elif seconds_remaining > 0:
                     _LOGGER.info(
                         f'Cannot ping Gateway. Retrying for another {seconds_remaining} seconds')
                     time.sleep(1)
@@ -106,41 +159,165 @@ def _try_starting_gateway(
                 ping_success = True
                 break
 
+        GATEWAY_STARTUP_DURATION.observe(time.time() - t_start, result='ready' if ping_success else 'not_responding')
+
         if not ping_success:
             _LOGGER.error('Gateway process found but cannot establish a connection with the Gateway')
 
     return server_process_pids
 
-def _kill_gateway(gateway_process_match:str):
-    processes = _find_procs_by_name(gateway_process_match)
+def _kill_gateway(gateway_process_match:str, find_processes:callable = None):
+    find_processes = find_processes if find_processes is not None else lambda: _find_procs_by_name(gateway_process_match)
+
+    processes = find_processes()
     if not processes:
         _LOGGER.warning(f'Attempting to kill but could not find process named "{gateway_process_match}"')
         return False
 
     for process in processes:
-        process.terminate()
-
-    time.sleep(1)
+        try:
+            process.terminate()
+        except psutil.NoSuchProcess:
+            pass
 
     # double check we succeeded
-    processes = _find_procs_by_name(gateway_process_match)
-    if processes:
-        return False
-    return True
+    _, alive = psutil.wait_procs(processes, timeout=1)
+    return not alive
 
 
 class ProcessHandler():
+    """
+    Starts, finds and kills the Gateway process.
+
+    The Gateway launched by this handler is tracked through its Popen handle and the tree of its child processes, so that finding it doesn't require scanning every process on the host. The tracked processes are stored in a PID file, allowing a restarted IBeam to adopt a Gateway that is already running. Scanning all processes is only used as a fallback, when no Gateway is tracked.
+
+    Attributes:
+        gateway_dir (os.PathLike): Directory containing the Gateway.
+        gateway_process_match (str): Text that the Gateway's command line or executable contains.
+        gateway_startup (int): Number of seconds to wait for the Gateway to start.
+        verify_connection (callable): Returns the Status of the Gateway's base route.
+        pid_file (str): Path of the file storing the tracked processes. Set to None to disable adoption.
+        readiness (GatewayReadiness): Detects when a starting Gateway is ready. If None, the Gateway is pinged once per second until it responds.
+        gateway_conf (str): Name of the conf file in the Gateway's root directory to start the Gateway with. If set, only Gateway processes started with it are matched, so that two Gateways can run alongside.
+    """
 
     def __init__(self,
                  gateway_dir: os.PathLike,
                  gateway_process_match:str,
                  gateway_startup:int,
                  verify_connection:callable,
+                 pid_file: Optional[str] = None,
+                 readiness: Optional[GatewayReadiness] = None,
+                 gateway_conf: Optional[str] = None,
                  ):
         self.gateway_dir = gateway_dir
         self.gateway_process_match = gateway_process_match
         self.gateway_startup = gateway_startup
         self.verify_connection = verify_connection
+        self.pid_file = pid_file
+        self.readiness = readiness
+        self.gateway_conf = gateway_conf
+
+        self._popen = None
+        self._tracked = []
+        self._adopt()
+
+    def _adopt(self):
+        """Tracks the Gateway processes stored in the PID file, if they are still running."""
+        if self.pid_file is None or not os.path.isfile(self.pid_file):
+            return
+
+        processes = []
+        try:
+            with open(self.pid_file, 'r') as f:
+                for line in f.read().split('\n'):
+                    if not line.strip():
+                        continue
+                    pid, create_time = line.split()
+                    try:
+                        process = psutil.Process(int(pid))
+                        # the create time guards against the PID having been reused by another process
+                        if abs(process.create_time() - float(create_time)) < 0.01 and self._matches(process):
+                            processes.append(process)
+                    except psutil.NoSuchProcess:
+                        continue
+        except (OSError, ValueError) as e:
+            _LOGGER.warning(f'Cannot read Gateway PID file {self.pid_file}: {e}')
+
+        if processes:
+            _LOGGER.info(f'Adopted running Gateway with pids: {[process.pid for process in processes]}')
+            self._tracked = processes
+        else:
+            self._write_pid_file()
+
+    def _matches(self, process: psutil.Process) -> bool:
+        return _matches(process, self.gateway_process_match) and (self.gateway_conf is None or _started_with_conf(process, self.gateway_conf))
+
+    def _find_procs(self, processes=None) -> List[psutil.Process]:
+        found = _find_procs_by_name(self.gateway_process_match, processes)
+        if self.gateway_conf is None:
+            return found
+
+        matching = []
+        for process in found:
+            try:
+                if _started_with_conf(process, self.gateway_conf):
+                    matching.append(process)
+            except psutil.NoSuchProcess:
+                continue
+        return matching
+
+    def _write_pid_file(self):
+        if self.pid_file is None:
+            return
+
+        try:
+            if not self._tracked:
+                if os.path.isfile(self.pid_file):
+                    os.remove(self.pid_file)
+                return
+
+            with open(self.pid_file, 'w') as f:
+                f.write(''.join(f'{process.pid} {process.create_time()}\n' for process in self._tracked))
+        except (OSError, psutil.Error) as e:
+            _LOGGER.warning(f'Cannot write Gateway PID file {self.pid_file}: {e}')
+
+    def _track(self, processes: List[psutil.Process]):
+        if [p.pid for p in processes] != [p.pid for p in self._tracked]:
+            self._tracked = processes
+            self._write_pid_file()
+
+    def _start(self, gateway_dir: os.PathLike) -> subprocess.Popen:
+        self._popen = _start_gateway(gateway_dir, self.gateway_conf or GATEWAY_CONF)
+        return self._popen
+
+    def find_processes(self) -> List[psutil.Process]:
+        """Returns the running Gateway processes, scanning all processes on the host only if no Gateway is tracked."""
+        if self._tracked:
+            processes = [process for process in self._tracked if _is_alive(process)]
+            if processes:
+                return processes
+
+            _LOGGER.info(f'Tracked Gateway processes have exited: {[process.pid for process in self._tracked]}')
+            self._track([])
+
+        if self._popen is not None and self._popen.poll() is None:
+            # the Gateway we launched is still starting up, it can only be found among the launcher's children
+            try:
+                launcher = psutil.Process(self._popen.pid)
+                processes = self._find_procs([launcher] + launcher.children(recursive=True))
+            except psutil.NoSuchProcess:
+                processes = []
+        else:
+            self._adopt()
+            if self._tracked:
+                return self._tracked
+
+            # the launcher either exited or detached the Gateway from its tree (eg. on macOS), fall back to a full scan
+            processes = self._find_procs()
+
+        self._track(processes)
+        return processes
 
     def start_gateway(self) ->  Optional[List[int]]:
         return _try_starting_gateway(
@@ -148,7 +325,176 @@ class ProcessHandler():
             gateway_dir=self.gateway_dir,
             gateway_startup=self.gateway_startup,
             verify_connection=self.verify_connection,
+            find_processes=self.find_processes,
+            start_gateway=self._start,
+            readiness=self.readiness,
         )
 
     def kill_gateway(self) -> bool:
-        return _kill_gateway(gateway_process_match=self.gateway_process_match)
\ No newline at end of file
+        success = _kill_gateway(gateway_process_match=self.gateway_process_match, find_processes=self.find_processes)
+        if success:
+            self._track([])
+            if self._popen is not None:
+                self._popen.poll()  # reap the launcher
+                self._popen = None
+        return success
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # process handles can't be pickled, a spawned process adopts the Gateway from the PID file instead
+        state['_popen'] = None
+        state['_tracked'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._adopt()
+
+
+def with_port(base_url: str, port: int) -> str:
+    """Returns the base URL with its port replaced."""
+    url = urllib.parse.urlsplit(base_url)
+    return url._replace(netloc=f'{url.hostname}:{port}').geturl()
+
+
+def write_alternate_conf(gateway_dir: os.PathLike, port: int, source: str = GATEWAY_CONF, target: str = GATEWAY_ALTERNATE_CONF) -> str:
+    """Writes a copy of the Gateway's conf file listening on another port, returning its path."""
+    root_dir = os.path.join(gateway_dir, 'root')
+    with open(os.path.join(root_dir, source), 'r') as f:
+        conf = f.read()
+
+    conf, count = re.subn(r'^(\s*listenPort:\s*)\d+', lambda match: f'{match.group(1)}{port}', conf, count=1, flags=re.MULTILINE)
+    if count == 0:
+        raise ValueError(f'Cannot find listenPort in {os.path.join(root_dir, source)}')
+
+    path = os.path.join(root_dir, target)
+    with open(path, 'w') as f:
+        f.write(conf)
+    return path
+
+
+class BlueGreenProcessHandler():
+    """
+    Runs the Gateway in one of two slots, each with its own conf file, port and PID file, so that a replacement Gateway can start alongside the running one.
+
+    Restarting starts the replacement in the standby slot and waits until it accepts connections. Only then is the running Gateway logged out and killed, and the standby slot becomes the active one, moving the base URL of every holder to its port. Otherwise, it acts as the ProcessHandler of the active slot.
+
+    The base URL of the active slot is written to the state file, so that consumers can find the Gateway and a restarted IBeam knows which slot is active.
+
+    Attributes:
+        process_handlers (list): ProcessHandlers of the two slots.
+        base_urls (list): Base URLs of the Gateways of the two slots.
+        base_url_holders (list): Objects whose 'base_url' attribute is set to the base URL of the active slot, such as the HttpHandler and LoginHandler.
+        state_file (str): Path of the file storing the base URL of the active slot. Set to None to disable it.
+    """
+
+    def __init__(self,
+                 process_handlers: List[ProcessHandler],
+                 base_urls: List[str],
+                 base_url_holders: list = None,
+                 state_file: Optional[str] = None,
+                 ):
+        self.process_handlers = process_handlers
+        self.base_urls = base_urls
+        self.base_url_holders = base_url_holders or []
+        self.state_file = state_file
+
+        self.active = self._read_state()
+        if not self.active_handler.find_processes() and self.process_handlers[1 - self.active].find_processes():
+            # IBeam stopped in the middle of a restart, the Gateway runs in the other slot
+            self.active = 1 - self.active
+        self._switch(self.active)
+
+    @property
+    def active_handler(self) -> ProcessHandler:
+        return self.process_handlers[self.active]
+
+    @property
+    def base_url(self) -> str:
+        return self.base_urls[self.active]
+
+    def _read_state(self) -> int:
+        if self.state_file is None or not os.path.isfile(self.state_file):
+            return 0
+        try:
+            with open(self.state_file, 'r') as f:
+                base_url = f.read().strip()
+        except OSError as e:
+            _LOGGER.warning(f'Cannot read Gateway state file {self.state_file}: {e}')
+            return 0
+        return self.base_urls.index(base_url) if base_url in self.base_urls else 0
+
+    def _switch(self, index: int):
+        self.active = index
+        for holder in self.base_url_holders:
+            holder.base_url = self.base_url
+
+        if self.state_file is None:
+            return
+        try:
+            with open(self.state_file, 'w') as f:
+                f.write(self.base_url + '\n')
+        except OSError as e:
+            _LOGGER.warning(f'Cannot write Gateway state file {self.state_file}: {e}')
+
+    def find_processes(self) -> List[psutil.Process]:
+        return self.active_handler.find_processes()
+
+    def start_gateway(self) -> Optional[List[int]]:
+        return self.active_handler.start_gateway()
+
+    def kill_gateway(self) -> bool:
+        return self.active_handler.kill_gateway()
+
+    def restart_gateway(self, logout: callable) -> bool:
+        """
+        Replaces the running Gateway with one started in the standby slot.
+
+        :param logout: Logs the running Gateway out, called once the replacement accepts connections.
+        :return: Whether the replacement accepts connections and became the active Gateway. If not, the running Gateway is kept.
+        """
+        standby_index = 1 - self.active
+        standby = self.process_handlers[standby_index]
+        _LOGGER.info(f'Starting a replacement Gateway at {self.base_urls[standby_index]} alongside the one at {self.base_url}')
+
+        if standby.find_processes():
+            _LOGGER.warning('A Gateway is already running in the standby slot, killing it first')
+            standby.kill_gateway()
+
+        t_start = time.time()
+        pids = standby.start_gateway()
+        if pids is None or not standby.verify_connection().running:
+            _LOGGER.error(f'Replacement Gateway did not accept connections in {standby.gateway_startup} seconds, keeping the running one')
+            standby.kill_gateway()
+            return False
+
+        _LOGGER.info(f'Replacement Gateway ready after {time.time() - t_start:.1f} seconds, logging out and killing the one at {self.base_url}')
+        try:
+            logout()
+        except Exception as e:
+            _LOGGER.warning(f'Error logging out of the replaced Gateway: {e}')
+
+        if not self.active_handler.kill_gateway():
+            _LOGGER.warning('Killing the replaced Gateway failed')
+
+        self._switch(standby_index)
+        _LOGGER.info(f'Switched to the Gateway at {self.base_url}')
+        return True
+
+    def follow_state(self) -> bool:
+        """Switches to the slot recorded in the state file, which a restart in a spawned maintenance process may have changed. Returns whether it switched."""
+        if self.state_file is None:
+            return False
+
+        active = self._read_state()
+        if active == self.active:
+            return False
+
+        self._switch(active)
+        _LOGGER.info(f'Following the Gateway at {self.base_url}, switched to by a spawned process')
+        return True
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # a spawned process follows the slot that is currently active
+        self.follow_state()
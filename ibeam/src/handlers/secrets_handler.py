@@ -1,9 +1,13 @@
 import base64
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 
 
 _LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
@@ -12,6 +16,13 @@ SECRETS_SOURCE_ENV = 'env'
 SECRETS_SOURCE_FS = 'fs'
 SECRETS_SOURCE_GCP_SECRETS = 'gcp_secrets_manager'
 
+GCP_METADATA_TOKEN_URL = 'http://169.254.169.254/computeMetadata/v1/instance/service-accounts/default/token'
+
+# the access token is renewed this many seconds before it expires, so that it doesn't expire in flight
+_TOKEN_EXPIRY_MARGIN = 60
+
+_CREDENTIALS = ('ACCOUNT', 'PASSWORD', 'KEY')
+
 """If IBEAM_SECRETS_SOURCE is set to
 SECRETS_SOURCE_ENV, or if it is not set, then
 environment values will be assumed to hold the
@@ -30,6 +41,9 @@ Platform secrets in form of:
 In this case IBEAM_GCP_BASE_URL must also be provided in form of:
 
 https://secretmanager.googleapis.com/v1/projects/[PROJECT_ID]/secrets
+
+The access token from the metadata server is reused until it
+expires, and the secret values for IBEAM_SECRETS_CACHE_TTL seconds.
 """
 
 class SecretsHandler():
@@ -37,14 +51,33 @@ class SecretsHandler():
     def __init__(self,
                  secrets_source: str,
                  gcp_base_url: Optional[str] = None,
+                 env_prefix: str = 'IBEAM_',
+                 gcp_metadata_url: str = GCP_METADATA_TOKEN_URL,
+                 secrets_cache_ttl: float = 0,
                  ):
         self.secrets_source = secrets_source
         self.gcp_base_url = gcp_base_url
+        self.gcp_metadata_url = gcp_metadata_url
+
+        """Number of seconds the values of GCP secrets are kept in memory for. If 0, they are requested on every read"""
+        self.secrets_cache_ttl = secrets_cache_ttl
+
+        """Prefix of the names of the environment values, such as 'IBEAM_ALICE_' to read the credentials of one of the supervised accounts"""
+        self.env_prefix = env_prefix
 
         """Character encoding for secret files"""
         self.encoding = os.environ.get(
             'IBEAM_ENCODING', default='UTF-8')
 
+        self._reset_gcp_state()
+
+    def _reset_gcp_state(self):
+        self._session = None
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
+        self._cache = {}
+
     def secret_value(self, encoding, name: str,
                      lstrip=None, rstrip='\r\n') -> Optional[str]:
         """
@@ -134,47 +167,107 @@ class SecretsHandler():
                     f'Unable to read env value for {name} as a file.')
                 return None
         elif self.secrets_source == SECRETS_SOURCE_GCP_SECRETS:
-            # get authentication token from GCP
-            response = requests.get('http://169.254.169.254/computeMetadata/v1/instance/service-accounts/default/token', headers={'Metadata-Flavor': 'Google'})
+            return self._gcp_secret_value(name, value)
+
+        else:
+            _LOGGER.error(
+                f'Unknown Secrets Source: {self.secrets_source}')
+            return None
+
+
+    def _gcp_session(self) -> requests.Session:
+        if self._session is None:
+            # one connection per credential, as they are requested at once
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=len(_CREDENTIALS))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def _access_token(self) -> Optional[str]:
+        """Returns the access token from the GCP metadata server, requesting a new one only once the previous one expires."""
+        with self._token_lock:
+            if self._token is not None and time.monotonic() < self._token_expires_at:
+                return self._token
+
+            response = self._gcp_session().get(self.gcp_metadata_url, headers={'Metadata-Flavor': 'Google'})
             if response.status_code != 200:
                 _LOGGER.error(f'Google Metadata request returned status code {response.status_code} :: {response.reason} :: {response.text}')
                 return None
 
-            access_token = response.json()['access_token']
+            token = response.json()
+            self._token = token['access_token']
+            self._token_expires_at = time.monotonic() + max(int(token.get('expires_in', 0)) - _TOKEN_EXPIRY_MARGIN, 0)
+            return self._token
 
-            # get secret from GCP
-            secret_url = self.gcp_base_url + '/' + value + ':access'
-            response2 = requests.get(secret_url, headers={'authorization': f'Bearer {access_token}'})
-            if response2.status_code!= 200:
-                _LOGGER.error(f'Google Secret Manager request returned status code {response2.status_code} :: {response2.reason} :: {response2.text}')
-                return None
+    def _gcp_secret_value(self, name: str, secret: str) -> Optional[str]:
+        if self.secrets_cache_ttl > 0:
+            cached = self._cache.get(secret)
+            if cached is not None and time.monotonic() - cached[1] < self.secrets_cache_ttl:
+                return cached[0]
 
-            payload_data = response2.json()['payload']['data']
-            try:
-                base64_data =  base64.b64decode(payload_data)
-                decoded_data = base64_data.decode('utf-8')
-            except Exception as e:
-                _LOGGER.error(f'Unable to decode secret value for {name}: {e}')
-                return None
-            return decoded_data
+        access_token = self._access_token()
+        if access_token is None:
+            return None
 
-        else:
-            _LOGGER.error(
-                f'Unknown Secrets Source: {self.secrets_source}')
+        # get secret from GCP
+        secret_url = self.gcp_base_url + '/' + secret + ':access'
+        response = self._gcp_session().get(secret_url, headers={'authorization': f'Bearer {access_token}'})
+        if response.status_code == 401:
+            # the token was revoked before its expiry
+            with self._token_lock:
+                self._token = None
+        if response.status_code != 200:
+            _LOGGER.error(f'Google Secret Manager request returned status code {response.status_code} :: {response.reason} :: {response.text}')
             return None
 
+        payload_data = response.json()['payload']['data']
+        try:
+            base64_data = base64.b64decode(payload_data)
+            decoded_data = base64_data.decode('utf-8')
+        except Exception as e:
+            _LOGGER.error(f'Unable to decode secret value for {name}: {e}')
+            return None
+
+        if self.secrets_cache_ttl > 0:
+            self._cache[secret] = (decoded_data, time.monotonic())
+        return decoded_data
+
+    def credentials(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Returns the account, password and key. GCP secrets are requested at once, rather than one after another."""
+        names = [self.env_prefix + credential for credential in _CREDENTIALS]
+        if self.secrets_source != SECRETS_SOURCE_GCP_SECRETS:
+            return tuple(self.secret_value(self.encoding, name) for name in names)
+
+        # the token is shared by the requests, hence requested first
+        if any(os.environ.get(name) is not None for name in names):
+            self._access_token()
+        with ThreadPoolExecutor(len(names), thread_name_prefix='ibeam-secrets') as executor:
+            return tuple(executor.map(lambda name: self.secret_value(self.encoding, name), names))
 
     @property
     def account(self):
         """IBKR account name."""
-        return self.secret_value(self.encoding, 'IBEAM_ACCOUNT')
+        return self.secret_value(self.encoding, self.env_prefix + 'ACCOUNT')
 
     @property
     def password(self):
         """IBKR account password."""
-        return self.secret_value(self.encoding, 'IBEAM_PASSWORD')
+        return self.secret_value(self.encoding, self.env_prefix + 'PASSWORD')
 
     @property
     def key(self):
         """Key to the IBKR password."""
-        return self.secret_value(self.encoding, 'IBEAM_KEY')
\ No newline at end of file
+        return self.secret_value(self.encoding, self.env_prefix + 'KEY')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the lock and session can't be pickled, and the token and secrets aren't passed on to a spawned process
+        for attribute in ['_session', '_token', '_token_expires_at', '_token_lock', '_cache']:
+            del state[attribute]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_gcp_state()
@@ -1,10 +1,13 @@
 import logging
 import time
 from pathlib import Path
+from typing import Optional
 
+from ibeam.src import log_context
 from ibeam.src.handlers.http_handler import Status, HttpHandler
 from ibeam.src.handlers.login_handler import LoginHandler
-from ibeam.src.handlers.process_handler import ProcessHandler
+from ibeam.src.handlers.process_handler import ProcessHandler, GATEWAY_RESTART_KILL, GATEWAY_RESTART_BLUE_GREEN
+from ibeam.src.metrics import TIME_TO_AUTHENTICATED
 
 _LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
 
@@ -42,6 +45,74 @@ def condition_not_competing(status:Status) -> bool:
 
     return False
 
+
+# decisions shared by the StrategyHandler and the AsyncStrategyHandler, which only differ in how they perform the I/O
+
+AUTHENTICATED = 'authenticated'
+NOT_AUTHENTICATED = 'not_authenticated'
+COMPETING = 'competing'
+FAILED = 'failed'
+
+LOG_IN = 'log_in'
+REAUTHENTICATE = 'reauthenticate'
+LOGOUT_AND_REAUTHENTICATE = 'logout_and_reauthenticate'
+
+
+def is_authenticated(status: Status) -> bool:
+    """Whether the Gateway is running, authenticated and not competing, hence needs no authentication."""
+    return bool(status.authenticated and not status.competing)
+
+
+def is_fully_authenticated(status: Status) -> bool:
+    """Whether the session is authenticated, connected and not competing, as expected after authenticating it."""
+    return bool(status.running and status.session and status.connected and not status.competing and status.authenticated)
+
+
+def strategy_A_logout_first(status: Status) -> bool:
+    """Returns whether the session found has to be logged out before logging in with strategy A."""
+    logout_first = False
+    if status.session:
+        if not status.connected or status.competing:
+            _LOGGER.info('Competing Gateway session found, restarting and logging in...')
+            logout_first = True
+
+        _LOGGER.info('Gateway session found but not authenticated, logging in...')
+    else:
+        _LOGGER.info('No active sessions, logging in...')
+    return logout_first
+
+
+def strategy_A_outcome(status: Status) -> str:
+    """Classifies the status checked after logging in with strategy A as AUTHENTICATED, NOT_AUTHENTICATED if the session still has to be reauthenticated, COMPETING, or FAILED."""
+    if not status.authenticated:
+        if status.session:
+            _LOGGER.error('Logging in succeeded, but active session is still not authenticated')
+            return NOT_AUTHENTICATED
+        elif status.running:
+            _LOGGER.error('Logging in succeeded but there are still no active sessions')
+        else:
+            _LOGGER.error('Logging in succeeded but now cannot communicate with the Gateway')
+        return FAILED
+    elif not status.connected or status.competing:
+        _LOGGER.info('Logging in succeeded, session is authenticated but competing, reauthenticating...')
+        return COMPETING
+
+    return AUTHENTICATED
+
+
+def strategy_B_action(status: Status) -> str:
+    """Returns how strategy B authenticates the session: LOG_IN, REAUTHENTICATE or LOGOUT_AND_REAUTHENTICATE."""
+    if not status.session:
+        _LOGGER.info('No active sessions, logging in...')
+        return LOG_IN
+    elif not status.connected or status.competing:
+        _LOGGER.info('Competing or disconnected Gateway session found, logging out and reauthenticating...')
+        return LOGOUT_AND_REAUTHENTICATE
+    else:
+        _LOGGER.info('Active session found but not authenticated, reauthenticating...')
+        return REAUTHENTICATE
+
+
 class StrategyHandler():
 
     def __init__(self,
@@ -54,6 +125,7 @@ class StrategyHandler():
                  restart_wait:int,
                  max_reauthenticate_retries:int,
                  max_status_check_retries:int,
+                 gateway_restart_mode:str=GATEWAY_RESTART_KILL,
                  ):
         self.http_handler = http_handler
         self.login_handler = login_handler
@@ -64,11 +136,18 @@ class StrategyHandler():
         self.restart_wait = restart_wait
         self.max_reauthenticate_retries = max_reauthenticate_retries
         self.max_status_check_retries = max_status_check_retries
+        self.gateway_restart_mode = gateway_restart_mode
+        self._authenticating_since = None
+        self._restarting = False
+        # set again by the GatewayClient whenever it starts a Gateway
+        self.resume_pending = True
 
+    @log_context.step('authenticate')
     def try_authenticating(self, request_retries=1) -> (bool, bool, Status):
 
         status = self.http_handler.get_status(max_attempts=request_retries)
-        if status.authenticated and not status.competing:  # running, authenticated and not competing
+        if is_authenticated(status):
+            self.resume_pending = False
             return True, False, status
 
         _LOGGER.info(str(status))
@@ -76,26 +155,115 @@ class StrategyHandler():
         if not status.running:  # no gateway running
             _LOGGER.error('Cannot communicate with the Gateway. Consider increasing IBEAM_GATEWAY_STARTUP')
             return False, False, status
-        else:
+
+        outermost = self._start_timing()
+        try:
+            resumed_status = self._resume_session() if self._take_resume() else None
+            if resumed_status is not None:
+                self._observe_authenticated('resume', outermost)
+                return True, False, resumed_status
+
             _LOGGER.info(f'Authentication strategy: "{self.authentication_strategy}"')
 
             if self.authentication_strategy == 'A':
-                return self._authentication_strategy_A(status, request_retries)
+                result = self._authentication_strategy_A(status, request_retries)
             elif self.authentication_strategy == 'B':
-                return self._authentication_strategy_B(status, request_retries)
+                result = self._authentication_strategy_B(status, request_retries)
             else:
                 _LOGGER.error(f'Unknown authentication strategy: "{self.authentication_strategy}". Defaulting to strategy A.')
-                return self._authentication_strategy_A(status, request_retries)
+                result = self._authentication_strategy_A(status, request_retries)
 
-    def _authentication_strategy_A(self, status:Status, request_retries=1) -> (bool, bool, Status):
-        if status.session:
-            if not status.connected or status.competing:
-                _LOGGER.info('Competing Gateway session found, restarting and logging in...')
-                self._logout()
+            if result[0]:
+                self._observe_authenticated('login', outermost)
+            return result
+        finally:
+            self._stop_timing(outermost)
 
-            _LOGGER.info('Gateway session found but not authenticated, logging in...')
-        else:
-            _LOGGER.info('No active sessions, logging in...')
+    @log_context.step('refresh_session')
+    def refresh_session(self, request_retries=1) -> (bool, bool, Status):
+        """
+        Logs out and logs in anew, so that the session expires later. Unlike try_authenticating, neither a stored session is resumed nor the session is reauthenticated, as neither extends the session's expiry.
+
+        Called ahead of the session's expiry, at the time planned by the RefreshPlanner.
+        """
+        _LOGGER.info('Refreshing the session ahead of its expiry, logging out and in anew...')
+        self._logout()
+
+        status = self.http_handler.get_status(max_attempts=request_retries)
+        if not status.running:
+            _LOGGER.error('Cannot communicate with the Gateway. Consider increasing IBEAM_GATEWAY_STARTUP')
+            return False, False, status
+
+        self._start_timing()
+        try:
+            if self.authentication_strategy == 'B':
+                result = self._log_in(status)
+            else:
+                result = self._authentication_strategy_A(status, request_retries)
+
+            if result[0]:
+                self._observe_authenticated('refresh', True)
+            return result
+        finally:
+            self._stop_timing(True)
+
+    def _start_timing(self) -> bool:
+        """Starts timing the authentication, returning whether this is the outermost call, as strategy A can call try_authenticating again."""
+        outermost = self._authenticating_since is None
+        if outermost:
+            self._authenticating_since = time.perf_counter()
+        return outermost
+
+    def _stop_timing(self, outermost: bool):
+        if outermost:
+            self._authenticating_since = None
+
+    def _take_resume(self) -> bool:
+        """Returns whether to try resuming the stored session, which is only done on the first authentication after IBeam or the Gateway starts."""
+        resume = self.resume_pending
+        self.resume_pending = False
+        return resume
+
+    def _replaces_gateway(self) -> bool:
+        """Whether a Gateway failing to authenticate is replaced, rather than killed. The replacement itself is killed if it fails too."""
+        return self.gateway_restart_mode == GATEWAY_RESTART_BLUE_GREEN and not self._restarting
+
+    def _observe_authenticated(self, path: str, outermost: bool):
+        if outermost:
+            TIME_TO_AUTHENTICATED.observe(time.perf_counter() - self._authenticating_since, path=path)
+
+    def _resume_session(self) -> Optional[Status]:
+        """Tries resuming the stored session through the validate and reauthenticate routes, returning the status if it is authenticated."""
+        if getattr(self.login_handler, 'session_store', None) is None:
+            return None
+
+        try:
+            if not self.login_handler.resume_session():
+                return None
+
+            _LOGGER.info('Validating and reauthenticating the resumed session...')
+            self.http_handler.validate()
+            self.http_handler.reauthenticate()
+        except Exception as e:
+            _LOGGER.exception(f'Error resuming the stored session: {e}')
+            return None
+
+        status = self._repeatedly_check_status(self.max_status_check_retries, condition_authenticated_true)
+        if is_fully_authenticated(status):
+            _LOGGER.info('Resuming the stored session succeeded, no login needed')
+            try:
+                self.http_handler.initialise()
+            except Exception as e:
+                _LOGGER.warning(f'Error initialising the resumed session: {e}')
+            return status
+
+        _LOGGER.info(f'Resuming the stored session failed, logging in instead. {status}')
+        self.login_handler.session_store.clear()
+        return None
+
+    def _authentication_strategy_A(self, status:Status, request_retries=1) -> (bool, bool, Status):
+        if strategy_A_logout_first(status):
+            self._logout()
 
         success, shutdown = self.login_handler.login()
         _LOGGER.info(f'Logging in {"succeeded" if success else "failed"}')
@@ -108,43 +276,29 @@ class StrategyHandler():
 
         # double check if authenticated
         status = self.http_handler.get_status(max_attempts=max(request_retries, 2))
-        if not status.authenticated:
-            if status.session:
-                _LOGGER.error('Logging in succeeded, but active session is still not authenticated')
-                self.http_handler.reauthenticate()
+        outcome = strategy_A_outcome(status)
+        if outcome == NOT_AUTHENTICATED:
+            self.http_handler.reauthenticate()
 
-                if self.reauthenticate_wait > 0:
-                    _LOGGER.info(f'Waiting {self.reauthenticate_wait} seconds to reauthenticate before restarting.')
-                    time.sleep(self.reauthenticate_wait)
+            if self.reauthenticate_wait > 0:
+                _LOGGER.info(f'Waiting {self.reauthenticate_wait} seconds to reauthenticate before restarting.')
+                time.sleep(self.reauthenticate_wait)
 
-                if self.restart_failed_sessions:
-                    _LOGGER.info('Logging out and reattempting full authentication')
-                    self._logout()
-                    return self.try_authenticating(request_retries=request_retries)
-            elif status.running:
-                _LOGGER.error('Logging in succeeded but there are still no active sessions')
-            else:
-                _LOGGER.error('Logging in succeeded but now cannot communicate with the Gateway')
-            return False, False, status
-        elif not status.connected or status.competing:
-            _LOGGER.info('Logging in succeeded, session is authenticated but competing, reauthenticating...')
+            if self.restart_failed_sessions:
+                _LOGGER.info('Logging out and reattempting full authentication')
+                self._logout()
+                return self.try_authenticating(request_retries=request_retries)
+        elif outcome == COMPETING:
             self.http_handler.reauthenticate()
             time.sleep(self.restart_wait)
-            return False, False, status
 
-        return True, False, status
+        return outcome == AUTHENTICATED, False, status
 
     def _authentication_strategy_B(self, status:Status, request_retries=1) -> (bool, bool, Status):
-        if not status.session:
-            _LOGGER.info('No active sessions, logging in...')
+        action = strategy_B_action(status)
+        if action == LOG_IN:
             return self._log_in(status)
-
-        elif not status.connected or status.competing:
-            _LOGGER.info('Competing or disconnected Gateway session found, logging out and reauthenticating...')
-            return self._reauthenticate(status, first_logout=True)
-        else:
-            _LOGGER.info('Active session found but not authenticated, reauthenticating...')
-            return self._reauthenticate(status)
+        return self._reauthenticate(status, first_logout=action == LOGOUT_AND_REAUTHENTICATE)
 
     def _log_in(self, status):
         try:
@@ -159,6 +313,7 @@ class StrategyHandler():
 
         return self._post_authentication()
 
+    @log_context.step('reauthenticate')
     def _reauthenticate(self, status, first_logout=False):
         try:
             if first_logout:
@@ -169,6 +324,7 @@ class StrategyHandler():
             return False, False, status
 
         return self._post_authentication()
+    @log_context.step('logout')
     def _logout(self):
         try:
             logout_response = self.http_handler.logout()
@@ -177,13 +333,20 @@ class StrategyHandler():
         except Exception as e:
             _LOGGER.exception(f'Exception logging out: {e}')
 
+    @log_context.step('post_authentication')
     def _post_authentication(self):
         """This method double-checks that the authentication was successful, and if not, reauthenticates"""
 
         # if we only just logged in and succeeded, this will not reauthenticate but only check status
         status = self._repeatedly_reauthenticate(self.max_reauthenticate_retries, condition_authenticated_true)
 
-        if not status.running or not status.session or not status.connected or status.competing or not status.authenticated:
+        if not is_fully_authenticated(status):
+            if self._replaces_gateway():
+                _LOGGER.error(f'Repeatedly reauthenticating failed {self.max_reauthenticate_retries} times. Replacing the Gateway and restarting the authentication process.')
+                result = self._restart_blue_green()
+                if result is not None:
+                    return result
+
             _LOGGER.error(f'Repeatedly reauthenticating failed {self.max_reauthenticate_retries} times. Killing the Gateway and restarting the authentication process.')
 
             try:
@@ -202,6 +365,24 @@ class StrategyHandler():
         return True, False, status
 
 
+    def _restart_blue_green(self) -> Optional[tuple]:
+        """Replaces the Gateway with one started alongside and authenticates it straight away, returning None if the replacement didn't start."""
+        try:
+            replaced = self.process_handler.restart_gateway(logout=self._logout)
+        except Exception as e:
+            _LOGGER.exception(f'Error replacing the Gateway: {e}')
+            replaced = False
+
+        if not replaced:
+            return None
+
+        # a failure to authenticate the replacement kills it rather than replacing it again
+        self._restarting = True
+        try:
+            return self.try_authenticating(request_retries=2)
+        finally:
+            self._restarting = False
+
     def _repeatedly_check_status(self, max_attempts=1, condition:callable=condition_authenticated_true):
         if not callable(condition):
             raise ValueError(f'Condition must be a callable, found: "{type(condition)}": {condition}')
@@ -229,6 +410,7 @@ class StrategyHandler():
         status = None
 
         for attempt in range(max_attempts):
+            log_context.set_attempt(attempt + 1)
             status = self._repeatedly_check_status(self.max_status_check_retries, condition)
             _LOGGER.info(str(status))
 
@@ -1,24 +1,166 @@
+import json
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import time
+import urllib.parse
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
 import logging
 
+from ibeam.src.metrics import REGISTRY
+
 _LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
 
 
+class Operations():
+    """
+    Runs long operations on background threads and keeps track of their state by an operation ID.
+
+    Only one operation of a given name runs at a time - starting it again while it is running returns the running one.
+    """
+
+    def __init__(self, max_finished: int = 100):
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._operations = {}
+        self._done = {}
+
+    def start(self, name: str, callback: callable) -> dict:
+        with self._lock:
+            for operation in self._operations.values():
+                if operation['name'] == name and operation['state'] == 'running':
+                    return operation.copy()
+
+            operation = {
+                'id': uuid.uuid4().hex,
+                'name': name,
+                'state': 'running',
+                'started': time.time(),
+                'finished': None,
+                'error': None,
+            }
+            self._operations[operation['id']] = operation
+            self._done[operation['id']] = threading.Event()
+            self._prune()
+
+        thread = threading.Thread(target=self._run, args=(operation, callback), name=f'ibeam-{name}-{operation["id"][:8]}', daemon=True)
+        thread.start()
+        return operation.copy()
+
+    def _run(self, operation: dict, callback: callable):
+        try:
+            success = callback()
+            state = 'succeeded' if success else 'failed'
+            error = None
+        except Exception as e:
+            _LOGGER.exception(f'Exception during {operation["name"]} operation {operation["id"]}: {e}')
+            state = 'failed'
+            error = str(e)
+
+        with self._lock:
+            operation['state'] = state
+            operation['error'] = error
+            operation['finished'] = time.time()
+            self._done[operation['id']].set()
+
+    def _prune(self):
+        finished = [operation for operation in self._operations.values() if operation['state'] != 'running']
+        for operation in sorted(finished, key=lambda op: op['started'])[:max(len(finished) - self.max_finished, 0)]:
+            del self._operations[operation['id']]
+            del self._done[operation['id']]
+
+    def wait(self, operation_id: str, timeout: float = None) -> dict:
+        with self._lock:
+            done = self._done.get(operation_id)
+
+        if done is not None:
+            done.wait(timeout)
+
+        return self.get(operation_id)
+
+    def get(self, operation_id: str) -> dict:
+        with self._lock:
+            operation = self._operations.get(operation_id)
+            return operation.copy() if operation is not None else None
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    """Responses shared by the health servers."""
+
+    def _metrics(self):
+        """
+        Serves the metrics of this process in the Prometheus text exposition format.
+
+        With SPAWN_NEW_PROCESSES, each maintenance runs in a spawned process and its observations are lost when that process exits. The login and login step durations, the time to authenticated, the Gateway startup duration and the Gateway requests and statuses are then only observed for the authentication at startup and the health server's own requests.
+        """
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code: int, content: dict):
+        body = json.dumps(content).encode()
+        self.send_response(code)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_ok(self):
+        self.send_response(200)
+        self.send_header("Content-type", "text/html")
+        self.end_headers()
+        self.wfile.write("OK".encode())
+
+    def _send_500(self):
+        self.send_response(500)
+        self.send_header("Content-type", "text/html")
+        self.end_headers()
+        self.wfile.write("Internal Error".encode())
+
+    def _not_ready(self):
+        self.send_response(503)
+        self.send_header("Content-type", "text/html")
+        self.end_headers()
+        self.wfile.write("Not Ready".encode())
+
+
+def _serve(port: int, handler_class) -> ThreadingHTTPServer:
+    # each request is handled on its own thread so that slow checks don't stall the probes
+    server = ThreadingHTTPServer(('', port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever).start()
+    _LOGGER.info(f'Health server started at port={port}')
+    return server
+
+
 def new_health_server(port: int, check_status, get_shutdown_status,
                       activate_callback:callable,
-                      deactivate_callback:callable):
-    class HealthzHandler(BaseHTTPRequestHandler):
+                      deactivate_callback:callable,
+                      get_base_url:callable=None):
+    operations = Operations()
+
+    class HealthzHandler(_HealthHandler):
         def do_GET(self):
-            if self.path == "/livez":
+            url = urllib.parse.urlsplit(self.path)
+            self.query = urllib.parse.parse_qs(url.query)
+
+            if url.path == "/livez":
                 return self._live()
-            elif self.path == "/readyz":
+            elif url.path == "/readyz":
                 return self._ready()
-            elif self.path == "/activate":
+            elif url.path == "/status":
+                return self._status()
+            elif url.path == "/metrics":
+                return self._metrics()
+            elif url.path == "/activate":
                 return self._activate()
-            elif self.path == "/deactivate":
+            elif url.path == "/deactivate":
                 return self._deactivate()
+            elif url.path.startswith("/operations/"):
+                return self._operation(url.path[len("/operations/"):])
             self.send_error(404, "Not Found")
 
         def _live(self):
@@ -33,6 +175,13 @@ def new_health_server(port: int, check_status, get_shutdown_status,
                 return self._not_ready()
             self._send_ok()
 
+        def _status(self):
+            status = check_status()
+            content = {**status.to_dict(), 'shutdown': get_shutdown_status()}
+            if get_base_url is not None:
+                content['gateway_base_url'] = get_base_url()
+            self._send_json(200, content)
+
         def _activate(self):
             if activate_callback():
                 return self._send_ok()
@@ -40,30 +189,98 @@ def new_health_server(port: int, check_status, get_shutdown_status,
                 return self._send_500()
 
         def _deactivate(self):
-            if deactivate_callback():
-                return self._send_ok()
+            # deactivating logs out and kills the Gateway, which can take a while
+            operation = operations.start('deactivate', deactivate_callback)
+
+            if self.query.get('wait', ['false'])[0].lower() in ['1', 'true', 'yes']:
+                operation = operations.wait(operation['id'])
+                if operation['state'] == 'succeeded':
+                    return self._send_ok()
+                else:
+                    return self._send_500()
+
+            self._send_json(202, operation)
+
+        def _operation(self, operation_id: str):
+            operation = operations.get(operation_id)
+            if operation is None:
+                return self.send_error(404, "Not Found")
+            self._send_json(200, operation)
+
+    return _serve(port, HealthzHandler)
+
+
+def new_supervisor_health_server(port: int, supervisor):
+    """
+    Health server of the Supervisor, running the Gateways of several accounts.
+
+    The top-level routes report on all accounts: /livez fails once every account is shut down, /readyz succeeds once every account is authenticated and /status lists the status of each. The routes of a single account are served under /accounts/<name>/.
+    """
+    operations = Operations()
+
+    class SupervisorHealthzHandler(_HealthHandler):
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            self.query = urllib.parse.parse_qs(url.query)
+
+            if url.path == "/livez":
+                return self._live()
+            elif url.path == "/readyz":
+                return self._ready()
+            elif url.path == "/status":
+                return self._send_json(200, supervisor.status())
+            elif url.path == "/metrics":
+                return self._metrics()
+            elif url.path.startswith("/accounts/"):
+                return self._account(*url.path[len("/accounts/"):].partition('/')[::2])
+            elif url.path.startswith("/operations/"):
+                return self._operation(url.path[len("/operations/"):])
+            self.send_error(404, "Not Found")
+
+        def _live(self):
+            if supervisor.get_shutdown_status():
+                self._send_500()
             else:
-                return self._send_500()
+                self._send_ok()
 
-        def _send_ok(self):
-            self.send_response(200)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            self.wfile.write("OK".encode())
-
-        def _send_500(self):
-            self.send_response(500)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            self.wfile.write("Internal Error".encode())
-
-        def _not_ready(self):
-            self.send_response(503)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            self.wfile.write("Not Ready".encode())
-
-    server = HTTPServer(('', port), HealthzHandler)
-    threading.Thread(target=server.serve_forever).start()
-    _LOGGER.info(f'Health server started at port={port}')
-    return server
+        def _ready(self):
+            if not all(client.status_snapshot.get().authenticated for client in supervisor.clients.values()):
+                return self._not_ready()
+            self._send_ok()
+
+        def _account(self, name: str, route: str):
+            client = supervisor.clients.get(name)
+            if client is None:
+                return self.send_error(404, "Not Found")
+
+            if route == "livez":
+                return self._send_500() if client.get_shutdown_status() else self._send_ok()
+            elif route == "readyz":
+                return self._send_ok() if client.status_snapshot.get().authenticated else self._not_ready()
+            elif route == "status":
+                return self._send_json(200, supervisor.account_status(name))
+            elif route == "activate":
+                return self._send_ok() if client.on_activate() else self._send_500()
+            elif route == "deactivate":
+                return self._deactivate(name, client)
+            self.send_error(404, "Not Found")
+
+        def _deactivate(self, name: str, client):
+            operation = operations.start(f'deactivate-{name}', client.on_deactivate)
+
+            if self.query.get('wait', ['false'])[0].lower() in ['1', 'true', 'yes']:
+                operation = operations.wait(operation['id'])
+                if operation['state'] == 'succeeded':
+                    return self._send_ok()
+                else:
+                    return self._send_500()
+
+            self._send_json(202, operation)
+
+        def _operation(self, operation_id: str):
+            operation = operations.get(operation_id)
+            if operation is None:
+                return self.send_error(404, "Not Found")
+            self._send_json(200, operation)
+
+    return _serve(port, SupervisorHealthzHandler)
@@ -0,0 +1,445 @@
+import asyncio
+import email.parser
+import errno
+import http.client
+import logging
+import os
+import re
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Optional
+from urllib.error import HTTPError, URLError
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+# errors indicating that the server closed a kept-alive connection before we reused it
+_RESET_ERRORS = (
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    http.client.CannotSendRequest,
+    http.client.ResponseNotReady,
+)
+
+
+class PooledResponse():
+    """
+    A fully-read response returned by the ConnectionPool.
+
+    The body is read eagerly so that the underlying connection can be returned to the pool immediately. It exposes the subset of the urllib response interface used by IBeam.
+    """
+
+    def __init__(self, url: str, status: int, reason: str, headers, body: bytes):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._body = body
+
+    def read(self) -> bytes:
+        return self._body
+
+    def getcode(self) -> int:
+        return self.status
+
+    def __repr__(self):
+        return f'PooledResponse(url={self.url}, status={self.status}, reason={self.reason})'
+
+
+class _PooledConnection():
+    def __init__(self, connection: http.client.HTTPConnection):
+        self.connection = connection
+        self.last_used = time.monotonic()
+        self.requests_served = 0
+
+
+class ConnectionPool():
+    """
+    A thread-safe pool of HTTP/1.1 keep-alive connections.
+
+    Connections are kept per (scheme, host, port) and reused across requests, saving a TCP connection and a TLS handshake for every request made to the Gateway.
+
+    Attributes:
+        ssl_context (ssl.SSLContext): The context used when opening HTTPS connections.
+        timeout (int): How many seconds to wait for a connection or a response.
+        pool_size (int): Maximum number of idle connections kept per host.
+        idle_timeout (int): Idle connections older than this many seconds are evicted instead of being reused.
+        max_reconnects (int): How many times to retry on a fresh connection if a reused one turns out to have been reset by the server.
+    """
+
+    def __init__(self,
+                 ssl_context: Optional[ssl.SSLContext],
+                 timeout: int,
+                 pool_size: int,
+                 idle_timeout: int,
+                 max_reconnects: int = 1,
+                 ):
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_reconnects = max_reconnects
+
+        self._lock = threading.Lock()
+        self._idle = {}
+
+        self.connections_opened = 0
+        self.requests_made = 0
+
+    def _new_connection(self, scheme: str, host: str, port: Optional[int]) -> _PooledConnection:
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+        with self._lock:
+            self.connections_opened += 1
+
+        return _PooledConnection(connection)
+
+    def _acquire(self, key) -> Optional[_PooledConnection]:
+        """Returns the most recently used idle connection for the key, closing any that sat idle for too long."""
+        stale = []
+        pooled = None
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate = idle.pop()
+                if now - candidate.last_used > self.idle_timeout:
+                    stale.append(candidate)
+                    continue
+                pooled = candidate
+                break
+
+            # anything left below the candidate is older still
+            if pooled is not None:
+                while idle and now - idle[0].last_used > self.idle_timeout:
+                    stale.append(idle.pop(0))
+
+        for candidate in stale:
+            candidate.connection.close()
+
+        if stale:
+            _LOGGER.debug(f'Evicted {len(stale)} idle connection(s) to {key[1]}:{key[2]}')
+
+        return pooled
+
+    def _release(self, key, pooled: _PooledConnection):
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(pooled)
+                return
+
+        pooled.connection.close()
+
+    def request(self, url: str, method: str = 'GET', headers: dict = None) -> PooledResponse:
+        """
+        Performs a request over a pooled connection.
+
+        Errors are raised the same way as urllib.request.urlopen would raise them, ie. HTTPError for HTTP error codes and URLError for connection errors, so that the callers can classify them in the same way.
+        """
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        headers = {} if headers is None else headers.copy()
+        headers.setdefault('Connection', 'keep-alive')
+        if method in ['POST', 'PUT']:
+            headers.setdefault('Content-Length', '0')
+
+        with self._lock:
+            self.requests_made += 1
+
+        reconnects = 0
+        while True:
+            pooled = self._acquire(key)
+            reused = pooled is not None
+            if not reused:
+                pooled = self._new_connection(*key)
+
+            try:
+                pooled.connection.request(method, path, headers=headers)
+                response = pooled.connection.getresponse()
+                body = response.read()
+            except _RESET_ERRORS as e:
+                pooled.connection.close()
+                if reused and reconnects < self.max_reconnects:
+                    reconnects += 1
+                    _LOGGER.debug(f'Pooled connection to {parsed.netloc} was reset ({e.__class__.__name__}), reconnecting')
+                    continue
+                raise URLError(e) from e
+            except socket.timeout:
+                # same as urlopen, read timeouts are raised as they are
+                pooled.connection.close()
+                raise
+            except OSError as e:
+                pooled.connection.close()
+                raise URLError(e) from e
+            except Exception:
+                pooled.connection.close()
+                raise
+
+            pooled.requests_served += 1
+
+            if response.will_close:
+                pooled.connection.close()
+            else:
+                self._release(key, pooled)
+
+            if response.status >= 400:
+                raise HTTPError(url, response.status, response.reason, response.headers, None)
+
+            return PooledResponse(url, response.status, response.reason, response.headers, body)
+
+    def clear(self):
+        """Closes all idle connections."""
+        with self._lock:
+            idle = [pooled for connections in self._idle.values() for pooled in connections]
+            self._idle = {}
+
+        for pooled in idle:
+            pooled.connection.close()
+
+    def __repr__(self):
+        return f'ConnectionPool(pool_size={self.pool_size}, idle_timeout={self.idle_timeout}, max_reconnects={self.max_reconnects}, connections_opened={self.connections_opened}, requests_made={self.requests_made})'
+
+
+# limits of http.client, which the ConnectionPool reads the responses with
+_MAX_LINE = 65536
+_MAX_HEADERS = 100
+
+# the requests never ask for an interim (1xx) response, hence these aren't expected
+_STATUS_LINE = re.compile(r'^HTTP/(1\.[01]) ([2-5]\d\d)(?: (.*))?$')
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readline()
+    except ValueError as e:
+        # raised by the reader when the line is longer than its limit, of _MAX_LINE by default
+        raise http.client.LineTooLong('response line') from e
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str) -> (int, str, http.client.HTTPMessage, bytes, bool):
+    """
+    Reads a response to the request made with the method, returning its status, reason, headers, body and whether the connection closes after it.
+
+    Only handles what the Gateway responds with: a final HTTP/1.x response, its body delimited by Content-Length, chunked, or by closing the connection. Anything else raises the http.client error that HTTPResponse would.
+    """
+    status_line = await _read_line(reader)
+    if not status_line:
+        raise http.client.RemoteDisconnected('Remote end closed connection without response')
+
+    match = _STATUS_LINE.match(status_line.decode('latin-1').rstrip('\r\n'))
+    if match is None:
+        raise http.client.BadStatusLine(status_line)
+    version, status, reason = match.group(1), int(match.group(2)), match.group(3) or ''
+
+    header_lines = []
+    while True:
+        line = await _read_line(reader)
+        if line in (b'\r\n', b'\n', b''):
+            break
+        header_lines.append(line.decode('latin-1'))
+        if len(header_lines) > _MAX_HEADERS:
+            raise http.client.HTTPException(f'got more than {_MAX_HEADERS} headers')
+    headers = email.parser.Parser(_class=http.client.HTTPMessage).parsestr(''.join(header_lines))
+
+    will_close = 'close' in headers.get('Connection', '').lower() or version == '1.0'
+
+    if method == 'HEAD' or status in (204, 304):
+        return status, reason, headers, b'', will_close
+
+    transfer_encoding = headers.get('Transfer-Encoding')
+    if transfer_encoding is not None:
+        if transfer_encoding.strip().lower() != 'chunked':
+            raise http.client.UnknownTransferEncoding(transfer_encoding)
+        return status, reason, headers, await _read_chunked(reader), will_close
+
+    content_length = headers.get('Content-Length')
+    if content_length is not None:
+        if not content_length.strip().isdigit():
+            raise http.client.HTTPException(f'Invalid Content-Length: {content_length}')
+        return status, reason, headers, await reader.readexactly(int(content_length)), will_close
+
+    return status, reason, headers, await reader.read(), True
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size_line = await _read_line(reader)
+        try:
+            size = int(size_line.split(b';')[0].strip(), 16)
+        except ValueError:
+            raise http.client.IncompleteRead(b''.join(chunks))
+        if size == 0:
+            break
+        chunks.append(await reader.readexactly(size))
+        if await _read_line(reader) not in (b'\r\n', b'\n'):
+            raise http.client.IncompleteRead(b''.join(chunks))
+
+    # skip the trailers
+    while (await _read_line(reader)) not in (b'\r\n', b'\n', b''):
+        pass
+    return b''.join(chunks)
+
+
+class _AsyncPooledConnection():
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.requests_served = 0
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool():
+    """
+    An asyncio counterpart of the ConnectionPool.
+
+    Speaks HTTP/1.1 over asyncio streams, keeping connections alive between requests. It is meant to be used from a single event loop and raises the same errors as the ConnectionPool does.
+    """
+
+    def __init__(self,
+                 ssl_context: Optional[ssl.SSLContext],
+                 timeout: int,
+                 pool_size: int,
+                 idle_timeout: int,
+                 max_reconnects: int = 1,
+                 ):
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_reconnects = max_reconnects
+
+        self._idle = {}
+
+        self.connections_opened = 0
+        self.requests_made = 0
+
+    async def _new_connection(self, scheme: str, host: str, port: Optional[int]) -> _AsyncPooledConnection:
+        try:
+            if scheme == 'https':
+                port = port if port is not None else 443
+                reader, writer = await asyncio.open_connection(host, port, ssl=self.ssl_context, server_hostname=host)
+            else:
+                port = port if port is not None else 80
+                reader, writer = await asyncio.open_connection(host, port)
+        except OSError as e:
+            # asyncio reports refused connections as "Connect call failed", we report them as the socket module does
+            if isinstance(e, ConnectionRefusedError) or (e.errno is None and f'[Errno {errno.ECONNREFUSED}]' in str(e)):
+                raise ConnectionRefusedError(errno.ECONNREFUSED, os.strerror(errno.ECONNREFUSED)) from e
+            raise
+
+        self.connections_opened += 1
+        return _AsyncPooledConnection(reader, writer)
+
+    def _acquire(self, key) -> Optional[_AsyncPooledConnection]:
+        now = time.monotonic()
+        idle = self._idle.get(key, [])
+        while idle:
+            pooled = idle.pop()
+            if now - pooled.last_used > self.idle_timeout or pooled.reader.at_eof():
+                pooled.close()
+                continue
+            return pooled
+        return None
+
+    def _release(self, key, pooled: _AsyncPooledConnection):
+        pooled.last_used = time.monotonic()
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.pool_size:
+            idle.append(pooled)
+        else:
+            pooled.close()
+
+    async def _exchange(self, pooled: _AsyncPooledConnection, method: str, path: str, host: str, headers: dict):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {host}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        pooled.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await pooled.writer.drain()
+
+        return await _read_response(pooled.reader, method)
+
+    async def request(self, url: str, method: str = 'GET', headers: dict = None) -> PooledResponse:
+        """Performs a request over a pooled connection, raising errors the same way ConnectionPool.request does."""
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        headers = {} if headers is None else headers.copy()
+        headers.setdefault('Connection', 'keep-alive' if self.pool_size > 0 else 'close')
+        if method in ['POST', 'PUT']:
+            headers.setdefault('Content-Length', '0')
+
+        self.requests_made += 1
+
+        reconnects = 0
+        while True:
+            pooled = self._acquire(key)
+            reused = pooled is not None
+
+            try:
+                if not reused:
+                    pooled = await asyncio.wait_for(self._new_connection(*key), self.timeout)
+                status, reason, response_headers, body, will_close = await asyncio.wait_for(
+                    self._exchange(pooled, method, path, parsed.netloc, headers), self.timeout)
+            except _RESET_ERRORS + (asyncio.IncompleteReadError,) as e:
+                if pooled is not None:
+                    pooled.close()
+                if reused and reconnects < self.max_reconnects:
+                    reconnects += 1
+                    _LOGGER.debug(f'Pooled connection to {parsed.netloc} was reset ({e.__class__.__name__}), reconnecting')
+                    continue
+                raise URLError(e) from e
+            except asyncio.TimeoutError as e:
+                if pooled is not None:
+                    pooled.close()
+                raise socket.timeout('timed out') from e
+            except OSError as e:
+                if pooled is not None:
+                    pooled.close()
+                raise URLError(e) from e
+            except BaseException:
+                if pooled is not None:
+                    pooled.close()
+                raise
+
+            pooled.requests_served += 1
+
+            if will_close or self.pool_size <= 0:
+                pooled.close()
+            else:
+                self._release(key, pooled)
+
+            if status >= 400:
+                raise HTTPError(url, status, reason, response_headers, None)
+
+            return PooledResponse(url, status, reason, response_headers, body)
+
+    def clear(self):
+        """Closes all idle connections."""
+        idle = [pooled for connections in self._idle.values() for pooled in connections]
+        self._idle = {}
+        for pooled in idle:
+            pooled.close()
+
+    def __repr__(self):
+        return f'AsyncConnectionPool(pool_size={self.pool_size}, idle_timeout={self.idle_timeout}, max_reconnects={self.max_reconnects}, connections_opened={self.connections_opened}, requests_made={self.requests_made})'
@@ -0,0 +1,208 @@
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class LogArchive():
+    """
+    Compresses and prunes the daily log files written by the DailyRotatingFileHandler, and keeps an index of them.
+
+    The file of each past day is compressed with gzip into 'ibeam_log__YYYY-MM-DD.txt.gz' in a background thread, so that logging doesn't wait for it. As every day keeps its own file, a past day's log can be streamed by decompressing that file only. The index, 'ibeam_log__index.json', records the original size and number of lines of each compressed file, so that listing them doesn't require decompressing either.
+
+    Attributes:
+        directory (str): Directory the log files are written to.
+        base_name (str): Name the log files start with.
+        compress (bool): Whether to compress the files of past days.
+        max_age (int): Number of days after which the files are deleted. If 0, they are kept indefinitely.
+        max_bytes (int): Number of bytes all files may take on disk, the oldest files being deleted beyond it. If 0, there is no limit. The current day's file is never deleted.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 base_name: str = 'ibeam_log',
+                 compress: bool = True,
+                 max_age: int = 0,
+                 max_bytes: int = 0,
+                 ):
+        self.directory = directory
+        self.base_name = base_name
+        self.compress = compress
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+        self.index_path = os.path.join(directory, f'{base_name}__index.json')
+        self._pattern = re.compile(rf'^{re.escape(base_name)}__(\d{{4}}-\d{{2}}-\d{{2}})\.txt(\.gz)?$')
+        self._lock = threading.Lock()
+
+    def _files(self) -> Dict[datetime.date, List[str]]:
+        """Returns the names of the log files by their day. A day can have both an uncompressed and a compressed file of the same lines, if compressing it was interrupted before deleting the former."""
+        files = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return files
+
+        for name in sorted(names):
+            match = self._pattern.match(name)
+            if match is None:
+                continue
+            files.setdefault(datetime.date.fromisoformat(match.group(1)), []).append(name)
+        return files
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def index(self) -> List[dict]:
+        """
+        Returns an entry for each log file, ordered by day.
+
+        Each entry holds the 'day', the 'file' name, whether it is 'compressed', the 'stored_bytes' it takes on disk, and its uncompressed 'bytes' and number of 'lines' when known.
+        """
+        recorded = self._read_index()
+        entries = []
+        for day, names in self._files().items():
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    stored_bytes = os.path.getsize(path)
+                except FileNotFoundError:
+                    continue
+
+                entry = recorded.get(name, {})
+                compressed = name.endswith('.gz')
+                entries.append({
+                    'day': day.isoformat(),
+                    'file': name,
+                    'compressed': compressed,
+                    'stored_bytes': stored_bytes,
+                    'bytes': entry.get('bytes') if compressed else stored_bytes,
+                    'lines': entry.get('lines'),
+                })
+        return entries
+
+    def _compress(self, name: str) -> dict:
+        """Compresses the file into its '.gz' counterpart and returns its index entry."""
+        path = os.path.join(self.directory, name)
+        target = path + '.gz'
+        tmp_path = target + '.tmp'
+
+        size = 0
+        lines = 0
+        if os.path.exists(target):
+            # the '.gz' is only put in place once complete, hence a run was interrupted before deleting the source
+            with open(path, 'rb') as source:
+                while chunk := source.read(_CHUNK_SIZE):
+                    size += len(chunk)
+                    lines += chunk.count(b'\n')
+            os.remove(path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            _LOGGER.debug(f'Removed {name}, already compressed by an interrupted run')
+            return {'bytes': size, 'lines': lines}
+
+        with open(path, 'rb') as source, gzip.open(tmp_path, 'wb') as destination:
+            while chunk := source.read(_CHUNK_SIZE):
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+                destination.write(chunk)
+
+        os.replace(tmp_path, target)
+        os.remove(path)
+        _LOGGER.debug(f'Compressed {name} from {size} to {os.path.getsize(target)} bytes')
+        return {'bytes': size, 'lines': lines}
+
+    def archive(self, current: Optional[str] = None, today: Optional[datetime.date] = None):
+        """Compresses the files of past days and deletes those beyond the retention limits. The file being written to - 'current' - is left as it is."""
+        today = today if today is not None else datetime.date.today()
+        current = os.path.basename(current) if current is not None else None
+
+        with self._lock:
+            index = self._read_index()
+            files = self._files()
+
+            if self.compress:
+                for day, names in files.items():
+                    for name in names:
+                        if day >= today or name.endswith('.gz') or name == current:
+                            continue
+                        try:
+                            entry = self._compress(name)
+                        except OSError as e:
+                            _LOGGER.error(f'Error compressing log file {name}: {e}')
+                            continue
+                        index[name + '.gz'] = entry
+
+            self._apply_retention(current, today)
+
+            names = {entry['file'] for entry in self.index()}
+            self._write_index({name: entry for name, entry in index.items() if name in names})
+
+    def _apply_retention(self, current: Optional[str], today: datetime.date):
+        entries = self.index()
+        total_bytes = sum(entry['stored_bytes'] for entry in entries)
+        oldest = today - datetime.timedelta(days=self.max_age)
+
+        # the entries are ordered by day, hence the oldest files are deleted first
+        for entry in entries:
+            day = datetime.date.fromisoformat(entry['day'])
+            if entry['file'] == current or day >= today:
+                continue
+
+            too_old = self.max_age > 0 and day < oldest
+            too_large = self.max_bytes > 0 and total_bytes > self.max_bytes
+            if not too_old and not too_large:
+                continue
+
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except FileNotFoundError:
+                continue
+            total_bytes -= entry['stored_bytes']
+            _LOGGER.info(f'Deleted log file {entry["file"]} of {entry["stored_bytes"]} bytes, beyond the retention limits')
+
+    def _archive_safely(self, current: Optional[str]):
+        try:
+            self.archive(current)
+        except Exception as e:
+            _LOGGER.exception(f'Error archiving log files: {e}')
+
+    def archive_in_background(self, current: Optional[str] = None) -> threading.Thread:
+        thread = threading.Thread(target=self._archive_safely, args=(current,), name='ibeam-log-archive', daemon=True)
+        thread.start()
+        return thread
+
+    def stream_day(self, day: datetime.date) -> Iterator[str]:
+        """Yields the lines of the day's log, decompressing them as they are read. Raises FileNotFoundError if there is none."""
+        names = self._files().get(day, [])
+        if not names:
+            raise FileNotFoundError(f'No log file for {day.isoformat()} in {self.directory}')
+
+        # a compressed file holds the same lines as an uncompressed one left besides it
+        name = max(names, key=lambda name: name.endswith('.gz'))
+        path = os.path.join(self.directory, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'rt', errors='replace') as f:
+            yield from f
+
+    def __repr__(self):
+        return f'LogArchive(directory={self.directory}, compress={self.compress}, max_age={self.max_age}, max_bytes={self.max_bytes})'
@@ -0,0 +1,115 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import Optional
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+CONTEXT_FIELDS = ('cycle_id', 'attempt', 'step', 'elapsed_ms')
+
+
+class _Frame():
+    """What is being done when a record is logged: the cycle, the attempt and the innermost step, with when each began."""
+
+    def __init__(self, cycle_id: str, cycle_start: float, step: Optional[str] = None, step_start: Optional[float] = None, attempt: Optional[int] = None):
+        self.cycle_id = cycle_id
+        self.cycle_start = cycle_start
+        self.step = step
+        self.step_start = step_start
+        self.attempt = attempt
+
+    def replace(self, **kwargs) -> '_Frame':
+        return _Frame(**{**vars(self), **kwargs})
+
+    def elapsed_ms(self, now: float = None) -> int:
+        start = self.step_start if self.step_start is not None else self.cycle_start
+        return round(((now if now is not None else time.perf_counter()) - start) * 1000)
+
+
+_CONTEXT: ContextVar[Optional[_Frame]] = ContextVar('ibeam_log_context', default=None)
+
+
+def current() -> dict:
+    """Returns the context fields of a record logged now. Outside of a cycle, all of them are None."""
+    frame = _CONTEXT.get()
+    if frame is None:
+        return dict.fromkeys(CONTEXT_FIELDS)
+    return {
+        'cycle_id': frame.cycle_id,
+        'attempt': frame.attempt,
+        'step': frame.step,
+        'elapsed_ms': frame.elapsed_ms(),
+    }
+
+
+@contextmanager
+def cycle(name: Optional[str] = None):
+    """
+    Gives the records logged within the block a new cycle ID, prefixed with the name if provided, and yields it.
+
+    Within a running cycle, the block carries on with that cycle's ID, so that the maintenance and the authentication it calls are one cycle.
+    """
+    frame = _CONTEXT.get()
+    if frame is not None:
+        yield frame.cycle_id
+        return
+
+    cycle_id = uuid.uuid4().hex[:12]
+    if name is not None:
+        cycle_id = f'{name}-{cycle_id}'
+
+    token = _CONTEXT.set(_Frame(cycle_id, time.perf_counter()))
+    try:
+        yield cycle_id
+    finally:
+        _LOGGER.debug('Cycle finished')
+        _CONTEXT.reset(token)
+
+
+@contextmanager
+def step(name: str):
+    """Names the step of the records logged within the block, their elapsed milliseconds counting from its start. Has no effect outside of a cycle."""
+    frame = _CONTEXT.get()
+    if frame is None:
+        yield
+        return
+
+    token = _CONTEXT.set(frame.replace(step=name, step_start=time.perf_counter()))
+    try:
+        yield
+    finally:
+        # carries the duration of the step in its elapsed milliseconds
+        _LOGGER.debug(f'Step {name} finished')
+        _CONTEXT.reset(token)
+
+
+def async_step(name: str):
+    """Decorator naming the step of the records logged while the decorated coroutine function runs, as step does for a block."""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with step(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_attempt(attempt: int):
+    """Sets the attempt number of the records logged until the end of the enclosing step or cycle."""
+    frame = _CONTEXT.get()
+    if frame is not None:
+        _CONTEXT.set(frame.replace(attempt=attempt))
+
+
+class ContextFilter(logging.Filter):
+    """Adds the context fields to the records, as attributes that log formats and the JsonFormatter can refer to."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # records handled on the listener's thread were given the fields on the logging thread already
+        if not hasattr(record, 'cycle_id'):
+            record.__dict__.update(current())
+        return True
@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+
+class BrowserBudget():
+    """
+    Limits how many login browsers run at once across the Gateways supervised by one IBeam process, bounding the memory and CPU Chrome takes.
+
+    A login waits for one of the browsers in the budget to be released before launching its own.
+
+    Attributes:
+        size (int): Number of browsers that can run at once.
+        timeout (float): Number of seconds a login waits for a browser before giving up. If None, it waits indefinitely.
+    """
+
+    def __init__(self, size: int, timeout: Optional[float] = None):
+        self.size = max(size, 1)
+        self.timeout = timeout
+
+        self._semaphore = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._holders = []
+
+    def acquire(self, holder: str) -> bool:
+        """Waits for a browser to become available to the holder, returning whether it did within the timeout."""
+        if not self._semaphore.acquire(blocking=False):
+            _LOGGER.info(f'Login of {holder} waiting for a browser, {self.size} in use by: {self.holders}')
+            start = time.time()
+            if not self._semaphore.acquire(timeout=self.timeout):
+                _LOGGER.error(f'Login of {holder} got no browser in {self.timeout} seconds, {self.size} in use by: {self.holders}')
+                return False
+            _LOGGER.info(f'Login of {holder} got a browser after waiting {time.time() - start:.1f} seconds')
+
+        with self._lock:
+            self._holders.append(holder)
+        return True
+
+    def release(self, holder: str):
+        with self._lock:
+            if holder in self._holders:
+                self._holders.remove(holder)
+        self._semaphore.release()
+
+    @property
+    def holders(self) -> list:
+        with self._lock:
+            return list(self._holders)
+
+    def to_dict(self) -> dict:
+        return {'size': self.size, 'holders': self.holders}
+
+    def __repr__(self):
+        return f'BrowserBudget(size={self.size}, timeout={self.timeout}, holders={self.holders})'
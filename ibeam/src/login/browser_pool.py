@@ -0,0 +1,206 @@
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from pyvirtualdisplay import Display
+from selenium import webdriver
+
+from ibeam.src.login.driver import DriverFactory, release_chrome_driver
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+
+class _PooledBrowser():
+    def __init__(self, slot: int, driver: webdriver.Chrome):
+        self.slot = slot
+        self.driver = driver
+        self.created = time.monotonic()
+        self.uses = 0
+
+
+class BrowserPool():
+    """
+    Keeps pre-launched Chrome instances and a persistent virtual display, so that logging in doesn't pay the browser cold start.
+
+    Browsers are health-checked before being handed out, reset between uses and recycled once they reach their maximum age or number of uses.
+
+    Attributes:
+        driver_factory (DriverFactory): Factory used to launch the browsers.
+        size (int): Number of browsers kept warm.
+        max_age (int): Number of seconds after which a browser is recycled.
+        max_uses (int): Number of logins after which a browser is recycled.
+    """
+
+    def __init__(self,
+                 driver_factory: DriverFactory,
+                 size: int,
+                 max_age: int,
+                 max_uses: int,
+                 ):
+        self.driver_factory = driver_factory
+        self.size = size
+        self.max_age = max_age
+        self.max_uses = max_uses
+
+        self._lock = threading.Lock()
+        self._idle = []
+        self._in_use = {}
+        self._free_slots = list(range(size))
+        self._display = None
+
+    def _slot_name(self, slot: int) -> str:
+        # reusing the names per slot keeps the browsers' profile directories stable
+        return f'{self.driver_factory.name}-pool-{slot}'
+
+    def _ensure_display(self):
+        if self._display is None and sys.platform == 'linux':
+            self._display = Display(visible=False, size=(800, 600))
+            self._display.start()
+
+    def _launch(self, slot: int) -> Optional[_PooledBrowser]:
+        self._ensure_display()
+        driver = self.driver_factory.new_driver(name=self._slot_name(slot))
+        if driver is None:
+            return None
+        _LOGGER.info(f'Launched pooled browser in slot {slot}')
+        return _PooledBrowser(slot, driver)
+
+    def _is_expired(self, browser: _PooledBrowser) -> bool:
+        return time.monotonic() - browser.created > self.max_age or browser.uses >= self.max_uses
+
+    def _is_healthy(self, browser: _PooledBrowser) -> bool:
+        try:
+            return browser.driver.execute_script('return 1;') == 1
+        except Exception as e:
+            _LOGGER.warning(f'Pooled browser in slot {browser.slot} failed the health check: {e}')
+            return False
+
+    def _discard(self, browser: _PooledBrowser):
+        try:
+            release_chrome_driver(browser.driver)
+        except Exception as e:
+            _LOGGER.warning(f'Error quitting pooled browser in slot {browser.slot}: {e}')
+
+        with self._lock:
+            self._free_slots.append(browser.slot)
+
+    def _reset(self, browser: _PooledBrowser):
+        """Brings the browser back to a clean state, as if it was freshly launched in incognito mode."""
+        driver = browser.driver
+        for handle in driver.window_handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(driver.window_handles[0])
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+        driver.get('about:blank')
+        driver.execute_script('try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}')
+
+    def warm(self):
+        """Launches browsers until all slots are filled."""
+        while True:
+            with self._lock:
+                if not self._free_slots:
+                    return
+                slot = self._free_slots.pop(0)
+
+            browser = self._launch(slot)
+            with self._lock:
+                if browser is None:
+                    self._free_slots.append(slot)
+                    return
+                self._idle.append(browser)
+
+    def warm_in_background(self):
+        threading.Thread(target=self.warm, name='ibeam-browser-pool', daemon=True).start()
+
+    def acquire(self) -> Optional[webdriver.Chrome]:
+        """Returns a healthy browser, launching a new one if none is warm."""
+        while True:
+            with self._lock:
+                browser = self._idle.pop() if self._idle else None
+                slot = self._free_slots.pop(0) if browser is None and self._free_slots else None
+
+            if browser is None:
+                if slot is None:
+                    # all slots are in use, fall back to an unpooled browser
+                    _LOGGER.warning('All pooled browsers are in use, launching an unpooled one')
+                    self._ensure_display()
+                    return self.driver_factory.new_driver()
+
+                browser = self._launch(slot)
+                if browser is None:
+                    with self._lock:
+                        self._free_slots.append(slot)
+                    return None
+
+            if self._is_expired(browser) or not self._is_healthy(browser):
+                _LOGGER.info(f'Recycling pooled browser in slot {browser.slot} after {browser.uses} uses and {round(time.monotonic() - browser.created)} seconds')
+                self._discard(browser)
+                continue
+
+            browser.uses += 1
+            with self._lock:
+                self._in_use[id(browser.driver)] = browser
+            return browser.driver
+
+    def release(self, driver: webdriver.Chrome):
+        """Returns the browser to the pool, resetting it, or quits it if it's not usable anymore."""
+        if driver is None:
+            return
+
+        with self._lock:
+            browser = self._in_use.pop(id(driver), None)
+
+        if browser is None:
+            release_chrome_driver(driver)
+            return
+
+        try:
+            self._reset(browser)
+        except Exception as e:
+            _LOGGER.warning(f'Resetting pooled browser in slot {browser.slot} failed: {e}')
+            self._discard(browser)
+            self.warm_in_background()
+            return
+
+        if self._is_expired(browser):
+            self._discard(browser)
+            self.warm_in_background()
+            return
+
+        with self._lock:
+            self._idle.append(browser)
+
+    def close(self):
+        """Quits all idle browsers and stops the virtual display."""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+
+        for browser in idle:
+            self._discard(browser)
+
+        if self._display is not None:
+            self._display.stop()
+            self._display = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # browsers, display and lock can't be pickled, a spawned process starts with an empty pool
+        state['_lock'] = None
+        state['_idle'] = []
+        state['_in_use'] = {}
+        state['_free_slots'] = list(range(self.size))
+        state['_display'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'BrowserPool(size={self.size}, max_age={self.max_age}, max_uses={self.max_uses}, idle={len(self._idle)})'
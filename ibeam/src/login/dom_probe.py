@@ -0,0 +1,183 @@
+import logging
+import time
+from pathlib import Path
+from typing import Union
+
+from selenium import webdriver
+from selenium.common import JavascriptException, StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.remote.webelement import WebElement
+
+from ibeam.src.login.targets import TargetCondition
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+DOM_WAIT_POLL = 'poll'
+DOM_WAIT_OBSERVER = 'observer'
+DOM_WAIT_ENGINES = [DOM_WAIT_POLL, DOM_WAIT_OBSERVER]
+
+_SCRIPT_TIMEOUT_MARGIN = 5
+"""Number of seconds the driver waits for the observer script beyond its own timeout, so that the script always finishes first."""
+
+_OBSERVE_RETRY_INTERVAL = 0.05
+"""Number of seconds to wait before observing again when the page navigated away or isn't ready to run scripts."""
+
+_PROBE_FUNCTION = """
+function find(type, identifier) {
+    switch (type) {
+        case 'ID': return document.getElementById(identifier);
+        case 'NAME': return document.getElementsByName(identifier)[0] || null;
+        case 'CLASS_NAME': return document.getElementsByClassName(identifier)[0] || null;
+        case 'CSS_SELECTOR':
+        case 'FOR': return document.querySelector(identifier);
+    }
+    return null;
+}
+
+function isVisible(el) {
+    if (el.tagName === 'INPUT' && el.type === 'hidden') return false;
+    const style = window.getComputedStyle(el);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.visibility === 'collapse' || parseFloat(style.opacity) === 0) return false;
+    return el.getClientRects().length > 0;
+}
+
+function probe(candidates) {
+    for (let i = 0; i < candidates.length; i++) {
+        const [type, identifier, state, tag] = candidates[i];
+
+        if (type === 'TAG_NAME') {
+            for (const tag of ['pre', 'body']) {
+                const el = document.getElementsByTagName(tag)[0];
+                if (el && (el.innerText || '').includes(identifier)) return [i, el, el.innerText];
+            }
+            continue;
+        }
+
+        const el = find(type, identifier);
+        if (el === null) continue;
+        if (tag !== null && el.tagName.toLowerCase() !== tag) continue;
+        if (state === 'text' && !(el.innerText || '').includes(identifier)) continue;
+        if ((state === 'visible' || state === 'clickable') && !isVisible(el)) continue;
+        if (state === 'clickable' && el.disabled) continue;
+        return [i, el, el.innerText || ''];
+    }
+    return null;
+}
+"""
+
+_PROBE_SCRIPT = _PROBE_FUNCTION + "return probe(arguments[0]);"
+
+# evaluates the probe on every DOM mutation and returns as soon as it finds a target. Visibility can also change without
+# mutations, for instance when a stylesheet loads or a transition ends, hence the additional periodic check.
+_OBSERVE_SCRIPT = _PROBE_FUNCTION + """
+const candidates = arguments[0];
+const timeoutMs = arguments[1];
+const done = arguments[arguments.length - 1];
+let finished = false;
+let observer = null;
+let interval = null;
+let timer = null;
+
+function finish(result) {
+    if (finished) return;
+    finished = true;
+    if (observer !== null) observer.disconnect();
+    clearInterval(interval);
+    clearTimeout(timer);
+    done(result);
+}
+
+function check() {
+    const result = probe(candidates);
+    if (result !== null) finish(result);
+}
+
+check();
+if (!finished) {
+    observer = new MutationObserver(check);
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    interval = setInterval(check, 100);
+    timer = setTimeout(() => finish(null), timeoutMs);
+}
+"""
+
+
+class ProbedElement(WebElement):
+    """WebElement found by the probe, carrying the text it had at that moment to save a round-trip to the driver."""
+
+    def __init__(self, element: WebElement, text: str):
+        super().__init__(element.parent, element.id)
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+
+def _candidates(conditions: tuple) -> list:
+    return [[condition.target.type, condition.target.identifier, condition.state, condition.tag] for condition in conditions]
+
+
+def dom_probe(*conditions: TargetCondition) -> callable:
+    """
+    An expectation that any of multiple target conditions is true, evaluated in the browser with a single script.
+
+    Returns a tuple of the element and the condition that fired first, or False if none did.
+    """
+    candidates = _candidates(conditions)
+
+    def dom_probe_condition(driver: webdriver.Chrome) -> Union[tuple, bool]:
+        try:
+            result = driver.execute_script(_PROBE_SCRIPT, candidates)
+        except (JavascriptException, StaleElementReferenceException) as e:
+            # the page is navigating away or not ready yet, other errors such as a lost session aren't waited out
+            _LOGGER.debug(f'DOM probe failed: {e}')
+            return False
+
+        if not result:
+            return False
+
+        index, element, text = result
+        return ProbedElement(element, text), conditions[index]
+
+    return dom_probe_condition
+
+
+def dom_observe(driver: webdriver.Chrome, timeout: float, *conditions: TargetCondition) -> (ProbedElement, TargetCondition):
+    """
+    Waits until any of multiple target conditions is true, getting notified by the page instead of polling it.
+
+    A MutationObserver installed in the page evaluates the conditions whenever the DOM changes, and the asynchronous script running it returns to the driver as soon as one is true. Selenium cannot subscribe to DevTools events, so the notification arrives as the result of that pending script instead. When the page navigates away the script is discarded, and the observer is installed anew in the next page.
+
+    Returns a tuple of the element and the condition that fired first, or raises TimeoutException like WebDriverWait.
+    """
+    candidates = _candidates(conditions)
+    deadline = time.monotonic() + timeout
+    previous_script_timeout = driver.timeouts.script
+
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutException(f'None of the target conditions was met in {timeout} seconds: {list(conditions)}')
+
+            try:
+                driver.set_script_timeout(remaining + _SCRIPT_TIMEOUT_MARGIN)
+                result = driver.execute_async_script(_OBSERVE_SCRIPT, candidates, int(remaining * 1000))
+            except (JavascriptException, StaleElementReferenceException) as e:
+                # the page navigated away or replaced the element, a lost session or crashed browser is raised instead
+                _LOGGER.debug(f'DOM observer interrupted, observing again: {e}')
+                time.sleep(_OBSERVE_RETRY_INTERVAL)
+                continue
+
+            if not result:
+                # the script's own timer ran out
+                raise TimeoutException(f'None of the target conditions was met in {timeout} seconds: {list(conditions)}')
+
+            index, element, text = result
+            return ProbedElement(element, text), conditions[index]
+    finally:
+        try:
+            driver.set_script_timeout(previous_script_timeout)
+        except WebDriverException as e:
+            # the browser is gone, the error that ended the observation is raised instead
+            _LOGGER.debug(f'Cannot restore the script timeout: {e}')
@@ -1,5 +1,6 @@
 import logging
 import os
+import socket
 import sys
 import tempfile
 from datetime import datetime
@@ -13,19 +14,20 @@ from selenium.webdriver.chrome.service import Service
 
 import ibeam
 from ibeam.src import var
+from ibeam.src.login.resource_blocking import ResourceBlocking
 
 _LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
 
-_DRIVER_NAMES = {}
 
+def _free_port() -> int:
+    """Returns a port that no process listens on, picked by the OS."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
 
-def _new_chrome_driver(driver_path, name: str = 'default', headless: bool = True, incognito: bool = True, ui_scaling: float = 1) -> webdriver.Chrome:
-    """Creates a new chrome driver."""
-
-    global _DRIVER_NAMES
 
-    _DRIVER_NAMES[name] = True  # just to ensure the name is in the dict
-    driver_index = list(_DRIVER_NAMES.keys()).index(name)  # order of insertion dictates the driver_index
+def _new_chrome_driver(driver_path, name: str = 'default', headless: bool = True, incognito: bool = True, ui_scaling: float = 1, resource_blocking: Optional[ResourceBlocking] = None) -> webdriver.Chrome:
+    """Creates a new chrome driver."""
 
     options = webdriver.ChromeOptions()
     if headless:
@@ -36,17 +38,22 @@ def _new_chrome_driver(driver_path, name: str = 'default', headless: bool = True
         options.add_argument("--incognito")  # this allows 2FA method to be selected every time
     options.add_argument('--ignore-ssl-errors=yes')
     options.add_argument('--ignore-certificate-errors')
-    options.add_argument(f'--remote-debugging-port={9222 + driver_index}')
+    # allocated per browser, so that browsers launched for several Gateways or by several IBeam processes don't clash
+    options.add_argument(f'--remote-debugging-port={_free_port()}')
     options.add_argument('--useAutomationExtension=false')
     options.add_argument('--disable-extensions')
     options.add_argument('--dns-prefetch-disable')
     options.add_argument('--disable-features=VizDisplayCompositor')
     options.add_argument(f"--force-device-scale-factor={ui_scaling}")
     options.add_argument(f'--user-data-dir={tempfile.gettempdir()}/ibeam-chrome-{name}')
+    if resource_blocking is not None:
+        resource_blocking.configure_options(options)
     service = Service(executable_path=driver_path)
     driver = webdriver.Chrome(options=options, service=service)
     if driver is None:
         _LOGGER.error('Unable to create a new chrome driver.')
+    elif resource_blocking is not None:
+        resource_blocking.apply(driver)
 
     return driver
 
@@ -60,10 +67,11 @@ def start_driver(driver_path: str,
                  headless: bool = True,
                  incognito: bool = True,
                  ui_scaling: float = 1,
-                 page_load_timeout: int = 15
+                 page_load_timeout: int = 15,
+                 resource_blocking: Optional[ResourceBlocking] = None,
                  ) -> Optional[webdriver.Chrome]:
     try:
-        driver = _new_chrome_driver(driver_path=driver_path, name=name, headless=headless, incognito=incognito, ui_scaling=ui_scaling)
+        driver = _new_chrome_driver(driver_path=driver_path, name=name, headless=headless, incognito=incognito, ui_scaling=ui_scaling, resource_blocking=resource_blocking)
         driver.set_page_load_timeout(page_load_timeout)
     except WebDriverException as e:
         if 'net::ERR_CONNECTION_REFUSED' in e.msg:
@@ -115,7 +123,8 @@ class DriverFactory():
                  headless: bool = True,
                  incognito: bool = True,
                  ui_scaling: float = 1,
-                 page_load_timeout: int = 15
+                 page_load_timeout: int = 15,
+                 resource_blocking: Optional[ResourceBlocking] = None,
                  ):
         self.driver_path = driver_path
         self.name = name
@@ -123,6 +132,7 @@ class DriverFactory():
         self.incognito = incognito
         self.ui_scaling = ui_scaling
         self.page_load_timeout = page_load_timeout
+        self.resource_blocking = resource_blocking
 
     def new_driver(self,
                    driver_path: str = None,
@@ -130,7 +140,8 @@ class DriverFactory():
                    headless: bool = None,
                    incognito: bool = None,
                    ui_scaling: float = None,
-                   page_load_timeout: int = None
+                   page_load_timeout: int = None,
+                   resource_blocking: Optional[ResourceBlocking] = None,
                    ) -> webdriver.Chrome:
 
         driver_path = driver_path if driver_path is not None else self.driver_path
@@ -139,8 +150,9 @@ class DriverFactory():
         incognito = incognito if incognito is not None else self.incognito
         ui_scaling = ui_scaling if ui_scaling is not None else self.ui_scaling
         page_load_timeout = page_load_timeout if page_load_timeout is not None else self.page_load_timeout
+        resource_blocking = resource_blocking if resource_blocking is not None else self.resource_blocking
 
-        return start_driver(driver_path=driver_path, name=name, headless=headless, incognito=incognito, ui_scaling=ui_scaling, page_load_timeout=page_load_timeout)
+        return start_driver(driver_path=driver_path, name=name, headless=headless, incognito=incognito, ui_scaling=ui_scaling, page_load_timeout=page_load_timeout, resource_blocking=resource_blocking)
 
 
 def start_up_browser(driver_factory:DriverFactory) -> (webdriver.Chrome, Optional[Display]):
@@ -0,0 +1,276 @@
+import logging
+import re
+import urllib.parse
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Optional, Union
+
+import requests
+from urllib3.exceptions import InsecureRequestWarning
+
+from ibeam.src.login.targets import Target, Targets
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+LOGIN_ENGINE_SELENIUM = 'selenium'
+LOGIN_ENGINE_HTTP = 'http'
+
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+_FIELD_TAGS = {'input', 'select', 'textarea'}
+_HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden')
+_SIMPLE_SELECTOR = re.compile(r'^(?P<tag>[a-zA-Z][\w-]*)?(?P<classes>(?:\.[\w-]+)*)(?P<attributes>(?:\[[\w-]+=[^\]]*\])*)$')
+_SELECTOR_ATTRIBUTE = re.compile(r'\[([\w-]+)=([^\]]*)\]')
+
+_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
+
+
+class LoginEngineUnsupported(Exception):
+    """Raised when the login page can't be driven without a browser, eg. because it requires JavaScript."""
+
+
+class HtmlElement():
+    def __init__(self, tag: str, attrs: dict, parent: Optional['HtmlElement'], form: Optional['HtmlElement']):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.form = form
+        self.options = []
+        self._text = []
+
+        style = attrs.get('style') or ''
+        self.hidden = 'hidden' in attrs \
+                      or (tag == 'input' and (attrs.get('type') or '').lower() == 'hidden') \
+                      or _HIDDEN_STYLE.search(style) is not None \
+                      or (parent is not None and parent.hidden)
+
+    @property
+    def text(self) -> str:
+        return ' '.join(''.join(self._text).split())
+
+    @property
+    def classes(self) -> list:
+        return (self.attrs.get('class') or '').split()
+
+    def __repr__(self):
+        return f'HtmlElement({self.tag}, {self.attrs})'
+
+
+class HtmlPage(HTMLParser):
+    """
+    A parsed login webpage.
+
+    Elements are located using the same Targets as the Selenium login. Since no JavaScript or CSS is evaluated, an element is considered visible unless it, or any of its parents, is hidden using the hidden attribute or an inline style.
+
+    Attributes:
+        url (str): URL the page was loaded from, used to resolve form actions and links.
+        html (str): Content of the page.
+    """
+
+    def __init__(self, url: str, html: str):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.html = html
+        self.elements = []
+        self.forms = []
+
+        self._open = []
+        self._form = None
+        self._select = None
+
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        parent = self._open[-1] if self._open else None
+        element = HtmlElement(tag, {name: value if value is not None else '' for name, value in attrs}, parent, self._form)
+        self.elements.append(element)
+
+        if tag == 'form':
+            self.forms.append(element)
+            self._form = element
+        elif tag == 'select':
+            self._select = element
+        elif tag == 'option' and self._select is not None:
+            self._select.options.append(element)
+
+        if tag not in _VOID_TAGS:
+            self._open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self._form = None
+        elif tag == 'select':
+            self._select = None
+
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i].tag == tag:
+                del self._open[i:]
+                break
+
+    def handle_data(self, data):
+        for element in self._open:
+            element._text.append(data)
+
+    def _matches(self, element: HtmlElement, target: Target) -> bool:
+        if target.type == 'ID':
+            return element.attrs.get('id') == target.identifier
+        elif target.type == 'NAME':
+            return element.attrs.get('name') == target.identifier
+        elif target.type == 'CLASS_NAME':
+            return target.identifier in element.classes
+        elif target.type in ['CSS_SELECTOR', 'FOR']:
+            return _matches_selector(element, target.identifier)
+        elif target.type == 'TAG_NAME':
+            return element.tag in ['pre', 'body'] and target.identifier in element.text
+        raise LoginEngineUnsupported(f'Target type {target.type} is not supported without a browser: {target}')
+
+    def find(self, target: Target, visible: bool = True) -> Optional[HtmlElement]:
+        """Returns the first element matching the target, or None."""
+        for element in self.elements:
+            if visible and element.hidden:
+                continue
+            if self._matches(element, target):
+                return element
+        return None
+
+    def find_by_id(self, id: str) -> Optional[HtmlElement]:
+        for element in self.elements:
+            if element.attrs.get('id') == id:
+                return element
+        return None
+
+    def fields(self, form: HtmlElement) -> dict:
+        """Returns the values the browser would submit for the form, before any user input."""
+        values = {}
+        for element in self.elements:
+            if element.form is not form or element.tag not in _FIELD_TAGS:
+                continue
+
+            name = element.attrs.get('name')
+            if not name or 'disabled' in element.attrs:
+                continue
+
+            type = (element.attrs.get('type') or 'text').lower()
+            if element.tag == 'select':
+                selected = [option for option in element.options if 'selected' in option.attrs] or element.options[:1]
+                if selected:
+                    values[name] = option_value(selected[0])
+            elif element.tag == 'textarea':
+                values[name] = element.text
+            elif type in ['checkbox', 'radio']:
+                if 'checked' in element.attrs:
+                    values[name] = element.attrs.get('value') or 'on'
+            elif type not in ['submit', 'button', 'image', 'reset', 'file']:
+                values[name] = element.attrs.get('value', '')
+        return values
+
+
+def option_value(option: HtmlElement) -> str:
+    return option.attrs['value'] if 'value' in option.attrs else option.text
+
+
+def _matches_selector(element: HtmlElement, selector: str) -> bool:
+    """Matches the compound selectors used by the login Targets, eg. '.btn.btn-lg' or 'label[for=toggle1]'."""
+    match = _SIMPLE_SELECTOR.match(selector.strip())
+    if match is None:
+        raise LoginEngineUnsupported(f'CSS selector "{selector}" is not supported without a browser')
+
+    if match['tag'] and match['tag'].lower() != element.tag:
+        return False
+
+    classes = element.classes
+    for cls in filter(None, match['classes'].split('.')):
+        if cls not in classes:
+            return False
+
+    for name, value in _SELECTOR_ATTRIBUTE.findall(match['attributes']):
+        if element.attrs.get(name) != value.strip('\'"'):
+            return False
+
+    return True
+
+
+def identify_page(page: HtmlPage, targets: Targets, *names: str) -> (Optional[HtmlElement], Optional[Target]):
+    """
+    Returns the first of the named targets displayed by the page, along with its element.
+
+    Mirrors waiting for any of several expected conditions in the browser, with the names given in order of precedence.
+    """
+    for name in names:
+        target = targets[name]
+        trigger = page.find(target)
+        if trigger is None:
+            continue
+        if name == 'TWO_FA_SELECT' and trigger.tag != 'select':
+            continue
+        if name == 'ERROR' and not trigger.text:
+            # error containers are commonly present but empty until an error occurs
+            continue
+        return trigger, target
+    return None, None
+
+
+class HttpLoginSession():
+    """
+    Replays the login form flow with plain HTTP requests, keeping cookies between them.
+
+    It is a lightweight stand-in for the browser: pages are loaded and parsed, forms are filled in and submitted as a browser would.
+
+    Attributes:
+        verify (Union[str, bool]): Path to the CA bundle used to verify the Gateway, or False not to verify it.
+        timeout (float): Number of seconds to wait for each request.
+    """
+
+    def __init__(self, verify: Union[str, bool], timeout: float):
+        self.verify = verify
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = _USER_AGENT
+
+    def _request(self, method: str, url: str, **kwargs) -> HtmlPage:
+        _LOGGER.debug(f'{method} {url}')
+        if self.verify is False:
+            # the Gateway uses a self-signed certificate unless one is provided, which HttpHandler doesn't verify either
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+        # verify is passed with every request, as the session's one would be overridden by REQUESTS_CA_BUNDLE
+        response = self.session.request(method, url, timeout=self.timeout, verify=self.verify, **kwargs)
+        response.raise_for_status()
+        return HtmlPage(response.url, response.text)
+
+    def load(self, url: str) -> HtmlPage:
+        return self._request('GET', url)
+
+    def submit(self, page: HtmlPage, element: HtmlElement, values: dict = None) -> HtmlPage:
+        """Submits the form containing the element, with the given values overriding the form's current ones."""
+        form = element.form if element.tag != 'form' else element
+        if form is None:
+            raise LoginEngineUnsupported(f'{element} is not placed in a form, the page likely requires JavaScript')
+
+        data = page.fields(form)
+        data.update(values or {})
+
+        action = urllib.parse.urljoin(page.url, form.attrs.get('action') or page.url)
+        method = (form.attrs.get('method') or 'GET').upper()
+
+        if method == 'POST':
+            return self._request('POST', action, data=data)
+        return self._request('GET', action, params=data)
+
+    def click(self, page: HtmlPage, element: HtmlElement) -> HtmlPage:
+        """Follows a link or submits a form through its button."""
+        if element.tag == 'a' and element.attrs.get('href', '').strip() not in ['', '#'] and not element.attrs['href'].startswith('javascript:'):
+            return self.load(urllib.parse.urljoin(page.url, element.attrs['href']))
+
+        values = {}
+        if element.attrs.get('name'):
+            values[element.attrs['name']] = element.attrs.get('value', '')
+        return self.submit(page, element, values)
+
+    def close(self):
+        self.session.close()
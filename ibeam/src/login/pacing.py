@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from selenium import webdriver
+from selenium.common import StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support.wait import WebDriverWait
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+READINESS_TIMEOUT = 3
+"""Number of seconds to wait for a readiness condition, the length of the fixed sleeps these conditions replace."""
+
+
+def wait_until_ready(driver: webdriver.Chrome, condition: callable, description: str, timeout: float = READINESS_TIMEOUT) -> bool:
+    """Waits until the condition is met, returning whether it was. Not being ready is logged but doesn't stop the login."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(condition)
+        return True
+    except TimeoutException:
+        _LOGGER.warning(f'Not ready after {timeout} seconds: {description}. Continuing regardless.')
+        return False
+
+
+def toggle_checkbox(driver: webdriver.Chrome, toggle_el: WebElement) -> WebElement:
+    """Returns the checkbox controlled by the toggle, which is either the checkbox itself or its label."""
+    for_id = toggle_el.get_attribute('for') if toggle_el.tag_name == 'label' else None
+    return driver.find_element(By.ID, for_id) if for_id else toggle_el
+
+
+def toggle_switched(checkbox_el: WebElement, initial: bool) -> callable:
+    """An expectation that the checkbox is no longer in its initial checked state."""
+
+    def _predicate(driver):
+        return checkbox_el.is_selected() != initial
+
+    return _predicate
+
+
+def fields_populated(values: dict) -> callable:
+    """An expectation that every input element in the dict holds the value it is mapped to."""
+
+    def _predicate(driver):
+        return all(element.get_attribute('value') == value for element, value in values.items())
+
+    return _predicate
+
+
+def trigger_cleared(trigger: WebElement) -> callable:
+    """An expectation that the trigger is no longer displayed, or was replaced by a new page."""
+    text = trigger.text
+
+    def _predicate(driver):
+        try:
+            return not trigger.is_displayed() or trigger.text != text
+        except StaleElementReferenceException:
+            return True
+        except WebDriverException:
+            return False
+
+    return _predicate
+
+
+class PresubmitBuffer():
+    """
+    Number of seconds to wait between filling in the login form and submitting it, learned from past logins.
+
+    The buffer prevents a race condition on the client side of the login page, which shows up as 'Invalid username password combination' despite correct credentials. Instead of growing after every failure and resetting after every success, the number of successes and failures is kept per buffer value:
+
+    * after a failure, the buffer rises to the lowest value that has only ever succeeded, or by 5 seconds if there is none.
+    * after 'explore_after' successes in a row, the buffer is lowered by a second towards 'floor', unless the lower value failed in more than 'max_failure_rate' of its logins and its last failure is less than 'retry_after' logins ago. The floor defaults to 'min_buffer', in which case the buffer is never lowered below it.
+
+    The history is saved to 'history_path' if provided, so that it carries over restarts and spawned processes. Deleting that file resets the learning.
+    """
+
+    def __init__(self,
+                 min_buffer: int,
+                 max_buffer: int,
+                 floor: Optional[int] = None,
+                 explore_after: int = 3,
+                 max_failure_rate: float = 0.05,
+                 retry_after: int = 50,
+                 history_path: Optional[str] = None,
+                 ):
+        self.min_buffer = min_buffer
+        self.max_buffer = max(max_buffer, min_buffer)
+        self.floor = min_buffer if floor is None else min(floor, min_buffer)
+        self.explore_after = explore_after
+        self.max_failure_rate = max_failure_rate
+        self.retry_after = retry_after
+        self.history_path = history_path
+
+        self.value = min_buffer
+        self.streak = 0
+        self.logins = 0
+        self.history = {}
+        self._load()
+
+    def _load(self):
+        if self.history_path is None or not os.path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path, 'r') as fh:
+                saved = json.load(fh)
+            self.history = {int(buffer): counts for buffer, counts in saved['history'].items()}
+            self.value = min(max(int(saved['value']), self.floor), self.max_buffer)
+            self.logins = int(saved.get('logins', 0))
+        except Exception as e:
+            _LOGGER.warning(f'Cannot read presubmit buffer history from {self.history_path}, starting anew: {e}')
+
+    def _save(self):
+        if self.history_path is None:
+            return
+        try:
+            with open(self.history_path, 'w') as fh:
+                json.dump({'value': self.value, 'logins': self.logins, 'history': self.history}, fh)
+        except Exception as e:
+            _LOGGER.warning(f'Cannot save presubmit buffer history to {self.history_path}: {e}')
+
+    @property
+    def exploring(self) -> bool:
+        """Whether the buffer was lowered below 'min_buffer', a failure then being caused by the lower value rather than by the credentials."""
+        return self.value < self.min_buffer
+
+    def _counts(self, buffer: int) -> dict:
+        return self.history.setdefault(buffer, {'successes': 0, 'failures': 0, 'last_failure': None})
+
+    def _eligible(self, buffer: int) -> bool:
+        counts = self.history.get(buffer)
+        if counts is None or counts['failures'] <= (counts['successes'] + counts['failures']) * self.max_failure_rate:
+            return True
+        return self.logins - counts['last_failure'] >= self.retry_after
+
+    def record_success(self):
+        self._counts(self.value)['successes'] += 1
+        self.logins += 1
+        self.streak += 1
+
+        lower = self.value - 1
+        if self.streak >= self.explore_after and lower >= self.floor and self._eligible(lower):
+            _LOGGER.info(f'Lowering presubmit buffer from {self.value} to {lower} after {self.streak} successful logins')
+            self.value = lower
+            self.streak = 0
+
+        self._save()
+
+    def record_failure(self):
+        counts = self._counts(self.value)
+        counts['failures'] += 1
+        counts['last_failure'] = self.logins
+        self.logins += 1
+        self.streak = 0
+
+        proven = [buffer for buffer, counts in self.history.items()
+                  if buffer > self.value and counts['successes'] > 0 and counts['failures'] == 0]
+        self.value = min(proven) if proven else min(self.value + 5, self.max_buffer)
+
+        if self.value >= self.max_buffer:
+            _LOGGER.warning(f'The presubmit buffer set to maximum: {self.max_buffer}')
+        else:
+            _LOGGER.warning(f'Increased presubmit buffer to {self.value}')
+
+        self._save()
+
+    def __repr__(self):
+        return f'PresubmitBuffer(value={self.value}, history={self.history})'
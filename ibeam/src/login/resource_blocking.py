@@ -0,0 +1,118 @@
+import logging
+import urllib.parse
+from pathlib import Path
+from typing import Optional
+
+from selenium import webdriver
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+RESOURCE_BLOCKING_OFF = 'off'
+RESOURCE_BLOCKING_SAFE = 'safe'
+RESOURCE_BLOCKING_STRICT = 'strict'
+
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.ico', '*.bmp'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.ogg', '*.mp3', '*.wav'],
+}
+"""URL patterns of the resource types that can be blocked."""
+
+ANALYTICS_PATTERNS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*connect.facebook.net*',
+    '*hotjar.com*',
+    '*nr-data.net*',
+    '*js-agent.newrelic.com*',
+    '*cdn.segment.com*',
+    '*bat.bing.com*',
+    '*clarity.ms*',
+]
+"""URL patterns of analytics and tracking scripts."""
+
+PRESETS = {
+    RESOURCE_BLOCKING_OFF: {
+        'resource_types': [],
+        'blocked_urls': [],
+        'allowlist': False,
+    },
+    # stylesheets and first-party scripts are kept, the login flow relies on them to show and hide its elements
+    RESOURCE_BLOCKING_SAFE: {
+        'resource_types': ['image', 'font', 'media'],
+        'blocked_urls': ANALYTICS_PATTERNS,
+        'allowlist': False,
+    },
+    # additionally, hosts other than the Gateway's aren't resolved, so no third-party resource is loaded
+    RESOURCE_BLOCKING_STRICT: {
+        'resource_types': ['image', 'font', 'media'],
+        'blocked_urls': ANALYTICS_PATTERNS,
+        'allowlist': True,
+    },
+}
+"""Presets of what to block in the login browser."""
+
+
+def parse_list(value: Optional[str]) -> list:
+    """Parses a comma-separated list, as used by environment variables."""
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+class ResourceBlocking():
+    """
+    Blocks network requests of the login browser which aren't needed to log in, such as images, fonts and analytics.
+
+    URL patterns are blocked through the Chrome DevTools Protocol with Network.setBlockedURLs. Images are also disabled through Chrome's content settings, so that they aren't decoded. An allowlist of hosts is applied with Chrome's host resolver rules, so that only the Gateway and the allowed hosts can be reached.
+
+    Attributes:
+        preset (str): One of PRESETS.
+        blocked_urls (list): URL patterns blocked in addition to those of the preset, '*' being a wildcard.
+        allowed_hosts (list): Hosts reachable when allowlisting. Setting any enables allowlisting regardless of the preset.
+        base_url (str): URL of the Gateway, whose host is always reachable.
+    """
+
+    def __init__(self,
+                 preset: str = RESOURCE_BLOCKING_OFF,
+                 blocked_urls: list = None,
+                 allowed_hosts: list = None,
+                 base_url: str = None,
+                 ):
+        if preset not in PRESETS:
+            raise ValueError(f'Unknown resource blocking preset: "{preset}", use one of: {list(PRESETS)}')
+
+        self.preset = preset
+        self.resource_types = list(PRESETS[preset]['resource_types'])
+        self.blocked_urls = list(PRESETS[preset]['blocked_urls']) + list(blocked_urls or [])
+        for resource_type in self.resource_types:
+            self.blocked_urls += RESOURCE_TYPE_PATTERNS[resource_type]
+
+        self.allowlist = PRESETS[preset]['allowlist'] or bool(allowed_hosts)
+        self.allowed_hosts = ['localhost', '127.0.0.1']
+        gateway_host = urllib.parse.urlsplit(base_url).hostname if base_url else None
+        for host in [gateway_host] + list(allowed_hosts or []):
+            if host and host not in self.allowed_hosts:
+                self.allowed_hosts.append(host)
+
+    def configure_options(self, options: webdriver.ChromeOptions):
+        """Adds the Chrome arguments and preferences applied at launch."""
+        if 'image' in self.resource_types:
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+        if self.allowlist:
+            excluded = ' , '.join(f'EXCLUDE {host}' for host in self.allowed_hosts)
+            options.add_argument(f'--host-resolver-rules=MAP * ~NOTFOUND , {excluded}')
+
+    def apply(self, driver: webdriver.Chrome):
+        """Blocks the URL patterns in the driver's current tab."""
+        if not self.blocked_urls:
+            return
+
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+        except Exception as e:
+            _LOGGER.warning(f'Cannot block resources of the login browser, loading them all: {e}')
+
+    def __repr__(self):
+        return f'ResourceBlocking(preset={self.preset}, blocked_urls={len(self.blocked_urls)}, allowed_hosts={self.allowed_hosts if self.allowlist else None})'
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import requests
+from cryptography.fernet import Fernet, InvalidToken
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+_COOKIE_FIELDS = ['name', 'value', 'domain', 'path', 'secure', 'expiry']
+
+
+def cookies_from_driver(driver) -> list:
+    """Returns the cookies of the browser's current page."""
+    return [{field: cookie[field] for field in _COOKIE_FIELDS if field in cookie} for cookie in driver.get_cookies()]
+
+
+def cookies_from_session(session: requests.Session) -> list:
+    """Returns the cookies collected by a requests session."""
+    cookies = []
+    for cookie in session.cookies:
+        cookies.append({
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path,
+            'secure': cookie.secure,
+            **({'expiry': cookie.expires} if cookie.expires is not None else {}),
+        })
+    return cookies
+
+
+def set_session_cookies(session: requests.Session, cookies: list):
+    """Adds the stored cookies to a requests session."""
+    for cookie in cookies:
+        session.cookies.set(
+            cookie['name'],
+            cookie['value'],
+            domain=cookie.get('domain', ''),
+            path=cookie.get('path', '/'),
+            secure=cookie.get('secure', False),
+            expires=cookie.get('expiry'),
+        )
+
+
+class SessionStore():
+    """
+    Encrypted store of the SSO cookies and session state produced by the last successful login, kept in a file in the Outputs Directory.
+
+    It lets a restarted IBeam or Gateway resume the IBKR session instead of logging in with credentials and 2FA again. The file is encrypted with Fernet, so that the cookies can't be used by whoever can read the Outputs Directory without the key.
+
+    Attributes:
+        path (str): Path of the encrypted file.
+        key (str): Fernet key encrypting the file.
+        max_age (int): Number of seconds after which a stored session is considered expired and isn't resumed.
+    """
+
+    def __init__(self, path: str, key: str, max_age: int = 86400):
+        self.path = path
+        self.key = key
+        self.max_age = max_age
+
+        # fail early on an invalid key rather than on the first login
+        Fernet(self.key)
+
+    def save(self, cookies: list, state: dict = None):
+        """Stores the cookies and session state, replacing any stored before."""
+        if not cookies:
+            _LOGGER.warning('No cookies found after logging in, nothing to store')
+            return
+
+        data = {'saved_at': time.time(), 'cookies': cookies, 'state': state or {}}
+        token = Fernet(self.key).encrypt(json.dumps(data).encode('utf-8'))
+
+        try:
+            # written to a temporary file first, so that a crash can't leave a partially written store behind
+            tmp_path = self.path + '.tmp'
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as fh:
+                fh.write(token)
+            os.replace(tmp_path, self.path)
+            _LOGGER.info(f'Stored {len(cookies)} session cookies in {self.path}')
+        except Exception as e:
+            _LOGGER.warning(f'Cannot store the session in {self.path}: {e}')
+
+    def load(self) -> Optional[dict]:
+        """Returns the stored cookies and session state, or None if there are none or they expired."""
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, 'rb') as fh:
+                data = json.loads(Fernet(self.key).decrypt(fh.read()).decode('utf-8'))
+        except InvalidToken:
+            _LOGGER.warning(f'Cannot decrypt the stored session in {self.path}, it was likely encrypted with a different key. Discarding it.')
+            self.clear()
+            return None
+        except Exception as e:
+            _LOGGER.warning(f'Cannot read the stored session in {self.path}: {e}')
+            return None
+
+        age = time.time() - data['saved_at']
+        if age > self.max_age:
+            _LOGGER.info(f'Stored session is {int(age)} seconds old, exceeding IBEAM_SESSION_STORE_MAX_AGE of {self.max_age} seconds. Discarding it.')
+            self.clear()
+            return None
+
+        now = time.time()
+        data['cookies'] = [cookie for cookie in data['cookies'] if cookie.get('expiry') is None or cookie['expiry'] > now]
+        if not data['cookies']:
+            _LOGGER.info('All stored session cookies expired. Discarding them.')
+            self.clear()
+            return None
+
+        return data
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            _LOGGER.warning(f'Cannot remove the stored session in {self.path}: {e}')
+
+    def __repr__(self):
+        return f'SessionStore(path={self.path}, max_age={self.max_age})'
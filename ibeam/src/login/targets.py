@@ -72,6 +72,42 @@ class Target():
 Targets = dict[str, Target]
 
 
+WEBSITE_VERSIONS = {
+    1: {
+        'USER_NAME_EL': 'NAME@@user_name',
+        'ERROR_EL': 'CSS_SELECTOR@@.alert.alert-danger.margin-top-10'
+    },
+    2: {
+        'USER_NAME_EL': 'NAME@@username',
+        'ERROR_EL': 'CSS_SELECTOR@@.xyz-errormessage'
+    },
+}
+"""
+Versions of the IBKR login website, recognised by the presence of their USER_NAME_EL. A new version is supported by adding its elements here.
+
+* 1 = available until March 2023
+* 2 = available from March 2023
+"""
+
+
+def versions_in_order(versions: dict, preferred: Optional[int] = None) -> list:
+    """Returns the versions to look for, starting with the preferred one."""
+    return sorted(versions, key=lambda version: version != preferred)
+
+
+def version_fingerprints(versions: dict, preferred: Optional[int] = None) -> callable:
+    """Expected condition returning the first version whose USER_NAME_EL is present, or False if none is."""
+    targets = [(version, Target(versions[version]['USER_NAME_EL'])) for version in versions_in_order(versions, preferred)]
+
+    def _predicate(driver: webdriver.Chrome):
+        for version, target in targets:
+            if driver.find_elements(target.by, target.identifier):
+                return version
+        return False
+
+    return _predicate
+
+
 def targets_from_versions(targets: Targets, versions: dict) -> Targets:
     version_target_user_name = Target(versions['USER_NAME_EL'])
     version_target_error = Target(versions['ERROR_EL'])
@@ -119,20 +155,48 @@ def identify_target(trigger: WebElement, targets: Targets) -> Optional[Target]:
     raise RuntimeError(f'Trigger found but cannot be identified: {trigger} :: {trigger.get_attribute("outerHTML")}')
 
 
-def is_present(target: Target) -> callable:
-    return EC.presence_of_element_located((target.by, target.identifier))
+class TargetCondition():
+    """
+    Expected condition on a target.
+
+    It can be used with WebDriverWait on its own, but when waited on together with other target conditions they are all evaluated by a single DOM probe script, see dom_probe.
+
+    Attributes:
+        target (Target): Target the condition applies to.
+        state (str): One of 'present', 'visible', 'clickable' or 'text'.
+        tag (str): Tag name the element must have, if provided. Tells apart the targets sharing an identifier, such as the 2FA method select and the 2FA code input.
+    """
+
+    def __init__(self, target: Target, state: str, expected_condition: callable, tag: Optional[str] = None):
+        self.target = target
+        self.state = state
+        self.expected_condition = expected_condition
+        self.tag = tag
+
+    def __call__(self, driver: webdriver.Chrome):
+        result = self.expected_condition(driver)
+        if self.tag is not None and isinstance(result, WebElement) and result.tag_name.lower() != self.tag:
+            return False
+        return result
+
+    def __repr__(self):
+        return f'TargetCondition({self.target.variable}, {self.state})'
+
+
+def is_present(target: Target) -> TargetCondition:
+    return TargetCondition(target, 'present', EC.presence_of_element_located((target.by, target.identifier)))
 
 
-def is_visible(target: Target) -> callable:
-    return EC.visibility_of_element_located((target.by, target.identifier))
+def is_visible(target: Target, tag: Optional[str] = None) -> TargetCondition:
+    return TargetCondition(target, 'visible', EC.visibility_of_element_located((target.by, target.identifier)), tag)
 
 
-def is_clickable(target: Target) -> callable:
-    return EC.element_to_be_clickable((target.by, target.identifier))
+def is_clickable(target: Target) -> TargetCondition:
+    return TargetCondition(target, 'clickable', EC.element_to_be_clickable((target.by, target.identifier)))
 
 
-def has_text(target: Target) -> callable:
-    return text_to_be_present_in_element(target.by, target.identifier)
+def has_text(target: Target) -> TargetCondition:
+    return TargetCondition(target, 'text', text_to_be_present_in_element(target.by, target.identifier))
 
 
 def find_element(target: Target, driver: webdriver.Chrome) -> WebElement:
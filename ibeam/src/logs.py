@@ -1,68 +1,179 @@
+import atexit
+import copy
 import datetime
+import json
 import logging
 import os
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
+from ibeam.src.log_archive import LogArchive
+from ibeam.src.log_context import ContextFilter, CONTEXT_FIELDS
+
 initialized = False
 
+_listener = None
+
 
 def initialize(log_format: str,
                log_level: str,
                log_to_file: bool,
-               outputs_dir: str
+               outputs_dir: str,
+               log_json: bool = False,
+               log_compress: bool = True,
+               log_max_age: int = 0,
+               log_max_bytes: int = 0,
                ):
-    global initialized
+    global initialized, _listener
     if initialized: return
     initialized = True
 
     logger = logging.getLogger('ibeam')
-    formatter = logging.Formatter(log_format)
+    formatter = JsonFormatter() if log_json else logging.Formatter(log_format)
+    context_filter = ContextFilter()
 
     # stdout handler, for INFO and below:
     h1 = logging.StreamHandler(stream=sys.stdout)
     h1.setLevel(getattr(logging, log_level))
     h1.addFilter(lambda record: record.levelno <= logging.INFO)
     h1.setFormatter(formatter)
-    logger.addHandler(h1)
+    h1.addFilter(context_filter)
 
     # stderr handler, for WARNING and above:
     h2 = logging.StreamHandler(stream=sys.stderr)
     h2.setLevel(logging.WARNING)
     h2.setFormatter(formatter)
-    logger.addHandler(h2)
+    h2.addFilter(context_filter)
 
+    handlers = [h1, h2]
 
     logger.setLevel(logging.DEBUG)
 
     if log_to_file:
-        file_handler = DailyRotatingFileHandler(os.path.join(outputs_dir, 'ibeam_log'))
+        archive = LogArchive(outputs_dir, compress=log_compress, max_age=log_max_age, max_bytes=log_max_bytes)
+        file_handler = DailyRotatingFileHandler(os.path.join(outputs_dir, 'ibeam_log'), on_rollover=archive.archive_in_background)
+        # files left by previous runs
+        archive.archive_in_background(file_handler.get_filename(file_handler.timestamp))
         file_handler.setFormatter(formatter)
         file_handler.setLevel(logging.DEBUG)
-        logger.addHandler(file_handler)
+        file_handler.addFilter(context_filter)
+        handlers.append(file_handler)
+
+    # records are only put on a queue by the logging threads, the handlers write them out on the listener's thread
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    # the context is that of the logging thread, hence added before the record is queued
+    queue_handler.addFilter(context_filter)
+    logger.addHandler(queue_handler)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _log_synchronously():
+    """Attaches the handlers to the logger directly in a forked process, as the listener's thread doesn't run in it."""
+    global _listener
+    if _listener is None:
+        return
+
+    logger = logging.getLogger('ibeam')
+    for handler in [handler for handler in logger.handlers if isinstance(handler, QueueHandler)]:
+        logger.removeHandler(handler)
+    for handler in _listener.handlers:
+        logger.addHandler(handler)
+    _listener = None
+
+
+def shutdown():
+    """Writes out the records still queued and closes the handlers."""
+    global initialized, _listener
+    if _listener is None:
+        return
+
+    listener, _listener = _listener, None
+    listener.stop()
+
+    logger = logging.getLogger('ibeam')
+    for handler in [handler for handler in logger.handlers if isinstance(handler, QueueHandler)]:
+        logger.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.close()
+    initialized = False
+
+
+atexit.register(shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_log_synchronously)
 
 
 def set_level_for_all(logger, level):
     logger.setLevel(level)
-    for handler in logger.handlers:
+    handlers = list(logger.handlers)
+    if _listener is not None:
+        handlers += _listener.handlers
+    for handler in handlers:
         handler.setLevel(level)
 
 
+class _QueueHandler(QueueHandler):
+    """Keeps the traceback of a queued record apart from its message, rather than appending it as QueueHandler does, so that the JsonFormatter can output it on its own."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a line of JSON, carrying the maintenance cycle, attempt, step and elapsed milliseconds it was logged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            entry[field] = getattr(record, field, None)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
 class DailyRotatingFileHandler(logging.FileHandler):
+    """
+    Writes the records of each day to a file named after that day, calling 'on_rollover' when switching to the next day's file.
+
+    The time of the next midnight is computed when a file is opened, so that checking whether a record belongs to the next day's file is a comparison of timestamps rather than formatting the date of every record.
+    """
 
-    def __init__(self, *args, date_format='%Y-%m-%d', **kwargs):
+    def __init__(self, *args, date_format='%Y-%m-%d', on_rollover: callable = None, **kwargs):
         self.timestamp = None
+        self.rollover_at = None
         self.date_format = date_format
+        self.on_rollover = on_rollover
         super().__init__(*args, **kwargs)
 
-    def get_timestamp(self):
-        return datetime.datetime.now().strftime(self.date_format)
+    def get_timestamp(self, now: datetime.datetime = None):
+        return (now or datetime.datetime.now()).strftime(self.date_format)
 
     def get_filename(self, timestamp):
         return f'{self.baseFilename}__{timestamp}.txt'
 
     def _open(self):
-        self.timestamp = self.get_timestamp()
+        now = datetime.datetime.now()
+        self.timestamp = self.get_timestamp(now)
+        self.rollover_at = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time()).timestamp()
         try:
             return open(self.get_filename(self.timestamp), self.mode, encoding=self.encoding)
         except FileNotFoundError:
@@ -70,7 +181,12 @@ class DailyRotatingFileHandler(logging.FileHandler):
             return open(self.get_filename(self.timestamp), self.mode, encoding=self.encoding)
 
     def emit(self, record):
-        if self.get_timestamp() != self.timestamp:
+        if self.rollover_at is not None and record.created >= self.rollover_at:
+            if self.stream is not None:
+                self.stream.close()
             self.stream = self._open()
+            if self.on_rollover is not None:
+                # called with the file now written to, the previous one being closed
+                self.on_rollover(self.get_filename(self.timestamp))
 
         super().emit(record)
@@ -0,0 +1,89 @@
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from ibeam.src.handlers.http_handler import Status
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+MAINTENANCE_SCHEDULE_FIXED = 'fixed'
+MAINTENANCE_SCHEDULE_ADAPTIVE = 'adaptive'
+
+
+class AdaptiveSchedule():
+    """
+    Works out when the next maintenance should happen.
+
+    While the session is healthy the next maintenance is scheduled at a fraction of the remaining SSO lifetime reported by the Gateway as 'ssoExpires', brought forward by the recent request latency. As the expiry approaches, or after a failed maintenance, the maintenance runs more often.
+
+    Attributes:
+        base_interval (int): Interval used when the session expiry is not known.
+        min_interval (int): Shortest allowed interval, used near expiry and right after failures.
+        max_interval (int): Longest allowed interval, used while the session is healthy and far from expiry.
+        expiry_fraction (float): Fraction of the remaining session lifetime to wait before the next maintenance.
+        latency_smoothing (float): Weight given to the most recent latency in its moving average.
+    """
+
+    def __init__(self,
+                 base_interval: int,
+                 min_interval: int,
+                 max_interval: int,
+                 expiry_fraction: float = 0.5,
+                 latency_smoothing: float = 0.3,
+                 ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.expiry_fraction = expiry_fraction
+        self.latency_smoothing = latency_smoothing
+
+        self.consecutive_failures = 0
+        self.latency = None
+        self._expires_at = None
+
+    def record(self, success: bool, status: Optional[Status] = None, latency: Optional[float] = None):
+        """Records the outcome of a maintenance."""
+        now = time.monotonic()
+
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = self.latency_smoothing * latency + (1 - self.latency_smoothing) * self.latency
+
+        if not success:
+            self.consecutive_failures += 1
+            self._expires_at = None
+            return
+
+        self.consecutive_failures = 0
+        if status is not None and status.expires is not None:
+            self._expires_at = now + status.expires / 1000
+        else:
+            self._expires_at = None
+
+    def seconds_to_expiry(self) -> Optional[float]:
+        if self._expires_at is None:
+            return None
+        return self._expires_at - time.monotonic()
+
+    def next_interval(self) -> float:
+        """Returns the number of seconds until the next maintenance should run."""
+        if self.consecutive_failures > 0:
+            # poll densely after errors, backing off up to the base interval if the failures persist
+            interval = self.min_interval * 2 ** (self.consecutive_failures - 1)
+            return max(self.min_interval, min(interval, max(self.base_interval, self.min_interval)))
+
+        seconds_to_expiry = self.seconds_to_expiry()
+        if seconds_to_expiry is None:
+            interval = self.base_interval
+        else:
+            # leave enough time for a couple of requests to complete before the session expires
+            safety_margin = 2 * self.latency if self.latency is not None else 0
+            interval = (seconds_to_expiry - safety_margin) * self.expiry_fraction
+
+        return max(self.min_interval, min(interval, self.max_interval))
+
+    def __repr__(self):
+        return f'AdaptiveSchedule(min_interval={self.min_interval}, max_interval={self.max_interval}, consecutive_failures={self.consecutive_failures}, latency={self.latency}, seconds_to_expiry={self.seconds_to_expiry()})'
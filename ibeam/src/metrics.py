@@ -0,0 +1,188 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LONG_BUCKETS = (0.5, 1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild():
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild():
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.bucket_counts), self.sum, self.count
+
+
+class _Metric():
+    type = None
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), registry: 'Registry' = None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._children_lock = threading.Lock()
+
+        registry = registry if registry is not None else REGISTRY
+        registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError()
+
+    def labels(self, **labels):
+        """Returns the child metric for the given label values, creating it on first use."""
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._children_lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self):
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines += self._samples()
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1, **labels):
+        self.labels(**labels).inc(amount)
+
+    def _samples(self):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(child.value)}'
+                for key, child in list(self._children.items())]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS, registry: 'Registry' = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the wrapped block, including when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """Decorator observing the duration of every call of the decorated function."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def totals(self) -> dict:
+        """Returns the number and sum of observations, keyed by label values."""
+        totals = {}
+        for key, child in list(self._children.items()):
+            _, total, count = child.snapshot()
+            totals[key] = (count, total)
+        return totals
+
+    def _samples(self):
+        samples = []
+        for key, child in list(self._children.items()):
+            bucket_counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                samples.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+            samples.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(float(total))}')
+            samples.append(f'{self.name}_count{_format_labels(self.label_names, key)} {count}')
+        return samples
+
+
+class Registry():
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = Histogram('ibeam_http_request_duration_seconds', 'Duration of requests made to the Gateway.', ('route', 'method'))
+
+STATUS_OUTCOMES = Counter('ibeam_status_total', 'Gateway statuses observed, by parsed status.', ('status',))
+
+LOGIN_DURATION = Histogram('ibeam_login_duration_seconds', 'Duration of the whole browser login.', ('result',), buckets=LONG_BUCKETS)
+
+LOGIN_STEP_DURATION = Histogram('ibeam_login_step_duration_seconds', 'Duration of each login step.', ('step',), buckets=LONG_BUCKETS)
+
+GATEWAY_STARTUP_DURATION = Histogram('ibeam_gateway_startup_seconds', 'Time from starting the Gateway until it accepts connections.', ('result',), buckets=LONG_BUCKETS)
+
+TIME_TO_AUTHENTICATED = Histogram('ibeam_time_to_authenticated_seconds', 'Time from finding the Gateway unauthenticated until it is authenticated, by whether a stored session was resumed, a login was needed or the session was refreshed ahead of its expiry.', ('path',), buckets=LONG_BUCKETS)
@@ -0,0 +1,160 @@
+import logging
+import re
+from datetime import datetime, date, time, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from ibeam.src.handlers.http_handler import Status
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+_WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def _parse_time(value: str) -> time:
+    match = re.match(r'^(\d{1,2}):(\d{2})$', value.strip())
+    if match is None:
+        raise ValueError(f'Invalid time: "{value}", use HH:MM')
+    return time(int(match.group(1)), int(match.group(2)))
+
+
+def parse_trading_hours(value: str) -> List[Tuple[time, time]]:
+    """Parses comma-separated trading hours, eg. '09:30-16:00'. A range closing before it opens ends on the next day."""
+    hours = []
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        opens, _, closes = item.partition('-')
+        hours.append((_parse_time(opens), _parse_time(closes)))
+    return hours
+
+
+def parse_trading_days(value: str) -> List[int]:
+    """Parses comma-separated weekdays, eg. 'mon,tue,wed,thu,fri', into their numbers as in datetime.weekday."""
+    days = []
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        day = item.strip().lower()[:3]
+        if day not in _WEEKDAYS:
+            raise ValueError(f'Invalid trading day: "{item}", use one of {_WEEKDAYS}')
+        days.append(_WEEKDAYS.index(day))
+    return days
+
+
+def parse_holidays(value: str) -> List[date]:
+    """Parses comma-separated dates, eg. '2024-12-25,2025-01-01'."""
+    return [date.fromisoformat(item.strip()) for item in value.split(',') if item.strip()]
+
+
+class TradingCalendar():
+    """
+    Trading hours of the markets traded through the Gateway, telling the busy times in which the session must be usable from the quiet times in which it can be refreshed.
+
+    Attributes:
+        timezone (str): Timezone of the trading hours, eg. 'America/New_York'.
+        hours (list): Pairs of opening and closing times. A pair closing before it opens ends on the next day.
+        days (list): Weekdays on which the market opens, as in datetime.weekday.
+        holidays (list): Dates on which the market doesn't open.
+        quiet_margin (int): Number of seconds before opening and after closing which aren't quiet either.
+    """
+
+    def __init__(self,
+                 timezone: str,
+                 hours: List[Tuple[time, time]],
+                 days: List[int],
+                 holidays: List[date] = None,
+                 quiet_margin: int = 1800,
+                 ):
+        try:
+            self.tz = ZoneInfo(timezone)
+        except ZoneInfoNotFoundError:
+            raise ValueError(f'Unknown timezone: "{timezone}". If the timezone is valid, install the tzdata package.')
+
+        self.timezone = timezone
+        self.hours = hours
+        self.days = days
+        self.holidays = set(holidays or [])
+        self.quiet_margin = timedelta(seconds=quiet_margin)
+
+    def busy_periods(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """Returns the trading sessions widened by the quiet margin which overlap the period, in UTC."""
+        periods = []
+        # a session opening the day before can still be running at the start of the period
+        day = start.astimezone(self.tz).date() - timedelta(days=1)
+        last_day = end.astimezone(self.tz).date()
+        while day <= last_day:
+            if day.weekday() in self.days and day not in self.holidays:
+                for opens, closes in self.hours:
+                    opens_at = datetime.combine(day, opens, tzinfo=self.tz)
+                    closes_at = datetime.combine(day + timedelta(days=1) if closes <= opens else day, closes, tzinfo=self.tz)
+                    busy_start = (opens_at - self.quiet_margin).astimezone(timezone.utc)
+                    busy_end = (closes_at + self.quiet_margin).astimezone(timezone.utc)
+                    if busy_start < end and busy_end > start:
+                        periods.append((busy_start, busy_end))
+            day += timedelta(days=1)
+        return sorted(periods)
+
+    def is_quiet(self, moment: datetime) -> bool:
+        return not any(busy_start <= moment < busy_end for busy_start, busy_end in self.busy_periods(moment, moment + timedelta(seconds=1)))
+
+    def latest_quiet(self, start: datetime, end: datetime) -> Optional[datetime]:
+        """Returns the latest quiet moment between start and end, or None if there is none."""
+        moment = end
+        # going back from the latest period, so that overlapping periods are skipped over as one
+        for busy_start, busy_end in reversed(self.busy_periods(start, end)):
+            if busy_start <= moment < busy_end:
+                moment = busy_start
+        return moment if moment >= start else None
+
+    def __repr__(self):
+        hours = ','.join(f'{opens:%H:%M}-{closes:%H:%M}' for opens, closes in self.hours)
+        return f'TradingCalendar(timezone={self.timezone}, hours={hours}, days={[_WEEKDAYS[day] for day in self.days]}, holidays={len(self.holidays)}, quiet_margin={self.quiet_margin})'
+
+
+class RefreshPlanner():
+    """
+    Plans when to log in anew before the session expires, so that the session doesn't expire in trading hours.
+
+    The session's expiry is known from 'ssoExpires', reported by the Gateway as Status.expires. The refresh is planned at the latest quiet time of the TradingCalendar which leaves 'lead_time' before the expiry, so that as few refreshes as possible happen and the login - possibly through the slow browser path - never runs during trading hours. If no quiet time is left before the expiry, the refresh is planned 'lead_time' before it, sparing at least the outage of an expired session.
+
+    Attributes:
+        calendar (TradingCalendar): Trading hours in which the session shouldn't be refreshed.
+        lead_time (int): Number of seconds before the expiry by which the refresh should have happened.
+        cooldown (int): Number of seconds after a refresh before which no other is planned, in case logging in anew didn't extend the session.
+    """
+
+    def __init__(self,
+                 calendar: TradingCalendar,
+                 lead_time: int = 900,
+                 cooldown: int = 3600,
+                 ):
+        self.calendar = calendar
+        self.lead_time = timedelta(seconds=lead_time)
+        self.cooldown = timedelta(seconds=cooldown)
+
+        self.last_refresh = None
+
+    def plan(self, status: Status, now: datetime = None) -> Optional[datetime]:
+        """Returns when to refresh the session, or None if it isn't authenticated or its expiry isn't known."""
+        if not status.authenticated or status.expires is None:
+            return None
+
+        now = now if now is not None else datetime.now(timezone.utc)
+        expires_at = now + timedelta(milliseconds=status.expires)
+        deadline = expires_at - self.lead_time
+        earliest = now if self.last_refresh is None else max(now, self.last_refresh + self.cooldown)
+        if expires_at <= earliest:
+            return None
+        if deadline < earliest:
+            return earliest
+
+        refresh_at = self.calendar.latest_quiet(earliest, deadline)
+        return refresh_at if refresh_at is not None else deadline
+
+    def record_refresh(self, now: datetime = None):
+        self.last_refresh = now if now is not None else datetime.now(timezone.utc)
+
+    def __repr__(self):
+        return f'RefreshPlanner(calendar={self.calendar}, lead_time={self.lead_time}, cooldown={self.cooldown}, last_refresh={self.last_refresh})'
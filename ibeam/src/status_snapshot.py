@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from ibeam.src.handlers.http_handler import Status
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+
+class StatusSnapshot():
+    """
+    A shared, time-limited copy of the most recent Gateway Status.
+
+    Readers receive the cached Status while it is younger than the TTL. Once it expires, the first reader fetches a new Status while all concurrent readers wait for that single request and share its result. The Status can also be fed directly, eg. by the maintenance.
+
+    Attributes:
+        fetch (callable): Returns a new Status from the Gateway.
+        ttl (float): How many seconds a Status is considered fresh. Set to 0 to fetch on every read.
+    """
+
+    def __init__(self, fetch: callable, ttl: float):
+        self.fetch = fetch
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._refreshed = threading.Condition(self._lock)
+        self._refreshing = False
+        self._status = None
+        self._updated_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._status is not None and time.monotonic() - self._updated_at < self.ttl
+
+    def update(self, status: Status):
+        """Stores the Status as the most recent one."""
+        with self._lock:
+            self._status = status
+            self._updated_at = time.monotonic()
+
+    def invalidate(self):
+        """Forces the next read to fetch a new Status."""
+        with self._lock:
+            self._status = None
+            self._updated_at = None
+
+    def age(self) -> Optional[float]:
+        """Number of seconds since the Status was last updated, or None if there is no Status."""
+        with self._lock:
+            if self._updated_at is None:
+                return None
+            return time.monotonic() - self._updated_at
+
+    def peek(self) -> Optional[Status]:
+        """Returns the most recent Status without refreshing it, regardless of its age."""
+        with self._lock:
+            return self._status
+
+    def get(self) -> Status:
+        """Returns the cached Status if it is fresh, otherwise fetches a new one, sharing the request with concurrent readers."""
+        with self._lock:
+            if self._is_fresh():
+                return self._status
+
+            if self._refreshing:
+                self._refreshed.wait_for(lambda: not self._refreshing)
+                if self._status is not None:
+                    return self._status
+                # the refresh we waited for failed, fall through and fetch ourselves
+
+            self._refreshing = True
+
+        status = None
+        try:
+            status = self.fetch()
+            return status
+        finally:
+            with self._lock:
+                if status is not None:
+                    self._status = status
+                    self._updated_at = time.monotonic()
+                self._refreshing = False
+                self._refreshed.notify_all()
+
+    def __repr__(self):
+        return f'StatusSnapshot(ttl={self.ttl}, age={self.age()}, status={self._status})'
@@ -0,0 +1,180 @@
+import logging
+import os
+import re
+import shutil
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor as ConcurrentThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from ibeam.src.gateway_client import GatewayClient
+from ibeam.src.handlers.process_handler import with_port
+from ibeam.src.health_server import new_supervisor_health_server
+from ibeam.src.login.browser_budget import BrowserBudget
+from ibeam.src.login.resource_blocking import parse_list
+
+_LOGGER = logging.getLogger('ibeam.' + Path(__file__).stem)
+
+_ACCOUNT_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+def parse_accounts(value: Optional[str]) -> list:
+    """Parses the comma-separated account names of IBEAM_ACCOUNTS."""
+    names = parse_list(value)
+    for name in names:
+        if not _ACCOUNT_NAME_PATTERN.match(name):
+            raise ValueError(f'Invalid account name: "{name}", use only letters, digits and underscores')
+    if len(set(name.lower() for name in names)) != len(names):
+        raise ValueError(f'Duplicate account names in: {names}')
+    return names
+
+
+def secrets_prefix(name: str) -> str:
+    """Prefix of the environment values holding the account's credentials, eg. IBEAM_ALICE_ACCOUNT."""
+    return f'IBEAM_{name.upper()}_'
+
+
+def account_conf(name: str, alternate: bool = False) -> str:
+    """Name of the account's conf file, distinct for each account so that their Gateway processes can be told apart."""
+    return f'conf.{name}.alternate.yaml' if alternate else f'conf.{name}.yaml'
+
+
+def account_variables(cnf, name: str, index: int) -> dict:
+    """
+    Returns the config variables that differ between the supervised accounts.
+
+    Each account runs its Gateway from its own copy of IBEAM_GATEWAY_DIR, on port IBEAM_ACCOUNTS_FIRST_PORT + 2 * index, the following port being its alternate port in 'blue_green' restart mode. Its outputs are kept in a subdirectory of the Outputs Directory named after it, and its inputs are read from such a subdirectory of the Inputs Directory if it exists.
+    """
+    port = cnf.ACCOUNTS_FIRST_PORT + 2 * index
+    inputs_dir = os.path.join(cnf.INPUTS_DIR, name)
+    return {
+        'GATEWAY_DIR': os.path.normpath(cnf.GATEWAY_DIR) + f'-{name}',
+        'GATEWAY_BASE_URL': with_port(cnf.GATEWAY_BASE_URL, port),
+        'GATEWAY_ALTERNATE_PORT': port + 1,
+        'INPUTS_DIR': inputs_dir if os.path.isdir(inputs_dir) else cnf.INPUTS_DIR,
+        'OUTPUTS_DIR': os.path.join(cnf.OUTPUTS_DIR, name),
+    }
+
+
+def copy_gateway_dir(source: os.PathLike, target: os.PathLike) -> bool:
+    """Copies the Gateway's directory for an account, returning whether it was copied. An existing copy is kept, along with its logs."""
+    if os.path.isdir(target):
+        return False
+
+    _LOGGER.info(f'Copying the Gateway from {source} to {target}')
+    shutil.copytree(source, target, ignore=shutil.ignore_patterns('logs'))
+    return True
+
+
+def port_of(base_url: str) -> int:
+    return urllib.parse.urlsplit(base_url).port
+
+
+class Supervisor():
+    """
+    Runs the Gateways of several accounts from one IBeam process.
+
+    Each account is maintained by its own GatewayClient, with its own Gateway directory, port, credentials and LoginHandler. Their maintenance runs on one scheduler, their login browsers are limited by one BrowserBudget and their status is served by one health server, so that the overhead of a Python runtime, scheduler, health server and Chrome is paid once rather than per account.
+
+    Attributes:
+        clients (dict): GatewayClients by account name. They must be created without a health server.
+        health_server_port (int): Port of the health server reporting on all accounts.
+        browser_budget (BrowserBudget): Budget shared by the login browsers of the accounts, reported in the status.
+    """
+
+    def __init__(self,
+                 clients: Dict[str, GatewayClient],
+                 health_server_port: int,
+                 browser_budget: Optional[BrowserBudget] = None,
+                 ):
+        self.clients = clients
+        self.health_server_port = health_server_port
+        self.browser_budget = browser_budget
+
+        self._scheduler = None
+        self._health_server = new_supervisor_health_server(self.health_server_port, self)
+
+    def get_shutdown_status(self) -> bool:
+        """Whether every account was shut down due to a critical error."""
+        return all(client.get_shutdown_status() for client in self.clients.values())
+
+    def account_status(self, name: str) -> dict:
+        client = self.clients[name]
+        return {
+            **client.status_snapshot.get().to_dict(),
+            'shutdown': client.get_shutdown_status(),
+            'active': client.active,
+            'gateway_base_url': client.get_base_url(),
+        }
+
+    def status(self) -> dict:
+        status = {
+            'accounts': {name: self.account_status(name) for name in self.clients},
+            'shutdown': self.get_shutdown_status(),
+        }
+        if self.browser_budget is not None:
+            status['browser_budget'] = self.browser_budget.to_dict()
+        return status
+
+    def _start_and_authenticate(self, name: str):
+        client = self.clients[name]
+        try:
+            success, shutdown, status = client.start_and_authenticate()
+        except Exception as e:
+            _LOGGER.exception(f'Error starting the Gateway of account {name}: {e}')
+            return
+
+        if success:
+            _LOGGER.info(f'Gateway of account {name} running and authenticated, session id: {status.session_id}, server name: {status.server_name}')
+        if shutdown:
+            _LOGGER.warning(f'Account {name} shut down due to critical error, the other accounts keep running.')
+
+    def start_and_authenticate(self):
+        """Starts and authenticates the Gateways of all active accounts at once, their logins being limited by the browser budget."""
+        names = [name for name, client in self.clients.items() if client.active]
+        if not names:
+            return
+
+        with ConcurrentThreadPoolExecutor(len(names), thread_name_prefix='ibeam-account') as executor:
+            list(executor.map(self._start_and_authenticate, names))
+
+    def build_scheduler(self):
+        # each account gets its own thread, so that a slow login doesn't delay the maintenance of the others
+        executors = {'default': ThreadPoolExecutor(len(self.clients))}
+        job_defaults = {'coalesce': False, 'max_instances': 1}
+        self._scheduler = BackgroundScheduler(executors=executors, job_defaults=job_defaults, timezone='UTC')
+        for name, client in self.clients.items():
+            if client.get_shutdown_status():
+                _LOGGER.warning(f'Not maintaining account {name}, it was shut down due to critical error.')
+                continue
+            client.schedule(self._scheduler)
+
+    def maintain(self):
+        self.build_scheduler()
+        _LOGGER.info(f'Starting maintenance of accounts: {list(self.clients)}')
+        self._scheduler.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt as e:
+            _LOGGER.info('Keyboard interrupt, shutting down.')
+            pass
+        self._scheduler.remove_all_jobs()
+        self._scheduler.shutdown(wait=False)
+        self.shutdown()
+
+    def kill_gateways(self) -> Dict[str, bool]:
+        return {name: client.process_handler.kill_gateway() for name, client in self.clients.items()}
+
+    def shutdown(self):
+        if self._health_server:
+            self._health_server.shutdown()
+        for client in self.clients.values():
+            client.shutdown()
+
+    def __repr__(self):
+        return f'Supervisor(accounts={list(self.clients)}, browser_budget={self.browser_budget})'
@@ -9,6 +9,7 @@ from typing import Optional
 from selenium.common.exceptions import ElementClickInterceptedException
 
 from ibeam.src.login.driver import release_chrome_driver, save_screenshot, DriverFactory
+from ibeam.src.login.resource_blocking import ResourceBlocking
 from ibeam.src.utils.selenium_utils import any_of
 from ibeam.src.two_fa_handlers.two_fa_handler import TwoFaHandler
 
@@ -46,7 +47,8 @@ class GoogleMessagesTwoFaHandler(TwoFaHandler):
     def get_two_fa_code(self, _) -> Optional[str]:
         code_two_fa = None
 
-        driver_2fa = self.driver_factory.new_driver(name='google_msg', incognito=False)
+        # the QR code is an image and Google Messages is on a third-party host, so nothing is blocked
+        driver_2fa = self.driver_factory.new_driver(name='google_msg', incognito=False, resource_blocking=ResourceBlocking())
         if driver_2fa is None:
             return None
 
@@ -29,11 +29,44 @@ GATEWAY_STARTUP = int(os.environ.get('IBEAM_GATEWAY_STARTUP', 20))
 GATEWAY_PROCESS_MATCH = os.environ.get('IBEAM_GATEWAY_PROCESS_MATCH', 'ibgroup.web.core.clientportal.gw.GatewayStart')
 """The gateway process' name to match against."""
 
+GATEWAY_READY_PATTERN = os.environ.get('IBEAM_GATEWAY_READY_PATTERN', r'(?i)\blistening\b|Open https?://\S+ to login')
+"""Regular expression matching the Gateway's log line announcing it accepts connections."""
+
+GATEWAY_READY_POLL_INTERVAL = float(os.environ.get('IBEAM_GATEWAY_READY_POLL_INTERVAL', 0.1))
+"""How many seconds between checks of the Gateway's log and listen socket while it is starting."""
+
+GATEWAY_RESTART_MODE = os.environ.get('IBEAM_GATEWAY_RESTART_MODE', 'kill')
+"""How to restart the Gateway when its session can't be recovered: 'kill' kills it and starts a new one at the next maintenance, 'blue_green' starts a new one on IBEAM_GATEWAY_ALTERNATE_PORT and kills the old one only once the new one accepts connections."""
+
+GATEWAY_ALTERNATE_PORT = int(os.environ.get('IBEAM_GATEWAY_ALTERNATE_PORT', 5002))
+"""Port the Gateway alternates with the one of IBEAM_GATEWAY_BASE_URL when restarting in 'blue_green' mode. The base URL in use is written to the Outputs Directory and reported by the /status route of the health server."""
+
+ACCOUNTS = os.environ.get('IBEAM_ACCOUNTS', '')
+"""Comma-separated names of the accounts whose Gateways are run by this IBeam process, eg. 'alice,bob'. The credentials of each are read from IBEAM_<NAME>_ACCOUNT, IBEAM_<NAME>_PASSWORD and IBEAM_<NAME>_KEY. If not set, a single Gateway is run with IBEAM_ACCOUNT, IBEAM_PASSWORD and IBEAM_KEY."""
+
+ACCOUNTS_FIRST_PORT = int(os.environ.get('IBEAM_ACCOUNTS_FIRST_PORT', 5010))
+"""Port of the Gateway of the first account in IBEAM_ACCOUNTS. Each following account takes the port two above, leaving one for its alternate port."""
+
+BROWSER_BUDGET = int(os.environ.get('IBEAM_BROWSER_BUDGET', 1))
+"""How many login browsers can run at once across the accounts in IBEAM_ACCOUNTS."""
+
+BROWSER_BUDGET_TIMEOUT = int(os.environ.get('IBEAM_BROWSER_BUDGET_TIMEOUT', 600))
+"""How many seconds a login waits for a browser of IBEAM_BROWSER_BUDGET before failing."""
+
 MAINTENANCE_INTERVAL = int(os.environ.get('IBEAM_MAINTENANCE_INTERVAL', 60))
 """How many seconds between each maintenance."""
 
+MAINTENANCE_SCHEDULE = os.environ.get('IBEAM_MAINTENANCE_SCHEDULE', 'fixed')
+"""How maintenance is scheduled: 'fixed' runs every MAINTENANCE_INTERVAL seconds, 'adaptive' derives the interval from the remaining session lifetime and recent failures."""
+
+MIN_MAINTENANCE_INTERVAL = int(os.environ.get('IBEAM_MIN_MAINTENANCE_INTERVAL', 10))
+"""Shortest number of seconds between each maintenance when using the adaptive schedule."""
+
+MAX_MAINTENANCE_INTERVAL = int(os.environ.get('IBEAM_MAX_MAINTENANCE_INTERVAL', 180))
+"""Longest number of seconds between each maintenance when using the adaptive schedule."""
+
 SPAWN_NEW_PROCESSES = to_bool(os.environ.get('IBEAM_SPAWN_NEW_PROCESSES', False))
-"""Whether new processes should be spawned for each maintenance."""
+"""Whether new processes should be spawned for each maintenance. The metrics observed during maintenance, such as the login durations and the time to authenticated, are then not available at /metrics."""
 
 LOG_LEVEL = os.environ.get('IBEAM_LOG_LEVEL', 'INFO')
 """Verbosity level of the logger used."""
@@ -42,7 +75,19 @@ LOG_TO_FILE = to_bool(os.environ.get('IBEAM_LOG_TO_FILE', True))
 """Whether logs should also be saved to a file."""
 
 LOG_FORMAT = os.environ.get('IBEAM_LOG_FORMAT', '%(asctime)s|%(levelname)-.1s| %(message)s')
-"""Log format that is used by IBeam. """
+"""Log format that is used by IBeam. Can refer to the cycle_id, attempt, step and elapsed_ms of each record too, eg. %(cycle_id)s."""
+
+LOG_JSON = to_bool(os.environ.get('IBEAM_LOG_JSON', False))
+"""Whether logs should be output as lines of JSON, carrying the maintenance cycle ID, attempt number, step name and elapsed milliseconds of each record. Takes precedence over IBEAM_LOG_FORMAT."""
+
+LOG_COMPRESS = to_bool(os.environ.get('IBEAM_LOG_COMPRESS', True))
+"""Whether the log files of past days should be compressed with gzip."""
+
+LOG_MAX_AGE = int(os.environ.get('IBEAM_LOG_MAX_AGE', 0))
+"""Number of days after which log files are deleted. If 0, they are kept indefinitely."""
+
+LOG_MAX_BYTES = int(os.environ.get('IBEAM_LOG_MAX_BYTES', 0))
+"""Number of bytes the log files may take in the Outputs Directory, the oldest files being deleted beyond it. If 0, there is no limit."""
 
 REQUEST_RETRIES = int(os.environ.get('IBEAM_REQUEST_RETRIES', 2))
 """How many times to reattempt a request to the gateway."""
@@ -50,6 +95,15 @@ REQUEST_RETRIES = int(os.environ.get('IBEAM_REQUEST_RETRIES', 2))
 REQUEST_TIMEOUT = int(os.environ.get('IBEAM_REQUEST_TIMEOUT', 15))
 """How many seconds to wait for a request to complete."""
 
+HTTP_POOL_SIZE = int(os.environ.get('IBEAM_HTTP_POOL_SIZE', 2))
+"""How many keep-alive connections to the Gateway to keep open. Set to 0 to open a new connection for every request."""
+
+HTTP_POOL_IDLE_TIMEOUT = int(os.environ.get('IBEAM_HTTP_POOL_IDLE_TIMEOUT', 30))
+"""How many seconds a keep-alive connection to the Gateway can stay idle before it is closed."""
+
+HTTP_POOL_MAX_RECONNECTS = int(os.environ.get('IBEAM_HTTP_POOL_MAX_RECONNECTS', 1))
+"""How many times to reconnect if a keep-alive connection to the Gateway was reset."""
+
 RESTART_FAILED_SESSIONS = to_bool(os.environ.get('IBEAM_RESTART_FAILED_SESSIONS', True))
 """Whether Gateway should be restarted on failed sessions."""
 
@@ -62,12 +116,18 @@ REAUTHENTICATE_WAIT = int(os.environ.get('IBEAM_REAUTHENTICATE_WAIT', 15))
 HEALTH_SERVER_PORT = int(os.environ.get("IBEAM_HEALTH_SERVER_PORT", 5001))
 """Port to start health server on."""
 
+STATUS_CACHE_TTL = float(os.environ.get('IBEAM_STATUS_CACHE_TTL', 10))
+"""How many seconds the health server can reuse the last known Gateway status before requesting a new one. Set to 0 to request it on every call."""
+
 SECRETS_SOURCE = os.environ.get("IBEAM_SECRETS_SOURCE", 'env')
 """Source of secrets."""
 
 GCP_SECRETS_URL = os.environ.get("IBEAM_GCP_SECRETS_URL", None)
 """Base URL for GCP secrets manager."""
 
+SECRETS_CACHE_TTL = float(os.environ.get('IBEAM_SECRETS_CACHE_TTL', 300))
+"""How many seconds the secrets read from GCP secrets manager are kept in memory before being requested again. Set to 0 to request them on every read."""
+
 START_ACTIVE = to_bool(os.environ.get('IBEAM_START_ACTIVE', True))
 """Whether IBeam should start activated or dormant."""
 
@@ -136,11 +196,14 @@ COUNT_TIMEOUT_AS_FAILED = to_bool(os.environ.get('IBEAM_COUNT_TIMEOUT_AS_FAILED'
 """Whether to count login timeouts toward the maximum number of failed authentication attempts."""
 
 MIN_PRESUBMIT_BUFFER = int(os.environ.get('IBEAM_MIN_PRESUBMIT_BUFFER', 5))
-"""Minimum number of seconds to wait before hitting the submit button"""
+"""Number of seconds to wait before hitting the submit button, until the presubmit buffer is learned from past logins"""
 
 MAX_PRESUBMIT_BUFFER = int(os.environ.get('IBEAM_MAX_PRESUBMIT_BUFFER', 30))
 """Maximum number of seconds to wait before hitting the submit button"""
 
+PRESUBMIT_BUFFER_FLOOR = int(os.environ.get('IBEAM_PRESUBMIT_BUFFER_FLOOR', MIN_PRESUBMIT_BUFFER))
+"""Lowest number of seconds the presubmit buffer is lowered to after successful logins. Defaults to IBEAM_MIN_PRESUBMIT_BUFFER, never lowering it."""
+
 MAX_IMMEDIATE_ATTEMPTS = int(os.environ.get('IBEAM_MAX_IMMEDIATE_ATTEMPTS', 10))
 """Maximum number of immediate retries upon detecting an error message."""
 
@@ -159,6 +222,63 @@ MAX_REAUTHENTICATE_RETRIES = int(os.environ.get('IBEAM_MAX_REAUTHENTICATE_RETRIE
 UI_SCALING = float(os.environ.get('IBEAM_UI_SCALING', 1))
 """The resolution UI scaling to be used by the browser."""
 
+BROWSER_POOL_SIZE = int(os.environ.get('IBEAM_BROWSER_POOL_SIZE', 0))
+"""How many browsers to keep launched between logins. Set to 0 to launch a new browser for every login. Not supported with SPAWN_NEW_PROCESSES, unless several accounts are run."""
+
+BROWSER_POOL_MAX_AGE = int(os.environ.get('IBEAM_BROWSER_POOL_MAX_AGE', 3600))
+"""How many seconds a pooled browser can be reused for before it is relaunched."""
+
+BROWSER_POOL_MAX_USES = int(os.environ.get('IBEAM_BROWSER_POOL_MAX_USES', 20))
+"""How many logins a pooled browser can be reused for before it is relaunched."""
+
+LOGIN_ENGINE = os.environ.get('IBEAM_LOGIN_ENGINE', 'selenium')
+"""How to log in: 'selenium' drives a browser, 'http' replays the login form with plain HTTP requests and falls back to the browser if the webpage can't be handled that way."""
+
+DOM_WAIT_ENGINE = os.environ.get('IBEAM_DOM_WAIT_ENGINE', 'poll')
+"""How the login browser waits for the webpage: 'poll' checks it every half a second, 'observer' gets notified by the webpage as soon as it changes."""
+
+SESSION_STORE = to_bool(os.environ.get('IBEAM_SESSION_STORE', False))
+"""Whether to store the session cookies of a successful login, encrypted in the Outputs Directory, and resume them instead of logging in after a restart."""
+
+SESSION_STORE_KEY = os.environ.get('IBEAM_SESSION_STORE_KEY', None)
+"""Fernet key encrypting the stored session. Defaults to IBEAM_KEY."""
+
+SESSION_STORE_MAX_AGE = int(os.environ.get('IBEAM_SESSION_STORE_MAX_AGE', 86400))
+"""How many seconds a stored session can be resumed for after the login that produced it."""
+
+SESSION_REFRESH = to_bool(os.environ.get('IBEAM_SESSION_REFRESH', False))
+"""Whether to log in anew ahead of the session's expiry, at a quiet time outside of IBEAM_TRADING_HOURS, rather than once the session expired."""
+
+SESSION_REFRESH_LEAD_TIME = int(os.environ.get('IBEAM_SESSION_REFRESH_LEAD_TIME', 900))
+"""How many seconds before the session's expiry it should be refreshed by."""
+
+SESSION_REFRESH_COOLDOWN = int(os.environ.get('IBEAM_SESSION_REFRESH_COOLDOWN', 3600))
+"""How many seconds after refreshing the session before it can be refreshed again."""
+
+TRADING_TIMEZONE = os.environ.get('IBEAM_TRADING_TIMEZONE', 'America/New_York')
+"""Timezone of IBEAM_TRADING_HOURS and IBEAM_TRADING_HOLIDAYS."""
+
+TRADING_HOURS = os.environ.get('IBEAM_TRADING_HOURS', '09:30-16:00')
+"""Comma-separated hours during which the session shouldn't be refreshed, eg. '04:00-20:00'. Hours closing before they open end on the next day."""
+
+TRADING_DAYS = os.environ.get('IBEAM_TRADING_DAYS', 'mon,tue,wed,thu,fri')
+"""Comma-separated weekdays on which IBEAM_TRADING_HOURS apply."""
+
+TRADING_HOLIDAYS = os.environ.get('IBEAM_TRADING_HOLIDAYS', '')
+"""Comma-separated dates on which IBEAM_TRADING_HOURS don't apply, eg. '2024-12-25,2025-01-01'."""
+
+TRADING_QUIET_MARGIN = int(os.environ.get('IBEAM_TRADING_QUIET_MARGIN', 1800))
+"""How many seconds before and after IBEAM_TRADING_HOURS the session shouldn't be refreshed either."""
+
+BROWSER_RESOURCE_BLOCKING = os.environ.get('IBEAM_BROWSER_RESOURCE_BLOCKING', 'off')
+"""What the login browser doesn't load: 'off' loads everything, 'safe' blocks images, fonts, media and analytics, 'strict' additionally only reaches the Gateway and IBEAM_BROWSER_ALLOWED_HOSTS."""
+
+BROWSER_BLOCKED_URLS = os.environ.get('IBEAM_BROWSER_BLOCKED_URLS', '')
+"""Comma-separated URL patterns the login browser doesn't load, in addition to those of IBEAM_BROWSER_RESOURCE_BLOCKING. '*' is a wildcard."""
+
+BROWSER_ALLOWED_HOSTS = os.environ.get('IBEAM_BROWSER_ALLOWED_HOSTS', '')
+"""Comma-separated hosts the login browser can reach besides the Gateway. Setting any makes the browser unable to reach other hosts."""
+
 ########### TWO-FACTOR AUTHENTICATION ###########
 
 TWO_FA_EL_ID = os.environ.get('IBEAM_TWO_FA_EL_ID', 'ID@@twofactbase')
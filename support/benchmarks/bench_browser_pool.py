@@ -0,0 +1,89 @@
+"""
+Compares the login latency of LoginHandler with and without the warm BrowserPool, logging into a local stand-in of the login page.
+
+Requires Chrome and the Chrome Driver to be installed.
+
+Usage:
+    python support/benchmarks/bench_browser_pool.py --driver-path /usr/bin/chromedriver [--runs 5] [--pool-size 1]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from login_page_standin import LoginPageHandler, start_login_page_standin
+from ibeam.config import Config
+from ibeam.src import var
+from ibeam.src.handlers.login_handler import LoginHandler
+from ibeam.src.login.browser_pool import BrowserPool
+from ibeam.src.login.driver import DriverFactory
+from ibeam.src.login.targets import create_targets
+
+
+def _login_handler(base_url: str, driver_factory: DriverFactory, browser_pool: BrowserPool = None) -> LoginHandler:
+    secrets_handler = SimpleNamespace(credentials=lambda: (LoginPageHandler.account, LoginPageHandler.password, None))
+    return LoginHandler(
+        secrets_handler=secrets_handler,
+        two_fa_handler=None,
+        driver_factory=driver_factory,
+        targets=create_targets(Config(var.all_variables)),
+        base_url=base_url,
+        route_auth=var.ROUTE_AUTH,
+        two_fa_select_target=var.TWO_FA_SELECT_TARGET,
+        strict_two_fa_code=True,
+        max_immediate_attempts=1,
+        oauth_timeout=var.OAUTH_TIMEOUT,
+        max_presubmit_buffer=0,
+        min_presubmit_buffer=0,
+        max_failed_auth=var.MAX_FAILED_AUTH,
+        outputs_dir=tempfile.gettempdir(),
+        browser_pool=browser_pool,
+    )
+
+
+def _measure(login_handler: LoginHandler, runs: int) -> list:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        success, _ = login_handler.login()
+        durations.append(time.perf_counter() - start)
+        if not success:
+            raise RuntimeError('Login to the stand-in failed')
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--driver-path', default=var.CHROME_DRIVER_PATH if var.CHROME_DRIVER_PATH is not var.UNDEFINED else 'chromedriver')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--pool-size', type=int, default=1)
+    args = parser.parse_args()
+
+    server = start_login_page_standin()
+    base_url = f'https://localhost:{server.server_address[1]}'
+    driver_factory = DriverFactory(driver_path=args.driver_path, name='bench')
+
+    results = {'cold start': _measure(_login_handler(base_url, driver_factory), args.runs)}
+
+    browser_pool = BrowserPool(driver_factory, size=args.pool_size, max_age=3600, max_uses=args.runs + 1)
+    browser_pool.warm()
+    try:
+        results[f'pool (size={args.pool_size})'] = _measure(_login_handler(base_url, driver_factory, browser_pool), args.runs)
+    finally:
+        browser_pool.close()
+        server.shutdown()
+
+    print(f'{args.runs} logins per mode')
+    print(f'{"mode":<18}{"mean s":>10}{"median s":>10}{"min s":>10}')
+    for mode, durations in results.items():
+        print(f'{mode:<18}{statistics.mean(durations):>10.2f}{statistics.median(durations):>10.2f}{min(durations):>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
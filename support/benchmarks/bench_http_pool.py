@@ -0,0 +1,117 @@
+"""
+Compares the number of TLS handshakes and the wall time of a maintenance cycle's Gateway requests with and without the HttpHandler keep-alive connection pool.
+
+A maintenance cycle is simulated as: tickle, reauthenticate, repeated status checks, validate and initialise.
+
+Usage:
+    python support/benchmarks/bench_http_pool.py [--cycles 10] [--status-checks 120] [--pool-size 2]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from local_tls import CountingTLSServer, generate_self_signed_cert, start_server
+from ibeam.src import var
+from ibeam.src.handlers.http_handler import HttpHandler
+
+_TICKLE_RESPONSE = json.dumps({
+    'session': 'bench', 'ssoExpires': 600000, 'collission': False,
+    'iserver': {'authStatus': {'authenticated': True, 'competing': False, 'connected': True}},
+}).encode()
+
+
+class _GatewayStandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        if self.path.startswith(var.ROUTE_VALIDATE):
+            body = b'{"RESULT":true}'
+        elif self.path.startswith(var.ROUTE_LOGOUT):
+            body = b'{"status":true}'
+        elif self.path.startswith(var.ROUTE_TICKLE):
+            body = _TICKLE_RESPONSE
+        else:
+            body = b'{}'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _run_cycle(http_handler: HttpHandler, status_checks: int):
+    http_handler.get_status(max_attempts=var.REQUEST_RETRIES)
+    http_handler.reauthenticate().read()
+    for _ in range(status_checks):
+        http_handler.get_status()
+    http_handler.validate()
+    http_handler.initialise().read()
+
+
+def _measure(base_url: str, pool_size: int, cycles: int, status_checks: int, server: CountingTLSServer) -> (float, float):
+    inputs_handler = SimpleNamespace(valid_certificates=False)
+    http_handler = HttpHandler(
+        inputs_handler=inputs_handler,
+        base_url=base_url,
+        route_validate=var.ROUTE_VALIDATE,
+        route_tickle=var.ROUTE_TICKLE,
+        route_logout=var.ROUTE_LOGOUT,
+        route_reauthenticate=var.ROUTE_REAUTHENTICATE,
+        route_initialise=var.ROUTE_INITIALISE,
+        request_timeout=var.REQUEST_TIMEOUT,
+        pool_size=pool_size,
+    )
+
+    server.reset_handshakes()
+    start = time.perf_counter()
+    for _ in range(cycles):
+        _run_cycle(http_handler, status_checks)
+    elapsed = time.perf_counter() - start
+
+    return server.handshakes / cycles, elapsed / cycles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--status-checks', type=int, default=var.MAX_STATUS_CHECK_RETRIES)
+    parser.add_argument('--pool-size', type=int, default=max(var.HTTP_POOL_SIZE, 1))
+    args = parser.parse_args()
+
+    cert_path, key_path = generate_self_signed_cert()
+    server = CountingTLSServer(('localhost', 0), _GatewayStandIn, cert_path, key_path)
+    start_server(server)
+    base_url = f'https://localhost:{server.server_address[1]}'
+
+    requests_per_cycle = args.status_checks + 4
+    print(f'{args.cycles} cycles, {requests_per_cycle} requests per cycle')
+    print(f'{"transport":<22}{"handshakes/cycle":>18}{"ms/cycle":>12}')
+    for label, pool_size in [('urlopen (no pool)', 0), (f'pool (size={args.pool_size})', args.pool_size)]:
+        handshakes, seconds = _measure(base_url, pool_size, args.cycles, args.status_checks, server)
+        print(f'{label:<22}{handshakes:>18.1f}{seconds * 1000:>12.1f}')
+
+    server.shutdown()
+    os.remove(cert_path)
+    os.remove(key_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Compares the time, CPU and memory needed to log in with the HTTP and the Selenium login engines, logging into a local stand-in of the login page.
+
+The Selenium engine requires Chrome and the Chrome Driver to be installed, pass --skip-selenium to measure the HTTP engine only.
+
+Usage:
+    python support/benchmarks/bench_login_engine.py [--runs 5] [--driver-path /usr/bin/chromedriver] [--skip-selenium]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_browser_pool import _login_handler
+from login_page_standin import start_login_page_standin
+from ibeam.src import var
+from ibeam.src.login.driver import DriverFactory
+from ibeam.src.login.http_login import LOGIN_ENGINE_HTTP, LOGIN_ENGINE_SELENIUM
+
+
+class _ProcessTreeSampler():
+    """Samples the RSS and CPU time of this process and all its children, such as Chrome and the Chrome Driver."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self.peak_rss = 0
+        self._cpu = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = 0
+        for process in [self.process] + self.process.children(recursive=True):
+            try:
+                rss += process.memory_info().rss
+                cpu_times = process.cpu_times()
+                self._cpu[process.pid] = cpu_times.user + cpu_times.system
+            except psutil.Error:
+                pass
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._sample()
+        self.baseline_rss = self.peak_rss
+        self.baseline_cpu = dict(self._cpu)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    @property
+    def cpu(self) -> float:
+        return sum(cpu - self.baseline_cpu.get(pid, 0) for pid, cpu in self._cpu.items())
+
+
+def _measure(login_handler, runs: int) -> dict:
+    durations = []
+    with _ProcessTreeSampler() as sampler:
+        for _ in range(runs):
+            start = time.perf_counter()
+            success, _ = login_handler.login()
+            durations.append(time.perf_counter() - start)
+            if not success:
+                raise RuntimeError('Login to the stand-in failed')
+
+    return {
+        'median': statistics.median(durations),
+        'cpu': sampler.cpu / runs,
+        'rss': (sampler.peak_rss - sampler.baseline_rss) / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--driver-path', default=var.CHROME_DRIVER_PATH if var.CHROME_DRIVER_PATH is not var.UNDEFINED else 'chromedriver')
+    parser.add_argument('--skip-selenium', action='store_true')
+    args = parser.parse_args()
+
+    server = start_login_page_standin()
+    base_url = f'https://localhost:{server.server_address[1]}'
+    driver_factory = DriverFactory(driver_path=args.driver_path, name='bench')
+
+    engines = [LOGIN_ENGINE_HTTP] if args.skip_selenium else [LOGIN_ENGINE_HTTP, LOGIN_ENGINE_SELENIUM]
+    results = {}
+    try:
+        for engine in engines:
+            login_handler = _login_handler(base_url, driver_factory)
+            login_handler.login_engine = engine
+            results[engine] = _measure(login_handler, args.runs)
+    finally:
+        server.shutdown()
+
+    print(f'{args.runs} logins per engine')
+    print(f'{"engine":<12}{"median s":>10}{"cpu s":>10}{"peak rss MB":>14}')
+    for engine, result in results.items():
+        print(f'{engine:<12}{result["median"]:>10.3f}{result["cpu"]:>10.3f}{result["rss"]:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
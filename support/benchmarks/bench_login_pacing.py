@@ -0,0 +1,92 @@
+"""
+Compares the seconds spent waiting in the login flow with the former fixed sleeps and with the readiness conditions and learned presubmit buffer that replace them.
+
+The client side race of the login page is modelled by a form that needs a random number of seconds after the fields are filled in before it accepts a submission: submitting earlier fails with 'Invalid username password combination'. Each policy logs in repeatedly and the seconds waited before submitting and the failed attempts are counted. The fixed sleeps of the other login steps are added per scenario, set against the measured time the readiness conditions take to pass.
+
+The readiness times default to those of the login page stand-in. Measure them for a real browser with bench_login_steps.py --engine selenium.
+
+Usage:
+    python support/benchmarks/bench_login_pacing.py [--logins 200] [--race-mean 0.5] [--readiness 0.05]
+"""
+import argparse
+import logging
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from ibeam.src import var
+from ibeam.src.login.pacing import PresubmitBuffer
+
+# fixed sleeps of the login steps before they were replaced with readiness conditions, in seconds
+FIXED_SLEEPS = {
+    'credentials': {'after attempt': 1},
+    'paper account': {'paper toggle': 3, 'after attempt': 1},
+    'paper account error': {'paper toggle': 3, 'after submit': 3, 'after attempt': 1},
+    'ib key promo': {'promo': 3, 'after attempt': 1},
+}
+
+
+class _BlindBuffer():
+    """The former policy: grow by 5 seconds after a failure, reset to the minimum after a success."""
+
+    def __init__(self, min_buffer: int, max_buffer: int):
+        self.min_buffer = min_buffer
+        self.max_buffer = max_buffer
+        self.value = min_buffer
+
+    def record_success(self):
+        self.value = self.min_buffer
+
+    def record_failure(self):
+        self.value = min(self.value + 5, self.max_buffer)
+
+
+def _simulate(buffer, logins: int, race_mean: float, max_attempts: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    waited, failures = 0, 0
+    for _ in range(logins):
+        race = rng.expovariate(1 / race_mean) if race_mean > 0 else 0
+        for _ in range(max_attempts):
+            waited += buffer.value
+            if buffer.value >= race:
+                buffer.record_success()
+                break
+            failures += 1
+            buffer.record_failure()
+    return {'waited': waited / logins, 'failures': failures / logins, 'final': buffer.value}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--race-mean', type=float, default=0.5, help='Mean number of seconds the form needs before accepting a submission.')
+    parser.add_argument('--readiness', type=float, default=0.05, help='Number of seconds a readiness condition takes to pass.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.getLogger('ibeam').setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        policies = {
+            'fixed (blind growth)': _BlindBuffer(var.MIN_PRESUBMIT_BUFFER, var.MAX_PRESUBMIT_BUFFER),
+            'learned': PresubmitBuffer(var.MIN_PRESUBMIT_BUFFER, var.MAX_PRESUBMIT_BUFFER, var.PRESUBMIT_BUFFER_FLOOR, history_path=str(Path(tmp_dir) / 'presubmit_buffer.json')),
+        }
+        results = {name: _simulate(buffer, args.logins, args.race_mean, var.MAX_IMMEDIATE_ATTEMPTS, args.seed) for name, buffer in policies.items()}
+
+    print(f'presubmit buffer, {args.logins} logins, race mean {args.race_mean} s')
+    for name, result in results.items():
+        print(f'  {name:<24}{result["waited"]:>8.2f} s per login{result["failures"]:>8.3f} failures per login, final buffer {result["final"]} s')
+
+    print(f'other login steps, readiness conditions passing in {args.readiness} s')
+    for scenario, sleeps in FIXED_SLEEPS.items():
+        fixed = sum(sleeps.values())
+        conditions = args.readiness * sum(1 for step in sleeps if step != 'after attempt')
+        print(f'  {scenario:<24}{fixed:>8.2f} s fixed{conditions:>8.2f} s conditions{fixed - conditions:>8.2f} s saved')
+
+
+if __name__ == '__main__':
+    main()
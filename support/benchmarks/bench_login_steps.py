@@ -0,0 +1,108 @@
+"""
+Measures the wall time of every login step and of the whole login, logging into the local login page stand-in.
+
+Every website version is logged into through every scenario of screens. The notification scenario needs a browser, so the HTTP engine falls back to Selenium for it.
+
+Requires Chrome and the Chrome Driver to be installed for the selenium engine, whose waits for the webpage use either DOM wait engine: compare them with --dom-wait-engine poll and --dom-wait-engine observer.
+
+Usage:
+    python support/benchmarks/bench_login_steps.py [--engine http] [--dom-wait-engine poll] [--runs 5] [--driver-path /usr/bin/chromedriver]
+"""
+import argparse
+import logging
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_browser_pool import _login_handler
+from login_page_standin import LoginPageHandler, start_login_page_standin, VERSIONS, PAPER_ERROR, TWO_FA_SELECT, TWO_FA, NOTIFICATION, IB_KEY_PROMO
+from ibeam.src import var
+from ibeam.src.login.dom_probe import DOM_WAIT_ENGINES
+from ibeam.src.login.driver import DriverFactory
+from ibeam.src.login.http_login import LOGIN_ENGINE_HTTP, LOGIN_ENGINE_SELENIUM
+from ibeam.src.metrics import LOGIN_STEP_DURATION
+from ibeam.src.two_fa_handlers.two_fa_handler import TwoFaHandler
+
+SCENARIOS = {
+    'credentials': [],
+    'paper toggle': [PAPER_ERROR],
+    '2fa code': [TWO_FA],
+    '2fa select and code': [TWO_FA_SELECT, TWO_FA],
+    '2fa notification': [NOTIFICATION],
+    'ib key promo': [TWO_FA, IB_KEY_PROMO],
+}
+
+
+class _StandinTwoFaHandler(TwoFaHandler):
+    def get_two_fa_code(self, driver) -> str:
+        return LoginPageHandler.two_fa_code
+
+    def __str__(self):
+        return '_StandinTwoFaHandler()'
+
+
+def _step_deltas(before: dict, after: dict) -> dict:
+    deltas = {}
+    for key, (count, total) in after.items():
+        previous_count, previous_total = before.get(key, (0, 0))
+        if count > previous_count:
+            deltas[key[0]] = total - previous_total
+    return deltas
+
+
+def _measure(login_handler, runs: int) -> (list, dict):
+    durations, steps = [], defaultdict(list)
+    for _ in range(runs):
+        before = LOGIN_STEP_DURATION.totals()
+        start = time.perf_counter()
+        success, _ = login_handler.login()
+        durations.append(time.perf_counter() - start)
+        if not success:
+            raise RuntimeError('Login to the stand-in failed')
+        for step, duration in _step_deltas(before, LOGIN_STEP_DURATION.totals()).items():
+            steps[step].append(duration)
+    return durations, steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--engine', choices=[LOGIN_ENGINE_HTTP, LOGIN_ENGINE_SELENIUM], default=LOGIN_ENGINE_HTTP)
+    parser.add_argument('--dom-wait-engine', choices=DOM_WAIT_ENGINES, default=var.DOM_WAIT_ENGINE)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--driver-path', default=var.CHROME_DRIVER_PATH if var.CHROME_DRIVER_PATH is not var.UNDEFINED else 'chromedriver')
+    parser.add_argument('--scenario', nargs='*', choices=list(SCENARIOS), default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    logging.getLogger('ibeam').setLevel(logging.WARNING)
+
+    server = start_login_page_standin()
+    base_url = f'https://localhost:{server.server_address[1]}'
+    driver_factory = DriverFactory(driver_path=args.driver_path, name='bench')
+
+    login_handler = _login_handler(base_url, driver_factory)
+    login_handler.login_engine = args.engine
+    login_handler.dom_wait_engine = args.dom_wait_engine
+    login_handler.two_fa_handler = _StandinTwoFaHandler(outputs_dir=login_handler.outputs_dir)
+
+    try:
+        for version in VERSIONS:
+            LoginPageHandler.version = version
+            for name in args.scenario:
+                LoginPageHandler.scenario = SCENARIOS[name]
+                durations, steps = _measure(login_handler, args.runs)
+
+                print(f'version {version}, {name}, {args.engine} engine, {args.dom_wait_engine} DOM wait, {args.runs} runs')
+                for step, step_durations in steps.items():
+                    print(f'  {step:<32}{statistics.mean(step_durations):>8.3f} s')
+                print(f'  {"total":<32}{statistics.mean(durations):>8.3f} s')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Measures IBeam's authentication and maintenance against the local Gateway simulator:
+
+* time-to-authenticated, when logging in from no session and when reauthenticating an existing session
+* requests and TLS handshakes per maintenance cycle of a healthy session
+* CPU time per maintenance cycle, extrapolated to CPU per hour for the fixed and the adaptive schedule
+
+Logging in uses the HTTP login engine against the simulator's login page, so no browser is required.
+
+Usage:
+    python support/benchmarks/bench_maintenance.py [--cycles 50] [--pool-size 2]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_browser_pool import _login_handler
+from gateway_simulator import GatewaySimulator, start_gateway_simulator, NO_SESSION, UNAUTHENTICATED, AUTHENTICATED
+from ibeam.src import var
+from ibeam.src.gateway_client import GatewayClient
+from ibeam.src.handlers.http_handler import HttpHandler
+from ibeam.src.handlers.strategy_handler import StrategyHandler
+from ibeam.src.login.http_login import LOGIN_ENGINE_HTTP
+from ibeam.src.maintenance_schedule import AdaptiveSchedule
+
+
+class _SimulatedProcessHandler():
+    """Stands in for the ProcessHandler, the simulated Gateway runs in this process."""
+
+    def __init__(self, simulator: GatewaySimulator):
+        self.simulator = simulator
+
+    def start_gateway(self):
+        return [os.getpid()]
+
+    def kill_gateway(self) -> bool:
+        self.simulator.set_state(NO_SESSION)
+        return True
+
+
+def _build(simulator: GatewaySimulator, base_url: str, pool_size: int, authentication_strategy: str) -> (HttpHandler, StrategyHandler, GatewayClient):
+    http_handler = HttpHandler(
+        inputs_handler=SimpleNamespace(valid_certificates=False),
+        base_url=base_url,
+        route_validate=var.ROUTE_VALIDATE,
+        route_tickle=var.ROUTE_TICKLE,
+        route_logout=var.ROUTE_LOGOUT,
+        route_reauthenticate=var.ROUTE_REAUTHENTICATE,
+        route_initialise=var.ROUTE_INITIALISE,
+        request_timeout=var.REQUEST_TIMEOUT,
+        pool_size=pool_size,
+    )
+    login_handler = _login_handler(base_url, driver_factory=None)
+    login_handler.login_engine = LOGIN_ENGINE_HTTP
+    process_handler = _SimulatedProcessHandler(simulator)
+    strategy_handler = StrategyHandler(
+        http_handler=http_handler,
+        login_handler=login_handler,
+        process_handler=process_handler,
+        authentication_strategy=authentication_strategy,
+        reauthenticate_wait=var.REAUTHENTICATE_WAIT,
+        restart_failed_sessions=var.RESTART_FAILED_SESSIONS,
+        restart_wait=var.RESTART_WAIT,
+        max_reauthenticate_retries=var.MAX_REAUTHENTICATE_RETRIES,
+        max_status_check_retries=var.MAX_STATUS_CHECK_RETRIES,
+    )
+    client = GatewayClient(
+        http_handler=http_handler,
+        strategy_handler=strategy_handler,
+        process_handler=process_handler,
+        health_server_port=0,
+        spawn_new_processes=False,
+        maintenance_interval=var.MAINTENANCE_INTERVAL,
+        request_retries=var.REQUEST_RETRIES,
+    )
+    return http_handler, strategy_handler, client
+
+
+def _time_to_authenticated(simulator: GatewaySimulator, strategy_handler: StrategyHandler, initial_state: str) -> float:
+    simulator.set_state(initial_state)
+    start = time.perf_counter()
+    success, _, _ = strategy_handler.try_authenticating()
+    duration = time.perf_counter() - start
+    if not success:
+        raise RuntimeError(f'Authenticating from "{initial_state}" failed')
+    return duration
+
+
+def _maintenance_cycles(simulator: GatewaySimulator, server, client: GatewayClient, cycles: int) -> dict:
+    simulator.set_state(AUTHENTICATED)
+    simulator.reset_requests()
+    server.reset_handshakes()
+
+    schedule = AdaptiveSchedule(base_interval=var.MAINTENANCE_INTERVAL, min_interval=var.MIN_MAINTENANCE_INTERVAL, max_interval=var.MAX_MAINTENANCE_INTERVAL)
+    cpu, intervals = [], []
+    for _ in range(cycles):
+        start = time.thread_time()
+        success, status, latency = client._maintenance()
+        cpu.append(time.thread_time() - start)
+        schedule.record(success, status, latency)
+        intervals.append(schedule.next_interval())
+
+    cpu_per_cycle = statistics.mean(cpu)
+    return {
+        'requests': simulator.total_requests / cycles,
+        'routes': {route: count / cycles for route, count in simulator.requests.items()},
+        'handshakes': server.handshakes / cycles,
+        'cpu_per_cycle': cpu_per_cycle,
+        'cpu_per_hour_fixed': cpu_per_cycle * 3600 / var.MAINTENANCE_INTERVAL,
+        'cpu_per_hour_adaptive': cpu_per_cycle * 3600 / statistics.mean(intervals),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--cycles', type=int, default=50)
+    parser.add_argument('--pool-size', type=int, default=var.HTTP_POOL_SIZE)
+    args = parser.parse_args()
+
+    logging.getLogger('ibeam').setLevel(logging.WARNING)
+
+    simulator = GatewaySimulator()
+    server = start_gateway_simulator(simulator)
+    clients = []
+    try:
+        authentication = {}
+        for strategy in ['A', 'B']:
+            _, strategy_handler, client = _build(simulator, server.base_url, args.pool_size, strategy)
+            clients.append(client)
+            authentication[f'login (strategy {strategy})'] = _time_to_authenticated(simulator, strategy_handler, NO_SESSION)
+            authentication[f'reauthenticate (strategy {strategy})'] = _time_to_authenticated(simulator, strategy_handler, UNAUTHENTICATED)
+
+        maintenance = _maintenance_cycles(simulator, server, clients[-1], args.cycles)
+    finally:
+        for client in clients:
+            client.shutdown()
+        server.shutdown()
+
+    print('time-to-authenticated')
+    for scenario, duration in authentication.items():
+        print(f'  {scenario:<30}{duration:>8.2f} s')
+
+    print(f'maintenance of a healthy session, {args.cycles} cycles, pool size {args.pool_size}')
+    print(f'  {"requests per cycle":<30}{maintenance["requests"]:>8.2f}')
+    for route, count in sorted(maintenance['routes'].items()):
+        print(f'    {route:<28}{count:>8.2f}')
+    print(f'  {"TLS handshakes per cycle":<30}{maintenance["handshakes"]:>8.2f}')
+    print(f'  {"CPU per cycle":<30}{maintenance["cpu_per_cycle"] * 1000:>8.2f} ms')
+    print(f'  {"CPU per hour (fixed)":<30}{maintenance["cpu_per_hour_fixed"]:>8.3f} s')
+    print(f'  {"CPU per hour (adaptive)":<30}{maintenance["cpu_per_hour_adaptive"]:>8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
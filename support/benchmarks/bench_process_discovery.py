@@ -0,0 +1,93 @@
+"""
+Compares finding the Gateway process by scanning all processes against finding it through the processes tracked by ProcessHandler, on a synthetic process table of a busy host.
+
+A real process stands in for the Gateway, while the rest of the process table is made of synthetic processes counting the calls made to them.
+
+Usage:
+    python support/benchmarks/bench_process_discovery.py [--processes 2000] [--runs 50]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from ibeam.src import var
+from ibeam.src.handlers.process_handler import ProcessHandler, _find_procs_by_name
+
+
+class _SyntheticProcess():
+    calls = 0
+
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def cmdline(self):
+        _SyntheticProcess.calls += 1
+        return ['/usr/bin/python3', '-m', f'worker_{self.pid}']
+
+    def exe(self):
+        _SyntheticProcess.calls += 1
+        return '/usr/bin/python3'
+
+
+def _measure(find: callable, runs: int) -> (float, float):
+    _SyntheticProcess.calls = 0
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        processes = find()
+        durations.append(time.perf_counter() - start)
+        if len(processes) != 1:
+            raise RuntimeError(f'Expected to find the Gateway stand-in, found: {processes}')
+    return statistics.median(durations), _SyntheticProcess.calls / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--processes', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    match = var.GATEWAY_PROCESS_MATCH
+    gateway = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(600)', match])
+    table = [_SyntheticProcess(100000 + i) for i in range(args.processes)] + [psutil.Process(gateway.pid)]
+
+    try:
+        with mock.patch('psutil.process_iter', side_effect=lambda: iter(table)), \
+                tempfile.TemporaryDirectory() as directory:
+            handler = ProcessHandler(
+                gateway_dir=directory,
+                gateway_process_match=match,
+                gateway_startup=10,
+                verify_connection=lambda: SimpleNamespace(running=True),
+                pid_file=str(Path(directory) / 'gateway.pid'),
+            )
+            # the first lookup scans once and starts tracking the Gateway
+            handler.find_processes()
+
+            results = {
+                'full scan': _measure(lambda: _find_procs_by_name(match), args.runs),
+                'tracked': _measure(handler.find_processes, args.runs),
+                'adopted': _measure(lambda: ProcessHandler(directory, match, 10, None, pid_file=handler.pid_file).find_processes(), args.runs),
+            }
+    finally:
+        gateway.kill()
+        gateway.wait()
+
+    print(f'{args.processes + 1} processes, {args.runs} lookups per mode')
+    print(f'{"mode":<12}{"median ms":>12}{"process calls":>16}')
+    for mode, (duration, calls) in results.items():
+        print(f'{mode:<12}{duration * 1000:>12.3f}{calls:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compares the page load time, transferred bytes and Chrome memory of the login browser for every resource blocking preset, loading a local stand-in of the login page which references images, a font, a first-party script and a third-party analytics script.
+
+Requires Chrome and the Chrome Driver to be installed.
+
+Usage:
+    python support/benchmarks/bench_resource_blocking.py --driver-path /usr/bin/chromedriver [--runs 5]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_login_engine import _ProcessTreeSampler
+from login_page_standin import start_login_page_standin
+from ibeam.src import var
+from ibeam.src.login.driver import DriverFactory, start_up_browser, shut_down_browser
+from ibeam.src.login.resource_blocking import ResourceBlocking, PRESETS
+
+_TRANSFERRED_SCRIPT = "return performance.getEntriesByType('resource').reduce((total, entry) => total + entry.transferSize, 0) + performance.getEntriesByType('navigation')[0].transferSize;"
+
+
+def _measure(driver_path: str, url: str, preset: str, runs: int) -> dict:
+    driver_factory = DriverFactory(driver_path=driver_path, name='bench', resource_blocking=ResourceBlocking(preset=preset, base_url=url))
+    load_times, transferred, rss = [], [], []
+    for _ in range(runs):
+        with _ProcessTreeSampler() as sampler:
+            driver, display = start_up_browser(driver_factory)
+            try:
+                start = time.perf_counter()
+                driver.get(url)
+                load_times.append(time.perf_counter() - start)
+                transferred.append(driver.execute_script(_TRANSFERRED_SCRIPT))
+            finally:
+                shut_down_browser(driver, display)
+        rss.append(sampler.peak_rss - sampler.baseline_rss)
+
+    return {
+        'load': statistics.mean(load_times),
+        'transferred': statistics.mean(transferred),
+        'rss': statistics.mean(rss),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--driver-path', default=var.CHROME_DRIVER_PATH if var.CHROME_DRIVER_PATH is not var.UNDEFINED else 'chromedriver')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_login_page_standin()
+    url = f'https://localhost:{server.server_address[1]}/sso/Login'
+    try:
+        results = {preset: _measure(args.driver_path, url, preset, args.runs) for preset in PRESETS}
+    finally:
+        server.shutdown()
+
+    print(f'login page load, {args.runs} runs')
+    for preset, result in results.items():
+        print(f'  {preset:<10}{result["load"]:>8.3f} s{result["transferred"] / 1024:>10.1f} KiB{result["rss"] / 1024 ** 2:>10.1f} MiB peak RSS')
+
+
+if __name__ == '__main__':
+    main()
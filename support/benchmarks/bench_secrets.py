@@ -0,0 +1,96 @@
+"""
+Compares the requests, connections and wall time of reading the credentials from GCP Secret Manager on every login attempt, against a local metadata server and Secret Manager stand-in.
+
+The reference requests a new access token and then the secret for each of the account, password and key, one after another, as the SecretsHandler did before caching. It is compared with the SecretsHandler reading the credentials one after another, fetching them at once and caching them.
+
+Usage:
+    python support/benchmarks/bench_secrets.py [--attempts 10] [--latency 0.02] [--ttl 300]
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from gcp_standin import GcpStandIn, GcpStandInServer, start_gcp_standin
+from ibeam.src.handlers.secrets_handler import SecretsHandler, SECRETS_SOURCE_GCP_SECRETS
+
+_ENVIRON = {
+    'IBEAM_ACCOUNT': 'account/versions/latest',
+    'IBEAM_PASSWORD': 'password/versions/latest',
+    'IBEAM_KEY': 'key/versions/latest',
+}
+
+
+def _read_uncached(server: GcpStandInServer) -> tuple:
+    values = []
+    for name in _ENVIRON:
+        token = requests.get(server.metadata_url, headers={'Metadata-Flavor': 'Google'}).json()['access_token']
+        response = requests.get(server.secrets_url + '/' + _ENVIRON[name] + ':access', headers={'authorization': f'Bearer {token}'})
+        values.append(base64.b64decode(response.json()['payload']['data']).decode('utf-8'))
+    return tuple(values)
+
+
+def _new_secrets_handler(server: GcpStandInServer, ttl: float) -> SecretsHandler:
+    return SecretsHandler(
+        secrets_source=SECRETS_SOURCE_GCP_SECRETS,
+        gcp_base_url=server.secrets_url,
+        gcp_metadata_url=server.metadata_url,
+        secrets_cache_ttl=ttl,
+    )
+
+
+def _measure(server: GcpStandInServer, read: callable, attempts: int) -> dict:
+    standin = server.standin
+    standin.reset_counts()
+    start = time.perf_counter()
+    for _ in range(attempts):
+        assert read() == (standin.secrets['account'], standin.secrets['password'], standin.secrets['key'])
+    elapsed = time.perf_counter() - start
+    return {
+        'tokens': standin.requests['token'] / attempts,
+        'secrets': standin.requests['secret'] / attempts,
+        'connections': standin.connections / attempts,
+        'concurrency': standin.max_in_flight,
+        'ms': elapsed / attempts * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--attempts', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds each request to the stand-in takes.')
+    parser.add_argument('--ttl', type=float, default=300, help='IBEAM_SECRETS_CACHE_TTL of the cached run.')
+    args = parser.parse_args()
+
+    server = start_gcp_standin(GcpStandIn(latency=args.latency))
+
+    sequential = _new_secrets_handler(server, ttl=0)
+    concurrent = _new_secrets_handler(server, ttl=0)
+    cached = _new_secrets_handler(server, ttl=args.ttl)
+    runs = [
+        ('new token per read', lambda: _read_uncached(server)),
+        ('cached token', lambda: (sequential.account, sequential.password, sequential.key)),
+        ('concurrent', concurrent.credentials),
+        (f'cached (ttl={args.ttl:g}s)', cached.credentials),
+    ]
+
+    print(f'{args.attempts} login attempts, {args.latency * 1000:.0f} ms per request')
+    print(f'{"reads":<24}{"tokens/att":>12}{"secrets/att":>13}{"conns/att":>11}{"concurrency":>13}{"ms/att":>10}')
+    with mock.patch.dict(os.environ, _ENVIRON):
+        for label, read in runs:
+            result = _measure(server, read, args.attempts)
+            print(f'{label:<24}{result["tokens"]:>12.1f}{result["secrets"]:>13.1f}{result["connections"]:>11.1f}{result["concurrency"]:>13}{result["ms"]:>10.1f}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares time-to-authenticated after a Gateway restart when logging in anew and when resuming the session stored by the previous login, against the local Gateway simulator.
+
+A restart is simulated by dropping the simulator's session, while the SSO session of the login page stand-in lasts. Logging in goes through the 2FA code screen. The HTTP engine needs no browser but is a lower bound of the login path: pass --engine selenium to log in with Chrome, as IBeam does by default.
+
+Usage:
+    python support/benchmarks/bench_session_resume.py [--runs 5] [--strategy B] [--engine http] [--driver-path /usr/bin/chromedriver]
+"""
+import argparse
+import logging
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cryptography.fernet import Fernet
+
+from bench_login_steps import _StandinTwoFaHandler
+from bench_maintenance import _build, _time_to_authenticated
+from gateway_simulator import GatewaySimulator, start_gateway_simulator, NO_SESSION
+from login_page_standin import LoginPageHandler, TWO_FA
+from ibeam.src import var
+from ibeam.src.login.driver import DriverFactory
+from ibeam.src.login.http_login import LOGIN_ENGINE_HTTP, LOGIN_ENGINE_SELENIUM
+from ibeam.src.login.session_store import SessionStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--strategy', choices=['A', 'B'], default=var.AUTHENTICATION_STRATEGY)
+    parser.add_argument('--engine', choices=[LOGIN_ENGINE_HTTP, LOGIN_ENGINE_SELENIUM], default=LOGIN_ENGINE_HTTP)
+    parser.add_argument('--driver-path', default=var.CHROME_DRIVER_PATH if var.CHROME_DRIVER_PATH is not var.UNDEFINED else 'chromedriver')
+    args = parser.parse_args()
+
+    logging.getLogger('ibeam').setLevel(logging.WARNING)
+
+    LoginPageHandler.scenario = [TWO_FA]
+    simulator = GatewaySimulator()
+    server = start_gateway_simulator(simulator)
+    results = {'login': [], 'resume': []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, strategy_handler, client = _build(simulator, server.base_url, var.HTTP_POOL_SIZE, args.strategy)
+        login_handler = strategy_handler.login_handler
+        login_handler.login_engine = args.engine
+        login_handler.driver_factory = DriverFactory(driver_path=args.driver_path, name='bench')
+        login_handler.two_fa_handler = _StandinTwoFaHandler(outputs_dir=login_handler.outputs_dir)
+        session_store = SessionStore(str(Path(tmp_dir) / 'session.enc'), Fernet.generate_key().decode())
+        login_handler.session_store = session_store
+        try:
+            for _ in range(args.runs):
+                # the stored session expired, so a login is needed
+                session_store.clear()
+                LoginPageHandler.sso_tokens.clear()
+                results['login'].append(_time_to_authenticated(simulator, strategy_handler, NO_SESSION))
+
+                # the Gateway restarted while the session stored by the login above lasts
+                results['resume'].append(_time_to_authenticated(simulator, strategy_handler, NO_SESSION))
+        finally:
+            client.shutdown()
+            server.shutdown()
+
+    print(f'time-to-authenticated after a Gateway restart, strategy {args.strategy}, {args.engine} engine, {args.runs} runs')
+    for path, durations in results.items():
+        print(f'  {path:<12}{statistics.mean(durations):>8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
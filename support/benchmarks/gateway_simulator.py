@@ -0,0 +1,242 @@
+"""
+A local stand-in for the Client Portal Gateway, serving the routes IBeam uses over HTTPS on localhost.
+
+The session state is scriptable: it can be set directly, follow a script of states consumed one per tickle, and transition on reauthenticate, logout, ssodh/init and logging in through the login page stand-in. Every request is counted per route, so that the work done by IBeam can be measured without an IBKR account.
+
+Usage:
+    python support/benchmarks/gateway_simulator.py [--port 5000] [--state no_session]
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from local_tls import CountingTLSServer, generate_self_signed_cert, start_server
+from login_page_standin import LoginPageHandler
+
+NO_SESSION = 'no_session'
+UNAUTHENTICATED = 'unauthenticated'
+AUTHENTICATED = 'authenticated'
+COMPETING = 'competing'
+DISCONNECTED = 'disconnected'
+SERVER_ERROR = 'server_error'
+UNAVAILABLE = 'unavailable'
+
+STATES = [NO_SESSION, UNAUTHENTICATED, AUTHENTICATED, COMPETING, DISCONNECTED, SERVER_ERROR, UNAVAILABLE]
+
+ROUTE_TICKLE = '/v1/api/tickle'
+ROUTE_VALIDATE = '/v1/portal/sso/validate'
+ROUTE_REAUTHENTICATE = '/v1/portal/iserver/reauthenticate'
+ROUTE_LOGOUT = '/v1/api/logout'
+ROUTE_INITIALISE = '/v1/api/iserver/auth/ssodh/init'
+ROUTE_LOGIN = '/sso/Login'
+
+
+class GatewaySimulator():
+    """
+    Session state of the simulated Gateway.
+
+    Attributes:
+        state (str): Current session state, one of STATES.
+        script (list): States to switch to, one per tickle, before the state settles on the last one.
+        transitions (dict): States to switch to when the 'reauthenticate', 'logout', 'initialise' and 'login' routes are called. None keeps the current state.
+        sso_lifetime (float): Number of seconds an authenticated session lasts, reported as ssoExpires.
+        latency (float): Number of seconds every request is delayed by.
+    """
+
+    def __init__(self,
+                 state: str = NO_SESSION,
+                 script: list = None,
+                 transitions: dict = None,
+                 sso_lifetime: float = 600,
+                 latency: float = 0,
+                 ):
+        self.state = state
+        self.script = list(script or [])
+        self.transitions = {
+            'reauthenticate': AUTHENTICATED,
+            'logout': UNAUTHENTICATED,
+            'initialise': None,
+            'login': AUTHENTICATED,
+        }
+        self.transitions.update(transitions or {})
+        self.sso_lifetime = sso_lifetime
+        self.latency = latency
+
+        self.requests = Counter()
+        self.session_id = uuid.uuid4().hex
+        self._authenticated_at = time.time()
+        self._lock = threading.Lock()
+
+    def set_state(self, state: str):
+        if state not in STATES:
+            raise ValueError(f'Unknown session state: {state}')
+        with self._lock:
+            if state == AUTHENTICATED and self.state != AUTHENTICATED:
+                self._authenticated_at = time.time()
+            if self.state == NO_SESSION and state != NO_SESSION:
+                self.session_id = uuid.uuid4().hex
+            self.state = state
+
+    def on(self, event: str):
+        """Applies the transition of the event. Only logging in can create a session."""
+        state = self.transitions.get(event)
+        if state is not None and (self.state != NO_SESSION or event == 'login'):
+            self.set_state(state)
+
+    def tickle_state(self) -> str:
+        """Advances the script by one step and returns the state to report."""
+        with self._lock:
+            script_state = self.script.pop(0) if self.script else None
+        if script_state is not None:
+            self.set_state(script_state)
+        return self.state
+
+    def sso_expires(self) -> int:
+        remaining = self.sso_lifetime - (time.time() - self._authenticated_at)
+        return max(int(remaining * 1000), 0)
+
+    def tickle_response(self, state: str) -> dict:
+        return {
+            'session': self.session_id,
+            'ssoExpires': self.sso_expires() if state == AUTHENTICATED else 0,
+            'collission': False,
+            'userId': 1,
+            'hmds': {'error': 'no bridge'},
+            'iserver': {
+                'authStatus': {
+                    'authenticated': state in [AUTHENTICATED, COMPETING],
+                    'competing': state == COMPETING,
+                    'connected': state != DISCONNECTED,
+                    'message': '',
+                    'MAC': '00:00:00:00:00:00',
+                    'serverInfo': {'serverName': 'Simulator', 'serverVersion': 'Build 0.0.0'},
+                }
+            },
+        }
+
+    def count(self, route: str):
+        with self._lock:
+            self.requests[route] += 1
+
+    def reset_requests(self):
+        with self._lock:
+            self.requests = Counter()
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+
+class GatewaySimulatorHandler(LoginPageHandler):
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def simulator(self) -> GatewaySimulator:
+        return self.server.simulator
+
+    def on_login_success(self):
+        self.simulator.on('login')
+
+    def _send_json(self, code: int, content: dict):
+        body = json.dumps(content).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_state(self, state: str) -> bool:
+        """Responds as the Gateway does when the IBKR servers are unhappy, returning whether it did."""
+        if state == SERVER_ERROR:
+            self.send_error(500, 'Internal Server Error')
+            return True
+        if state == UNAVAILABLE:
+            self.send_error(503, 'Service Unavailable')
+            return True
+        return False
+
+    def _handle(self, method: str):
+        path = urllib.parse.urlsplit(self.path).path
+        self.simulator.count(path)
+        if self.simulator.latency:
+            time.sleep(self.simulator.latency)
+
+        if path.startswith(ROUTE_LOGIN):
+            self.handle_login(method)
+            return
+
+        if path == ROUTE_TICKLE:
+            state = self.simulator.tickle_state()
+            if self._send_error_state(state):
+                return
+            if state == NO_SESSION:
+                return self.send_error(401, 'Unauthorized')
+            return self._send_json(200, self.simulator.tickle_response(state))
+
+        state = self.simulator.state
+        if self._send_error_state(state):
+            return
+
+        if path == ROUTE_VALIDATE:
+            if state == NO_SESSION:
+                return self.send_error(401, 'Unauthorized')
+            return self._send_json(200, {'RESULT': state in [AUTHENTICATED, COMPETING], 'USER_ID': 1, 'EXPIRES': self.simulator.sso_expires()})
+        elif path == ROUTE_REAUTHENTICATE:
+            self.simulator.on('reauthenticate')
+            return self._send_json(200, {'message': 'triggered'})
+        elif path == ROUTE_LOGOUT:
+            self.simulator.on('logout')
+            return self._send_json(200, {'status': True})
+        elif path == ROUTE_INITIALISE:
+            self.simulator.on('initialise')
+            state = self.simulator.state
+            return self._send_json(200, {'authenticated': state == AUTHENTICATED, 'connected': state != DISCONNECTED, 'competing': state == COMPETING})
+        elif path == '/':
+            return self._send_html('<html><body>Client Portal Gateway simulator</body></html>')
+
+        self.send_error(404, 'Not Found')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class GatewaySimulatorServer(CountingTLSServer):
+    def __init__(self, server_address, simulator: GatewaySimulator, cert_path: str, key_path: str):
+        super().__init__(server_address, GatewaySimulatorHandler, cert_path, key_path)
+        self.simulator = simulator
+
+    @property
+    def base_url(self) -> str:
+        return f'https://localhost:{self.server_address[1]}'
+
+
+def start_gateway_simulator(simulator: GatewaySimulator = None, port: int = 0) -> GatewaySimulatorServer:
+    cert_path, key_path = generate_self_signed_cert()
+    server = GatewaySimulatorServer(('localhost', port), simulator or GatewaySimulator(), cert_path, key_path)
+    start_server(server)
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in of the Client Portal Gateway.')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--state', choices=STATES, default=NO_SESSION)
+    args = parser.parse_args()
+    server = start_gateway_simulator(GatewaySimulator(state=args.state), args.port)
+    print(f'Gateway simulator running at {server.base_url}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
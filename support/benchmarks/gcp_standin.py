@@ -0,0 +1,152 @@
+"""
+A local stand-in for the GCP metadata server and Secret Manager, serving the routes the SecretsHandler uses over HTTP on localhost.
+
+Every request is delayed by a configurable latency, as the real services are some way off, and is counted per kind along with the connections opened and the most requests served at once.
+
+Usage:
+    python support/benchmarks/gcp_standin.py [--port 8080] [--latency 0.02]
+"""
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_ROUTE = '/computeMetadata/v1/instance/service-accounts/default/token'
+SECRETS_ROUTE = '/v1/projects/bench/secrets'
+
+_SECRET_PATTERN = re.compile(rf'^{re.escape(SECRETS_ROUTE)}/([^/]+)/versions/[^/:]+:access$')
+
+DEFAULT_SECRETS = {'account': 'bench-user', 'password': 'bench-password', 'key': 'bench-key'}
+
+
+class GcpStandIn():
+    def __init__(self, secrets: dict = None, latency: float = 0, expires_in: int = 3599):
+        self.secrets = dict(DEFAULT_SECRETS if secrets is None else secrets)
+        self.latency = latency
+        self.expires_in = expires_in
+
+        self.requests = Counter()
+        self.connections = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._tokens = set()
+        self._lock = threading.Lock()
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+            self.connections = 0
+            self.max_in_flight = 0
+
+    def _enter(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def new_token(self) -> dict:
+        with self._lock:
+            token = f'token-{len(self._tokens) + 1}'
+            self._tokens.add(token)
+        return {'access_token': token, 'expires_in': self.expires_in, 'token_type': 'Bearer'}
+
+    def is_authorized(self, authorization: str) -> bool:
+        with self._lock:
+            return authorization is not None and authorization.removeprefix('Bearer ') in self._tokens
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and body are written apart, which would wait on delayed ACKs of kept-alive connections
+    disable_nagle_algorithm = True
+    server: 'GcpStandInServer'
+
+    def _send_json(self, code: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        standin = self.server.standin
+        secret = _SECRET_PATTERN.match(self.path)
+        kind = 'token' if self.path == TOKEN_ROUTE else 'secret' if secret else 'unknown'
+
+        standin._enter(kind)
+        try:
+            time.sleep(standin.latency)
+            if kind == 'token':
+                if self.headers.get('Metadata-Flavor') != 'Google':
+                    return self._send_json(403, {'error': 'Missing Metadata-Flavor header'})
+                return self._send_json(200, standin.new_token())
+
+            if kind == 'secret':
+                if not standin.is_authorized(self.headers.get('authorization')):
+                    return self._send_json(401, {'error': {'code': 401, 'status': 'UNAUTHENTICATED'}})
+                value = standin.secrets.get(secret.group(1))
+                if value is None:
+                    return self._send_json(404, {'error': {'code': 404, 'status': 'NOT_FOUND'}})
+                data = base64.b64encode(value.encode()).decode()
+                return self._send_json(200, {'name': secret.group(1), 'payload': {'data': data}})
+
+            self._send_json(404, {})
+        finally:
+            standin._exit()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GcpStandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, standin: GcpStandIn):
+        self.standin = standin
+        super().__init__(server_address, _Handler)
+
+    def process_request(self, request, client_address):
+        with self.standin._lock:
+            self.standin.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    @property
+    def metadata_url(self) -> str:
+        return self.base_url + TOKEN_ROUTE
+
+    @property
+    def secrets_url(self) -> str:
+        return self.base_url + SECRETS_ROUTE
+
+
+def start_gcp_standin(standin: GcpStandIn = None, port: int = 0) -> GcpStandInServer:
+    server = GcpStandInServer(('127.0.0.1', port), standin or GcpStandIn())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in of the GCP metadata server and Secret Manager.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+    server = start_gcp_standin(GcpStandIn(latency=args.latency), args.port)
+    print(f'GCP stand-in running, metadata at {server.metadata_url}, secrets at {server.secrets_url}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
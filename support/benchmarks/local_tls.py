@@ -0,0 +1,84 @@
+"""
+Helpers for running local HTTPS stand-ins used by the benchmarks.
+"""
+import datetime
+import os
+import socket
+import ssl
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+
+def generate_self_signed_cert(directory: str = None, hostname: str = 'localhost') -> (str, str):
+    """Generates a self-signed certificate and key, returning their file paths."""
+    directory = directory if directory is not None else tempfile.mkdtemp(prefix='ibeam-bench-')
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+            .sign(key, hashes.SHA256()))
+
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()))
+
+    return cert_path, key_path
+
+
+class CountingTLSServer(ThreadingHTTPServer):
+    """A threading HTTPS server that counts the TLS handshakes it completes."""
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, cert_path: str, key_path: str):
+        super().__init__(server_address, handler_class)
+        self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.ssl_context.load_cert_chain(cert_path, key_path)
+        self.handshakes = 0
+        self._handshakes_lock = threading.Lock()
+
+    def get_request(self):
+        sock, address = self.socket.accept()
+        # the handshake is performed in the handler thread to not block accepting further connections
+        return sock, address
+
+    def finish_request(self, request, client_address):
+        # responses are written in several chunks, don't let Nagle's algorithm delay them
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            request = self.ssl_context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+
+        with self._handshakes_lock:
+            self.handshakes += 1
+
+        super().finish_request(request, client_address)
+
+    def reset_handshakes(self):
+        with self._handshakes_lock:
+            self.handshakes = 0
+
+
+def start_server(server: ThreadingHTTPServer) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
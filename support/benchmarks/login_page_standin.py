@@ -0,0 +1,221 @@
+"""
+A local stand-in for the IBKR login page served by the Gateway at /sso/Login.
+
+It serves the HTML fixtures in login_pages/ for both website versions known to LoginHandler, so that login latency can be measured without an IBKR account. After the credentials are submitted, the stand-in walks through a scenario of screens: 2FA method select, 2FA code, notification, IB Key promo and the paper account error, before displaying the success screen.
+
+The success screen sets an SSO cookie. Loading the login page with a valid SSO cookie displays the success screen straight away, as IBKR does while its SSO session lasts.
+
+Usage:
+    python support/benchmarks/login_page_standin.py [--port 5000] [--version 2] [--scenario two_fa_select two_fa ib_key_promo]
+"""
+import argparse
+import http.cookies
+import string
+import sys
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from local_tls import CountingTLSServer, generate_self_signed_cert, start_server
+
+PAGES_DIR = Path(__file__).parent / 'login_pages'
+
+VERSIONS = {
+    1: {'user_name_field': 'user_name', 'error_class': 'alert alert-danger margin-top-10'},
+    2: {'user_name_field': 'username', 'error_class': 'xyz-errormessage'},
+}
+
+PAPER_ERROR = 'paper_error'
+TWO_FA_SELECT = 'two_fa_select'
+TWO_FA = 'two_fa'
+NOTIFICATION = 'notification'
+IB_KEY_PROMO = 'ib_key_promo'
+SUCCESS = 'success'
+
+SCREENS = [PAPER_ERROR, TWO_FA_SELECT, TWO_FA, NOTIFICATION, IB_KEY_PROMO]
+
+# sizes in bytes of the static assets the login page references, standing in for the images, fonts and scripts of the real one
+ASSET_SIZES = {
+    'favicon.ico': 5_000,
+    'logo.png': 40_000,
+    'banner.jpg': 250_000,
+    'brand.woff2': 80_000,
+    'login.js': 2_000,
+}
+
+INVALID_CREDENTIALS_ERROR = 'Invalid username password combination'
+SSO_COOKIE = 'XYZAB'
+
+PAPER_ACCOUNT_ERROR = 'You have selected the Live Account Mode, but the specified user is a Paper Trading user. Please select the correct Login mode.'
+
+
+def _template(name: str) -> string.Template:
+    return string.Template((PAGES_DIR / f'{name}.html').read_text())
+
+
+_TEMPLATES = {name: _template(name) for name in ['login', TWO_FA_SELECT, TWO_FA, NOTIFICATION, IB_KEY_PROMO, SUCCESS]}
+
+
+def render_login_page(version: int, error: str = '', step: str = 'login') -> str:
+    return _TEMPLATES['login'].substitute(
+        VERSIONS[version],
+        error=error,
+        error_style='' if error else 'display: none',
+        step=step,
+    )
+
+
+class LoginPageHandler(BaseHTTPRequestHandler):
+    """
+    Serves the login flow. The class attributes configure it:
+
+    Attributes:
+        account (str): Expected account name.
+        password (str): Expected password.
+        two_fa_code (str): Expected 2FA code.
+        version (int): Website version to render, one of VERSIONS.
+        scenario (list): Screens displayed after correct credentials are submitted, in order, from SCREENS.
+        approval_delay (int): Number of seconds after which the notification screen is approved.
+        sso_tokens (set): Values of the SSO cookies that are still valid. Clear it to expire the SSO sessions.
+    """
+    protocol_version = 'HTTP/1.1'
+    account = 'standin'
+    password = 'standin'
+    two_fa_code = '123456'
+    version = 2
+    scenario = []
+    approval_delay = 1
+    sso_tokens = set()
+
+    def _send_html(self, html: str):
+        body = html.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        for cookie in self._cookies_to_set:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_asset(self, name: str):
+        if name not in ASSET_SIZES:
+            return self.send_error(404)
+        # whitespace keeps the script valid
+        body = (b' ' if name.endswith('.js') else b'\0') * ASSET_SIZES[name]
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _screen(self, screen: str) -> str:
+        if screen == PAPER_ERROR:
+            return render_login_page(self.version, PAPER_ACCOUNT_ERROR, step=PAPER_ERROR)
+        if screen == SUCCESS:
+            token = uuid.uuid4().hex
+            self.sso_tokens.add(token)
+            self._cookies_to_set.append(f'{SSO_COOKIE}={token}; Path=/; Secure; HttpOnly')
+            self.on_login_success()
+        return _TEMPLATES[screen].substitute(approval_delay=self.approval_delay)
+
+    def _next_screen(self, after: str = None) -> str:
+        """Returns the screen following 'after' in the scenario, skipping the paper error."""
+        scenario = [screen for screen in self.scenario if screen != PAPER_ERROR]
+        index = scenario.index(after) + 1 if after in scenario else 0
+        return scenario[index] if index < len(scenario) else SUCCESS
+
+    def _has_sso_session(self) -> bool:
+        cookies = http.cookies.SimpleCookie(self.headers.get('Cookie', ''))
+        return SSO_COOKIE in cookies and cookies[SSO_COOKIE].value in self.sso_tokens
+
+    def on_login_success(self):
+        """Called when the success screen is displayed."""
+
+    def handle_login(self, method: str) -> bool:
+        """Handles the login routes, returning False if the path isn't one of them."""
+        path = urllib.parse.urlsplit(self.path).path
+        if not path.startswith('/sso/Login'):
+            return False
+
+        self._cookies_to_set = []
+
+        if method == 'GET':
+            if path.startswith('/sso/Login/assets/'):
+                self._send_asset(path.rsplit('/', 1)[-1])
+                return True
+            if path == '/sso/Login/promo-skip':
+                html = self._screen(self._next_screen(IB_KEY_PROMO))
+            elif path == '/sso/Login/notification-approved':
+                html = self._screen(self._next_screen(NOTIFICATION))
+            elif path == '/sso/Login/notification-resend':
+                html = self._screen(NOTIFICATION)
+            elif self._has_sso_session():
+                self.on_login_success()
+                html = _TEMPLATES[SUCCESS].substitute()
+            else:
+                html = render_login_page(self.version)
+            self._send_html(html)
+            return True
+
+        length = int(self.headers.get('Content-Length', 0))
+        form = {key: values[0] for key, values in urllib.parse.parse_qs(self.rfile.read(length).decode()).items()}
+        step = form.get('step', 'login')
+
+        if step in ['login', PAPER_ERROR]:
+            if form.get(VERSIONS[self.version]['user_name_field']) != self.account or form.get('password') != self.password:
+                html = render_login_page(self.version, INVALID_CREDENTIALS_ERROR)
+            elif PAPER_ERROR in self.scenario and 'paper' not in form:
+                html = self._screen(PAPER_ERROR)
+            else:
+                html = self._screen(self._next_screen())
+        elif step == TWO_FA_SELECT:
+            html = self._screen(self._next_screen(TWO_FA_SELECT))
+        elif step == TWO_FA:
+            if form.get('code') != self.two_fa_code:
+                html = render_login_page(self.version, 'failed')
+            else:
+                html = self._screen(self._next_screen(TWO_FA))
+        else:
+            self.send_error(400)
+            return True
+
+        self._send_html(html)
+        return True
+
+    def do_GET(self):
+        if not self.handle_login('GET'):
+            self.send_error(404)
+
+    def do_POST(self):
+        if not self.handle_login('POST'):
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_login_page_standin(port: int = 0) -> CountingTLSServer:
+    cert_path, key_path = generate_self_signed_cert()
+    server = CountingTLSServer(('localhost', port), LoginPageHandler, cert_path, key_path)
+    start_server(server)
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in of the IBKR login page.')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--version', type=int, choices=list(VERSIONS), default=2)
+    parser.add_argument('--scenario', nargs='*', choices=SCREENS, default=[])
+    args = parser.parse_args()
+    LoginPageHandler.version = args.version
+    LoginPageHandler.scenario = args.scenario
+    server = start_login_page_standin(args.port)
+    print(f'Login page stand-in running at https://localhost:{server.server_address[1]}/sso/Login')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,148 @@
+"""
+Tests for ibeam.src.handlers.async_http_handler and ibeam.src.handlers.async_strategy_handler
+"""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from ibeam.src import var
+from ibeam.src.handlers.async_http_handler import AsyncHttpHandler
+from ibeam.src.handlers.async_strategy_handler import AsyncStrategyHandler
+from ibeam.src.handlers.http_handler import Status
+from ibeam.src.handlers.strategy_handler import strategy_A_outcome, strategy_B_action, AUTHENTICATED, NOT_AUTHENTICATED, COMPETING, FAILED, \
+    LOG_IN, REAUTHENTICATE, LOGOUT_AND_REAUTHENTICATE
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    authenticated = True
+
+    def do_POST(self):
+        if self.path.startswith(var.ROUTE_TICKLE):
+            body = json.dumps({
+                'session': 'abc', 'ssoExpires': 5000,
+                'iserver': {'authStatus': {'authenticated': self.authenticated, 'competing': False, 'connected': True}},
+            }).encode()
+        else:
+            body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _http_handler(base_url) -> AsyncHttpHandler:
+    return AsyncHttpHandler(
+        inputs_handler=SimpleNamespace(valid_certificates=False),
+        base_url=base_url,
+        route_validate=var.ROUTE_VALIDATE,
+        route_tickle=var.ROUTE_TICKLE,
+        route_logout=var.ROUTE_LOGOUT,
+        route_reauthenticate=var.ROUTE_REAUTHENTICATE,
+        route_initialise=var.ROUTE_INITIALISE,
+        request_timeout=5,
+        pool_size=2,
+    )
+
+
+def test_get_status(server):
+    http_handler = _http_handler(f'http://127.0.0.1:{server.server_address[1]}')
+
+    async def run():
+        return await asyncio.gather(*[http_handler.get_status() for _ in range(5)])
+
+    statuses = asyncio.run(run())
+
+    for status in statuses:
+        assert status.parsed_status == 'AUTHENTICATED'
+        assert status.session_id == 'abc'
+        assert status.expires == 5000
+
+
+def test_connection_refused_classified(server):
+    port = server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+    status = asyncio.run(_http_handler(f'http://127.0.0.1:{port}').get_status())
+
+    assert status.running
+    assert not status.session
+
+
+def test_try_authenticating_many_sessions(server):
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    strategy_handlers = [AsyncStrategyHandler(
+        http_handler=_http_handler(base_url),
+        login_handler=None,
+        process_handler=None,
+        authentication_strategy='B',
+        reauthenticate_wait=0,
+        restart_failed_sessions=False,
+        restart_wait=0,
+        max_reauthenticate_retries=1,
+        max_status_check_retries=1,
+    ) for _ in range(3)]
+
+    async def run():
+        return await asyncio.gather(*[handler.try_authenticating() for handler in strategy_handlers])
+
+    for success, shutdown, status in asyncio.run(run()):
+        assert success
+        assert not shutdown
+        assert status.authenticated
+
+
+def test_try_authenticating_logs_in_with_strategy_a(server, monkeypatch):
+    monkeypatch.setattr(_Handler, 'authenticated', False)
+    login_handler = SimpleNamespace(login=mock.MagicMock(side_effect=lambda: setattr(_Handler, 'authenticated', True) or (True, False)))
+    strategy_handler = AsyncStrategyHandler(
+        http_handler=_http_handler(f'http://127.0.0.1:{server.server_address[1]}'),
+        login_handler=login_handler,
+        process_handler=None,
+        authentication_strategy='A',
+        reauthenticate_wait=0,
+        restart_failed_sessions=False,
+        restart_wait=0,
+        max_reauthenticate_retries=1,
+        max_status_check_retries=1,
+    )
+
+    with mock.patch('ibeam.src.handlers.async_strategy_handler.asyncio.sleep') as sleep:
+        success, shutdown, status = asyncio.run(strategy_handler.try_authenticating())
+
+    assert success and not shutdown and status.authenticated
+    login_handler.login.assert_called_once()
+    sleep.assert_called_once_with(3)
+
+
+@pytest.mark.parametrize('status, outcome, action', [
+    (Status(running=True, session=True, connected=True, authenticated=True), AUTHENTICATED, REAUTHENTICATE),
+    (Status(running=True, session=True, connected=True), NOT_AUTHENTICATED, REAUTHENTICATE),
+    (Status(running=True, session=True, connected=True, authenticated=True, competing=True), COMPETING, LOGOUT_AND_REAUTHENTICATE),
+    (Status(running=True), FAILED, LOG_IN),
+])
+def test_shared_strategy_decisions(status, outcome, action):
+    assert strategy_A_outcome(status) == outcome
+    assert strategy_B_action(status) == action
@@ -0,0 +1,76 @@
+"""
+Tests for ibeam.src.login.browser_pool
+"""
+from unittest import mock
+
+from ibeam.src.login.browser_pool import BrowserPool
+
+
+class _FakeFactory():
+    name = 'test'
+
+    def __init__(self):
+        self.drivers = []
+
+    def new_driver(self, name=None):
+        driver = mock.MagicMock(name=f'driver-{len(self.drivers)}')
+        driver.execute_script.return_value = 1
+        driver.window_handles = ['main']
+        self.drivers.append(driver)
+        return driver
+
+
+def _pool(**kwargs) -> (BrowserPool, _FakeFactory):
+    factory = _FakeFactory()
+    params = dict(size=1, max_age=3600, max_uses=3)
+    params.update(kwargs)
+    pool = BrowserPool(factory, **params)
+    pool._ensure_display = lambda: None
+    # warm synchronously, so that acquiring right after a recycle doesn't race the background warm
+    pool.warm_in_background = pool.warm
+    return pool, factory
+
+
+def test_browser_reused_and_reset():
+    pool, factory = _pool()
+    pool.warm()
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert first is second
+    assert len(factory.drivers) == 1
+    first.execute_cdp_cmd.assert_any_call('Network.clearBrowserCookies', {})
+
+
+def test_browser_recycled_after_max_uses():
+    pool, factory = _pool(max_uses=2)
+
+    for _ in range(3):
+        pool.release(pool.acquire())
+
+    assert len(factory.drivers) == 2
+    factory.drivers[0].quit.assert_called_once()
+
+
+def test_unhealthy_browser_replaced():
+    pool, factory = _pool()
+    pool.warm()
+    factory.drivers[0].execute_script.side_effect = RuntimeError('chrome not reachable')
+
+    driver = pool.acquire()
+
+    assert driver is factory.drivers[1]
+    factory.drivers[0].quit.assert_called_once()
+
+
+def test_unpooled_browser_when_all_in_use():
+    pool, factory = _pool()
+
+    pooled = pool.acquire()
+    unpooled = pool.acquire()
+    assert pooled is not unpooled
+
+    pool.release(unpooled)
+    unpooled.quit.assert_called_once()
@@ -0,0 +1,117 @@
+"""
+Tests for ibeam.src.login.dom_probe
+"""
+import time
+from unittest import mock
+
+import pytest
+from selenium.common import InvalidSessionIdException, JavascriptException, StaleElementReferenceException, TimeoutException
+from selenium.webdriver.remote.webelement import WebElement
+
+from ibeam.src.handlers.login_handler import _wait_and_identify_trigger
+from ibeam.src.login.dom_probe import dom_probe, dom_observe, ProbedElement, DOM_WAIT_OBSERVER
+from ibeam.src.login.targets import Target, has_text, is_visible, is_clickable
+
+
+def _targets() -> dict:
+    return {
+        'SUCCESS': Target('TAG_NAME@@Client login succeeds'),
+        'TWO_FA_INPUT': Target('ID@@xyz-field-bronze-response'),
+        'TWO_FA_SELECT': Target('ID@@xyz-field-bronze-response'),
+        'ERROR': Target('CSS_SELECTOR@@.xyz-errormessage'),
+    }
+
+
+def test_single_script_identifies_target_sharing_identifier():
+    targets = _targets()
+    driver = mock.MagicMock()
+    driver.execute_script.return_value = [1, WebElement(driver, 'element-1'), 'IB Key']
+
+    trigger, target = _wait_and_identify_trigger(targets, driver, 1, has_text(targets['SUCCESS']), is_visible(targets['TWO_FA_SELECT'], tag='select'), is_visible(targets['ERROR']))
+
+    assert target is targets['TWO_FA_SELECT']
+    assert isinstance(trigger, ProbedElement) and trigger.id == 'element-1'
+    assert trigger.text == 'IB Key'
+    assert driver.execute_script.call_count == 1
+    assert driver.execute_script.call_args.args[1] == [
+        ['TAG_NAME', 'Client login succeeds', 'text', None],
+        ['ID', 'xyz-field-bronze-response', 'visible', 'select'],
+        ['CSS_SELECTOR', '.xyz-errormessage', 'visible', None],
+    ]
+
+
+@pytest.mark.parametrize('tag_name, matches', [('input', False), ('select', True)])
+def test_select_condition_skips_input_sharing_identifier(tag_name, matches):
+    targets = _targets()
+    driver = mock.MagicMock()
+    element = mock.MagicMock(spec=WebElement, tag_name=tag_name)
+    element.is_displayed.return_value = True
+    driver.find_element.return_value = element
+
+    condition = is_visible(targets['TWO_FA_SELECT'], tag='select')
+
+    assert condition(driver) == (element if matches else False)
+    driver.find_element.assert_called_once_with('id', 'xyz-field-bronze-response')
+
+
+def test_probe_without_match_or_failing_script():
+    targets = _targets()
+    driver = mock.MagicMock()
+    probe = dom_probe(is_clickable(targets['TWO_FA_INPUT']))
+
+    driver.execute_script.return_value = None
+    assert probe(driver) is False
+
+    driver.execute_script.side_effect = JavascriptException('document is not ready')
+    assert probe(driver) is False
+
+    driver.execute_script.side_effect = StaleElementReferenceException('element is not attached to the page document')
+    assert probe(driver) is False
+
+    driver.execute_script.side_effect = InvalidSessionIdException('invalid session id')
+    with pytest.raises(InvalidSessionIdException):
+        probe(driver)
+
+
+def test_observer_returns_once_notified_and_survives_navigation():
+    targets = _targets()
+    driver = mock.MagicMock()
+    driver.execute_async_script.side_effect = [
+        JavascriptException('javascript error: document unloaded while waiting for result'),
+        [0, WebElement(driver, 'element-0'), 'Client login succeeds'],
+    ]
+
+    trigger, target = _wait_and_identify_trigger(targets, driver, 5, has_text(targets['SUCCESS']), is_visible(targets['ERROR']), dom_wait_engine=DOM_WAIT_OBSERVER)
+
+    assert target is targets['SUCCESS']
+    assert trigger.id == 'element-0'
+    assert driver.execute_async_script.call_count == 2
+    assert driver.execute_script.call_count == 0
+    assert driver.execute_async_script.call_args.args[1] == [
+        ['TAG_NAME', 'Client login succeeds', 'text', None],
+        ['CSS_SELECTOR', '.xyz-errormessage', 'visible', None],
+    ]
+
+
+def test_observer_times_out():
+    targets = _targets()
+    driver = mock.MagicMock()
+    driver.execute_async_script.side_effect = lambda script, candidates, timeout_ms: time.sleep(timeout_ms / 1000)
+
+    with pytest.raises(TimeoutException):
+        dom_observe(driver, 0.2, is_visible(targets['ERROR']))
+
+    assert driver.execute_async_script.call_count == 1
+
+
+def test_observer_raises_for_lost_session_and_restores_script_timeout():
+    targets = _targets()
+    driver = mock.MagicMock()
+    driver.timeouts.script = 30
+    driver.execute_async_script.side_effect = InvalidSessionIdException('invalid session id')
+
+    with pytest.raises(InvalidSessionIdException):
+        dom_observe(driver, 5, is_visible(targets['ERROR']))
+
+    assert driver.execute_async_script.call_count == 1
+    assert driver.set_script_timeout.call_args.args == (30,)
@@ -1,251 +1,253 @@
 """
-Tests for ibeam.src.gateway_client
+Tests for ibeam.src.gateway_client, run against the local Gateway simulator.
 """
-import ibeam.src.var
-import os
-import pytest
-import random
-import socket
-import string
-import types
-
-from contextlib import closing
-
+import pickle
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
 from unittest import mock
 
-from ibeam.src.gateway_client import SECRETS_SOURCE_ENV
-from ibeam.src.gateway_client import SECRETS_SOURCE_FS
-from ibeam.src.gateway_client import GatewayClient
-from ibeam.src.secrets_handler import secret_value
-
+import pytest
 
-def next_free_port(host='127.0.0.1'):
-    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
-        sock.bind((host, 0))
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        return sock.getsockname()[1]
+sys.path.insert(0, str(Path(__file__).parents[3] / 'support' / 'benchmarks'))
 
+from gateway_simulator import GatewaySimulator, start_gateway_simulator, AUTHENTICATED, UNAUTHENTICATED, NO_SESSION, ROUTE_TICKLE, ROUTE_VALIDATE, ROUTE_LOGOUT, ROUTE_REAUTHENTICATE
+from ibeam import ibeam_starter
+from ibeam.config import Config
+from ibeam.src import log_context, var
+from ibeam.src.gateway_client import GatewayClient
+from ibeam.src.handlers.http_handler import HttpHandler, Status
+from ibeam.src.handlers.process_handler import BlueGreenProcessHandler, GATEWAY_RESTART_BLUE_GREEN
+from ibeam.src.handlers.strategy_handler import StrategyHandler
+
+
+@pytest.fixture
+def simulator():
+    simulator = GatewaySimulator()
+    server = start_gateway_simulator(simulator)
+    simulator.base_url = server.base_url
+    yield simulator
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(simulator):
+    http_handler = HttpHandler(
+        inputs_handler=SimpleNamespace(valid_certificates=False),
+        base_url=simulator.base_url,
+        route_validate=var.ROUTE_VALIDATE,
+        route_tickle=var.ROUTE_TICKLE,
+        route_logout=var.ROUTE_LOGOUT,
+        route_reauthenticate=var.ROUTE_REAUTHENTICATE,
+        route_initialise=var.ROUTE_INITIALISE,
+        request_timeout=5,
+        pool_size=2,
+    )
+    login_handler = mock.MagicMock()
+    login_handler.session_store = None
+    login_handler.login.side_effect = lambda: (simulator.set_state(AUTHENTICATED), (True, False))[1]
+    process_handler = mock.MagicMock()
+    strategy_handler = StrategyHandler(
+        http_handler=http_handler,
+        login_handler=login_handler,
+        process_handler=process_handler,
+        authentication_strategy='B',
+        reauthenticate_wait=0,
+        restart_failed_sessions=False,
+        restart_wait=0,
+        max_reauthenticate_retries=2,
+        max_status_check_retries=2,
+    )
+    client = GatewayClient(
+        http_handler=http_handler,
+        strategy_handler=strategy_handler,
+        process_handler=process_handler,
+        health_server_port=0,
+        spawn_new_processes=False,
+        maintenance_interval=60,
+        request_retries=1,
+    )
+    yield client
+    client.shutdown()
+
+
+def test_maintenance_of_authenticated_session(simulator, client):
+    simulator.set_state(AUTHENTICATED)
+
+    success, status, latency = client._maintenance()
+
+    assert success
+    assert status.parsed_status == 'AUTHENTICATED'
+    assert latency is not None
+    assert simulator.requests == {ROUTE_TICKLE: 1, ROUTE_VALIDATE: 1}
+    client.strategy_handler.login_handler.login.assert_not_called()
+
+
+def test_maintenance_reauthenticates_existing_session(simulator, client):
+    simulator.set_state(UNAUTHENTICATED)
+
+    success, status, _ = client._maintenance()
+
+    assert success
+    assert simulator.requests[ROUTE_REAUTHENTICATE] == 1
+    client.strategy_handler.login_handler.login.assert_not_called()
+
+
+def test_maintenance_logs_in_without_session(simulator, client):
+    simulator.set_state(NO_SESSION)
+
+    success, status, _ = client._maintenance()
+
+    assert success
+    assert status.authenticated
+    client.strategy_handler.login_handler.login.assert_called_once()
+
+
+def test_maintenance_cycle_id_propagated_to_login(simulator, client):
+    contexts = []
+
+    def login():
+        contexts.append(log_context.current())
+        simulator.set_state(AUTHENTICATED)
+        return True, False
+
+    client.strategy_handler.login_handler.login.side_effect = login
+    for _ in range(2):
+        simulator.set_state(NO_SESSION)
+        client._maintenance()
+
+    assert [context['step'] for context in contexts] == ['authenticate', 'authenticate']
+    assert contexts[0]['cycle_id'] is not None
+    assert contexts[0]['cycle_id'] != contexts[1]['cycle_id']
+    assert log_context.current()['cycle_id'] is None
+
+
+def test_deactivate_logs_out_and_kills_gateway(simulator, client):
+    simulator.set_state(AUTHENTICATED)
+
+    assert client.on_deactivate()
+
+    assert simulator.requests[ROUTE_LOGOUT] == 1
+    assert simulator.state == UNAUTHENTICATED
+    client.process_handler.kill_gateway.assert_called_once()
+    assert client._maintenance() is None
+
+
+def test_blue_green_restart_authenticates_replacement_gateway(simulator, client):
+    # the running Gateway can't be reauthenticated
+    simulator.transitions['reauthenticate'] = None
+    simulator.set_state(UNAUTHENTICATED)
+
+    replacement = GatewaySimulator()
+    replacement_server = start_gateway_simulator(replacement)
+
+    def restart_gateway(logout):
+        logout()
+        client.http_handler.base_url = replacement_server.base_url
+        return True
 
-@mock.patch('ibeam.src.gateway_client.input')
-@mock.patch('ibeam.src.gateway_client.getpass')
-def test_init_prompt(mock_input, mock_getpass):
-    """
-    GatewayClient.__init__ test stdout/stdin prompts for
-    secrets.
-    """
+    client.strategy_handler.gateway_restart_mode = GATEWAY_RESTART_BLUE_GREEN
+    client.process_handler.restart_gateway.side_effect = restart_gateway
+    client.strategy_handler.login_handler.login.side_effect = lambda: (replacement.set_state(AUTHENTICATED), (True, False))[1]
+    try:
+        success, status, _ = client._maintenance()
+    finally:
+        replacement_server.shutdown()
+        replacement_server.server_close()
+
+    assert success
+    assert status.authenticated
+    assert simulator.requests[ROUTE_LOGOUT] == 1
+    assert client.get_base_url() == replacement_server.base_url
+    client.process_handler.kill_gateway.assert_not_called()
+
+
+def test_planned_refresh_logs_in_anew(simulator, client):
+    simulator.set_state(AUTHENTICATED)
+    client._refresh_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    success, status, _ = client._maintenance()
+
+    assert success
+    assert simulator.requests[ROUTE_LOGOUT] == 1
+    assert client.strategy_handler.login_handler.login.call_count == 1
+    assert simulator.requests[ROUTE_REAUTHENTICATE] == 0
+
+
+@pytest.mark.parametrize('success', [True, False])
+def test_only_successful_refresh_recorded(client, success):
+    client.refresh_planner = mock.MagicMock()
+    client.refresh_planner.plan.return_value = None
+    run_time = datetime.now(timezone.utc)
+    client._refresh_at = run_time - timedelta(seconds=1)
+
+    client._on_maintenance_executed(SimpleNamespace(job_id=client.job_id, retval=(success, Status(running=True), None), scheduled_run_time=run_time))
+
+    assert client.refresh_planner.record_refresh.call_count == (1 if success else 0)
+
+
+def test_built_client_pickled_for_spawned_maintenance(tmp_path):
+    cnf = Config(var.all_variables).with_variables(
+        GATEWAY_DIR=str(tmp_path),
+        INPUTS_DIR=str(tmp_path),
+        OUTPUTS_DIR=str(tmp_path),
+        CHROME_DRIVER_PATH='chromedriver',
+        HEALTH_SERVER_PORT=0,
+        SPAWN_NEW_PROCESSES=True,
+        SECRETS_SOURCE='gcp_secrets_manager',
+    )
+    client = ibeam_starter.new_gateway_client(cnf)
+    client.build_scheduler()
+    secrets_handler = client.strategy_handler.login_handler.secrets_handler
+    secrets_handler._token = 'token'
+    secrets_handler._cache['account/versions/1'] = ('secret', 0)
+    try:
+        # as the scheduler does to run the maintenance in a spawned process
+        maintenance = pickle.loads(pickle.dumps(client._maintenance))
+    finally:
+        client.shutdown()
+
+    spawned_secrets_handler = maintenance.__self__.strategy_handler.login_handler.secrets_handler
+    assert spawned_secrets_handler.secrets_source == 'gcp_secrets_manager'
+    assert spawned_secrets_handler._token is None
+    assert spawned_secrets_handler._cache == {}
+
+
+def test_parent_follows_blue_green_restart_of_spawned_maintenance(simulator, client, tmp_path):
+    replacement = GatewaySimulator()
+    replacement_server = start_gateway_simulator(replacement)
+    replacement.set_state(AUTHENTICATED)
+
+    def new_blue_green():
+        return BlueGreenProcessHandler(
+            process_handlers=[mock.MagicMock(), mock.MagicMock()],
+            base_urls=[simulator.base_url, replacement_server.base_url],
+            base_url_holders=[client.http_handler],
+            state_file=str(tmp_path / 'gateway_base_url'),
+        )
+
+    client.spawn_new_processes = True
+    client.process_handler = new_blue_green()
+    # the spawned maintenance works on its own copy, switching only its own slot
+    spawned = new_blue_green()
+    spawned.base_url_holders = [SimpleNamespace(base_url=None)]
+    try:
+        assert spawned.restart_gateway(logout=lambda: None)
+        client.http_handler.base_url = simulator.base_url
 
-    # record os.environ for later restoration
-    restore_env = dict(os.environ)
+        client._on_maintenance_executed(SimpleNamespace(job_id=client.job_id, retval=None, scheduled_run_time=datetime.now(timezone.utc)))
+        assert client.get_base_url() == replacement_server.base_url
+        assert client.status_snapshot.get().authenticated
 
-    try:
-        # clear os.environ for testing, restore at the end
-        os.environ.clear()
-
-        # call fake_input when input and getpass are called
-        def fake_input(s):
-            return 'fake ' + s + 'response'
-        mock_input.side_effect = fake_input
-        mock_getpass.side_effect = fake_input
-
-        # test init w/o any setup, which should write prompts to
-        # stdout and should read stdin for the values
-        ibeam.src.var.HEALTH_SERVER_PORT = next_free_port()
-
-        client = GatewayClient(
-            http_handler=None, inputs_handler=None, two_fa_handler=None)
-
-        try:
-            assert client.account == 'fake Account: response'
-            assert client.password == 'fake Password: response'
-            assert client.key == 'fake Key: response'
-        finally:
-            client.kill()
+        client.on_deactivate()
     finally:
-        os.environ.update(restore_env)
-
-def test_secret_value(tmpdir):
-    """
-    GatewayClient.secret_value tests both via init and when
-    directly called
-    """
-
-    # rnd generates a random value w/o any control
-    # characters
-    def rnd(n=16):
-        c = string.ascii_letters + string.digits + string.punctuation
-        return ''.join(random.choice(c) for i in range(n))
-
-    # basic tests to run include specifying the secrets
-    # directly, reading them from the environment, and
-    # reading them from the filesystem
-    tests = [
-        types.SimpleNamespace(
-            name='passed values',
-            source=None,
-            initial_env={
-            },
-        ),
-        types.SimpleNamespace(
-            name='env values w/o IBEAM_SECRETS_SOURCE',
-            source=SECRETS_SOURCE_ENV,
-            initial_env={
-            },
-        ),
-        types.SimpleNamespace(
-            name='env values w/ IBEAM_SECRETS_SOURCE',
-            source=SECRETS_SOURCE_ENV,
-            initial_env={
-                'IBEAM_SECRETS_SOURCE': SECRETS_SOURCE_ENV,
-            },
-        ),
-        types.SimpleNamespace(
-            name='fs values w/ IBEAM_SECRETS_SOURCE',
-            source=SECRETS_SOURCE_FS,
-            initial_env={
-                'IBEAM_SECRETS_SOURCE': SECRETS_SOURCE_FS,
-            },
-        ),
-    ]
-
-    # names of the secret values
-    ibeam_fields = [
-        'IBEAM_ACCOUNT',
-        'IBEAM_PASSWORD',
-        'IBEAM_KEY',
-    ]
-
-    for test in tests:
-        # GatewayClient init variables
-        account = None
-        password = None
-        key = None
-
-        # generate random secret values
-        for field in ibeam_fields:
-            setattr(test, field, rnd())
-
-        # setup test state based on the test.source value
-        if test.source is None:
-            # passing init values directly
-            account = test.IBEAM_ACCOUNT
-            password = test.IBEAM_PASSWORD
-            key = test.IBEAM_KEY
-
-            # noop test_setup
-            def test_setup(test, lappend='', rappend=''):
-                return mock.patch.dict(os.environ, {})
-
-        elif test.source == SECRETS_SOURCE_ENV:
-            # test_setup sets the source and copies the
-            # secrets into the environment
-            def test_setup(test, lappend='', rappend=''):
-                environ = test.initial_env
-                for field in ibeam_fields:
-                    environ[field] = lappend + getattr(test, field) + rappend
-                return mock.patch.dict(os.environ, environ)
-        elif test.source == SECRETS_SOURCE_FS:
-            # test_setup sets the source and copies the
-            # secrets onto the filesystem, setting the
-            # filepath into the environment
-            def test_setup(test, lappend='', rappend=''):
-                environ = test.initial_env
-                for field in ibeam_fields:
-                    environ[field] = os.path.join(tmpdir, field)
-                    with open(environ[field], 'wt', encoding='UTF-8') as fh:
-                        fh.write(lappend + getattr(test, field) + rappend)
-                return mock.patch.dict(os.environ, environ)
-        else:
-            pytest.fail(f'unhandled test test source: {test.source}')
-
-        # test via the GatewayClient init routine
-        with test_setup(test):
-
-            # test init which will call secret_value
-            ibeam.src.var.HEALTH_SERVER_PORT = next_free_port()
-
-            client = GatewayClient(
-                http_handler=None, inputs_handler=None, two_fa_handler=None,
-                account=account, password=password, key=key)
-
-            try:
-                # test the env or fs read values
-                assert client.account == test.IBEAM_ACCOUNT
-                assert client.password == test.IBEAM_PASSWORD
-                assert client.key == test.IBEAM_KEY
-
-                # test secret_value w/ left appended text
-                if test.source is not None:
-                    with test_setup(test, lappend='\t'):
-
-                        # read the test values from the fs
-                        if test.source == SECRETS_SOURCE_FS:
-                            fs_val = {}
-                            for field in ibeam_fields:
-                                with open(os.environ[field],
-                                          mode='rt', encoding='UTF-8') as fh:
-                                    fs_val[field] = fh.read()
-
-                        # test secret_value
-                        for field in ibeam_fields:
-                            val = secret_value(client.secrets_handler.secrets_source, client.encoding,
-                                               name=field, lstrip='\t')
-
-                            assert val == getattr(test, field)
-                            assert not val.startswith('\t')
-
-                            if test.source == SECRETS_SOURCE_ENV:
-                                assert os.environ[field].startswith('\t')
-                            elif test.source == SECRETS_SOURCE_FS:
-                                assert fs_val[field].startswith('\t')
-
-                # test secret_value w/ right appended text
-                if test.source is not None:
-                    with test_setup(test, rappend='\t'):
-
-                        # read the test values from the fs
-                        if test.source == SECRETS_SOURCE_FS:
-                            fs_val = {}
-                            for field in ibeam_fields:
-                                with open(os.environ[field],
-                                          mode='rt', encoding='UTF-8') as fh:
-                                    fs_val[field] = fh.read()
-
-                        # test secret_value
-                        for field in ibeam_fields:
-                            val = secret_value(client.secrets_handler.secrets_source, client.encoding,
-                                               name=field, rstrip='\t')
-
-                            assert val == getattr(test, field)
-                            assert not val.endswith('\t')
-
-                            if test.source == SECRETS_SOURCE_ENV:
-                                assert os.environ[field].endswith('\t')
-                            elif test.source == SECRETS_SOURCE_FS:
-                                assert fs_val[field].endswith('\t')
-
-                # test secret_value w/o any text that needs
-                # stripping
-                if test.source is not None:
-                    with test_setup(test):
-
-                        # read the test values from the fs
-                        if test.source == SECRETS_SOURCE_FS:
-                            fs_val = {}
-                            for field in ibeam_fields:
-                                with open(os.environ[field],
-                                          mode='rt', encoding='UTF-8') as fh:
-                                    fs_val[field] = fh.read()
-
-                        # test secret_value
-                        for field in ibeam_fields:
-                            val = secret_value(client.secrets_handler.secrets_source, client.encoding, name=field)
-
-                            assert val == getattr(test, field)
-
-                            if test.source == SECRETS_SOURCE_ENV:
-                                assert os.environ[field] == val
-                            elif test.source == SECRETS_SOURCE_FS:
-                                assert fs_val[field] == val
-
-            finally:
-                client.kill()
+        replacement_server.shutdown()
+        replacement_server.server_close()
+
+    # the live Gateway is the one logged out and killed
+    assert replacement.requests[ROUTE_LOGOUT] == 1
+    assert simulator.requests[ROUTE_LOGOUT] == 0
+    client.process_handler.process_handlers[1].kill_gateway.assert_called_once()
+    client.process_handler.process_handlers[0].kill_gateway.assert_not_called()
@@ -0,0 +1,49 @@
+"""
+Tests for ibeam.src.gateway_readiness
+"""
+import socket
+import time
+
+from ibeam.src.gateway_readiness import GatewayReadiness
+
+_PATTERN = r'(?i)\blistening\b'
+
+
+def _unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def test_log_line_written_after_mark(tmp_path):
+    log = tmp_path / 'gw.2023-01-01.log'
+    log.write_text('12:00:00.000 INFO main : Server listening on port 5000\n')
+    readiness = GatewayReadiness(str(tmp_path), f'https://localhost:{_unused_port()}', _PATTERN)
+
+    readiness.mark()
+    assert not readiness.log_ready()
+
+    with open(log, 'a') as f:
+        f.write('12:01:00.000 INFO main : Server liste')
+        f.flush()
+        assert not readiness.log_ready()
+        f.write('ning on port 5000\n')
+    assert readiness.log_ready()
+
+
+def test_socket_becoming_connectable(tmp_path):
+    with socket.socket() as server:
+        server.bind(('localhost', 0))
+        readiness = GatewayReadiness(str(tmp_path), f'https://localhost:{server.getsockname()[1]}', _PATTERN)
+        assert not readiness.socket_ready()
+
+        server.listen()
+        assert readiness.wait(time.time() + 1) == 'socket'
+
+
+def test_wait_gives_up_at_deadline(tmp_path):
+    readiness = GatewayReadiness(str(tmp_path / 'missing'), f'https://localhost:{_unused_port()}', _PATTERN, poll_interval=0.05)
+
+    start = time.time()
+    assert readiness.wait(start + 0.2) is None
+    assert time.time() - start < 1
@@ -0,0 +1,98 @@
+"""
+Tests for ibeam.src.health_server
+"""
+import json
+import socket
+import threading
+import urllib.request
+from contextlib import closing
+from urllib.error import HTTPError
+
+import pytest
+
+from ibeam.src.handlers.http_handler import Status
+from ibeam.src.health_server import new_health_server
+
+
+def next_free_port(host='127.0.0.1'):
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class _Callbacks():
+    def __init__(self):
+        self.deactivate_started = threading.Event()
+        self.release_deactivate = threading.Event()
+
+    def check_status(self):
+        return Status(running=True, session=True, connected=True, authenticated=True, session_id='abc')
+
+    def deactivate(self):
+        self.deactivate_started.set()
+        self.release_deactivate.wait(5)
+        return True
+
+
+@pytest.fixture
+def health_server():
+    callbacks = _Callbacks()
+    port = next_free_port()
+    server = new_health_server(port, callbacks.check_status, lambda: False, lambda: True, callbacks.deactivate)
+    yield f'http://127.0.0.1:{port}', callbacks
+    callbacks.release_deactivate.set()
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.status, response.read().decode()
+
+
+def test_status_json(health_server):
+    base_url, _ = health_server
+    code, body = _get(base_url + '/status')
+
+    status = json.loads(body)
+    assert code == 200
+    assert status['parsed_status'] == 'AUTHENTICATED'
+    assert status['session_id'] == 'abc'
+    assert status['shutdown'] is False
+    assert 'response' not in status
+
+
+def test_deactivate_does_not_block_probes(health_server):
+    base_url, callbacks = health_server
+
+    code, body = _get(base_url + '/deactivate')
+    operation = json.loads(body)
+    assert code == 202
+    assert operation['state'] == 'running'
+    assert callbacks.deactivate_started.wait(5)
+
+    # the probes are answered while deactivating is still in progress
+    assert _get(base_url + '/livez') == (200, 'OK')
+    assert _get(base_url + '/readyz') == (200, 'OK')
+
+    # deactivating again returns the same operation
+    assert json.loads(_get(base_url + '/deactivate')[1])['id'] == operation['id']
+
+    callbacks.release_deactivate.set()
+    code, body = _get(base_url + '/deactivate?wait=true')
+    assert code == 200
+
+    code, body = _get(base_url + f'/operations/{operation["id"]}')
+    assert json.loads(body)['state'] == 'succeeded'
+
+    with pytest.raises(HTTPError):
+        _get(base_url + '/operations/unknown')
+
+
+def test_metrics(health_server):
+    base_url, _ = health_server
+    code, body = _get(base_url + '/metrics')
+
+    assert code == 200
+    assert '# TYPE ibeam_http_request_duration_seconds histogram' in body
+    assert '# TYPE ibeam_status_total counter' in body
@@ -0,0 +1,191 @@
+"""
+Tests for ibeam.src.login.http_login
+"""
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[3] / 'support' / 'benchmarks'))
+
+from login_page_standin import LoginPageHandler, start_login_page_standin, VERSIONS, PAPER_ERROR, TWO_FA_SELECT, TWO_FA, IB_KEY_PROMO
+from ibeam.src.handlers.login_handler import LoginHandler
+from ibeam.src.login.http_login import HtmlPage, identify_page, LOGIN_ENGINE_HTTP
+from ibeam.src.login.targets import Target
+
+LOGIN_PAGE = """<html><body><div class="login">
+<form method="POST" action="/sso/Login">
+  <input type="hidden" name="loginType" value="1">
+  <div class="xyz-errormessage">{error}</div>
+  <input type="checkbox" id="toggle1" name="paper"><label for="toggle1">Paper</label>
+  <input type="text" name="username"><input type="password" name="password">
+  <button type="submit" class="btn btn-lg xyz-button-login">Login</button>
+</form></div></body></html>"""
+
+TWO_FA_PAGE = """<html><body><div id="twofactbase">
+<form method="POST" action="/sso/Login?step=2fa"><input id="xyz-field-bronze-response" name="code"></form>
+</div></body></html>"""
+
+SUCCESS_PAGE = """<html><body><pre>Client login succeeds</pre></body></html>"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    login_page = LOGIN_PAGE
+    two_fa_page = TWO_FA_PAGE
+    submitted = []
+
+    def _send(self, html: str):
+        body = html.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(self.login_page.format(error=''))
+
+    def do_POST(self):
+        form = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        _Handler.submitted.append(form)
+        if 'step=2fa' in self.path:
+            return self._send(SUCCESS_PAGE if form['code'] == ['123456'] else LOGIN_PAGE.format(error='failed'))
+        if form.get('password') == ['secret'] and form.get('loginType') == ['1']:
+            return self._send(self.two_fa_page)
+        self._send(LOGIN_PAGE.format(error='Invalid username password combination'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    _Handler.login_page = LOGIN_PAGE
+    _Handler.two_fa_page = TWO_FA_PAGE
+    _Handler.submitted = []
+    server = ThreadingHTTPServer(('localhost', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://localhost:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def _login_handler(base_url: str, password: str) -> LoginHandler:
+    targets = {
+        'PASSWORD': Target('NAME@@password'),
+        'SUBMIT': Target('CSS_SELECTOR@@.btn.btn-lg.xyz-button-login'),
+        'SUCCESS': Target('TAG_NAME@@Client login succeeds'),
+        'IBKEY_PROMO': Target('CLASS_NAME@@ibkey-promo-skip'),
+        'TWO_FA': Target('ID@@twofactbase'),
+        'TWO_FA_NOTIFICATION': Target('CLASS_NAME@@login-step-notification'),
+        'TWO_FA_INPUT': Target('ID@@xyz-field-bronze-response'),
+        'TWO_FA_SELECT': Target('ID@@xyz-field-bronze-response'),
+        'LIVE_PAPER_TOGGLE': Target('FOR@@label[for=toggle1]'),
+    }
+    two_fa_handler = mock.MagicMock()
+    two_fa_handler.get_two_fa_code.return_value = '123456'
+    return LoginHandler(
+        secrets_handler=SimpleNamespace(credentials=lambda: ('user', password, None)),
+        two_fa_handler=two_fa_handler,
+        driver_factory=None,
+        targets=targets,
+        base_url=base_url,
+        route_auth='/sso/Login',
+        two_fa_select_target='IB Key',
+        strict_two_fa_code=True,
+        max_immediate_attempts=1,
+        oauth_timeout=5,
+        max_presubmit_buffer=30,
+        min_presubmit_buffer=0,
+        max_failed_auth=5,
+        outputs_dir='',
+        login_engine=LOGIN_ENGINE_HTTP,
+    )
+
+
+def test_identify_page_skips_hidden_and_empty_elements():
+    page = HtmlPage('http://localhost/', '<div class="xyz-errormessage"></div><div id="twofactbase" style="display: none"><pre>x</pre></div>')
+    targets = {'ERROR': Target('CSS_SELECTOR@@.xyz-errormessage'), 'TWO_FA': Target('ID@@twofactbase')}
+
+    assert identify_page(page, targets, 'ERROR', 'TWO_FA') == (None, None)
+
+
+def test_login_with_two_fa(base_url):
+    login_handler = _login_handler(base_url, 'secret')
+
+    assert login_handler.login() == (True, False)
+    assert _Handler.submitted[0]['username'] == ['user']
+    assert login_handler.two_fa_handler.get_two_fa_code.call_args == mock.call(None)
+
+
+def test_login_error_counts_failed_attempt(base_url):
+    login_handler = _login_handler(base_url, 'wrong')
+
+    with mock.patch('ibeam.src.handlers.login_handler.time.sleep'):
+        assert login_handler.login() == (False, False)
+    assert login_handler.failed_attempts == 1
+
+
+def test_falls_back_to_browser_without_form(base_url):
+    _Handler.login_page = '<html><body><div id="app"></div><script src="/login.js"></script></body></html>'
+    login_handler = _login_handler(base_url, 'secret')
+
+    with mock.patch.object(login_handler, '_login_browser', return_value=(True, False)) as login_browser:
+        assert login_handler.login() == (True, False)
+    login_browser.assert_called_once()
+
+
+@pytest.mark.parametrize('two_fa_page', [
+    TWO_FA_PAGE.replace(' name="code"', ''),
+    '<html><body><div class="login-step-notification">Check your phone</div></body></html>',
+    '<html><body><div id="app"></div></body></html>',
+])
+def test_no_fallback_to_browser_once_credentials_submitted(base_url, two_fa_page):
+    _Handler.two_fa_page = two_fa_page
+    login_handler = _login_handler(base_url, 'secret')
+
+    with mock.patch.object(login_handler, '_login_browser') as login_browser:
+        assert login_handler.login() == (False, False)
+    login_browser.assert_not_called()
+    login_handler.two_fa_handler.get_two_fa_code.assert_not_called()
+    assert login_handler.failed_attempts == 1
+    assert len(_Handler.submitted) == 1
+
+
+def test_no_fallback_to_browser_when_reloading_after_error(base_url):
+    login_handler = _login_handler(base_url, 'wrong')
+    login_handler.max_immediate_attempts = 2
+    load_page_http = login_handler.load_page_http
+
+    def load_page_rendered_after_submission(*args):
+        if _Handler.submitted:
+            _Handler.login_page = '<html><body><div id="app"></div></body></html>'
+        return load_page_http(*args)
+
+    with mock.patch.object(login_handler, 'load_page_http', side_effect=load_page_rendered_after_submission), \
+            mock.patch.object(login_handler, '_login_browser') as login_browser, \
+            mock.patch('ibeam.src.handlers.login_handler.time.sleep'):
+        assert login_handler.login() == (False, False)
+    login_browser.assert_not_called()
+    assert len(_Handler.submitted) == 1
+
+
+@pytest.mark.parametrize('version', list(VERSIONS))
+def test_login_to_standin(version, monkeypatch):
+    monkeypatch.setattr(LoginPageHandler, 'account', 'user')
+    monkeypatch.setattr(LoginPageHandler, 'password', 'secret')
+    monkeypatch.setattr(LoginPageHandler, 'version', version)
+    monkeypatch.setattr(LoginPageHandler, 'scenario', [PAPER_ERROR, TWO_FA_SELECT, TWO_FA, IB_KEY_PROMO])
+    server = start_login_page_standin()
+    try:
+        login_handler = _login_handler(f'https://localhost:{server.server_address[1]}', 'secret')
+        with mock.patch.object(login_handler, '_login_browser') as login_browser:
+            assert login_handler.login() == (True, False)
+        login_browser.assert_not_called()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,200 @@
+"""
+Tests for ibeam.src.http_pool
+"""
+import asyncio
+import http.client
+import socketserver
+import ssl
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[3] / 'support' / 'benchmarks'))
+
+from gateway_simulator import GatewaySimulator, start_gateway_simulator, AUTHENTICATED, NO_SESSION, ROUTE_TICKLE, ROUTE_VALIDATE, ROUTE_LOGOUT
+from ibeam.src.http_pool import AsyncConnectionPool, ConnectionPool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        code = 500 if self.path == '/error' else 200
+        body = b'{"ok":true}'
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path == '/drop':
+            # close the connection without announcing it, as a server restart would
+            self.close_connection = True
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server, path='/tickle'):
+    return f'http://127.0.0.1:{server.server_address[1]}{path}'
+
+
+def test_connection_reused(server):
+    pool = ConnectionPool(ssl_context=None, timeout=5, pool_size=2, idle_timeout=30)
+    for _ in range(5):
+        assert pool.request(_url(server), 'POST').read() == b'{"ok":true}'
+
+    assert pool.requests_made == 5
+    assert pool.connections_opened == 1
+
+
+def test_idle_connection_evicted(server):
+    pool = ConnectionPool(ssl_context=None, timeout=5, pool_size=2, idle_timeout=-1)
+    pool.request(_url(server))
+    pool.request(_url(server))
+
+    assert pool.connections_opened == 2
+
+
+def test_reconnect_on_reset(server):
+    pool = ConnectionPool(ssl_context=None, timeout=5, pool_size=2, idle_timeout=30)
+    pool.request(_url(server, '/drop'))
+
+    assert pool.request(_url(server)).read() == b'{"ok":true}'
+    assert pool.connections_opened == 2
+
+
+def test_errors_match_urlopen(server):
+    pool = ConnectionPool(ssl_context=None, timeout=5, pool_size=2, idle_timeout=30)
+
+    with pytest.raises(HTTPError) as e:
+        pool.request(_url(server, '/error'), 'POST')
+    assert e.value.code == 500
+    assert 'Internal Server Error' in str(e.value)
+
+    port = server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    pool.clear()
+
+    with pytest.raises(URLError) as e:
+        pool.request(f'http://127.0.0.1:{port}/tickle')
+    assert 'Connection refused' in str(e.value)
+
+
+TICKLE_BODY = b'{"session":"abc","ssoExpires":5000,"iserver":{"authStatus":{"authenticated":true,"competing":false,"connected":true}}}'
+
+# responses as sent by the Gateway, and the ways of framing a body HTTP/1.1 allows
+RAW_RESPONSES = {
+    '/length': b'HTTP/1.1 200 OK\r\nx-response-time: 1ms\r\nContent-Type: application/json;charset=utf-8\r\nContent-Length: %d\r\n\r\n%s' % (len(TICKLE_BODY), TICKLE_BODY),
+    '/chunked': b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n' + b'%x;ext=1\r\n%s\r\n' % (len(TICKLE_BODY), TICKLE_BODY) + b'0\r\nX-Trailer: 1\r\n\r\n',
+    '/no-content': b'HTTP/1.1 204 No Content\r\n\r\n',
+    '/close': b'HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n' + TICKLE_BODY,
+    '/interim': b'HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n',
+    '/bad-status': b'ICY 200 OK\r\n\r\n',
+    '/gzip': b'HTTP/1.1 200 OK\r\nTransfer-Encoding: gzip, chunked\r\n\r\n0\r\n\r\n',
+    '/bad-chunk': b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n',
+    '/bad-length': b'HTTP/1.1 200 OK\r\nContent-Length: -1\r\n\r\n',
+}
+
+
+class _RawHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            request_line = self.rfile.readline()
+            if not request_line:
+                return
+            while self.rfile.readline() not in (b'\r\n', b''):
+                pass
+            response = RAW_RESPONSES[request_line.split()[1].decode()]
+            self.wfile.write(response)
+            if response.startswith(b'HTTP/1.0'):
+                return
+
+
+@pytest.fixture
+def raw_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _RawHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('path, body, connections', [
+    ('/length', TICKLE_BODY, 1),
+    ('/chunked', TICKLE_BODY, 1),
+    ('/no-content', b'', 1),
+    ('/close', TICKLE_BODY, 2),
+])
+def test_async_responses_read(raw_server, path, body, connections):
+    pool = AsyncConnectionPool(ssl_context=None, timeout=5, pool_size=2, idle_timeout=30)
+
+    async def run():
+        return [await pool.request(_url(raw_server, path)) for _ in range(2)]
+
+    for response in asyncio.run(run()):
+        assert response.status in (200, 204)
+        assert response.read() == body
+    assert pool.connections_opened == connections
+
+
+@pytest.mark.parametrize('path, error', [
+    ('/interim', URLError),
+    ('/bad-status', URLError),
+    ('/gzip', http.client.UnknownTransferEncoding),
+    ('/bad-chunk', http.client.IncompleteRead),
+    ('/bad-length', http.client.HTTPException),
+])
+def test_async_unexpected_responses_raise(raw_server, path, error):
+    pool = AsyncConnectionPool(ssl_context=None, timeout=5, pool_size=2, idle_timeout=30)
+
+    with pytest.raises(error):
+        asyncio.run(pool.request(_url(raw_server, path)))
+
+
+def test_async_pool_reads_simulator_as_sync_pool():
+    simulator = GatewaySimulator(state=AUTHENTICATED)
+    # the expiry counts down between the two requests otherwise
+    simulator.sso_expires = lambda: 5000
+    server = start_gateway_simulator(simulator)
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    sync_pool = ConnectionPool(ssl_context=ssl_context, timeout=5, pool_size=2, idle_timeout=30)
+    # every request runs its own event loop, which connections can't be kept across
+    async_pool = AsyncConnectionPool(ssl_context=ssl_context, timeout=5, pool_size=0, idle_timeout=30)
+
+    def read(request):
+        try:
+            response = request()
+            return response.status, response.headers.get('Content-Type'), response.read()
+        except HTTPError as e:
+            return e.code, e.headers.get('Content-Type'), None
+
+    try:
+        for route, method in [(ROUTE_TICKLE, 'POST'), (ROUTE_VALIDATE, 'GET'), ('/missing', 'GET'), (ROUTE_LOGOUT, 'POST')]:
+            url = server.base_url + route
+            assert read(lambda: asyncio.run(async_pool.request(url, method))) == read(lambda: sync_pool.request(url, method))
+
+        simulator.set_state(NO_SESSION)
+        url = server.base_url + ROUTE_TICKLE
+        assert read(lambda: asyncio.run(async_pool.request(url, 'POST')))[0] == 401
+    finally:
+        server.shutdown()
+        server.server_close()
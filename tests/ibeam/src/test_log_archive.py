@@ -0,0 +1,66 @@
+"""
+Tests for ibeam.src.log_archive.
+"""
+import datetime
+
+from ibeam.src.log_archive import LogArchive
+
+TODAY = datetime.date(2024, 3, 10)
+
+
+def _write_day(directory, day: datetime.date, lines: int) -> str:
+    name = f'ibeam_log__{day.isoformat()}.txt'
+    (directory / name).write_text(''.join(f'{day} line {i}\n' for i in range(lines)))
+    return name
+
+
+def test_past_days_compressed_and_streamed(tmp_path):
+    _write_day(tmp_path, TODAY - datetime.timedelta(days=1), 1000)
+    current = _write_day(tmp_path, TODAY, 10)
+    archive = LogArchive(str(tmp_path))
+
+    archive.archive(current=str(tmp_path / current), today=TODAY)
+
+    assert sorted(path.name for path in tmp_path.glob('ibeam_log__*.txt*')) == ['ibeam_log__2024-03-09.txt.gz', current]
+    entries = archive.index()
+    assert [(entry['day'], entry['compressed'], entry['lines']) for entry in entries] == [('2024-03-09', True, 1000), ('2024-03-10', False, None)]
+    assert entries[0]['bytes'] > entries[0]['stored_bytes']
+
+    lines = archive.stream_day(TODAY - datetime.timedelta(days=1))
+    assert next(lines) == '2024-03-09 line 0\n'
+    assert len(list(lines)) == 999
+
+
+def test_compression_interrupted_before_deleting_source(tmp_path):
+    day = TODAY - datetime.timedelta(days=1)
+    name = _write_day(tmp_path, day, 100)
+    source = (tmp_path / name).read_bytes()
+    archive = LogArchive(str(tmp_path))
+    archive.archive(today=TODAY)
+
+    # the '.gz' was put in place, but neither the source deleted nor the index written
+    (tmp_path / name).write_bytes(source)
+    (tmp_path / 'ibeam_log__index.json').unlink()
+    (tmp_path / f'{name}.gz.tmp').write_bytes(b'partial')
+    assert len(list(archive.stream_day(day))) == 100
+
+    archive.archive(today=TODAY)
+
+    assert sorted(path.name for path in tmp_path.glob('ibeam_log__*.txt*')) == [f'{name}.gz']
+    assert [(entry['bytes'], entry['lines']) for entry in archive.index()] == [(len(source), 100)]
+    assert len(list(archive.stream_day(day))) == 100
+
+
+def test_retention_deletes_oldest_days(tmp_path):
+    for days_ago in range(5):
+        _write_day(tmp_path, TODAY - datetime.timedelta(days=days_ago), 100)
+    size = (tmp_path / f'ibeam_log__{TODAY}.txt').stat().st_size
+
+    LogArchive(str(tmp_path), compress=False, max_age=3).archive(today=TODAY)
+    assert [entry['day'] for entry in LogArchive(str(tmp_path)).index()] == ['2024-03-07', '2024-03-08', '2024-03-09', '2024-03-10']
+
+    # the current day's file is kept even beyond the limit
+    LogArchive(str(tmp_path), compress=False, max_bytes=size * 2).archive(today=TODAY)
+    assert [entry['day'] for entry in LogArchive(str(tmp_path)).index()] == ['2024-03-09', '2024-03-10']
+    LogArchive(str(tmp_path), compress=False, max_bytes=1).archive(today=TODAY)
+    assert [entry['day'] for entry in LogArchive(str(tmp_path)).index()] == ['2024-03-10']
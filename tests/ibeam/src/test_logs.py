@@ -0,0 +1,82 @@
+"""
+Tests for ibeam.src.logs.
+"""
+import io
+import json
+import logging
+import threading
+
+from ibeam.src import log_context, logs
+from ibeam.src.log_context import ContextFilter
+from ibeam.src.logs import DailyRotatingFileHandler, JsonFormatter
+
+
+def _record(created: float) -> logging.LogRecord:
+    record = logging.LogRecord('ibeam.test', logging.INFO, __file__, 0, 'message', None, None)
+    record.created = created
+    return record
+
+
+def test_file_rotated_at_precomputed_midnight(tmp_path):
+    rollovers = []
+    handler = DailyRotatingFileHandler(str(tmp_path / 'ibeam_log'), on_rollover=rollovers.append)
+    try:
+        handler.emit(_record(handler.rollover_at - 1))
+        stream = handler.stream
+        assert (tmp_path / f'ibeam_log__{handler.timestamp}.txt').read_text() == 'message\n'
+
+        # a record from before midnight keeps to the current file
+        handler.emit(_record(handler.rollover_at - 1))
+        assert handler.stream is stream
+
+        # the first record after midnight opens the file anew, closing the previous one
+        handler.emit(_record(handler.rollover_at))
+        assert handler.stream is not stream
+        assert stream.closed
+        assert rollovers == [handler.get_filename(handler.timestamp)]
+    finally:
+        handler.close()
+
+
+def test_records_written_by_listener_thread(tmp_path):
+    logs.initialize(log_format='%(threadName)s|%(message)s', log_level='INFO', log_to_file=True, outputs_dir=str(tmp_path))
+    try:
+        thread = threading.Thread(target=lambda: logging.getLogger('ibeam.test').debug('from thread'), name='logging-thread')
+        thread.start()
+        thread.join()
+    finally:
+        # writes out the records still queued
+        logs.shutdown()
+
+    contents = next(tmp_path.glob('ibeam_log__*.txt')).read_text()
+    assert contents == 'logging-thread|from thread\n'
+    assert not logs.initialized
+    assert logging.getLogger('ibeam').handlers == []
+
+
+def test_json_records_carry_cycle_attempt_and_step():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(ContextFilter())
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger('ibeam.test_json')
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    try:
+        logger.info('outside')
+        with log_context.cycle('alice') as cycle_id:
+            with log_context.step('login'):
+                log_context.set_attempt(2)
+                logger.info('logging in')
+            logger.info('logged in')
+    finally:
+        logger.removeHandler(handler)
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record['message'] for record in records] == ['outside', 'logging in', 'logged in']
+    assert records[0]['cycle_id'] is None
+    assert cycle_id.startswith('alice-')
+    assert (records[1]['cycle_id'], records[1]['step'], records[1]['attempt']) == (cycle_id, 'login', 2)
+    # the attempt ends with the step it was set in
+    assert (records[2]['cycle_id'], records[2]['step'], records[2]['attempt']) == (cycle_id, None, None)
+    assert isinstance(records[2]['elapsed_ms'], int)
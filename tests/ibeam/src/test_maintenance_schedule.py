@@ -0,0 +1,44 @@
+"""
+Tests for ibeam.src.maintenance_schedule
+"""
+from ibeam.src.handlers.http_handler import Status
+from ibeam.src.maintenance_schedule import AdaptiveSchedule
+
+
+def _schedule() -> AdaptiveSchedule:
+    return AdaptiveSchedule(base_interval=60, min_interval=10, max_interval=180)
+
+
+def test_unknown_expiry_uses_base_interval():
+    schedule = _schedule()
+    assert schedule.next_interval() == 60
+
+    schedule.record(True, Status(expires=None), latency=0.1)
+    assert schedule.next_interval() == 60
+
+
+def test_sparse_when_healthy_dense_near_expiry():
+    schedule = _schedule()
+
+    schedule.record(True, Status(expires=3_600_000), latency=0.1)
+    assert schedule.next_interval() == 180
+
+    schedule.record(True, Status(expires=100_000), latency=0.1)
+    assert 10 < schedule.next_interval() < 50
+
+    schedule.record(True, Status(expires=5_000), latency=0.1)
+    assert schedule.next_interval() == 10
+
+
+def test_failures_back_off_from_min_interval():
+    schedule = _schedule()
+
+    intervals = []
+    for _ in range(5):
+        schedule.record(False)
+        intervals.append(schedule.next_interval())
+
+    assert intervals == [10, 20, 40, 60, 60]
+
+    schedule.record(True, Status(expires=3_600_000))
+    assert schedule.next_interval() == 180
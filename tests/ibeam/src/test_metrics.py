@@ -0,0 +1,61 @@
+"""
+Tests for ibeam.src.metrics
+"""
+from ibeam.src.metrics import Counter, Histogram, Registry
+
+
+def test_counter_render():
+    registry = Registry()
+    counter = Counter('test_outcomes_total', 'Test outcomes.', ('status',), registry=registry)
+    counter.inc(status='AUTHENTICATED')
+    counter.inc(status='AUTHENTICATED')
+    counter.inc(status='NO "SESSION"')
+
+    rendered = registry.render()
+    assert '# TYPE test_outcomes_total counter' in rendered
+    assert 'test_outcomes_total{status="AUTHENTICATED"} 2' in rendered
+    assert 'test_outcomes_total{status="NO \\"SESSION\\""} 1' in rendered
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = Histogram('test_duration_seconds', 'Test durations.', ('route',), buckets=(0.1, 1), registry=registry)
+    histogram.observe(0.05, route='/tickle')
+    histogram.observe(0.5, route='/tickle')
+    histogram.observe(5, route='/tickle')
+
+    with histogram.time(route='/validate'):
+        pass
+
+    rendered = registry.render()
+    assert 'test_duration_seconds_bucket{route="/tickle",le="0.1"} 1' in rendered
+    assert 'test_duration_seconds_bucket{route="/tickle",le="1"} 2' in rendered
+    assert 'test_duration_seconds_bucket{route="/tickle",le="+Inf"} 3' in rendered
+    assert 'test_duration_seconds_sum{route="/tickle"} 5.55' in rendered
+    assert 'test_duration_seconds_count{route="/tickle"} 3' in rendered
+    assert 'test_duration_seconds_count{route="/validate"} 1' in rendered
+
+
+def test_timed_observes_on_exception():
+    registry = Registry()
+    histogram = Histogram('test_step_seconds', 'Test steps.', ('step',), registry=registry)
+
+    @histogram.timed(step='failing')
+    def failing():
+        raise RuntimeError()
+
+    try:
+        failing()
+    except RuntimeError:
+        pass
+
+    assert histogram.labels(step='failing').count == 1
+
+
+def test_histogram_totals():
+    registry = Registry()
+    histogram = Histogram('test_login_seconds', 'Test logins.', ('step',), registry=registry)
+    histogram.observe(1, step='login')
+    histogram.observe(2, step='login')
+
+    assert histogram.totals() == {('login',): (2, 3)}
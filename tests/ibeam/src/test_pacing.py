@@ -0,0 +1,100 @@
+"""
+Tests for ibeam.src.login.pacing
+"""
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from selenium.common import StaleElementReferenceException
+
+from ibeam.src.handlers.login_handler import AttemptException, LoginHandler
+from ibeam.src.login.pacing import PresubmitBuffer, fields_populated, trigger_cleared
+
+
+def test_presubmit_buffer_lowered_after_successes():
+    buffer = PresubmitBuffer(min_buffer=5, max_buffer=30, floor=0, explore_after=2)
+
+    for _ in range(4):
+        buffer.record_success()
+
+    assert buffer.value == 3
+
+
+def test_presubmit_buffer_returns_to_proven_value_after_failure():
+    buffer = PresubmitBuffer(min_buffer=5, max_buffer=30, floor=0, explore_after=1)
+    buffer.record_success()
+    assert buffer.value == 4
+
+    buffer.record_failure()
+    assert buffer.value == 5
+
+    # the failed value isn't retried on the next successes
+    buffer.record_success()
+    assert buffer.value == 5
+
+
+def test_presubmit_buffer_not_lowered_by_default():
+    buffer = PresubmitBuffer(min_buffer=5, max_buffer=30, explore_after=1)
+
+    for _ in range(3):
+        buffer.record_success()
+
+    assert buffer.value == 5
+    assert not buffer.exploring
+
+
+def test_failure_of_explored_buffer_not_counted():
+    login_handler = LoginHandler(
+        secrets_handler=None,
+        two_fa_handler=None,
+        driver_factory=None,
+        targets={},
+        base_url='',
+        route_auth='',
+        two_fa_select_target='',
+        strict_two_fa_code=True,
+        max_immediate_attempts=1,
+        oauth_timeout=5,
+        max_presubmit_buffer=30,
+        min_presubmit_buffer=5,
+        max_failed_auth=5,
+        outputs_dir='',
+        presubmit_buffer_floor=0,
+    )
+    login_handler.presubmit_buffer.explore_after = 1
+    login_handler.presubmit_buffer.record_success()
+    error_trigger = SimpleNamespace(text='Invalid username password combination')
+
+    with pytest.raises(AttemptException):
+        login_handler.step_error(None, error_trigger, 30, 5, '')
+    assert login_handler.failed_attempts == 0
+    assert login_handler.presubmit_buffer.value == 5
+
+    with pytest.raises(AttemptException):
+        login_handler.step_error(None, error_trigger, 30, 5, '')
+    assert login_handler.failed_attempts == 1
+
+
+def test_presubmit_buffer_history_persisted(tmpdir):
+    history_path = str(tmpdir / 'presubmit_buffer.json')
+    buffer = PresubmitBuffer(min_buffer=5, max_buffer=30, history_path=history_path)
+    buffer.record_failure()
+
+    restored = PresubmitBuffer(min_buffer=5, max_buffer=30, history_path=history_path)
+
+    assert restored.value == 10
+    assert restored.history == {5: {'successes': 0, 'failures': 1, 'last_failure': 0}}
+
+
+def test_readiness_conditions():
+    user_name_el, trigger = mock.MagicMock(), mock.MagicMock()
+    user_name_el.get_attribute.return_value = 'user'
+    trigger.text = 'error'
+
+    assert fields_populated({user_name_el: 'user'})(None)
+    assert not fields_populated({user_name_el: 'other'})(None)
+
+    cleared = trigger_cleared(trigger)
+    assert not cleared(None)
+    trigger.is_displayed.side_effect = StaleElementReferenceException()
+    assert cleared(None)
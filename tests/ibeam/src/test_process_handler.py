@@ -0,0 +1,123 @@
+"""
+Tests for ibeam.src.handlers.process_handler
+"""
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+import psutil
+import pytest
+
+from ibeam.src.handlers.process_handler import ProcessHandler, BlueGreenProcessHandler, GATEWAY_CONF, GATEWAY_ALTERNATE_CONF, write_alternate_conf
+
+_MATCH = 'ibeam-test-gateway-process'
+
+
+def _start_fake_gateway(gateway_dir, conf_name=GATEWAY_CONF) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)', _MATCH, f'../root/{conf_name}'])
+
+
+@pytest.fixture
+def process_handler(tmp_path):
+    handlers = []
+
+    def new_handler(gateway_conf=None, pid_file='gateway.pid', running=True):
+        handler = ProcessHandler(
+            gateway_dir=str(tmp_path),
+            gateway_process_match=_MATCH,
+            gateway_startup=10 if running else 1,
+            verify_connection=lambda: SimpleNamespace(running=running),
+            pid_file=str(tmp_path / pid_file),
+            gateway_conf=gateway_conf,
+        )
+        handlers.append(handler)
+        return handler
+
+    with mock.patch('ibeam.src.handlers.process_handler._start_gateway', _start_fake_gateway):
+        yield new_handler
+
+    for handler in handlers:
+        for process in handler._tracked:
+            process.kill()
+
+
+def test_started_gateway_found_without_scanning(process_handler):
+    handler = process_handler()
+    with mock.patch('psutil.process_iter', return_value=[]) as process_iter:
+        pids = handler.start_gateway()
+        assert handler.find_processes()[0].pid == pids[0]
+
+    # only the initial lookup, before anything was launched, scanned the host
+    assert process_iter.call_count == 1
+    assert pids == [handler._popen.pid]
+
+
+def test_gateway_adopted_from_pid_file(process_handler):
+    pids = process_handler().start_gateway()
+
+    with mock.patch('psutil.process_iter', side_effect=AssertionError('scanned all processes')):
+        adopted = process_handler()
+        assert [process.pid for process in adopted.find_processes()] == pids
+
+
+def test_kill_gateway(process_handler, tmp_path):
+    handler = process_handler()
+    pids = handler.start_gateway()
+
+    assert handler.kill_gateway()
+    assert not psutil.pid_exists(pids[0]) or psutil.Process(pids[0]).status() == psutil.STATUS_ZOMBIE
+    assert not (tmp_path / 'gateway.pid').exists()
+
+
+def _blue_green(process_handler, tmp_path, standby_running=True) -> BlueGreenProcessHandler:
+    return BlueGreenProcessHandler(
+        process_handlers=[
+            process_handler(GATEWAY_CONF, 'gateway.pid'),
+            process_handler(GATEWAY_ALTERNATE_CONF, 'gateway.alternate.pid', running=standby_running),
+        ],
+        base_urls=['https://localhost:5000', 'https://localhost:5002'],
+        base_url_holders=[SimpleNamespace(base_url=None)],
+        state_file=str(tmp_path / 'gateway_base_url'),
+    )
+
+
+def test_blue_green_restart_switches_once_replacement_is_ready(process_handler, tmp_path):
+    handler = _blue_green(process_handler, tmp_path)
+    blue_pids = handler.start_gateway()
+    logout = mock.MagicMock()
+
+    assert handler.restart_gateway(logout)
+
+    logout.assert_called_once()
+    assert handler.active == 1
+    assert handler.base_url_holders[0].base_url == 'https://localhost:5002'
+    assert (tmp_path / 'gateway_base_url').read_text().strip() == 'https://localhost:5002'
+    # the slots don't mistake each other's Gateway for their own
+    assert [process.pid for process in handler.find_processes()] != blue_pids
+    assert not handler.process_handlers[0].find_processes()
+
+    # a restarted IBeam picks up the active slot
+    assert _blue_green(process_handler, tmp_path).active == 1
+
+
+def test_blue_green_restart_keeps_running_gateway_if_replacement_fails(process_handler, tmp_path):
+    handler = _blue_green(process_handler, tmp_path, standby_running=False)
+    blue_pids = handler.start_gateway()
+    logout = mock.MagicMock()
+
+    assert not handler.restart_gateway(logout)
+
+    logout.assert_not_called()
+    assert handler.active == 0
+    assert [process.pid for process in handler.find_processes()] == blue_pids
+    assert not handler.process_handlers[1].find_processes()
+
+
+def test_alternate_conf_listens_on_other_port(tmp_path):
+    (tmp_path / 'root').mkdir()
+    (tmp_path / 'root' / GATEWAY_CONF).write_text('ip2loc: "US"\nlistenPort: 5000\nlistenSsl: true\n')
+
+    path = write_alternate_conf(str(tmp_path), 5002)
+
+    assert open(path).read() == 'ip2loc: "US"\nlistenPort: 5002\nlistenSsl: true\n'
@@ -0,0 +1,51 @@
+"""
+Tests for ibeam.src.login.resource_blocking
+"""
+from unittest import mock
+
+import pytest
+from selenium import webdriver
+
+from ibeam.src.login.resource_blocking import ResourceBlocking, parse_list, RESOURCE_BLOCKING_OFF, RESOURCE_BLOCKING_SAFE, RESOURCE_BLOCKING_STRICT
+
+
+def test_off_preset_changes_nothing():
+    resource_blocking = ResourceBlocking(preset=RESOURCE_BLOCKING_OFF)
+    options = webdriver.ChromeOptions()
+    driver = mock.MagicMock()
+
+    resource_blocking.configure_options(options)
+    resource_blocking.apply(driver)
+
+    assert options.arguments == []
+    assert 'prefs' not in options.experimental_options
+    driver.execute_cdp_cmd.assert_not_called()
+
+
+def test_safe_preset_blocks_urls():
+    resource_blocking = ResourceBlocking(preset=RESOURCE_BLOCKING_SAFE, blocked_urls=parse_list(' *.css , *banner*'))
+    driver = mock.MagicMock()
+
+    resource_blocking.apply(driver)
+
+    blocked_urls = driver.execute_cdp_cmd.call_args_list[-1].args[1]['urls']
+    assert driver.execute_cdp_cmd.call_args_list[-1].args[0] == 'Network.setBlockedURLs'
+    assert {'*.png', '*.woff2', '*googletagmanager.com*', '*.css', '*banner*'} <= set(blocked_urls)
+
+
+@pytest.mark.parametrize('preset, allowed_hosts, expected', [
+    (RESOURCE_BLOCKING_STRICT, [], '--host-resolver-rules=MAP * ~NOTFOUND , EXCLUDE localhost , EXCLUDE 127.0.0.1 , EXCLUDE gateway'),
+    (RESOURCE_BLOCKING_OFF, ['cdn.example.com'], '--host-resolver-rules=MAP * ~NOTFOUND , EXCLUDE localhost , EXCLUDE 127.0.0.1 , EXCLUDE gateway , EXCLUDE cdn.example.com'),
+])
+def test_allowlist(preset, allowed_hosts, expected):
+    resource_blocking = ResourceBlocking(preset=preset, allowed_hosts=allowed_hosts, base_url='https://gateway:5000')
+    options = webdriver.ChromeOptions()
+
+    resource_blocking.configure_options(options)
+
+    assert options.arguments == [expected]
+
+
+def test_unknown_preset():
+    with pytest.raises(ValueError):
+        ResourceBlocking(preset='everything')
@@ -0,0 +1,135 @@
+"""
+Tests for ibeam.src.handlers.secrets_handler
+"""
+import os
+import random
+import string
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[3] / 'support' / 'benchmarks'))
+
+from gcp_standin import GcpStandIn, start_gcp_standin
+from ibeam.src.handlers.secrets_handler import SecretsHandler, SECRETS_SOURCE_ENV, SECRETS_SOURCE_FS, SECRETS_SOURCE_GCP_SECRETS
+
+_FIELDS = ['IBEAM_ACCOUNT', 'IBEAM_PASSWORD', 'IBEAM_KEY']
+
+
+def _random_value(n=16) -> str:
+    # no control characters, so that stripping doesn't alter the value
+    c = string.ascii_letters + string.digits + string.punctuation
+    return ''.join(random.choice(c) for _ in range(n))
+
+
+def _environ(source: str, values: dict, directory, lappend='', rappend='') -> dict:
+    environ = {}
+    for field, value in values.items():
+        if source == SECRETS_SOURCE_ENV:
+            environ[field] = lappend + value + rappend
+        else:
+            environ[field] = os.path.join(directory, field)
+            with open(environ[field], 'wt', encoding='UTF-8') as fh:
+                fh.write(lappend + value + rappend)
+    return environ
+
+
+@pytest.mark.parametrize('source', [SECRETS_SOURCE_ENV, SECRETS_SOURCE_FS])
+def test_secret_properties(source, tmpdir):
+    values = {field: _random_value() for field in _FIELDS}
+    secrets_handler = SecretsHandler(secrets_source=source)
+
+    with mock.patch.dict(os.environ, _environ(source, values, tmpdir)):
+        assert secrets_handler.account == values['IBEAM_ACCOUNT']
+        assert secrets_handler.password == values['IBEAM_PASSWORD']
+        assert secrets_handler.key == values['IBEAM_KEY']
+
+
+@pytest.mark.parametrize('source', [SECRETS_SOURCE_ENV, SECRETS_SOURCE_FS])
+def test_secret_value_strips(source, tmpdir):
+    values = {field: _random_value() for field in _FIELDS}
+    secrets_handler = SecretsHandler(secrets_source=source)
+
+    with mock.patch.dict(os.environ, _environ(source, values, tmpdir, lappend='\t')):
+        for field in _FIELDS:
+            assert secrets_handler.secret_value(secrets_handler.encoding, name=field, lstrip='\t') == values[field]
+
+    with mock.patch.dict(os.environ, _environ(source, values, tmpdir, rappend='\t')):
+        for field in _FIELDS:
+            assert secrets_handler.secret_value(secrets_handler.encoding, name=field, rstrip='\t') == values[field]
+
+    # by default only line endings are stripped
+    with mock.patch.dict(os.environ, _environ(source, values, tmpdir, rappend='\r\n')):
+        for field in _FIELDS:
+            assert secrets_handler.secret_value(secrets_handler.encoding, name=field) == values[field]
+
+
+def test_missing_secret(tmpdir):
+    secrets_handler = SecretsHandler(secrets_source=SECRETS_SOURCE_FS)
+
+    with mock.patch.dict(os.environ, {'IBEAM_ACCOUNT': os.path.join(tmpdir, 'missing')}):
+        assert secrets_handler.account is None
+
+    with mock.patch.dict(os.environ, {}, clear=True):
+        assert secrets_handler.account is None
+
+
+def test_secret_properties_with_env_prefix():
+    secrets_handler = SecretsHandler(secrets_source=SECRETS_SOURCE_ENV, env_prefix='IBEAM_ALICE_')
+
+    with mock.patch.dict(os.environ, {'IBEAM_ACCOUNT': 'default', 'IBEAM_ALICE_ACCOUNT': 'alice', 'IBEAM_ALICE_PASSWORD': 'secret'}):
+        assert secrets_handler.account == 'alice'
+        assert secrets_handler.password == 'secret'
+        assert secrets_handler.key is None
+
+
+@pytest.fixture
+def gcp_standin():
+    server = start_gcp_standin(GcpStandIn(latency=0.05))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _gcp_secrets_handler(server, ttl: float) -> SecretsHandler:
+    return SecretsHandler(secrets_source=SECRETS_SOURCE_GCP_SECRETS, gcp_base_url=server.secrets_url, gcp_metadata_url=server.metadata_url, secrets_cache_ttl=ttl)
+
+
+def test_gcp_credentials_fetched_at_once_and_cached(gcp_standin):
+    environ = {'IBEAM_ACCOUNT': 'account/versions/1', 'IBEAM_PASSWORD': 'password/versions/1', 'IBEAM_KEY': 'key/versions/1'}
+    standin = gcp_standin.standin
+    secrets_handler = _gcp_secrets_handler(gcp_standin, ttl=300)
+
+    with mock.patch.dict(os.environ, environ):
+        assert secrets_handler.credentials() == ('bench-user', 'bench-password', 'bench-key')
+        assert standin.requests == {'token': 1, 'secret': 3}
+        assert standin.max_in_flight == 3
+
+        assert secrets_handler.credentials() == ('bench-user', 'bench-password', 'bench-key')
+        assert secrets_handler.account == 'bench-user'
+        assert standin.requests == {'token': 1, 'secret': 3}
+
+        # without caching, the secrets are requested again but the token is reused
+        secrets_handler.secrets_cache_ttl = 0
+        assert secrets_handler.password == 'bench-password'
+        assert standin.requests == {'token': 1, 'secret': 4}
+
+
+def test_gcp_token_requested_anew_when_expired_or_revoked(gcp_standin):
+    standin = gcp_standin.standin
+    standin.expires_in = 0
+    secrets_handler = _gcp_secrets_handler(gcp_standin, ttl=0)
+
+    with mock.patch.dict(os.environ, {'IBEAM_ACCOUNT': 'account/versions/1'}):
+        assert secrets_handler.account == 'bench-user'
+        assert secrets_handler.account == 'bench-user'
+        assert standin.requests['token'] == 2
+
+        standin.expires_in = 3599
+        assert secrets_handler.account == 'bench-user'
+        standin._tokens.clear()
+        assert secrets_handler.account is None
+        assert secrets_handler.account == 'bench-user'
+        assert standin.requests['token'] == 4
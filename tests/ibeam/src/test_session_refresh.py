@@ -0,0 +1,68 @@
+"""
+Tests for ibeam.src.session_refresh
+"""
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from ibeam.src.handlers.http_handler import Status
+from ibeam.src.session_refresh import RefreshPlanner, TradingCalendar, parse_trading_hours, parse_trading_days, parse_holidays
+
+_NEW_YORK = ZoneInfo('America/New_York')
+
+
+def _calendar(hours='09:30-16:00', holidays='', quiet_margin=1800):
+    return TradingCalendar(
+        timezone='America/New_York',
+        hours=parse_trading_hours(hours),
+        days=parse_trading_days('mon,tue,wed,thu,fri'),
+        holidays=parse_holidays(holidays),
+        quiet_margin=quiet_margin,
+    )
+
+
+def _status(now: datetime, expires_at: datetime) -> Status:
+    return Status(running=True, session=True, connected=True, authenticated=True, expires=int((expires_at - now).total_seconds() * 1000))
+
+
+def _new_york(*args) -> datetime:
+    return datetime(*args, tzinfo=_NEW_YORK)
+
+
+@pytest.mark.parametrize('now, expires_at, refresh_at', [
+    # expiring during trading hours, refreshed before the quiet margin ahead of the open
+    (_new_york(2024, 3, 4, 20, 0), _new_york(2024, 3, 5, 11, 0), _new_york(2024, 3, 5, 9, 0)),
+    # expiring at a quiet time, refreshed the lead time ahead of it
+    (_new_york(2024, 3, 4, 20, 0), _new_york(2024, 3, 5, 22, 0), _new_york(2024, 3, 5, 21, 45)),
+    # the weekend is quiet
+    (_new_york(2024, 3, 9, 12, 0), _new_york(2024, 3, 10, 12, 0), _new_york(2024, 3, 10, 11, 45)),
+    # holidays are quiet too
+    (_new_york(2024, 12, 24, 20, 0), _new_york(2024, 12, 25, 12, 0), _new_york(2024, 12, 25, 11, 45)),
+    # no quiet time is left before the expiry, refreshed the lead time ahead of it
+    (_new_york(2024, 3, 5, 10, 0), _new_york(2024, 3, 5, 12, 0), _new_york(2024, 3, 5, 11, 45)),
+])
+def test_refresh_planned_at_latest_quiet_time(now, expires_at, refresh_at):
+    planner = RefreshPlanner(_calendar(holidays='2024-12-25'), lead_time=900)
+
+    assert planner.plan(_status(now, expires_at), now=now) == refresh_at
+
+
+def test_overnight_trading_hours():
+    calendar = _calendar(hours='18:00-17:00', quiet_margin=900)
+
+    assert not calendar.is_quiet(_new_york(2024, 3, 5, 3, 0))
+    assert calendar.is_quiet(_new_york(2024, 3, 5, 17, 30))
+    assert calendar.latest_quiet(_new_york(2024, 3, 5, 3, 0), _new_york(2024, 3, 6, 3, 0)) == _new_york(2024, 3, 5, 17, 45)
+
+
+def test_no_refresh_planned():
+    planner = RefreshPlanner(_calendar(), lead_time=900, cooldown=3600)
+    now = _new_york(2024, 3, 4, 20, 0)
+
+    assert planner.plan(Status(running=True, session=True, authenticated=True), now=now) is None
+    assert planner.plan(Status(running=True, session=True, authenticated=False, expires=3600000), now=now) is None
+
+    # refreshing again didn't extend a session expiring before the cooldown is over
+    planner.record_refresh(now)
+    assert planner.plan(_status(now, now + timedelta(minutes=30)), now=now) is None
@@ -0,0 +1,151 @@
+"""
+Tests for ibeam.src.login.session_store, resuming sessions against the local Gateway simulator.
+"""
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(Path(__file__).parents[3] / 'support' / 'benchmarks'))
+
+from bench_browser_pool import _login_handler
+from gateway_simulator import GatewaySimulator, start_gateway_simulator, NO_SESSION, AUTHENTICATED
+from login_page_standin import LoginPageHandler
+from ibeam.src import var
+from ibeam.src.handlers.http_handler import HttpHandler
+from ibeam.src.handlers.strategy_handler import StrategyHandler
+from ibeam.src.login.http_login import LOGIN_ENGINE_HTTP
+from ibeam.src.login.session_store import SessionStore
+
+
+def _cookies() -> list:
+    return [{'name': 'XYZAB', 'value': 'secret-token', 'domain': 'localhost', 'path': '/', 'secure': True}]
+
+
+def test_store_is_encrypted_and_discarded_when_expired_or_unreadable(tmp_path):
+    path = str(tmp_path / 'session.enc')
+    store = SessionStore(path, Fernet.generate_key().decode(), max_age=60)
+
+    store.save(_cookies(), {'website_version': 2})
+    assert b'secret-token' not in Path(path).read_bytes()
+    assert store.load()['cookies'] == _cookies()
+    assert store.load()['state'] == {'website_version': 2}
+
+    assert SessionStore(path, Fernet.generate_key().decode()).load() is None
+    assert not Path(path).exists()
+
+    store.save(_cookies())
+    store.max_age = -1
+    assert store.load() is None
+    assert not Path(path).exists()
+
+    store.save([dict(_cookies()[0], expiry=int(time.time()) - 1)])
+    store.max_age = 60
+    assert store.load() is None
+
+
+@pytest.fixture
+def strategy_handler(tmp_path):
+    simulator = GatewaySimulator()
+    server = start_gateway_simulator(simulator)
+    http_handler = HttpHandler(
+        inputs_handler=SimpleNamespace(valid_certificates=False),
+        base_url=server.base_url,
+        route_validate=var.ROUTE_VALIDATE,
+        route_tickle=var.ROUTE_TICKLE,
+        route_logout=var.ROUTE_LOGOUT,
+        route_reauthenticate=var.ROUTE_REAUTHENTICATE,
+        route_initialise=var.ROUTE_INITIALISE,
+        request_timeout=5,
+    )
+    login_handler = _login_handler(server.base_url, driver_factory=None)
+    login_handler.login_engine = LOGIN_ENGINE_HTTP
+    login_handler.session_store = SessionStore(str(tmp_path / 'session.enc'), Fernet.generate_key().decode())
+    strategy_handler = StrategyHandler(
+        http_handler=http_handler,
+        login_handler=login_handler,
+        process_handler=None,
+        authentication_strategy='B',
+        reauthenticate_wait=0,
+        restart_failed_sessions=False,
+        restart_wait=0,
+        max_reauthenticate_retries=1,
+        max_status_check_retries=1,
+    )
+    strategy_handler.simulator = simulator
+    LoginPageHandler.scenario = []
+    LoginPageHandler.sso_tokens.clear()
+    yield strategy_handler
+    server.shutdown()
+    server.server_close()
+
+
+def _logins(simulator: GatewaySimulator) -> int:
+    return simulator.requests['/sso/Login']
+
+
+def test_restart_resumes_stored_session_without_logging_in(strategy_handler):
+    simulator = strategy_handler.simulator
+
+    success, _, _ = strategy_handler.try_authenticating()
+    assert success
+    assert strategy_handler.login_handler.session_store.load() is not None
+    logins = _logins(simulator)
+
+    # the Gateway restarts, while the SSO session lasts
+    simulator.set_state(NO_SESSION)
+    strategy_handler.resume_pending = True
+    success, _, status = strategy_handler.try_authenticating()
+
+    assert success and status.authenticated
+    assert simulator.state == AUTHENTICATED
+    # a single GET of the login page replaying the cookies, no credentials submitted
+    assert _logins(simulator) == logins + 1
+
+
+def test_falls_back_to_login_when_stored_session_is_rejected(strategy_handler):
+    simulator = strategy_handler.simulator
+
+    strategy_handler.try_authenticating()
+    LoginPageHandler.sso_tokens.clear()
+    simulator.set_state(NO_SESSION)
+    strategy_handler.resume_pending = True
+
+    success, _, _ = strategy_handler.try_authenticating()
+
+    assert success
+    # the stored session was discarded and a new one stored by the login
+    assert strategy_handler.login_handler.session_store.load()['cookies'][0]['value'] in LoginPageHandler.sso_tokens
+
+
+def test_stored_session_is_only_resumed_after_a_start(strategy_handler):
+    simulator = strategy_handler.simulator
+
+    strategy_handler.try_authenticating()
+    logins = _logins(simulator)
+
+    # the session is lost while the Gateway keeps running
+    simulator.set_state(NO_SESSION)
+    success, _, _ = strategy_handler.try_authenticating()
+
+    assert success
+    # logged in with credentials: the login page and the form submission
+    assert _logins(simulator) == logins + 2
+
+
+def test_resume_requires_the_login_success_message(strategy_handler, monkeypatch):
+    login_handler = strategy_handler.login_handler
+
+    def handle_login(self, method: str) -> bool:
+        # a webpage rendered with JavaScript displays neither the success message nor the login form
+        self._send_html('<html><body><div id="app"></div></body></html>')
+        return True
+
+    strategy_handler.try_authenticating()
+    monkeypatch.setattr(LoginPageHandler, 'handle_login', handle_login)
+
+    assert not login_handler.resume_session()
+    assert login_handler.session_store.load() is not None
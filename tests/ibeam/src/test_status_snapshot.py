@@ -0,0 +1,67 @@
+"""
+Tests for ibeam.src.status_snapshot
+"""
+import threading
+import time
+
+from ibeam.src.handlers.http_handler import Status
+from ibeam.src.status_snapshot import StatusSnapshot
+
+
+class _SlowFetch():
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self) -> Status:
+        self.calls += 1
+        time.sleep(self.delay)
+        return Status(running=True, session=True, authenticated=True)
+
+
+def test_fresh_status_is_reused():
+    fetch = _SlowFetch(delay=0)
+    snapshot = StatusSnapshot(fetch, ttl=60)
+
+    first = snapshot.get()
+    assert snapshot.get() is first
+    assert fetch.calls == 1
+
+
+def test_zero_ttl_always_fetches():
+    fetch = _SlowFetch(delay=0)
+    snapshot = StatusSnapshot(fetch, ttl=0)
+
+    snapshot.get()
+    snapshot.get()
+    assert fetch.calls == 2
+
+
+def test_concurrent_readers_share_single_fetch():
+    fetch = _SlowFetch()
+    snapshot = StatusSnapshot(fetch, ttl=60)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(snapshot.get())) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetch.calls == 1
+    assert len(results) == 10
+    assert all(status is results[0] for status in results)
+
+
+def test_update_and_invalidate():
+    fetch = _SlowFetch(delay=0)
+    snapshot = StatusSnapshot(fetch, ttl=60)
+
+    status = Status(running=True)
+    snapshot.update(status)
+    assert snapshot.get() is status
+    assert fetch.calls == 0
+
+    snapshot.invalidate()
+    assert snapshot.get() is not status
+    assert fetch.calls == 1
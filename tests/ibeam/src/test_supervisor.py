@@ -0,0 +1,164 @@
+"""
+Tests for ibeam.src.supervisor, run against one local Gateway simulator per account.
+"""
+import json
+import socket
+import sys
+import threading
+import urllib.request
+from contextlib import closing
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from urllib.error import HTTPError
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[3] / 'support' / 'benchmarks'))
+
+from gateway_simulator import GatewaySimulator, start_gateway_simulator, AUTHENTICATED
+from ibeam.src import var
+from ibeam.src.gateway_client import GatewayClient
+from ibeam.src.handlers.http_handler import HttpHandler
+from ibeam.src.handlers.strategy_handler import StrategyHandler
+from ibeam.src.login.browser_budget import BrowserBudget
+from ibeam.src.supervisor import Supervisor, parse_accounts
+
+
+def next_free_port(host='127.0.0.1'):
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def _new_client(name: str, simulator: GatewaySimulator, login_result: tuple) -> GatewayClient:
+    http_handler = HttpHandler(
+        inputs_handler=SimpleNamespace(valid_certificates=False),
+        base_url=simulator.base_url,
+        route_validate=var.ROUTE_VALIDATE,
+        route_tickle=var.ROUTE_TICKLE,
+        route_logout=var.ROUTE_LOGOUT,
+        route_reauthenticate=var.ROUTE_REAUTHENTICATE,
+        route_initialise=var.ROUTE_INITIALISE,
+        request_timeout=5,
+        pool_size=2,
+    )
+
+    def login():
+        if login_result[0]:
+            simulator.set_state(AUTHENTICATED)
+        return login_result
+
+    login_handler = mock.MagicMock()
+    login_handler.session_store = None
+    login_handler.login.side_effect = login
+    process_handler = mock.MagicMock()
+    strategy_handler = StrategyHandler(
+        http_handler=http_handler,
+        login_handler=login_handler,
+        process_handler=process_handler,
+        authentication_strategy='B',
+        reauthenticate_wait=0,
+        restart_failed_sessions=False,
+        restart_wait=0,
+        max_reauthenticate_retries=2,
+        max_status_check_retries=2,
+    )
+    return GatewayClient(
+        http_handler=http_handler,
+        strategy_handler=strategy_handler,
+        process_handler=process_handler,
+        health_server_port=None,
+        spawn_new_processes=False,
+        maintenance_interval=60,
+        request_retries=1,
+        name=name,
+    )
+
+
+@pytest.fixture
+def supervisor():
+    servers = []
+    clients = {}
+    # alice logs in, bob's credentials are rejected
+    for name, login_result in [('alice', (True, False)), ('bob', (False, False))]:
+        simulator = GatewaySimulator()
+        servers.append(start_gateway_simulator(simulator))
+        simulator.base_url = servers[-1].base_url
+        clients[name] = _new_client(name, simulator, login_result)
+
+    port = next_free_port()
+    supervisor = Supervisor(clients=clients, health_server_port=port, browser_budget=BrowserBudget(size=1))
+    supervisor.url = f'http://127.0.0.1:{port}'
+    yield supervisor
+    supervisor.shutdown()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read().decode()
+    except HTTPError as e:
+        return e.code, None
+
+
+def test_status_of_each_account(supervisor):
+    supervisor.start_and_authenticate()
+
+    code, body = _get(supervisor.url + '/status')
+    status = json.loads(body)
+    assert code == 200
+    assert status['accounts']['alice']['parsed_status'] == 'AUTHENTICATED'
+    assert status['accounts']['bob']['parsed_status'] != 'AUTHENTICATED'
+    assert status['accounts']['alice']['gateway_base_url'] == supervisor.clients['alice'].http_handler.base_url
+    assert status['browser_budget'] == {'size': 1, 'holders': []}
+
+    assert _get(supervisor.url + '/readyz')[0] == 503
+    assert _get(supervisor.url + '/accounts/alice/readyz')[0] == 200
+    assert _get(supervisor.url + '/accounts/bob/readyz')[0] == 503
+    assert _get(supervisor.url + '/accounts/carol/status')[0] == 404
+
+
+def test_shut_down_account_leaves_others_maintained(supervisor):
+    supervisor.clients['bob'].strategy_handler.login_handler.login.side_effect = lambda: (False, True)
+    supervisor.build_scheduler()
+
+    assert supervisor.clients['bob']._maintenance() is None
+
+    assert supervisor.clients['bob'].get_shutdown_status()
+    assert not supervisor.get_shutdown_status()
+    assert [job.id for job in supervisor._scheduler.get_jobs()] == ['maintenance-alice']
+    assert _get(supervisor.url + '/livez')[0] == 200
+    assert _get(supervisor.url + '/accounts/bob/livez')[0] == 500
+
+
+def test_browser_budget_limits_concurrent_browsers():
+    budget = BrowserBudget(size=1, timeout=0.1)
+    assert budget.acquire('alice')
+
+    # bob gives up waiting while alice holds the only browser
+    assert not budget.acquire('bob')
+
+    acquired = threading.Event()
+    budget.timeout = 5
+    thread = threading.Thread(target=lambda: budget.acquire('bob') and acquired.set())
+    thread.start()
+    assert not acquired.wait(0.2)
+
+    budget.release('alice')
+    thread.join(5)
+    assert acquired.is_set()
+    assert budget.holders == ['bob']
+
+
+def test_parse_accounts():
+    assert parse_accounts(' alice, bob ') == ['alice', 'bob']
+    assert parse_accounts('') == []
+
+    with pytest.raises(ValueError):
+        parse_accounts('alice,ALICE')
+    with pytest.raises(ValueError):
+        parse_accounts('alice-smith')
@@ -0,0 +1,52 @@
+"""
+Tests for the IBKR website version detection of ibeam.src.handlers.login_handler
+"""
+import time
+from unittest import mock
+
+from ibeam.src.handlers.login_handler import LoginHandler, check_version
+from ibeam.src.login.targets import Target, WEBSITE_VERSIONS
+
+
+class _FakeDriver():
+    def __init__(self, present_names: list):
+        self.present_names = present_names
+        self.lookups = []
+
+    def find_elements(self, by, identifier):
+        self.lookups.append(identifier)
+        return [object()] if identifier in self.present_names else []
+
+
+def test_check_version_in_single_wait():
+    driver = _FakeDriver(['username'])
+
+    start = time.monotonic()
+    assert check_version(driver, WEBSITE_VERSIONS, timeout=5) == 2
+    assert time.monotonic() - start < 1
+    assert driver.lookups == ['user_name', 'username']
+
+
+def test_check_version_starts_with_preferred():
+    driver = _FakeDriver(['username'])
+
+    assert check_version(driver, WEBSITE_VERSIONS, preferred=2) == 2
+    assert driver.lookups == ['username']
+
+
+def test_check_version_unknown_page():
+    with mock.patch('selenium.webdriver.support.wait.time.sleep'):
+        assert check_version(_FakeDriver([]), WEBSITE_VERSIONS, timeout=0.1) is None
+
+
+def test_version_change_replaces_targets():
+    login_handler = LoginHandler.__new__(LoginHandler)
+    login_handler.website_version = None
+    targets = {'PASSWORD': Target('NAME@@password')}
+
+    login_handler.apply_version(targets, 2)
+    login_handler.apply_version(targets, 1)
+
+    assert login_handler.website_version == 1
+    assert targets['USER_NAME'].variable == WEBSITE_VERSIONS[1]['USER_NAME_EL']
+    assert targets['ERROR'].variable == WEBSITE_VERSIONS[1]['ERROR_EL']